@@ -1,4 +1,6 @@
 import os
+import sys
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -26,6 +28,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Durée, statut et SQL de chaque requête (voir main/metriques.py)
+    'main.middleware.MetriquesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -33,6 +37,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Profil à la demande des superutilisateurs (?profil=, voir main/profilage.py)
+    'main.middleware.ProfilMiddleware',
 ]
 
 ROOT_URLCONF = 'esco_clean.urls'
@@ -62,9 +68,115 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Attente du verrou SQLite (secondes) avant « database is locked ».
+            # Les transactions de réservation prennent le verrou d'écriture dès
+            # le BEGIN (reservations.transaction_ecriture) ; les autres, dont
+            # l'export, restent en BEGIN différé pour ne pas bloquer les RDV.
+            'timeout': 5,
+        },
     }
 }
 
+# Sessions - ne pas écrire dans la base clinique à chaque navigation
+# 'signed_cookies' (défaut) : session signée dans le cookie, aucune requête SQL
+# 'cache' : cache fichier partagé entre les workers
+# 'cached_db' : cache + base dédiée sessions.sqlite3 (jamais db.sqlite3)
+# 'db' : comportement Django d'origine, dans la base dédiée également
+ESCO_SESSION_BACKEND = os.environ.get('ESCO_SESSION_BACKEND', 'signed_cookies')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{ESCO_SESSION_BACKEND}'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_COOKIE_HTTPONLY = True
+SESSION_SAVE_EVERY_REQUEST = False
+
+CACHES = {
+    # Backends de Django qui comptent succès et échecs de lecture (main/caches.py)
+    'default': {
+        'BACKEND': 'main.caches.LocMemCache',
+        'NOM': 'default',
+    },
+    'sessions': {
+        'BACKEND': 'main.caches.FileBasedCache',
+        'NOM': 'sessions',
+        'LOCATION': BASE_DIR / 'cache' / 'sessions',
+        'TIMEOUT': None,
+        # Pas d'éviction (300 entrées par défaut) : elle supprimerait un tiers
+        # des sessions, et déconnecterait leurs utilisateurs. Chaque session
+        # expire à sa date d'expiration ; son fichier est supprimé à la lecture,
+        # ou par la commande `purger_sessions` (à lancer chaque nuit par cron)
+        # pour les sessions jamais relues
+        'EVICTION': False,
+    },
+}
+
+DATABASE_ROUTERS = []
+if ESCO_SESSION_BACKEND in ('db', 'cached_db'):
+    DATABASES['sessions'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'sessions.sqlite3',
+    }
+    DATABASE_ROUTERS.append('main.routeurs.SessionsRouter')
+
+# Réplique en lecture (voir main/replica.py) : copie de db.sqlite3 rafraîchie
+# par `manage.py rafraichir_replica`, qui sert les lectures des requêtes GET.
+# db_backup.sqlite3 reste une sauvegarde manuelle, distincte de la réplique.
+ESCO_REPLICA = os.environ.get('ESCO_REPLICA', '') == '1'
+ESCO_REPLICA_CHEMIN = Path(os.environ.get('ESCO_REPLICA_CHEMIN', BASE_DIR / 'db_replica.sqlite3'))
+# Au-delà de ce retard (secondes), les lectures repassent sur la base principale
+ESCO_REPLICA_RETARD_MAX = float(os.environ.get('ESCO_REPLICA_RETARD_MAX', 30))
+if ESCO_REPLICA:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        # Ouverture en lecture seule : aucune écriture ne peut s'y perdre
+        'NAME': f'file:{ESCO_REPLICA_CHEMIN}?mode=ro',
+        'OPTIONS': {'uri': True, 'timeout': 5},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS.append('main.routeurs.ReplicaRouter')
+    MIDDLEWARE.insert(1, 'main.middleware.ReplicaMiddleware')
+
+# Admin sur de gros volumes (voir main/admin_echelle.py) : pas de comptage
+# complet des listes, pagination plafonnée, recherche par préfixe indexée
+ESCO_ADMIN_GRANDE_ECHELLE = os.environ.get('ESCO_ADMIN_GRANDE_ECHELLE', '') == '1'
+
+# Archivage (voir main/archivage.py) : RDV, consultations et soins plus anciens
+# que cet horizon passent dans les tables d'archive (commande `archiver`)
+ESCO_ARCHIVAGE_HORIZON_JOURS = int(os.environ.get('ESCO_ARCHIVAGE_HORIZON_JOURS', 730))
+
+# Sauvegardes en ligne (voir main/sauvegardes.py, commande `sauvegarder`) :
+# instantanés compressés et vérifiables, les plus anciens au-delà de
+# ESCO_SAUVEGARDES_GARDER sont supprimés
+ESCO_SAUVEGARDES_DOSSIER = Path(os.environ.get('ESCO_SAUVEGARDES_DOSSIER', BASE_DIR / 'sauvegardes'))
+ESCO_SAUVEGARDES_GARDER = int(os.environ.get('ESCO_SAUVEGARDES_GARDER', 7))
+
+# Lancement par `manage.py test`
+TESTS = sys.argv[1:2] == ['test']
+
+# Journal des accès aux dossiers (voir main/audit.py) : file en mémoire bornée
+# à ESCO_AUDIT_FILE_MAX événements, écrite par lots par un thread d'arrière-plan.
+# Pas de thread pendant les tests : ils vident la file eux-mêmes (audit.vider)
+ESCO_AUDIT_FILE_MAX = int(os.environ.get('ESCO_AUDIT_FILE_MAX', 10000))
+ESCO_AUDIT_ASYNCHRONE = not TESTS
+
+# Métriques Prometheus (voir main/metriques.py) : chaque worker publie ses
+# valeurs dans ESCO_METRIQUES_DOSSIER, un dossier local à la machine, que
+# /metrics additionne. /metrics est lisible depuis ESCO_METRIQUES_ADRESSES
+# (liste séparée par des virgules, vide par défaut : derrière un proxy local,
+# toutes les requêtes viennent de 127.0.0.1), avec le jeton
+# ESCO_METRIQUES_JETON ou par un superutilisateur.
+ESCO_METRIQUES_DOSSIER = Path(os.environ.get(
+    'ESCO_METRIQUES_DOSSIER',
+    Path(tempfile.gettempdir()) / 'esco-metriques-tests' if TESTS else BASE_DIR / 'metriques',
+))
+ESCO_METRIQUES_ASYNCHRONE = not TESTS
+ESCO_METRIQUES_ADRESSES = [a for a in os.environ.get('ESCO_METRIQUES_ADRESSES', '').split(',') if a]
+ESCO_METRIQUES_JETON = os.environ.get('ESCO_METRIQUES_JETON', '')
+
+# /readyz (voir main/views_supervision.py) : attente maximale d'un verrou de
+# la base (secondes) et espace libre minimal pour MEDIA_ROOT (octets)
+ESCO_SANTE_DELAI = float(os.environ.get('ESCO_SANTE_DELAI', 0.5))
+ESCO_SANTE_DISQUE_MIN = int(os.environ.get('ESCO_SANTE_DISQUE_MIN', 500 * 1024 * 1024))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -108,6 +220,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Configuration d'authentification personnalisée
 AUTH_USER_MODEL = 'main.CustomUser'
+AUTHENTICATION_BACKENDS = ['main.backends.ESCOModelBackend']
 
 # Redirection après connexion/déconnexion
 LOGIN_URL = '/login/'
@@ -122,4 +235,33 @@ MESSAGE_TAGS = {
     messages.SUCCESS: 'success',
     messages.WARNING: 'warning',
     messages.ERROR: 'danger',
-}
\ No newline at end of file
+}
+# Journalisation (voir main/journalisation.py) : les requêtes mettent les
+# enregistrements en file, un thread les écrit en JSON dans un fichier commun
+# à tous les workers, que seul logrotate fait tourner (configuration fournie :
+# deploy/logrotate.esco, à installer dans /etc/logrotate.d/). Les tests
+# écrivent dans le dossier temporaire, pas dans logs/.
+ESCO_LOG_FICHIER = Path(os.environ.get(
+    'ESCO_LOG_FICHIER',
+    Path(tempfile.gettempdir()) / 'esco-tests.log' if TESTS else BASE_DIR / 'logs' / 'esco.log',
+))
+ESCO_LOG_NIVEAU = os.environ.get('ESCO_LOG_NIVEAU', 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'main.journalisation.FormatJSON'},
+    },
+    'handlers': {
+        'fichier': {
+            'class': 'main.journalisation.JournalEnFile',
+            'filename': ESCO_LOG_FICHIER,
+            'formatter': 'json',
+        },
+    },
+    # Avertissements et erreurs de Django (dont les erreurs 500 de django.request)
+    'root': {'handlers': ['fichier'], 'level': 'WARNING'},
+    'loggers': {
+        'main': {'level': ESCO_LOG_NIVEAU},
+    },
+}
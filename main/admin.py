@@ -1,10 +1,31 @@
 
 # main/admin.py
+import logging
+from datetime import date
+
 from django.contrib import admin
-from django.contrib.admin import AdminSite, SimpleListFilter
-from django.utils.html import format_html
+from django.contrib import messages
+from django.contrib.admin import AdminSite, SimpleListFilter, helpers
+from django.db import IntegrityError
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
 # Dans admin.py ligne 6
-from .models import CustomUser, Patient, Medecin, Infirmier, Secretaire, RendezVous, Consultation, SoinsInfirmier, Planning
+from .models import CustomUser, Patient, Medecin, Infirmier, Secretaire, RendezVous, Consultation, SoinsInfirmier, Planning, MesureConstante
+from .models import AccesDossier, DemandeAttente, ProfilRequete, SerieRendezVous
+from .models import TRANCHES_AGE, CATEGORIES_IMC
+from .admin_echelle import GrandeEchelleMixin, choix_medecins, grande_echelle
+from .forms import ReplanificationForm, SerieRendezVousForm
+from . import audit, liste_attente, reservations, series
+from .journalisation import chronometre
+
+logger = logging.getLogger(__name__)
+
 class ESCOAdminSite(AdminSite):
     site_header = '🏥 ESCO - Administration Médicale'
     site_title = 'ESCO Admin'
@@ -15,23 +36,72 @@ class ESCOAdminSite(AdminSite):
         context['site_url'] = '/'
         return context
 
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('rapport-activite/', self.admin_view(self.rapport_activite_view), name='rapport_activite'),
+        ]
+        return custom_urls + urls
+
+    def rapport_activite_view(self, request):
+        """Rapport d'activité : délais, annulations, RDV non honorés et occupation"""
+        try:
+            from .analytics import calculer_statistiques, periode_par_defaut
+        except ImportError:
+            messages.error(request, 'Erreur: NumPy non installé. Contactez l\'administrateur.')
+            return redirect('esco_admin:index')
+
+        debut, fin = periode_par_defaut()
+        try:
+            if request.GET.get('debut'):
+                debut = date.fromisoformat(request.GET['debut'])
+            if request.GET.get('fin'):
+                fin = date.fromisoformat(request.GET['fin'])
+        except ValueError:
+            messages.error(request, 'Dates invalides, période par défaut utilisée.')
+            debut, fin = periode_par_defaut()
+
+        context = {
+            **self.each_context(request),
+            'title': 'Rapport d\'activité',
+            'stats': calculer_statistiques(debut, fin),
+            'debut': debut,
+            'fin': fin,
+        }
+        return TemplateResponse(request, 'admin/rapport_activite.html', context)
+
 # Créer une instance personnalisée
 admin_site = ESCOAdminSite(name='esco_admin')
 
 # ===== FILTRES PERSONNALISÉS =====
-class MedecinFilter(SimpleListFilter):
+# Choix en cache (main.admin_echelle) et sous-requêtes EXISTS : ni liste de
+# tous les utilisateurs, ni jointure + DISTINCT sur les rendez-vous.
+class ChoixMedecinFilter(SimpleListFilter):
     title = 'Médecin'
     parameter_name = 'medecin'
 
     def lookups(self, request, model_admin):
-        medecins = CustomUser.objects.filter(role='docteur').distinct()
-        return [(m.id, f"Dr. {m.get_full_name() or m.username}") for m in medecins]
+        return choix_medecins()
+
+class MedecinFilter(ChoixMedecinFilter):
+    """Patients ayant eu au moins un RDV avec le médecin"""
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(Exists(RendezVous.objects.filter(patient=OuterRef('user'), medecin_id=self.value())))
+        return queryset
+
+class MedecinRdvFilter(ChoixMedecinFilter):
+    champ = 'medecin_id'
 
     def queryset(self, request, queryset):
         if self.value():
-            return queryset.filter(user__patient_rdv__medecin_id=self.value())
+            return queryset.filter(**{self.champ: self.value()})
         return queryset
 
+class MedecinConsultationFilter(MedecinRdvFilter):
+    champ = 'rdv__medecin_id'
+
 class PatientAvecRdvFilter(SimpleListFilter):
     title = 'Patients avec RDV'
     parameter_name = 'avec_rdv'
@@ -43,12 +113,106 @@ class PatientAvecRdvFilter(SimpleListFilter):
         ]
 
     def queryset(self, request, queryset):
+        rdv = Exists(RendezVous.objects.filter(patient=OuterRef('user')))
         if self.value() == 'oui':
-            return queryset.filter(user__patient_rdv__isnull=False).distinct()
+            return queryset.filter(rdv)
         elif self.value() == 'non':
-            return queryset.filter(user__patient_rdv__isnull=True)
+            return queryset.filter(~rdv)
+        return queryset
+
+class GroupeSanguinFilter(SimpleListFilter):
+    """Groupes sanguins connus, sans SELECT DISTINCT sur la table des patients"""
+    title = 'Groupe sanguin'
+    parameter_name = 'groupe_sanguin'
+
+    def lookups(self, request, model_admin):
+        return CustomUser._meta.get_field('groupe_sanguin').choices
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(groupe_sanguin=self.value())
+        return queryset
+
+class TrancheAgeFilter(SimpleListFilter):
+    title = "Tranche d'âge"
+    parameter_name = 'tranche_age'
+
+    def lookups(self, request, model_admin):
+        return [(code, libelle) for code, libelle, _, _ in TRANCHES_AGE]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.tranche_age(self.value())
+        return queryset
+
+class CategorieIMCFilter(SimpleListFilter):
+    title = 'IMC'
+    parameter_name = 'categorie_imc'
+
+    def lookups(self, request, model_admin):
+        return [(code, libelle) for code, libelle, _, _ in CATEGORIES_IMC]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.categorie_imc(self.value())
+        return queryset
+
+class UtilisateurAccesFilter(SimpleListFilter):
+    """
+    Accès d'un utilisateur (index utilisateur + date). Pas de liste de tous les
+    comptes : le filtre s'active depuis les liens de la liste et n'affiche que
+    l'utilisateur choisi.
+    """
+    title = 'Utilisateur'
+    parameter_name = 'utilisateur'
+    champ = 'utilisateur_id'
+
+    def lookups(self, request, model_admin):
+        if not (self.value() or '').isdigit():
+            return []
+        utilisateur = CustomUser.objects.filter(pk=self.value()).only('username', 'first_name', 'last_name').first()
+        return [(self.value(), utilisateur.get_full_name() or utilisateur.username if utilisateur else 'Compte supprimé')]
+
+    def queryset(self, request, queryset):
+        if (self.value() or '').isdigit():
+            return queryset.filter(**{self.champ: self.value()})
         return queryset
 
+class PatientAccesFilter(UtilisateurAccesFilter):
+    """Accès au dossier d'un patient (index patient + date)"""
+    title = 'Patient'
+    parameter_name = 'patient'
+    champ = 'patient_id'
+
+class JournalAccesMixin:
+    """
+    Met en file (main/audit.py) l'ouverture d'une fiche liée à un patient.
+    `champ_patient` : chemin de l'id du patient depuis l'objet affiché.
+    """
+    champ_patient = 'patient_id'
+
+    def patient_de(self, obj):
+        valeur = obj
+        for attribut in self.champ_patient.split('__'):
+            valeur = getattr(valeur, attribut)
+        return valeur
+
+    def render_change_form(self, request, context, add=False, change=False, form_url='', obj=None):
+        if obj is not None and request.method == 'GET':
+            patient_id = self.patient_de(obj)
+            if patient_id:
+                audit.enregistrer(request, patient_id, 'admin', f"{self.opts.verbose_name} {obj.pk}")
+        return super().render_change_form(request, context, add, change, form_url, obj)
+
+class ActionsChronometreesMixin:
+    """Durée de chaque action de masse (main/journalisation.py), avec le nombre de lignes cochées"""
+
+    def response_action(self, request, queryset):
+        with chronometre(logger, 'action_admin', modele=self.opts.label, action=request.POST.get('action'),
+                         lignes=len(request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)),
+                         utilisateur=request.user.pk):
+            return super().response_action(request, queryset)
+
 # ===== ADMIN CLASSES =====
 # Ajoute/remplace dans admin.py
 from django.contrib.auth.admin import UserAdmin
@@ -63,8 +227,11 @@ class CustomUserChangeForm(UserChangeForm):
     class Meta(UserChangeForm.Meta):
         model = CustomUser
 
+# Champ d'autocomplétion -> rôle des utilisateurs proposés
+ROLES_AUTOCOMPLETE = {'patient': 'patient', 'medecin': 'docteur', 'infirmier': 'infirmier'}
+
 @admin.register(CustomUser, site=admin_site)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(JournalAccesMixin, GrandeEchelleMixin, UserAdmin):
     add_form = CustomUserCreationForm
     form = CustomUserChangeForm
     
@@ -83,10 +250,32 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
     
-    list_display = ('username', 'email', 'first_name', 'last_name', 'role', 'is_active')
-    list_filter = ('role', 'is_active', 'is_staff')
+    list_display = ('username', 'email', 'first_name', 'last_name', 'role', 'age', 'imc', 'categorie_tension', 'is_active')
+    list_filter = ('role', 'is_active', 'is_staff', TrancheAgeFilter, CategorieIMCFilter, 'categorie_tension')
     search_fields = ('username', 'email', 'first_name', 'last_name')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).avec_indicateurs()
+
+    def get_search_results(self, request, queryset, search_term):
+        # Autocomplétion d'un champ patient / médecin / infirmier : seulement ce rôle
+        role = ROLES_AUTOCOMPLETE.get(request.GET.get('field_name')) if 'app_label' in request.GET else None
+        if role:
+            queryset = queryset.filter(role=role)
+        if grande_echelle():
+            for mot in search_term.split():
+                queryset = queryset.recherche_prefixe(mot)
+            return queryset, False
+        return super().get_search_results(request, queryset, search_term)
+
+    def patient_de(self, obj):
+        # Seule la fiche d'un patient est un accès à un dossier
+        return obj.pk if obj.role == 'patient' else None
+
+    @admin.display(description='Âge', ordering='age')
+    def age(self, obj):
+        return obj.age
+
 # @admin.register(CustomUser, site=admin_site)
 # class CustomUserAdmin(admin.ModelAdmin):
 #     list_display = ('user_id_display', 'username', 'get_full_name', 'email', 'role', 'is_active', 'date_joined')
@@ -130,11 +319,15 @@ class CustomUserAdmin(UserAdmin):
 #     )
 
 @admin.register(Patient, site=admin_site)
-class PatientAdmin(admin.ModelAdmin):
+class PatientAdmin(JournalAccesMixin, GrandeEchelleMixin, admin.ModelAdmin):
+    champ_patient = 'user_id'
     list_display = ('numero_patient_display', 'get_nom_complet', 'groupe_sanguin', 'created_at', 'get_medecin_traitant')
-    list_filter = ('groupe_sanguin', 'created_at', MedecinFilter, PatientAvecRdvFilter)
+    list_filter = (GroupeSanguinFilter, 'created_at', MedecinFilter, PatientAvecRdvFilter)
     search_fields = ('user__username', 'user__first_name', 'user__last_name', 'numero_patient')
     readonly_fields = ('numero_patient', 'created_at')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    recherche_utilisateurs = ('user',)
     
     def numero_patient_display(self, obj):
         return format_html(
@@ -152,27 +345,41 @@ class PatientAdmin(admin.ModelAdmin):
     get_nom_complet.short_description = 'Nom complet'
     
     def get_medecin_traitant(self, obj):
-        """Afficher le médecin traitant principal"""
-        rdv_recent = RendezVous.objects.filter(patient=obj.user).order_by('-date_rdv').first()
-        if rdv_recent:
-            return f"Dr. {rdv_recent.medecin.get_full_name() or rdv_recent.medecin.username}"
+        """Afficher le médecin traitant principal (médecin du RDV le plus récent, annoté)"""
+        if obj.medecin_traitant_nom:
+            return f"Dr. {obj.medecin_traitant_nom}"
         return "Aucun"
     get_medecin_traitant.short_description = 'Médecin traitant'
     
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
+        rdv_recent = RendezVous.objects.filter(patient=OuterRef('user')).order_by('-date_rdv').annotate(
+            nom=Coalesce(
+                NullIf(Trim(Concat('medecin__first_name', Value(' '), 'medecin__last_name')), Value('')),
+                'medecin__username',
+            )
+        )
+        qs = super().get_queryset(request).annotate(medecin_traitant_nom=Subquery(rdv_recent.values('nom')[:1]))
         # Si l'utilisateur connecté est un médecin, filtrer ses patients
         if hasattr(request.user, 'role') and request.user.role == 'docteur' and not request.user.is_superuser:
             # Patients qui ont eu des RDV avec ce médecin
-            return qs.filter(user__patient_rdv__medecin=request.user).distinct()
+            return qs.filter(Exists(RendezVous.objects.filter(patient=OuterRef('user'), medecin=request.user)))
         return qs
 
 @admin.register(Medecin, site=admin_site)
-class MedecinAdmin(admin.ModelAdmin):
+class MedecinAdmin(GrandeEchelleMixin, admin.ModelAdmin):
     list_display = ('numero_ordre_display', 'get_nom_complet', 'specialite', 'get_nb_patients')
     list_filter = ('specialite',)
     search_fields = ('user__username', 'user__first_name', 'user__last_name', 'numero_ordre', 'specialite')
     readonly_fields = ('numero_ordre',)
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    recherche_utilisateurs = ('user',)
+
+    def get_list_display(self, request):
+        # Compter les patients distincts parcourt tous les RDV de chaque médecin affiché
+        if grande_echelle():
+            return [champ for champ in self.list_display if champ != 'get_nb_patients']
+        return self.list_display
     
     def numero_ordre_display(self, obj):
         return format_html(
@@ -186,29 +393,36 @@ class MedecinAdmin(admin.ModelAdmin):
         return f"Dr. {obj.user.get_full_name() or obj.user.username}"
     get_nom_complet.short_description = 'Nom complet'
     
+    @admin.display(description='Patients', ordering='nb_patients')
     def get_nb_patients(self, obj):
-        """Nombre de patients uniques du médecin"""
-        count = RendezVous.objects.filter(medecin=obj.user).values('patient').distinct().count()
+        """Nombre de patients uniques du médecin (annoté dans get_queryset)"""
         return format_html(
             '<span style="background: #10b981; color: white; '
             'padding: 0.25rem 0.5rem; border-radius: 15px; font-size: 0.8rem;">{} patients</span>',
-            count
+            obj.nb_patients
         )
-    get_nb_patients.short_description = 'Patients'
     
     def get_queryset(self, request):
+        nb_patients = RendezVous.objects.filter(medecin=OuterRef('user')).order_by().values('medecin').annotate(
+            total=Count('patient', distinct=True)
+        ).values('total')
         qs = super().get_queryset(request)
+        if not grande_echelle():
+            qs = qs.annotate(nb_patients=Coalesce(Subquery(nb_patients), 0))
         # Si l'utilisateur n'est pas superuser, ne montrer que lui-même
         if hasattr(request.user, 'role') and request.user.role == 'docteur' and not request.user.is_superuser:
             return qs.filter(user=request.user)
         return qs
 
 @admin.register(Infirmier, site=admin_site)
-class InfirmierAdmin(admin.ModelAdmin):
+class InfirmierAdmin(GrandeEchelleMixin, admin.ModelAdmin):
     list_display = ('numero_ordre_display', 'get_nom_complet', 'service')
     list_filter = ('service',)
     search_fields = ('user__username', 'user__first_name', 'user__last_name', 'numero_ordre', 'service')
     readonly_fields = ('numero_ordre',)
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    recherche_utilisateurs = ('user',)
     
     def numero_ordre_display(self, obj):
         return format_html(
@@ -223,22 +437,32 @@ class InfirmierAdmin(admin.ModelAdmin):
     get_nom_complet.short_description = 'Nom complet'
 
 @admin.register(Secretaire, site=admin_site)
-class SecretaireAdmin(admin.ModelAdmin):
+class SecretaireAdmin(GrandeEchelleMixin, admin.ModelAdmin):
     list_display = ('get_nom_complet', 'service')
     list_filter = ('service',)
     search_fields = ('user__username', 'user__first_name', 'user__last_name', 'service')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    recherche_utilisateurs = ('user',)
     
     def get_nom_complet(self, obj):
         return f"Sec. {obj.user.get_full_name() or obj.user.username}"
     get_nom_complet.short_description = 'Nom complet'
 
 @admin.register(RendezVous, site=admin_site)
-class RendezVousAdmin(admin.ModelAdmin):
+class RendezVousAdmin(JournalAccesMixin, ActionsChronometreesMixin, GrandeEchelleMixin, admin.ModelAdmin):
     list_display = ('patient_display', 'medecin_display', 'date_rdv', 'heure_rdv', 'status_display', 'created_at')
-    list_filter = ('status', 'date_rdv', 'medecin', 'created_at')
+    list_filter = ('status', 'date_rdv', MedecinRdvFilter, 'created_at')
     search_fields = ('patient__username', 'patient__first_name', 'patient__last_name', 'medecin__username', 'motif')
     date_hierarchy = 'date_rdv'
-    actions = ['marquer_confirme', 'marquer_termine', 'marquer_annule']
+    # Tri servi par l'index de la hiérarchie de dates, y compris une fois filtré sur une période
+    ordering = ('-date_rdv',)
+    actions = ['marquer_confirme', 'marquer_termine', 'marquer_annule', 'replanifier']
+    list_select_related = ('patient', 'medecin')
+    autocomplete_fields = ('patient', 'medecin')
+    recherche_utilisateurs = ('patient', 'medecin')
+    # Le lien à une série se gère depuis la série (modification / annulation de la suite)
+    readonly_fields = ('serie',)
     
     def patient_display(self, obj):
         return format_html(
@@ -291,9 +515,9 @@ class RendezVousAdmin(admin.ModelAdmin):
             if hasattr(request.user, 'role') and request.user.role == 'docteur' and not request.user.is_superuser:
                 # Patients qui ont déjà eu des RDV avec ce médecin
                 patients_existants = CustomUser.objects.filter(
+                    Exists(RendezVous.objects.filter(patient=OuterRef('pk'), medecin=request.user)),
                     role='patient',
-                    patient_rdv__medecin=request.user
-                ).distinct()
+                )
                 if patients_existants.exists():
                     kwargs["queryset"] = patients_existants
                 else:
@@ -316,29 +540,168 @@ class RendezVousAdmin(admin.ModelAdmin):
         return super().has_delete_permission(request, obj)
     
     # Actions personnalisées
+    def _changer_statut(self, request, queryset, status):
+        """UPDATE du statut ; réactiver un RDV annulé dont le créneau a été repris viole rdv_creneau_unique"""
+        try:
+            with reservations.transaction_ecriture():
+                # update() ne passe pas par auto_now : updated_at sert de suivi à l'export incrémental
+                return queryset.update(status=status, updated_at=timezone.now())
+        except IntegrityError:
+            self.message_user(request, "Aucun changement : un rendez-vous annulé sélectionné a un créneau "
+                                       "déjà réservé par un autre rendez-vous.", messages.ERROR)
+            return None
+
     def marquer_confirme(self, request, queryset):
-        updated = queryset.update(status='confirme')
-        self.message_user(request, f'{updated} rendez-vous marqués comme confirmés.')
+        updated = self._changer_statut(request, queryset, 'confirme')
+        if updated is not None:
+            self.message_user(request, f'{updated} rendez-vous marqués comme confirmés.')
     marquer_confirme.short_description = "Marquer comme confirmés"
     
     def marquer_termine(self, request, queryset):
-        updated = queryset.update(status='termine')
-        self.message_user(request, f'{updated} rendez-vous marqués comme terminés.')
+        updated = self._changer_statut(request, queryset, 'termine')
+        if updated is not None:
+            self.message_user(request, f'{updated} rendez-vous marqués comme terminés.')
     marquer_termine.short_description = "Marquer comme terminés"
     
     def marquer_annule(self, request, queryset):
-        updated = queryset.update(status='annule')
+        updated, attribues = liste_attente.annuler_rdvs(queryset)
         self.message_user(request, f'{updated} rendez-vous annulés.')
+        if attribues:
+            self.message_user(request, f"{len(attribues)} créneau(x) libéré(s) attribué(s) à des patients "
+                                       f"de la liste d'attente.")
     marquer_annule.short_description = "Annuler les RDV sélectionnés"
 
+    def replanifier(self, request, queryset):
+        """Formulaire intermédiaire, puis déplacement tout ou rien des RDV à venir sélectionnés"""
+        a_venir = queryset.filter(status__in=reservations.STATUTS_A_VENIR)
+        specialites = set(a_venir.values_list('medecin__specialite', flat=True))
+        form = ReplanificationForm(request.POST if 'appliquer' in request.POST else None, specialites=specialites)
+        if form.is_valid():
+            try:
+                deplaces = reservations.replanifier(queryset, form.cleaned_data['decalage_jours'], form.cleaned_data['medecin'])
+            except reservations.ConflitsCreneaux as e:
+                for conflit in e.conflits:
+                    form.add_error(None, conflit)
+            else:
+                self.message_user(request, f'{deplaces} rendez-vous replanifiés.')
+                return None
+
+        apercu = list(a_venir.select_related('patient', 'medecin').order_by('date_rdv', 'heure_rdv')[:50])
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Replanifier des rendez-vous',
+            'opts': self.model._meta,
+            'form': form,
+            'selection': queryset.values_list('pk', flat=True),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'apercu': apercu,
+            'nb_a_venir': a_venir.count(),
+            'nb_selection': queryset.count(),
+        }
+        return TemplateResponse(request, 'admin/main/rendezvous/replanifier.html', context)
+    replanifier.short_description = "Replanifier (décaler / changer de médecin)"
+
+
+@admin.register(SerieRendezVous, site=admin_site)
+class SerieRendezVousAdmin(ActionsChronometreesMixin, GrandeEchelleMixin, admin.ModelAdmin):
+    form = SerieRendezVousForm
+    list_display = ('patient', 'medecin', 'frequence', 'heure_rdv', 'date_debut', 'nb_a_venir')
+    list_filter = ('frequence', MedecinRdvFilter)
+    list_select_related = ('patient', 'medecin')
+    autocomplete_fields = ('patient', 'medecin')
+    recherche_utilisateurs = ('patient', 'medecin')
+    ordering = ('-date_debut',)
+    actions = ['annuler_suite']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            nb_a_venir=Count('occurrences', filter=Q(occurrences__status__in=reservations.STATUTS_A_VENIR,
+                                                    occurrences__date_rdv__gte=timezone.localdate()))
+        )
+
+    @admin.display(description='RDV à venir', ordering='nb_a_venir')
+    def nb_a_venir(self, obj):
+        return obj.nb_a_venir
+
+    def get_readonly_fields(self, request, obj=None):
+        # Une série créée se modifie par son heure, son médecin ou son motif, reportés sur la suite
+        if obj is not None:
+            return ('patient', 'frequence', 'date_debut', 'date_fin', 'nombre')
+        return ()
+
+    def save_model(self, request, obj, form, change):
+        try:
+            if change:
+                modifies = series.modifier_suite(obj)
+                self.message_user(request, f'{modifies} rendez-vous à venir mis à jour.')
+            else:
+                crees = series.creer_serie(obj)
+                self.message_user(request, f'{len(crees)} rendez-vous créés.')
+        except reservations.ConflitsCreneaux as e:
+            # Créneau réservé entre la validation du formulaire et l'enregistrement : rien n'a été écrit
+            obj.conflits = e.conflits
+            for conflit in e.conflits:
+                self.message_user(request, conflit, messages.ERROR)
+
+    def log_addition(self, request, obj, message):
+        if not getattr(obj, 'conflits', None):
+            return super().log_addition(request, obj, message)
+
+    def log_change(self, request, obj, message):
+        if not getattr(obj, 'conflits', None):
+            return super().log_change(request, obj, message)
+
+    def response_add(self, request, obj, post_url_continue=None):
+        if getattr(obj, 'conflits', None):
+            return redirect(request.get_full_path())
+        return super().response_add(request, obj, post_url_continue)
+
+    def response_change(self, request, obj):
+        if getattr(obj, 'conflits', None):
+            return redirect(request.get_full_path())
+        return super().response_change(request, obj)
+
+    def annuler_suite(self, request, queryset):
+        annules, attribues = series.annuler_suite(queryset)
+        self.message_user(request, f'{annules} rendez-vous à venir annulés.')
+        if attribues:
+            self.message_user(request, f"{len(attribues)} créneau(x) libéré(s) attribué(s) à des patients "
+                                       f"de la liste d'attente.")
+    annuler_suite.short_description = "Annuler les rendez-vous à venir des séries"
+
+
+@admin.register(DemandeAttente, site=admin_site)
+class DemandeAttenteAdmin(ActionsChronometreesMixin, GrandeEchelleMixin, admin.ModelAdmin):
+    list_display = ('patient', 'medecin', 'specialite', 'date_min', 'date_max', 'heure_min', 'heure_max',
+                    'statut', 'created_at')
+    list_filter = ('statut', 'specialite')
+    list_select_related = ('patient', 'medecin')
+    autocomplete_fields = ('patient', 'medecin')
+    recherche_utilisateurs = ('patient', 'medecin')
+    readonly_fields = ('rdv',)
+    # Ordre de priorité de la liste d'attente
+    ordering = ('created_at',)
+    actions = ['retirer']
+
+    def retirer(self, request, queryset):
+        retirees = queryset.filter(statut='en_attente').update(statut='retiree', updated_at=timezone.now())
+        self.message_user(request, f"{retirees} demande(s) retirée(s) de la liste d'attente.")
+    retirer.short_description = "Retirer de la liste d'attente"
+
+
 @admin.register(Consultation, site=admin_site)
-class ConsultationAdmin(admin.ModelAdmin):
+class ConsultationAdmin(JournalAccesMixin, GrandeEchelleMixin, admin.ModelAdmin):
+    champ_patient = 'rdv__patient_id'
     list_display = ('patient_display', 'medecin_display', 'date_consultation', 'diagnostic_court')
-    list_filter = ('created_at', 'rdv__medecin')
+    list_filter = ('created_at', MedecinConsultationFilter)
     search_fields = ('rdv__patient__username', 'rdv__patient__first_name', 'rdv__patient__last_name', 
                     'rdv__medecin__username', 'diagnostic', 'symptomes')
     readonly_fields = ('created_at', 'updated_at')
     date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+    list_select_related = ('rdv__patient', 'rdv__medecin')
+    raw_id_fields = ('rdv',)
+    recherche_utilisateurs = ('rdv__patient', 'rdv__medecin')
     
     def patient_display(self, obj):
         return obj.rdv.patient.get_full_name() or obj.rdv.patient.username
@@ -364,11 +727,15 @@ class ConsultationAdmin(admin.ModelAdmin):
         return qs
 
 @admin.register(SoinsInfirmier, site=admin_site)
-class SoinsInfirmierAdmin(admin.ModelAdmin):
+class SoinsInfirmierAdmin(JournalAccesMixin, GrandeEchelleMixin, admin.ModelAdmin):
     list_display = ('patient_display', 'infirmier_display', 'type_soin_display', 'date_soin')
     list_filter = ('type_soin', 'date_soin')
     search_fields = ('patient__username', 'infirmier__username', 'description', 'type_soin')
     date_hierarchy = 'date_soin'
+    ordering = ('-date_soin',)
+    list_select_related = ('patient', 'infirmier')
+    autocomplete_fields = ('patient', 'infirmier')
+    recherche_utilisateurs = ('patient', 'infirmier')
     
     def patient_display(self, obj):
         return obj.patient.get_full_name() or obj.patient.username
@@ -386,11 +753,121 @@ class SoinsInfirmierAdmin(admin.ModelAdmin):
         )
     type_soin_display.short_description = 'Type de soin'
 
+@admin.register(MesureConstante, site=admin_site)
+class MesureConstanteAdmin(JournalAccesMixin, GrandeEchelleMixin, admin.ModelAdmin):
+    list_display = ('patient_display', 'type_mesure', 'valeur', 'date_mesure')
+    list_filter = ('type_mesure',)
+    search_fields = ('patient__username', 'patient__first_name', 'patient__last_name')
+    date_hierarchy = 'date_mesure'
+    ordering = ('-date_mesure',)
+    raw_id_fields = ('patient', 'soin')
+    list_select_related = ('patient',)
+    recherche_utilisateurs = ('patient',)
+    
+    def patient_display(self, obj):
+        return obj.patient.get_full_name() or obj.patient.username
+    patient_display.short_description = 'Patient'
+
+
+@admin.register(AccesDossier, site=admin_site)
+class AccesDossierAdmin(GrandeEchelleMixin, admin.ModelAdmin):
+    """Journal en lecture seule ; cliquer un nom filtre sur ses accès (servi par l'index correspondant)"""
+    list_display = ('date', 'utilisateur_display', 'patient_display', 'action', 'objet', 'adresse_ip')
+    list_filter = (PatientAccesFilter, UtilisateurAccesFilter, 'action')
+    search_fields = ('patient__username', 'utilisateur__username')
+    date_hierarchy = 'date'
+    ordering = ('-date',)
+    list_select_related = ('utilisateur', 'patient')
+    recherche_utilisateurs = ('patient', 'utilisateur')
+
+    def _lien(self, utilisateur, parametre):
+        if utilisateur is None:
+            return '-'
+        return format_html('<a href="?{}={}">{}</a>', parametre, utilisateur.pk,
+                           utilisateur.get_full_name() or utilisateur.username)
+
+    def utilisateur_display(self, obj):
+        return self._lien(obj.utilisateur, 'utilisateur')
+    utilisateur_display.short_description = 'Utilisateur'
+
+    def patient_display(self, obj):
+        return self._lien(obj.patient, 'patient')
+    patient_display.short_description = 'Patient'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProfilRequete, site=admin_site)
+class ProfilRequeteAdmin(admin.ModelAdmin):
+    """
+    Profils demandés avec ?profil= (main/profilage.py), en lecture seule. Les
+    piles se téléchargent au format collapsed pour flamegraph.pl, speedscope
+    ou inferno.
+    """
+    list_display = ('date', 'methode', 'chemin', 'statut', 'duree_ms', 'nb_requetes', 'duree_sql_ms', 'mode',
+                    'utilisateur')
+    list_filter = ('mode', 'methode')
+    search_fields = ('chemin',)
+    ordering = ('-date',)
+    list_select_related = ('utilisateur',)
+    fields = ('date', 'utilisateur', 'methode', 'chemin', 'statut', 'mode', 'duree_ms', 'nb_requetes', 'duree_sql_ms',
+              'piles_display', 'statistiques_display', 'requetes_display')
+    readonly_fields = ('piles_display', 'statistiques_display', 'requetes_display')
+
+    def get_urls(self):
+        return [
+            path('<int:profil_id>/piles/', self.admin_site.admin_view(self.piles_view),
+                 name='main_profilrequete_piles'),
+        ] + super().get_urls()
+
+    def piles_view(self, request, profil_id):
+        profil = get_object_or_404(ProfilRequete, pk=profil_id)
+        if not self.has_view_permission(request, profil):
+            messages.error(request, 'Accès non autorisé.')
+            return redirect('esco_admin:index')
+        response = HttpResponse(profil.piles + '\n', content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="profil_{profil.pk}.folded"'
+        return response
+
+    def piles_display(self, obj):
+        lignes = sorted(obj.piles.splitlines(), key=lambda ligne: -int(ligne.rsplit(' ', 1)[-1]))
+        return format_html('<a href="{}">Télécharger les piles (collapsed)</a><pre style="white-space: pre-wrap;">{}</pre>',
+                           reverse('esco_admin:main_profilrequete_piles', args=[obj.pk]), '\n'.join(lignes[:15]))
+    piles_display.short_description = 'Piles les plus lourdes'
+
+    def statistiques_display(self, obj):
+        return format_html('<pre>{}</pre>', obj.statistiques)
+    statistiques_display.short_description = 'Fonctions'
+
+    def requetes_display(self, obj):
+        return format_html(
+            '<table><tr><th>ms</th><th>Base</th><th>SQL</th></tr>{}</table>',
+            format_html_join('', '<tr><td>{}</td><td>{}</td><td><code>{}</code><br><small>{}</small></td></tr>',
+                             ((r['duree_ms'], r['base'], r['sql'], r['params']) for r in obj.requetes)),
+        )
+    requetes_display.short_description = "Requêtes SQL (ordre d'exécution)"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Planning, site=admin_site)
-class PlanningAdmin(admin.ModelAdmin):
+class PlanningAdmin(GrandeEchelleMixin, admin.ModelAdmin):
     list_display = ('user_display', 'jour_display', 'heure_debut', 'heure_fin', 'disponible_display')
     list_filter = ('jour', 'disponible', 'user__role')
     search_fields = ('user__username', 'user__first_name', 'user__last_name')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    recherche_utilisateurs = ('user',)
     
     def user_display(self, obj):
         return obj.user.get_full_name() or obj.user.username
@@ -421,21 +898,6 @@ class PlanningAdmin(admin.ModelAdmin):
             return qs.filter(user=request.user)
         return qs
 
-# Enregistrer tous les modèles sur l'admin par défaut aussi (pour compatibilité)
-admin.site.register(CustomUser, CustomUserAdmin)
-admin.site.register(Patient, PatientAdmin)
-admin.site.register(Medecin, MedecinAdmin)
-admin.site.register(Infirmier, InfirmierAdmin)
-admin.site.register(Secretaire, SecretaireAdmin)
-admin.site.register(RendezVous, RendezVousAdmin)
-admin.site.register(Consultation, ConsultationAdmin)
-admin.site.register(SoinsInfirmier, SoinsInfirmierAdmin)
-admin.site.register(Planning, PlanningAdmin)
-
-# Personnaliser l'en-tête et le titre de l'admin
-admin.site.site_header = "🏥 ESCO - Administration Médicale"
-admin.site.site_title = "ESCO Admin"
-admin.site.index_title = "Système de Gestion Hospitalière"
 # # main/admin.py
 # from django.contrib import admin
 # from django.contrib.admin import AdminSite
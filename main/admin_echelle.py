@@ -0,0 +1,209 @@
+# main/admin_echelle.py
+"""
+Admin sur de gros volumes (millions de lignes).
+
+Toujours actifs :
+  - choix des filtres (médecins...) mis en cache au lieu d'être relus à
+    chaque affichage de liste ;
+  - `date_hierarchy` calculée par des sondages EXISTS sur des intervalles
+    [debut, fin[, servis par l'index de la colonne, au lieu d'un
+    SELECT DISTINCT sur la date de toute la table.
+
+Mode « grande échelle » (settings.ESCO_ADMIN_GRANDE_ECHELLE) :
+  - pas de comptage complet de la table (show_full_result_count) ;
+  - pagination au comptage plafonné à COMPTE_MAX lignes ;
+  - recherche par préfixe sur les utilisateurs (username, nom, prénom),
+    servie par les index NOCASE, au lieu de LIKE '%...%' sur toutes les
+    colonnes et jointures.
+"""
+import calendar
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.admin.utils import get_fields_from_path
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import models
+from django.utils import formats, timezone
+from django.utils.functional import cached_property
+from django.utils.text import capfirst
+
+from . import periodes
+from .models import CustomUser
+
+DUREE_CACHE_CHOIX = 600
+COMPTE_MAX = 10000
+
+
+def grande_echelle():
+    return getattr(settings, 'ESCO_ADMIN_GRANDE_ECHELLE', False)
+
+
+def choix_en_cache(cle, calcul):
+    """Choix d'un filtre de liste, recalculés au plus toutes les DUREE_CACHE_CHOIX secondes"""
+    return cache.get_or_set(f'admin_choix:{cle}', calcul, DUREE_CACHE_CHOIX)
+
+
+def choix_medecins():
+    def calcul():
+        medecins = CustomUser.objects.filter(role='docteur').order_by('last_name', 'first_name', 'pk')
+        return [
+            (pk, f"Dr. {f'{prenom} {nom}'.strip() or username}")
+            for pk, username, prenom, nom in medecins.values_list('pk', 'username', 'first_name', 'last_name')
+        ]
+    return choix_en_cache('medecins', calcul)
+
+
+class PaginateurPlafonne(Paginator):
+    """
+    Paginator qui ne compte pas au-delà de `plafond` lignes (COUNT sur un
+    LIMIT), sans tri ni annotations dans la sous-requête comptée.
+    """
+    plafond = COMPTE_MAX
+    compte_plafonne = False
+
+    @cached_property
+    def count(self):
+        total = self.object_list.order_by().values('pk')[:self.plafond + 1].count()
+        self.compte_plafonne = total > self.plafond
+        return min(total, self.plafond)
+
+
+class GrandeEchelleMixin:
+    """
+    À placer avant admin.ModelAdmin. `recherche_utilisateurs` liste les
+    chemins des clés étrangères vers CustomUser utilisés par la recherche
+    par préfixe du mode grande échelle.
+    """
+    recherche_utilisateurs = ()
+
+    @property
+    def show_full_result_count(self):
+        return not grande_echelle()
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if grande_echelle():
+            return PaginateurPlafonne(queryset, per_page, orphans, allow_empty_first_page)
+        return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not (grande_echelle() and self.recherche_utilisateurs):
+            return super().get_search_results(request, queryset, search_term)
+        for mot in search_term.split():
+            utilisateurs = CustomUser.objects.recherche_prefixe(mot).values('pk')
+            condition = models.Q()
+            for chemin in self.recherche_utilisateurs:
+                condition |= models.Q(**{f'{chemin}__in': utilisateurs})
+            queryset = queryset.filter(condition)
+        return queryset, False
+
+
+# ===== HIÉRARCHIE DE DATES INDEXÉE =====
+
+def _extreme(queryset, champ, ordre):
+    """Première ou dernière valeur de `champ` (ORDER BY ... LIMIT 1, servi par l'index)"""
+    return queryset.order_by(ordre + champ).values_list(champ, flat=True).first()
+
+
+def _sondages(queryset, champ, horodatage, intervalles):
+    """
+    Pour chaque intervalle [debut, fin[, indique s'il contient au moins une
+    ligne : un seul SELECT, avec un EXISTS (recherche dans l'index) par intervalle.
+
+    Les bornes de l'intervalle sont placées en tête du WHERE : la liste est
+    déjà filtrée sur l'année ou le mois choisi, et SQLite parcourt l'index
+    selon les premières bornes rencontrées sur la colonne.
+    """
+    queryset = queryset.order_by()
+    annotations = {
+        f'intervalle_{i}': models.Exists(
+            queryset.model._default_manager.filter(periodes.Periode(debut, fin).q(champ, horodatage=horodatage))
+            & queryset
+        )
+        for i, (debut, fin) in enumerate(intervalles)
+    }
+    ligne = next(iter(queryset.annotate(**annotations).values_list(*annotations)[:1]), None)
+    return ligne or [False] * len(intervalles)
+
+
+def hierarchie_dates(cl):
+    """
+    Contexte du gabarit admin/date_hierarchy.html, comme le tag `date_hierarchy`
+    de Django, mais les choix (années, mois, jours) sont obtenus par des EXISTS
+    sur chaque intervalle au lieu d'un SELECT DISTINCT sur la période entière.
+    """
+    champ = cl.date_hierarchy
+    horodatage = isinstance(get_fields_from_path(cl.model, champ)[-1], models.DateTimeField)
+    champ_annee, champ_mois, champ_jour = (f'{champ}__year', f'{champ}__month', f'{champ}__day')
+    annee = cl.params.get(champ_annee)
+    mois = cl.params.get(champ_mois)
+    jour = cl.params.get(champ_jour)
+
+    def lien(filtres):
+        return cl.get_query_string(filtres, [f'{champ}__'])
+
+    def non_vides(debuts, pas):
+        """Débuts d'intervalle [debut, pas(debut)[ contenant au moins une ligne"""
+        presents = _sondages(cl.queryset, champ, horodatage, [(debut, pas(debut)) for debut in debuts])
+        return [debut for debut, present in zip(debuts, presents) if present]
+
+    if not (annee or mois or jour):
+        # Niveau de départ : comme Django, descendre si tout tient dans une année / un mois
+        premier, dernier = _extreme(cl.queryset, champ, ''), _extreme(cl.queryset, champ, '-')
+        if premier is None or dernier is None:
+            return {'show': True, 'back': None, 'choices': []}
+        if horodatage:
+            premier, dernier = (timezone.localtime(v) if timezone.is_aware(v) else v for v in (premier, dernier))
+        if premier.year == dernier.year:
+            annee = premier.year
+            if premier.month == dernier.month:
+                mois = premier.month
+        else:
+            return {
+                'show': True,
+                'back': None,
+                'choices': [
+                    {'link': lien({champ_annee: str(a.year)}), 'title': str(a.year)}
+                    for a in non_vides([date(a, 1, 1) for a in range(premier.year, dernier.year + 1)],
+                                       lambda a: a.replace(year=a.year + 1))
+                ],
+            }
+
+    if annee and mois and jour:
+        jour_choisi = date(int(annee), int(mois), int(jour))
+        return {
+            'show': True,
+            'back': {
+                'link': lien({champ_annee: annee, champ_mois: mois}),
+                'title': capfirst(formats.date_format(jour_choisi, 'YEAR_MONTH_FORMAT')),
+            },
+            'choices': [{'title': capfirst(formats.date_format(jour_choisi, 'MONTH_DAY_FORMAT'))}],
+        }
+    if annee and mois:
+        premier_jour = date(int(annee), int(mois), 1)
+        jours = [premier_jour + timedelta(days=n)
+                 for n in range(calendar.monthrange(premier_jour.year, premier_jour.month)[1])]
+        return {
+            'show': True,
+            'back': {'link': lien({champ_annee: annee}), 'title': str(annee)},
+            'choices': [
+                {
+                    'link': lien({champ_annee: annee, champ_mois: mois, champ_jour: j.day}),
+                    'title': capfirst(formats.date_format(j, 'MONTH_DAY_FORMAT')),
+                }
+                for j in non_vides(jours, lambda j: j + timedelta(days=1))
+            ],
+        }
+    mois_annee = non_vides([date(int(annee), m, 1) for m in range(1, 13)],
+                           lambda m: (m + timedelta(days=32)).replace(day=1))
+    return {
+        'show': True,
+        'back': {'link': lien({}), 'title': 'Toutes les dates'},
+        'choices': [
+            {
+                'link': lien({champ_annee: annee, champ_mois: m.month}),
+                'title': capfirst(formats.date_format(m, 'YEAR_MONTH_FORMAT')),
+            }
+            for m in mois_annee
+        ],
+    }
@@ -0,0 +1,294 @@
+# main/analytics.py
+"""
+Statistiques d'activité de la clinique calculées en bloc avec NumPy.
+
+Les colonnes des rendez-vous sont lues par lots depuis un curseur brut
+(pas d'instanciation de modèles) puis toutes les métriques sont calculées
+de façon vectorisée : délai de prise de RDV, taux d'annulation, taux de
+RDV non honorés et taux d'occupation par rapport au `Planning`.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import CustomUser, Planning, RendezVous
+
+# Taille des lots lus depuis le curseur
+TAILLE_LOT = 50000
+
+# Granularité des changements d'heure des fuseaux (secondes)
+QUART_HEURE = 900
+
+# Statuts considérés comme "non honorés" une fois la date passée
+STATUTS_EN_ATTENTE = ('programme', 'confirme')
+
+JOURS = [code for code, _ in Planning.JOURS_SEMAINE]
+LIBELLES_JOURS = [libelle for _, libelle in Planning.JOURS_SEMAINE]
+
+
+def _duree_creneau_minutes():
+    return getattr(settings, 'ESCO_DUREE_CRENEAU_MINUTES', 30)
+
+
+def _jour_semaine(dates):
+    """Jour de la semaine (0 = lundi) d'un tableau datetime64[D]"""
+    # Le 1er janvier 1970 était un jeudi (indice 3)
+    return (dates.astype(np.int64) + 3) % 7
+
+
+def _decalages_locaux(instants):
+    """
+    Décalage UTC -> heure locale (secondes) de chaque instant (secondes
+    depuis l'epoch, UTC) dans le fuseau courant, heure d'été comprise. Les
+    changements d'heure ayant lieu sur des quarts d'heure, le décalage n'est
+    calculé qu'une fois par quart d'heure distinct.
+    """
+    quarts, inverse = np.unique(instants // QUART_HEURE, return_inverse=True)
+    fuseau = timezone.get_current_timezone()
+    decalages = np.fromiter(
+        (datetime.fromtimestamp(int(quart) * QUART_HEURE, fuseau).utcoffset().total_seconds() for quart in quarts),
+        dtype=np.int64, count=len(quarts),
+    )
+    return decalages[inverse.reshape(-1)]
+
+
+def charger_colonnes_rdv(debut=None, fin=None, medecin_id=None):
+    """Charge les colonnes utiles des RDV dans des tableaux NumPy"""
+    queryset = RendezVous.objects.order_by()
+    if debut:
+        queryset = queryset.filter(date_rdv__gte=debut)
+    if fin:
+        queryset = queryset.filter(date_rdv__lte=fin)
+    if medecin_id:
+        queryset = queryset.filter(medecin_id=medecin_id)
+
+    sql, params = queryset.values_list(
+        'medecin_id', 'date_rdv', 'heure_rdv', 'status', 'created_at'
+    ).query.sql_with_params()
+
+    lots = {'medecin': [], 'date': [], 'heure': [], 'status': [], 'created_at': []}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            lignes = cursor.fetchmany(TAILLE_LOT)
+            if not lignes:
+                break
+            medecins, dates, heures, statuts, crees = zip(*lignes)
+            lots['medecin'].append(np.asarray(medecins, dtype=np.int64))
+            lots['date'].append(np.asarray(dates, dtype='datetime64[D]'))
+            heures = np.char.add('1970-01-01T', np.asarray(heures, dtype='U15'))
+            lots['heure'].append(heures.astype('datetime64[s]').astype(np.int64))
+            lots['status'].append(np.asarray(statuts, dtype='U20'))
+            lots['created_at'].append(
+                np.asarray(crees, dtype='datetime64[us]').astype('datetime64[s]')
+            )
+
+    vides = {
+        'medecin': np.empty(0, dtype=np.int64),
+        'date': np.empty(0, dtype='datetime64[D]'),
+        'heure': np.empty(0, dtype=np.int64),
+        'status': np.empty(0, dtype='U20'),
+        'created_at': np.empty(0, dtype='datetime64[s]'),
+    }
+    return {
+        nom: np.concatenate(morceaux) if morceaux else vides[nom]
+        for nom, morceaux in lots.items()
+    }
+
+
+def _capacite_planning(medecin_ids):
+    """Nombre de créneaux disponibles par médecin et par jour de semaine"""
+    capacite = np.zeros((len(medecin_ids), 7), dtype=np.int64)
+    if not len(medecin_ids):
+        return capacite
+
+    duree = _duree_creneau_minutes()
+    index_medecin = {int(m): i for i, m in enumerate(medecin_ids)}
+    plannings = Planning.objects.filter(
+        user_id__in=[int(m) for m in medecin_ids], disponible=True
+    ).values_list('user_id', 'jour', 'heure_debut', 'heure_fin')
+
+    for user_id, jour, heure_debut, heure_fin in plannings:
+        minutes = (heure_fin.hour * 60 + heure_fin.minute) - (heure_debut.hour * 60 + heure_debut.minute)
+        if minutes > 0 and jour in JOURS:
+            capacite[index_medecin[user_id], JOURS.index(jour)] += minutes // duree
+    return capacite
+
+
+def _ratio(numerateur, denominateur):
+    numerateur = np.asarray(numerateur, dtype=np.float64)
+    denominateur = np.asarray(denominateur, dtype=np.float64)
+    resultat = np.full(numerateur.shape, np.nan)
+    np.divide(numerateur, denominateur, out=resultat, where=denominateur > 0)
+    return resultat
+
+
+def _mediane_par_groupe(valeurs, groupes, nb_groupes):
+    """Médiane de `valeurs` pour chaque groupe (tri unique, sans boucle Python sur les lignes)"""
+    medianes = np.full(nb_groupes, np.nan)
+    if not len(valeurs):
+        return medianes
+    ordre = np.lexsort((valeurs, groupes))
+    groupes_tries = groupes[ordre]
+    valeurs_triees = valeurs[ordre]
+    debuts = np.searchsorted(groupes_tries, np.arange(nb_groupes), side='left')
+    fins = np.searchsorted(groupes_tries, np.arange(nb_groupes), side='right')
+    tailles = fins - debuts
+    presents = tailles > 0
+    bas = debuts[presents] + (tailles[presents] - 1) // 2
+    haut = debuts[presents] + tailles[presents] // 2
+    medianes[presents] = (valeurs_triees[bas] + valeurs_triees[haut]) / 2
+    return medianes
+
+
+def _en_float(valeur):
+    return None if np.isnan(valeur) else round(float(valeur), 3)
+
+
+def calculer_statistiques(debut=None, fin=None, medecin_id=None):
+    """Calcule les indicateurs d'activité sur la période demandée"""
+    colonnes = charger_colonnes_rdv(debut, fin, medecin_id)
+    total = len(colonnes['date'])
+    aujourd_hui = np.datetime64(timezone.localdate(), 'D')
+
+    if total:
+        debut = debut or colonnes['date'].min().astype(object)
+        fin = fin or colonnes['date'].max().astype(object)
+
+    # Délai de prise de RDV (création -> date/heure du RDV), en jours
+    # created_at est en UTC, la date et l'heure du RDV en heure locale
+    moment_rdv = colonnes['date'].astype('datetime64[s]').astype(np.int64) + colonnes['heure']
+    creation_utc = colonnes['created_at'].astype(np.int64)
+    moment_creation = creation_utc + _decalages_locaux(creation_utc)
+    delai_jours = (moment_rdv - moment_creation) / 86400.0
+
+    annules = colonnes['status'] == 'annule'
+    passes = colonnes['date'] < aujourd_hui
+    non_honores = passes & np.isin(colonnes['status'], STATUTS_EN_ATTENTE)
+    # Base du taux d'absence : RDV passés et non annulés
+    honorables = passes & ~annules
+    jours = _jour_semaine(colonnes['date'])
+
+    # Regroupement par médecin (indices denses)
+    medecin_ids, groupe_medecin = np.unique(colonnes['medecin'], return_inverse=True)
+    nb_medecins = len(medecin_ids)
+
+    def compter(masque, groupes, nb):
+        return np.bincount(groupes, weights=masque.astype(np.float64), minlength=nb)
+
+    totaux_medecin = np.bincount(groupe_medecin, minlength=nb_medecins)
+    annules_medecin = compter(annules, groupe_medecin, nb_medecins)
+    non_honores_medecin = compter(non_honores, groupe_medecin, nb_medecins)
+    honorables_medecin = compter(honorables, groupe_medecin, nb_medecins)
+    delai_medecin = _mediane_par_groupe(delai_jours, groupe_medecin, nb_medecins)
+
+    # Taux d'occupation : RDV non annulés / créneaux offerts par le planning
+    capacite = _capacite_planning(medecin_ids)
+    if total:
+        calendrier = np.arange(np.datetime64(debut, 'D'), np.datetime64(fin, 'D') + 1)
+        occurrences_jour = np.bincount(_jour_semaine(calendrier), minlength=7)
+    else:
+        occurrences_jour = np.zeros(7, dtype=np.int64)
+    creneaux_medecin_jour = capacite * occurrences_jour
+    reserves = ~annules
+    reserves_medecin_jour = np.zeros((nb_medecins, 7))
+    np.add.at(reserves_medecin_jour, (groupe_medecin[reserves], jours[reserves]), 1)
+
+    # Informations sur les médecins (une seule requête)
+    infos = {
+        m['id']: m for m in CustomUser.objects.filter(id__in=medecin_ids.tolist()).values(
+            'id', 'username', 'first_name', 'last_name', 'specialite'
+        )
+    }
+
+    par_medecin = []
+    for i, medecin in enumerate(medecin_ids.tolist()):
+        info = infos.get(medecin, {})
+        nom = f"{info.get('first_name', '')} {info.get('last_name', '')}".strip() or info.get('username', str(medecin))
+        creneaux = int(creneaux_medecin_jour[i].sum())
+        par_medecin.append({
+            'medecin_id': medecin,
+            'nom': nom,
+            'specialite': info.get('specialite') or 'Généraliste',
+            'total': int(totaux_medecin[i]),
+            'annules': int(annules_medecin[i]),
+            'taux_annulation': _en_float(_ratio(annules_medecin[i], totaux_medecin[i])),
+            'non_honores': int(non_honores_medecin[i]),
+            'taux_absence': _en_float(_ratio(non_honores_medecin[i], honorables_medecin[i])),
+            'delai_median_jours': _en_float(delai_medecin[i]),
+            'creneaux': creneaux,
+            'taux_occupation': _en_float(_ratio(reserves_medecin_jour[i].sum(), creneaux)),
+        })
+
+    # Regroupement par spécialité
+    specialites_medecin = np.asarray([ligne['specialite'] for ligne in par_medecin], dtype=str)
+    noms_specialites, groupe_specialite_medecin = np.unique(specialites_medecin, return_inverse=True)
+    nb_specialites = len(noms_specialites)
+    groupe_specialite = groupe_specialite_medecin[groupe_medecin]
+    totaux_specialite = np.bincount(groupe_specialite, minlength=nb_specialites)
+    annules_specialite = compter(annules, groupe_specialite, nb_specialites)
+    non_honores_specialite = compter(non_honores, groupe_specialite, nb_specialites)
+    honorables_specialite = compter(honorables, groupe_specialite, nb_specialites)
+    delai_specialite = _mediane_par_groupe(delai_jours, groupe_specialite, nb_specialites)
+    creneaux_specialite = np.bincount(
+        groupe_specialite_medecin, weights=creneaux_medecin_jour.sum(axis=1), minlength=nb_specialites
+    )
+    reserves_specialite = np.bincount(
+        groupe_specialite_medecin, weights=reserves_medecin_jour.sum(axis=1), minlength=nb_specialites
+    )
+
+    par_specialite = [{
+        'specialite': str(noms_specialites[i]),
+        'total': int(totaux_specialite[i]),
+        'taux_annulation': _en_float(_ratio(annules_specialite[i], totaux_specialite[i])),
+        'taux_absence': _en_float(_ratio(non_honores_specialite[i], honorables_specialite[i])),
+        'delai_median_jours': _en_float(delai_specialite[i]),
+        'taux_occupation': _en_float(_ratio(reserves_specialite[i], creneaux_specialite[i])),
+    } for i in range(nb_specialites)]
+
+    # Regroupement par jour de la semaine
+    totaux_jour = np.bincount(jours, minlength=7)
+    annules_jour = compter(annules, jours, 7)
+    non_honores_jour = compter(non_honores, jours, 7)
+    honorables_jour = compter(honorables, jours, 7)
+    delai_jour = _mediane_par_groupe(delai_jours, jours, 7)
+    creneaux_jour = creneaux_medecin_jour.sum(axis=0)
+    reserves_jour = reserves_medecin_jour.sum(axis=0)
+
+    par_jour = [{
+        'jour': LIBELLES_JOURS[i],
+        'total': int(totaux_jour[i]),
+        'taux_annulation': _en_float(_ratio(annules_jour[i], totaux_jour[i])),
+        'taux_absence': _en_float(_ratio(non_honores_jour[i], honorables_jour[i])),
+        'delai_median_jours': _en_float(delai_jour[i]),
+        'taux_occupation': _en_float(_ratio(reserves_jour[i], creneaux_jour[i])),
+    } for i in range(7)]
+
+    return {
+        'debut': debut,
+        'fin': fin,
+        'total': total,
+        'annules': int(annules.sum()),
+        'non_honores': int(non_honores.sum()),
+        'taux_annulation': _en_float(_ratio(annules.sum(), total)),
+        'taux_absence': _en_float(_ratio(non_honores.sum(), honorables.sum())),
+        'delai': {
+            'moyenne_jours': _en_float(delai_jours.mean()) if total else None,
+            'mediane_jours': _en_float(np.median(delai_jours)) if total else None,
+            'p90_jours': _en_float(np.percentile(delai_jours, 90)) if total else None,
+        },
+        'taux_occupation': _en_float(_ratio(reserves_medecin_jour.sum(), creneaux_medecin_jour.sum())),
+        'duree_creneau_minutes': _duree_creneau_minutes(),
+        'par_medecin': par_medecin,
+        'par_specialite': par_specialite,
+        'par_jour': par_jour,
+    }
+
+
+def periode_par_defaut(jours=365):
+    """Période glissante se terminant aujourd'hui"""
+    fin = timezone.localdate()
+    return fin - timedelta(days=jours), fin
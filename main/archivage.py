@@ -0,0 +1,181 @@
+# main/archivage.py
+"""
+Archivage de l'historique clinique froid.
+
+Les rendez-vous (avec leur consultation) et les soins plus anciens que
+l'horizon (settings.ESCO_ARCHIVAGE_HORIZON_JOURS) quittent les tables
+chaudes pour les tables *Archive, mêmes colonnes et même id. Les requêtes
+courantes (agendas, tableaux de bord, réservations) ne parcourent plus
+des années d'historique terminé.
+
+Le déplacement se fait par lots, chaque lot dans sa propre transaction
+courte (INSERT ... SELECT puis DELETE, par id) : le verrou d'écriture de
+SQLite est relâché entre deux lots et les réservations continuent pendant
+un archivage. Un lot interrompu est annulé en entier, sans ligne perdue
+ni dupliquée.
+
+Les vues qui affichent l'historique complet (dossiers patient, export)
+lisent les deux tables à travers `Historique`. Les lignes archivées étant
+toutes plus anciennes que les lignes chaudes, les N plus récentes sont
+les N premières de la table chaude complétées par celles de l'archive :
+deux requêtes indexées, sans UNION ni tri global, et un nombre de
+requêtes qui ne dépend pas du volume.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import (
+    Consultation, ConsultationArchive, DemandeAttente, MesureConstante, RendezVous, RendezVousArchive,
+    SoinsInfirmier, SoinsInfirmierArchive,
+)
+
+TAILLE_LOT = 500
+
+ARCHIVES = {
+    RendezVous: RendezVousArchive,
+    Consultation: ConsultationArchive,
+    SoinsInfirmier: SoinsInfirmierArchive,
+}
+
+
+def date_limite(horizon_jours=None, reference=None):
+    """Date locale avant laquelle un enregistrement est archivé"""
+    if horizon_jours is None:
+        horizon_jours = settings.ESCO_ARCHIVAGE_HORIZON_JOURS
+    return (reference or timezone.localdate()) - timedelta(days=horizon_jours)
+
+
+def _deplacer(modele, ids, archive_le):
+    """Copie les lignes `ids` de `modele` dans son archive puis les supprime (SQL brut, sans cascade ORM)"""
+    if not ids:
+        return 0
+    archive = ARCHIVES[modele]
+    nom = connection.ops.quote_name
+    colonnes = ', '.join(nom(champ.column) for champ in modele._meta.concrete_fields)
+    marques = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {nom(archive._meta.db_table)} ({colonnes}, {nom('archive_le')}) "
+            f"SELECT {colonnes}, %s FROM {nom(modele._meta.db_table)} WHERE id IN ({marques})",
+            [archive_le, *ids],
+        )
+        cursor.execute(f"DELETE FROM {nom(modele._meta.db_table)} WHERE id IN ({marques})", ids)
+    return len(ids)
+
+
+def _lot_rendez_vous(limite, taille_lot):
+    """Archive un lot de RDV antérieurs à `limite`, avec leurs consultations ; retourne les compteurs"""
+    with transaction.atomic():
+        ids = list(RendezVous.objects.filter(date_rdv__lt=limite).order_by('pk')
+                   .values_list('pk', flat=True)[:taille_lot])
+        if not ids:
+            return Counter()
+        maintenant = timezone.now()
+        consultations = list(Consultation.objects.filter(rdv__in=ids).values_list('pk', flat=True))
+        # Une demande d'attente servie garde sa trace, sans lien vers le RDV archivé
+        DemandeAttente.objects.filter(rdv__in=ids).update(rdv=None)
+        return Counter({
+            'consultations': _deplacer(Consultation, consultations, maintenant),
+            'rendez_vous': _deplacer(RendezVous, ids, maintenant),
+        })
+
+
+def _lot_soins(limite, taille_lot):
+    with transaction.atomic():
+        debut_limite = timezone.make_aware(datetime.combine(limite, time.min))
+        ids = list(SoinsInfirmier.objects.filter(date_soin__lt=debut_limite).order_by('pk')
+                   .values_list('pk', flat=True)[:taille_lot])
+        # Le DELETE brut n'applique pas le SET_NULL : une mesure prise pendant le soin reste, sans lien vers lui
+        MesureConstante.objects.filter(soin__in=ids).update(soin=None)
+        return Counter({'soins': _deplacer(SoinsInfirmier, ids, timezone.now())})
+
+
+def a_archiver(horizon_jours=None):
+    """Nombre d'enregistrements que l'archivage déplacerait, sans rien modifier"""
+    limite = date_limite(horizon_jours)
+    debut_limite = timezone.make_aware(datetime.combine(limite, time.min))
+    return {
+        'rendez_vous': RendezVous.objects.filter(date_rdv__lt=limite).count(),
+        'consultations': Consultation.objects.filter(rdv__date_rdv__lt=limite).count(),
+        'soins': SoinsInfirmier.objects.filter(date_soin__lt=debut_limite).count(),
+    }
+
+
+def archiver(horizon_jours=None, taille_lot=TAILLE_LOT, apres_lot=None):
+    """
+    Archive tout ce qui est antérieur à l'horizon, lot par lot. `apres_lot`,
+    appelé avec les compteurs cumulés entre deux lots, permet d'afficher la
+    progression ou de marquer une pause. Retourne les compteurs.
+    """
+    limite = date_limite(horizon_jours)
+    bilan = Counter({'rendez_vous': 0, 'consultations': 0, 'soins': 0, 'lots': 0})
+    for lot in (_lot_rendez_vous, _lot_soins):
+        while True:
+            deplaces = lot(limite, taille_lot)
+            if not any(deplaces.values()):
+                break
+            bilan.update(deplaces)
+            bilan['lots'] += 1
+            if apres_lot:
+                apres_lot(bilan)
+    return dict(bilan)
+
+
+class Historique:
+    """
+    Lecture de l'historique complet d'un modèle archivé : même filtre sur la
+    table chaude et sur son archive. Les lignes archivées sont considérées
+    plus anciennes que toutes les lignes chaudes ; l'ordre (order_by) doit
+    donc commencer par un champ de date.
+    """
+
+    def __init__(self, modele, *args, **filtres):
+        self.chaud = modele.objects.filter(*args, **filtres)
+        self.archive = ARCHIVES[modele].objects.filter(*args, **filtres)
+        self.decroissant = True
+
+    def _les_deux(self, methode, *args):
+        historique = Historique.__new__(Historique)
+        historique.chaud = getattr(self.chaud, methode)(*args)
+        historique.archive = getattr(self.archive, methode)(*args)
+        historique.decroissant = self.decroissant
+        return historique
+
+    def select_related(self, *champs):
+        return self._les_deux('select_related', *champs)
+
+    def order_by(self, *ordre):
+        historique = self._les_deux('order_by', *ordre)
+        historique.decroissant = ordre[0].startswith('-')
+        return historique
+
+    def _dans_l_ordre(self):
+        """(plus récente, plus ancienne) des deux tables dans l'ordre de lecture"""
+        return (self.chaud, self.archive) if self.decroissant else (self.archive, self.chaud)
+
+    def count(self):
+        return self.chaud.count() + self.archive.count()
+
+    def __getitem__(self, tranche):
+        if not isinstance(tranche, slice) or tranche.start or tranche.step or tranche.stop is None:
+            raise TypeError("Historique ne prend en charge que les tranches [:n]")
+        premiere, seconde = self._dans_l_ordre()
+        return (list(premiere[:tranche.stop]) + list(seconde[:tranche.stop]))[:tranche.stop]
+
+    def __iter__(self):
+        premiere, seconde = self._dans_l_ordre()
+        yield from premiere
+        yield from seconde
+
+    def first(self):
+        lignes = self[:1]
+        return lignes[0] if lignes else None
+
+    def last(self):
+        premiere, seconde = self._dans_l_ordre()
+        lignes = [ligne for ligne in (premiere.last(), seconde.last()) if ligne is not None]
+        return lignes[-1] if lignes else None
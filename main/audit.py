@@ -0,0 +1,155 @@
+# main/audit.py
+"""
+Journal des accès aux dossiers patients (modèle AccesDossier).
+
+Une vue qui affiche un dossier ne fait qu'ajouter l'événement à une file en
+mémoire (`enregistrer`) : aucune écriture, aucune requête, pas de verrou
+SQLite pris pendant une page en lecture. Un thread d'écriture, démarré au
+premier événement du processus, vide la file toutes les INTERVALLE secondes
+par lots de TAILLE_LOT (bulk_create : un INSERT et une transaction par lot).
+
+La file est bornée (settings.ESCO_AUDIT_FILE_MAX). Elle ne se remplit que
+si la base reste verrouillée : la requête attend alors au plus ATTENTE_FILE
+secondes une place, puis abandonne l'événement et le compte dans la
+métrique esco_audit_perdus_total. Elle n'écrit jamais elle-même : une page
+en lecture ne peut pas échouer à cause du journal. Un lot dont l'écriture
+échoue est gardé (`en_echec`) et retenté avant la suite de la file. À
+l'arrêt du processus (atexit), le thread est arrêté et ce qui reste est
+écrit si la base le permet.
+
+Sans thread (settings.ESCO_AUDIT_ASYNCHRONE faux, cas des tests), les
+événements restent dans la file jusqu'à un appel à `vider`.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+from . import metriques
+from .models import AccesDossier
+
+logger = logging.getLogger(__name__)
+
+TAILLE_LOT = 500
+INTERVALLE = 1.0
+ATTENTE_FILE = 0.05  # secondes d'attente d'une place dans une file pleine
+
+_verrou = threading.Lock()
+_etat = {'pid': None, 'file': None, 'ecrivain': None, 'arret': None, 'en_echec': []}
+
+
+def _file():
+    """File du processus courant, recréée après un fork (workers gunicorn)"""
+    if _etat['pid'] != os.getpid():
+        with _verrou:
+            if _etat['pid'] != os.getpid():
+                _etat.update(pid=os.getpid(), file=queue.Queue(settings.ESCO_AUDIT_FILE_MAX),
+                             ecrivain=None, arret=None, en_echec=[])
+    return _etat['file']
+
+
+def reinitialiser():
+    """Oublie les événements en attente et recrée la file (tests, changement de taille)"""
+    arreter()
+    with _verrou:
+        _etat.update(pid=None)
+
+
+def _demarrer():
+    with _verrou:
+        if _etat['ecrivain'] is not None:
+            return
+        arret = threading.Event()
+        ecrivain = threading.Thread(target=_boucle, args=(_etat['file'], arret), name='esco-audit', daemon=True)
+        _etat.update(ecrivain=ecrivain, arret=arret)
+        ecrivain.start()
+
+
+def enregistrer(request, patient_id, action, objet=''):
+    """Ajoute à la file l'accès de l'utilisateur de `request` au dossier de `patient_id`"""
+    evenement = AccesDossier(
+        utilisateur_id=request.user.pk,
+        patient_id=patient_id,
+        action=action,
+        objet=str(objet)[:100],
+        adresse_ip=request.META.get('REMOTE_ADDR') or None,
+        date=timezone.now(),
+    )
+    file = _file()
+    if settings.ESCO_AUDIT_ASYNCHRONE and _etat['ecrivain'] is None:
+        _demarrer()
+    try:
+        if _etat['ecrivain']:
+            file.put(evenement, timeout=ATTENTE_FILE)
+        else:
+            # Sans thread d'écriture, personne ne libère de place : inutile d'attendre
+            file.put_nowait(evenement)
+    except queue.Full:
+        metriques.incrementer('esco_audit_perdus_total')
+
+
+def _prendre(file):
+    """Retire jusqu'à TAILLE_LOT événements de la file"""
+    lot = []
+    try:
+        while len(lot) < TAILLE_LOT:
+            lot.append(file.get_nowait())
+    except queue.Empty:
+        pass
+    return lot
+
+
+def _ecrire(lot):
+    AccesDossier.objects.bulk_create(lot, batch_size=TAILLE_LOT)
+
+
+def _ecrire_en_attente(file):
+    """
+    Écrit le lot en échec puis la file, lot par lot ; s'arrête au premier
+    lot qui ne s'écrit pas, gardé dans `en_echec`. Ne lève jamais. Retourne
+    le nombre d'événements écrits.
+    """
+    total = 0
+    try:
+        while lot := _etat['en_echec'] or _prendre(file):
+            _etat['en_echec'] = lot
+            _ecrire(lot)
+            _etat['en_echec'] = []
+            total += len(lot)
+    except Exception:
+        # Base verrouillée ou indisponible : le lot est retenté au tour suivant
+        # (ou par l'écriture finale de `arreter`)
+        logger.exception("Écriture de %d accès aux dossiers impossible, nouvel essai", len(_etat['en_echec']))
+    return total
+
+
+def vider():
+    """Écrit les événements en attente dans le thread appelant (tests, arrêt) ; retourne leur nombre"""
+    return _ecrire_en_attente(_file())
+
+
+def _boucle(file, arret):
+    while not arret.wait(INTERVALLE):
+        close_old_connections()
+        _ecrire_en_attente(file)
+    connections.close_all()
+
+
+def arreter(delai=5):
+    """Arrête le thread d'écriture puis écrit ce qui reste dans la file"""
+    ecrivain, arret = _etat['ecrivain'], _etat['arret']
+    if ecrivain is None or _etat['pid'] != os.getpid():
+        return 0
+    arret.set()
+    ecrivain.join(delai)
+    with _verrou:
+        _etat.update(ecrivain=None, arret=None)
+    return vider()
+
+
+atexit.register(arreter)
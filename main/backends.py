@@ -0,0 +1,23 @@
+# main/backends.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class ESCOModelBackend(ModelBackend):
+    """
+    Backend d'authentification ESCO.
+
+    L'utilisateur rattaché à chaque requête (AuthenticationMiddleware) est
+    chargé en une seule requête, sans les champs médicaux volumineux : les
+    vues ne lisent que son rôle et son identité. Les pages médicales
+    rechargent ces champs à la demande avec `charger_profil_medical()`.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.defer(*UserModel.CHAMPS_MEDICAUX).get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
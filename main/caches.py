@@ -0,0 +1,71 @@
+# main/caches.py
+"""
+Backends de cache de Django qui comptent leurs lectures (métrique
+esco_cache_lectures_total, voir main/metriques.py). Le nom du cache dans
+les métriques est l'option NOM de settings.CACHES.
+"""
+from django.core.cache.backends import filebased, locmem
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from . import metriques
+
+
+class LecturesComptees:
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.nom = params.get('NOM', location or 'default')
+
+    def get(self, key, default=None, version=None):
+        valeur = super().get(key, self._missing_key, version=version)
+        trouve = valeur is not self._missing_key
+        metriques.incrementer('esco_cache_lectures_total', cache=self.nom, resultat='succes' if trouve else 'echec')
+        return valeur if trouve else default
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        # Comme BaseCache.get_or_set, sans compter la relecture après l'ajout
+        valeur = self.get(key, self._missing_key, version=version)
+        if valeur is self._missing_key:
+            if callable(default):
+                default = default()
+            self.add(key, default, timeout=timeout, version=version)
+            valeur = super().get(key, default, version=version)
+        return valeur
+
+
+class LocMemCache(LecturesComptees, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(LecturesComptees, filebased.FileBasedCache):
+    """
+    Option EVICTION=False : pas d'éviction à l'écriture, donc pas de
+    parcours du dossier à chaque set() ; les entrées expirées sont supprimées
+    par purger() (commande `purger_sessions`).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.eviction = params.get('EVICTION', True)
+
+    def _cull(self):
+        if self.eviction:
+            super()._cull()
+
+    def purger(self):
+        """Supprime les entrées expirées ; retourne leur nombre"""
+        supprimees = 0
+        for fichier in self._list_cache_files():
+            try:
+                with open(fichier, 'rb') as f:
+                    # _is_expired() supprime le fichier d'une entrée expirée
+                    supprimees += self._is_expired(f)
+            except FileNotFoundError:
+                pass
+        return supprimees
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        # Entrée expirée : Django supprime et ferme le fichier avant de le déverrouiller (ValueError)
+        try:
+            return super().touch(key, timeout, version)
+        except ValueError:
+            return False
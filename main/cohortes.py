@@ -0,0 +1,98 @@
+# main/cohortes.py
+"""
+Constructeur de cohortes de patients pour les médecins.
+
+Les critères structurés (groupe sanguin, mots-clés, âge, dernière
+consultation, statut des RDV avec le médecin) sont compilés en une seule
+requête SQL : les conditions sur l'historique du patient sont des
+sous-requêtes EXISTS / NOT EXISTS corrélées, appuyées sur l'index
+RendezVous (patient, medecin, date_rdv).
+"""
+from django.db.models import Exists, OuterRef, Q, Subquery
+
+from .models import CustomUser, RendezVous
+
+# Statut RDV : valeurs spéciales en plus des statuts de RendezVous
+RDV_AU_MOINS_UN = 'tous'
+RDV_AUCUN = 'aucun'
+
+# Colonnes de l'export CSV / de l'API : (clé, libellé)
+COLONNES = [
+    ('id', 'ID'),
+    ('user_id', 'Identifiant'),
+    ('last_name', 'Nom'),
+    ('first_name', 'Prénom'),
+    ('date_naissance', 'Date de naissance'),
+    ('age', 'Âge'),
+    ('groupe_sanguin', 'Groupe sanguin'),
+    ('imc', 'IMC'),
+    ('categorie_tension', 'Tension'),
+    ('derniere_consultation', 'Dernière consultation'),
+]
+
+
+def _mots_cles(texte):
+    """Découpe une saisie libre en mots-clés (séparés par des virgules ou des espaces)"""
+    return [mot for mot in texte.replace(',', ' ').split() if mot]
+
+
+def _q_mots_cles(champs, mots):
+    """Chaque mot doit apparaître dans au moins un des champs"""
+    condition = Q()
+    for mot in mots:
+        un_des_champs = Q()
+        for champ in champs:
+            un_des_champs |= Q(**{f'{champ}__icontains': mot})
+        condition &= un_des_champs
+    return condition
+
+
+def construire_cohorte(medecin, criteres):
+    """
+    Retourne le queryset des patients actifs correspondant aux critères.
+
+    `criteres` est le cleaned_data de CohorteForm (clés absentes ou vides ignorées) :
+        groupe_sanguin, allergies, antecedents, age_min, age_max,
+        consulte_depuis, non_consulte_depuis, statut_rdv
+    """
+    patients = CustomUser.objects.filter(role='patient', is_active=True)
+
+    if criteres.get('groupe_sanguin'):
+        patients = patients.filter(groupe_sanguin=criteres['groupe_sanguin'])
+
+    if criteres.get('age_min') is not None or criteres.get('age_max') is not None:
+        patients = patients.age_entre(criteres.get('age_min'), criteres.get('age_max'))
+
+    if criteres.get('allergies'):
+        patients = patients.filter(_q_mots_cles(['allergies'], _mots_cles(criteres['allergies'])))
+    if criteres.get('antecedents'):
+        patients = patients.filter(_q_mots_cles(
+            ['antecedents_medicaux', 'medicaments_actuels'], _mots_cles(criteres['antecedents'])
+        ))
+
+    rdv_avec_medecin = RendezVous.objects.filter(patient=OuterRef('pk'), medecin=medecin)
+    consultations = rdv_avec_medecin.filter(consultation__isnull=False)
+
+    if criteres.get('consulte_depuis'):
+        patients = patients.filter(Exists(consultations.filter(date_rdv__gte=criteres['consulte_depuis'])))
+    if criteres.get('non_consulte_depuis'):
+        patients = patients.filter(~Exists(consultations.filter(date_rdv__gte=criteres['non_consulte_depuis'])))
+
+    statut = criteres.get('statut_rdv')
+    if statut == RDV_AU_MOINS_UN:
+        patients = patients.filter(Exists(rdv_avec_medecin))
+    elif statut == RDV_AUCUN:
+        patients = patients.filter(~Exists(rdv_avec_medecin))
+    elif statut:
+        patients = patients.filter(Exists(rdv_avec_medecin.filter(status=statut)))
+
+    # Date de la dernière consultation avec ce médecin (calculée pour les lignes affichées)
+    derniere = consultations.order_by('-date_rdv').values('date_rdv')[:1]
+    return patients.avec_indicateurs().annotate(
+        derniere_consultation=Subquery(derniere)
+    ).order_by('last_name', 'first_name', 'pk')
+
+
+def lignes(cohorte):
+    """Lignes (dictionnaires) de la cohorte pour l'API et l'export, sans les champs texte"""
+    return cohorte.values(*[cle for cle, _ in COLONNES])
@@ -0,0 +1,103 @@
+# main/constantes.py
+"""
+Saisie et lecture des constantes vitales (poids, tension, température...).
+
+Les relevés des tournées infirmières sont enregistrés en bloc : un
+`SoinsInfirmier` de type 'prise_constantes' par patient (la description
+texte est conservée pour l'affichage existant) et une `MesureConstante`
+par valeur mesurée.
+"""
+import math
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CustomUser, MesureConstante, SoinsInfirmier
+
+TYPES_VALIDES = {code for code, _ in MesureConstante.TYPE_CHOICES}
+LIBELLES = dict(MesureConstante.TYPE_CHOICES)
+
+# Taille des lots pour bulk_create
+TAILLE_LOT = 500
+
+
+def _description(mesures):
+    """Résumé texte des mesures, pour le champ description du soin"""
+    return ', '.join(f"{LIBELLES[type_mesure]}: {valeur}" for type_mesure, valeur in mesures.items())
+
+
+def enregistrer_tournee(infirmier, releves, date_soin=None):
+    """
+    Enregistre les relevés d'une tournée infirmière.
+
+    `releves` est une liste de dictionnaires :
+        {'patient': <CustomUser ou id>, 'mesures': {'poids': 72.5, ...},
+         'date_mesure': <datetime optionnelle>, 'observations': '...'}
+
+    Retourne la liste des soins créés. Lève ValueError si un relevé est mal
+    formé, si un type de mesure est inconnu ou si une valeur n'est pas finie.
+    """
+    date_soin = date_soin or timezone.now()
+    soins = []
+    mesures_par_soin = []
+
+    for releve in releves:
+        if not isinstance(releve, dict) or not isinstance(releve.get('mesures'), dict):
+            raise ValueError("Relevé mal formé : un objet avec des mesures est attendu")
+        mesures = {cle: float(valeur) for cle, valeur in releve['mesures'].items() if valeur not in (None, '')}
+        inconnus = set(mesures) - TYPES_VALIDES
+        if inconnus:
+            raise ValueError(f"Type(s) de mesure inconnu(s): {', '.join(sorted(inconnus))}")
+        if not all(math.isfinite(valeur) for valeur in mesures.values()):
+            raise ValueError("Valeur de mesure non finie (NaN ou infini)")
+        if not mesures:
+            continue
+
+        patient = releve['patient']
+        patient_id = patient.pk if isinstance(patient, CustomUser) else int(patient)
+        date_mesure = releve.get('date_mesure') or date_soin
+        soins.append(SoinsInfirmier(
+            patient_id=patient_id,
+            infirmier=infirmier,
+            type_soin='prise_constantes',
+            description=_description(mesures),
+            date_soin=date_mesure,
+            observations=releve.get('observations') or None,
+        ))
+        mesures_par_soin.append((patient_id, date_mesure, mesures))
+
+    with transaction.atomic():
+        soins = SoinsInfirmier.objects.bulk_create(soins, batch_size=TAILLE_LOT)
+        MesureConstante.objects.bulk_create([
+            MesureConstante(
+                patient_id=patient_id,
+                soin=soin,
+                type_mesure=type_mesure,
+                valeur=valeur,
+                date_mesure=date_mesure,
+            )
+            for soin, (patient_id, date_mesure, mesures) in zip(soins, mesures_par_soin)
+            for type_mesure, valeur in mesures.items()
+        ], batch_size=TAILLE_LOT)
+
+    return soins
+
+
+def enregistrer_profil(patient, champs=None, date_mesure=None):
+    """
+    Historise les constantes saisies par le patient dans son profil médical.
+    `champs` limite l'enregistrement aux champs modifiés (form.changed_data).
+    """
+    date_mesure = date_mesure or timezone.now()
+    types = [
+        type_mesure for type_mesure in ('poids', 'taille', 'tension_systolique', 'tension_diastolique')
+        if champs is None or type_mesure in champs
+    ]
+    mesures = [
+        MesureConstante(patient=patient, type_mesure=type_mesure, valeur=valeur, date_mesure=date_mesure)
+        for type_mesure in types
+        for valeur in [getattr(patient, type_mesure)]
+        if valeur is not None
+    ]
+    MesureConstante.objects.bulk_create(mesures)
+    return mesures
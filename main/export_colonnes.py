@@ -0,0 +1,447 @@
+# main/export_colonnes.py
+"""
+Export colonnaire de la base clinique pour l'équipe data.
+
+Chaque table est lue par lots depuis un curseur brut (comme analytics.py),
+une requête courte par lot sans transaction englobante, et écrite colonne
+par colonne :
+  - Arrow IPC (.arrow) ou Parquet (.parquet) si pyarrow est installé,
+  - sinon un fichier NumPy .npz par lot.
+
+Les colonnes catégorielles (statut, type de soin, spécialité...) sont
+encodées en dictionnaire : codes entiers + liste des valeurs, le
+dictionnaire étant calculé avant la lecture pour rester identique dans
+tous les lots d'un fichier.
+
+Les exports sont incrémentaux : chaque exécution ajoute un fichier par
+table contenant les lignes créées ou modifiées depuis la précédente
+(colonne de suivi, mémorisée dans etat_export.json). Une ligne modifiée
+apparaît donc dans plusieurs fichiers : garder la dernière version par id.
+Les données démographiques des patients n'ont pas de date de modification
+fiable ; elles sont réécrites en entier à chaque export.
+
+Les RDV, consultations et soins archivés (main/archivage.py) sont lus avec
+les lignes chaudes (UNION ALL) : l'archivage ne change pas le contenu de
+l'export. Une ligne archivée garde son id et sa colonne de suivi, elle
+n'est donc pas réexportée par un export incrémental.
+"""
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.db import connection
+from django.utils import timezone
+
+from .models import (
+    Consultation, ConsultationArchive, CustomUser, Prescription, RendezVous, RendezVousArchive, SoinsInfirmier,
+    SoinsInfirmierArchive,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dépend de l'environnement
+    pa = None
+    pq = None
+
+# Nombre de lignes lues (et écrites) par lot
+TAILLE_LOT = 200000
+
+FICHIER_ETAT = 'etat_export.json'
+
+
+def _specialites():
+    return CustomUser.objects.filter(role='docteur')
+
+
+# Tables exportées : colonnes (lookup, type, nom de colonne), colonne de suivi
+# pour l'incrémental (None = réécriture complète), table d'archive lue avec la
+# table chaude et source des dictionnaires quand elle diffère de la table elle-même.
+TABLES = {
+    'rendezvous': {
+        'queryset': lambda: RendezVous.objects.all(),
+        'archive': lambda: RendezVousArchive.objects.all(),
+        'suivi': 'updated_at',
+        'colonnes': [
+            ('id', 'int', 'id'),
+            ('patient_id', 'int', 'patient_id'),
+            ('medecin_id', 'int', 'medecin_id'),
+            ('medecin__specialite', 'cat', 'specialite'),
+            ('date_rdv', 'date', 'date_rdv'),
+            ('heure_rdv', 'time', 'heure_rdv'),
+            ('status', 'cat', 'status'),
+            ('created_at', 'datetime', 'created_at'),
+            ('updated_at', 'datetime', 'updated_at'),
+        ],
+        'dictionnaires': {'medecin__specialite': (_specialites, 'specialite')},
+    },
+    'consultation': {
+        'queryset': lambda: Consultation.objects.all(),
+        'archive': lambda: ConsultationArchive.objects.all(),
+        'suivi': 'updated_at',
+        'colonnes': [
+            ('id', 'int', 'id'),
+            ('rdv_id', 'int', 'rdv_id'),
+            ('rdv__patient_id', 'int', 'patient_id'),
+            ('rdv__medecin_id', 'int', 'medecin_id'),
+            ('rdv__medecin__specialite', 'cat', 'specialite'),
+            ('rdv__date_rdv', 'date', 'date_rdv'),
+            ('created_at', 'datetime', 'created_at'),
+            ('updated_at', 'datetime', 'updated_at'),
+        ],
+        'dictionnaires': {'rdv__medecin__specialite': (_specialites, 'specialite')},
+    },
+    'prescription': {
+        'queryset': lambda: Prescription.objects.all(),
+        'suivi': 'updated_at',
+        'colonnes': [
+            ('id', 'int', 'id'),
+            ('patient_id', 'int', 'patient_id'),
+            ('medecin_id', 'int', 'medecin_id'),
+            ('medecin__specialite', 'cat', 'specialite'),
+            ('date_prescription', 'datetime', 'date_prescription'),
+            ('created_at', 'datetime', 'created_at'),
+            ('updated_at', 'datetime', 'updated_at'),
+        ],
+        'dictionnaires': {'medecin__specialite': (_specialites, 'specialite')},
+    },
+    'soins': {
+        # Les soins ne sont jamais modifiés : la date de création sert de suivi
+        'queryset': lambda: SoinsInfirmier.objects.all(),
+        'archive': lambda: SoinsInfirmierArchive.objects.all(),
+        'suivi': 'created_at',
+        'colonnes': [
+            ('id', 'int', 'id'),
+            ('patient_id', 'int', 'patient_id'),
+            ('infirmier_id', 'int', 'infirmier_id'),
+            ('type_soin', 'cat', 'type_soin'),
+            ('date_soin', 'datetime', 'date_soin'),
+            ('created_at', 'datetime', 'created_at'),
+        ],
+    },
+    'patients': {
+        'queryset': lambda: CustomUser.objects.filter(role='patient').avec_indicateurs(),
+        'suivi': None,
+        'colonnes': [
+            ('id', 'int', 'id'),
+            ('is_active', 'bool', 'actif'),
+            ('date_joined', 'datetime', 'date_inscription'),
+            ('date_naissance', 'date', 'date_naissance'),
+            ('age', 'int', 'age'),
+            ('tranche_age', 'cat', 'tranche_age'),
+            ('groupe_sanguin', 'cat', 'groupe_sanguin'),
+            ('poids', 'float', 'poids'),
+            ('taille', 'float', 'taille'),
+            ('imc', 'float', 'imc'),
+            ('categorie_imc', 'cat', 'categorie_imc'),
+            ('tension_systolique', 'int', 'tension_systolique'),
+            ('tension_diastolique', 'int', 'tension_diastolique'),
+            ('categorie_tension', 'cat', 'categorie_tension'),
+        ],
+    },
+}
+
+
+def format_par_defaut():
+    return 'arrow' if pa is not None else 'npz'
+
+
+# ===== LECTURE =====
+
+def _valeurs_distinctes(queryset, lookup):
+    valeurs = queryset.order_by().values_list(lookup, flat=True).distinct()
+    return sorted(valeur for valeur in valeurs if valeur not in (None, ''))
+
+
+def _dictionnaires(config, querysets):
+    """Dictionnaire (valeurs triées) de chaque colonne catégorielle, sur l'ensemble des `querysets`"""
+    sources = config.get('dictionnaires', {})
+    dictionnaires = {}
+    for lookup, type_colonne, nom in config['colonnes']:
+        if type_colonne != 'cat':
+            continue
+        if lookup in sources:
+            source, champ = sources[lookup]
+            dictionnaires[nom] = _valeurs_distinctes(source(), champ)
+        else:
+            dictionnaires[nom] = sorted({valeur for queryset in querysets
+                                         for valeur in _valeurs_distinctes(queryset, lookup)})
+    return dictionnaires
+
+
+def _sources(config):
+    """Querysets lus pour la table : table chaude, puis son archive s'il y en a une"""
+    return [config['queryset']()] + ([config['archive']()] if 'archive' in config else [])
+
+
+def _convertir(valeurs, type_colonne, dictionnaire=None):
+    """Convertit une colonne (tuple Python) en tableau NumPy + masque des valeurs nulles"""
+    if type_colonne == 'cat':
+        index = {valeur: code for code, valeur in enumerate(dictionnaire)}
+        codes = np.fromiter((index.get(v, -1) for v in valeurs), dtype=np.int32, count=len(valeurs))
+        return codes, codes < 0
+    if type_colonne == 'time':
+        secondes = np.fromiter(
+            (-1 if v is None else v.hour * 3600 + v.minute * 60 + v.second for v in valeurs),
+            dtype=np.int32, count=len(valeurs),
+        )
+        return secondes, secondes < 0
+    if type_colonne in ('date', 'datetime'):
+        unite = 'D' if type_colonne == 'date' else 'us'
+        tableau = np.array(valeurs, dtype=f'datetime64[{unite}]')
+        return tableau, np.isnat(tableau)
+
+    masque = np.fromiter((v is None for v in valeurs), dtype=bool, count=len(valeurs))
+    if type_colonne == 'float':
+        return np.array([np.nan if v is None else v for v in valeurs], dtype=np.float64), masque
+    dtype = bool if type_colonne == 'bool' else np.int64
+    return np.array([0 if v is None else v for v in valeurs], dtype=dtype), masque
+
+
+def lire_lots(nom_table, depuis=None, jusqua=None, taille_lot=TAILLE_LOT):
+    """
+    Générateur : dictionnaires de la table puis lots {colonne: (valeurs, masque)}.
+
+    Le premier élément produit est le dict des dictionnaires catégoriels ;
+    les suivants sont les lots, table chaude puis archive. Chaque lot est
+    une requête courte (lignes d'id supérieur au dernier lu, par l'index de
+    la clé primaire), hors transaction : aucun verrou n'est gardé sur la
+    base entre deux lots et les réservations passent pendant l'export. Une
+    ligne modifiée entre-temps a une colonne de suivi postérieure à `jusqua`
+    et ira dans l'export suivant ; une ligne archivée entre-temps peut être
+    lue deux fois (garder la dernière version par id). Les tables sans suivi
+    sont lues telles quelles : une valeur catégorielle apparue après le
+    calcul des dictionnaires y est exportée comme nulle.
+    """
+    config = TABLES[nom_table]
+    colonnes = config['colonnes']
+    dictionnaires = _dictionnaires(config, _sources(config))
+    yield dictionnaires
+
+    for queryset in _sources(config):
+        if config['suivi'] and depuis is not None:
+            queryset = queryset.filter(**{f"{config['suivi']}__gt": depuis})
+        if config['suivi'] and jusqua is not None:
+            queryset = queryset.filter(**{f"{config['suivi']}__lte": jusqua})
+        # La première colonne est l'id : le dernier id lu borne le lot suivant
+        lecture = queryset.order_by('pk').values_list(*[lookup for lookup, _, _ in colonnes])
+        dernier = None
+        while True:
+            lot = lecture if dernier is None else lecture.filter(pk__gt=dernier)
+            sql, params = lot[:taille_lot].query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                lignes = cursor.fetchall()
+            if not lignes:
+                break
+            dernier = lignes[-1][0]
+            valeurs_par_colonne = list(zip(*lignes))
+            yield {
+                nom: _convertir(valeurs, type_colonne, dictionnaires.get(nom))
+                for (_, type_colonne, nom), valeurs in zip(colonnes, valeurs_par_colonne)
+            }
+            if len(lignes) < taille_lot:
+                break
+
+
+# ===== ÉCRITURE =====
+
+def _type_arrow(type_colonne):
+    return {
+        'int': pa.int64(),
+        'float': pa.float64(),
+        'bool': pa.bool_(),
+        'date': pa.date32(),
+        'datetime': pa.timestamp('us', tz='UTC'),
+        'time': pa.time32('s'),
+        'cat': pa.dictionary(pa.int32(), pa.string()),
+    }[type_colonne]
+
+
+class EcrivainArrow:
+    """Écrit les lots dans un seul fichier Arrow IPC ou Parquet (un lot = un record batch / row group)"""
+
+    def __init__(self, chemin, nom_table, dictionnaires, format_sortie):
+        self.chemin = f'{chemin}.{format_sortie}'
+        self.colonnes = [(nom, type_colonne) for _, type_colonne, nom in TABLES[nom_table]['colonnes']]
+        self.dictionnaires = {
+            nom: pa.array(valeurs, type=pa.string()) for nom, valeurs in dictionnaires.items()
+        }
+        self.schema = pa.schema([(nom, _type_arrow(type_colonne)) for nom, type_colonne in self.colonnes])
+        self._temporaire = self.chemin + '.partiel'
+        if format_sortie == 'parquet':
+            self._writer = pq.ParquetWriter(self._temporaire, self.schema, compression='zstd')
+        else:
+            self._writer = pa.ipc.new_file(self._temporaire, self.schema)
+        self.fichiers = [self.chemin]
+
+    def _colonne(self, nom, type_colonne, valeurs, masque):
+        if type_colonne == 'cat':
+            return pa.DictionaryArray.from_arrays(
+                pa.array(valeurs, mask=masque), self.dictionnaires[nom]
+            )
+        if type_colonne == 'datetime':
+            return pa.array(valeurs.astype(np.int64), type=_type_arrow('datetime'), mask=masque)
+        if type_colonne == 'date':
+            return pa.array(valeurs.astype(np.int32), type=pa.date32(), mask=masque)
+        return pa.array(valeurs, type=_type_arrow(type_colonne), mask=masque)
+
+    def ecrire(self, lot):
+        batch = pa.record_batch(
+            [self._colonne(nom, type_colonne, *lot[nom]) for nom, type_colonne in self.colonnes],
+            schema=self.schema,
+        )
+        if isinstance(self._writer, pq.ParquetWriter):
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+
+    def fermer(self):
+        self._writer.close()
+        os.replace(self._temporaire, self.chemin)
+
+
+class EcrivainNpz:
+    """
+    Écrit un fichier .npz par lot (np.load ne sait pas ajouter à un .npz).
+
+    Pour chaque colonne : `<nom>` (valeurs, codes int32 pour les catégories),
+    `<nom>__masque` si la colonne contient des nulls et `<nom>__dictionnaire`
+    pour les colonnes catégorielles.
+    """
+
+    def __init__(self, chemin, nom_table, dictionnaires, format_sortie='npz'):
+        self.chemin = chemin
+        self.dictionnaires = {nom: np.array(valeurs, dtype=str) for nom, valeurs in dictionnaires.items()}
+        self.fichiers = []
+
+    def ecrire(self, lot):
+        tableaux = {}
+        for nom, (valeurs, masque) in lot.items():
+            tableaux[nom] = valeurs
+            if masque.any():
+                tableaux[f'{nom}__masque'] = masque
+            if nom in self.dictionnaires:
+                tableaux[f'{nom}__dictionnaire'] = self.dictionnaires[nom]
+        chemin = f'{self.chemin}-{len(self.fichiers) + 1:05d}.npz'
+        # np.savez ajoute .npz si le nom ne se termine pas par .npz
+        temporaire = chemin[:-len('.npz')] + '.partiel.npz'
+        np.savez(temporaire, **tableaux)
+        os.replace(temporaire, chemin)
+        self.fichiers.append(chemin)
+
+    def fermer(self):
+        pass
+
+
+# ===== EXPORT =====
+
+def _lire_etat(dossier):
+    chemin = os.path.join(dossier, FICHIER_ETAT)
+    if not os.path.exists(chemin):
+        return {}
+    with open(chemin, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _ecrire_etat(dossier, etat):
+    chemin = os.path.join(dossier, FICHIER_ETAT)
+    with open(chemin + '.partiel', 'w', encoding='utf-8') as f:
+        json.dump(etat, f, indent=2)
+    os.replace(chemin + '.partiel', chemin)
+
+
+def _supprimer_fichiers(dossier_table, conserver=()):
+    for nom in os.listdir(dossier_table):
+        chemin = os.path.join(dossier_table, nom)
+        if chemin not in conserver and os.path.isfile(chemin):
+            os.remove(chemin)
+
+
+def exporter(dossier, tables=None, format_sortie=None, complet=False, taille_lot=TAILLE_LOT):
+    """
+    Exporte les tables demandées dans `dossier`/<table>/.
+
+    Retourne {table: {'lignes': n, 'fichiers': [...], 'depuis': iso ou None}}.
+    """
+    format_sortie = format_sortie or format_par_defaut()
+    if format_sortie in ('arrow', 'parquet') and pa is None:
+        raise ImportError("pyarrow est requis pour les formats Arrow et Parquet")
+    ecrivain_classe = EcrivainNpz if format_sortie == 'npz' else EcrivainArrow
+
+    os.makedirs(dossier, exist_ok=True)
+    etat = {} if complet else _lire_etat(dossier)
+    # Borne haute commune : les lignes modifiées pendant l'export iront dans le suivant
+    jusqua = timezone.now()
+    horodatage = jusqua.strftime('%Y%m%dT%H%M%S%f')
+    resultats = {}
+
+    for nom_table in tables or list(TABLES):
+        config = TABLES[nom_table]
+        dossier_table = os.path.join(dossier, nom_table)
+        os.makedirs(dossier_table, exist_ok=True)
+
+        etat_table = etat.get(nom_table, {})
+        incremental = config['suivi'] is not None and etat_table.get('format') == format_sortie
+        depuis = datetime.fromisoformat(etat_table['jusqua']) if incremental else None
+
+        lots = lire_lots(nom_table, depuis, jusqua if config['suivi'] else None, taille_lot)
+        dictionnaires = next(lots)
+        ecrivain = None
+        nb_lignes = 0
+        for lot in lots:
+            if ecrivain is None:
+                ecrivain = ecrivain_classe(
+                    os.path.join(dossier_table, f'{nom_table}-{horodatage}'),
+                    nom_table, dictionnaires, format_sortie,
+                )
+            ecrivain.ecrire(lot)
+            nb_lignes += len(lot['id'][0])
+        fichiers = []
+        if ecrivain is not None:
+            ecrivain.fermer()
+            fichiers = ecrivain.fichiers
+
+        if not incremental:
+            # Export complet : les fichiers des exports précédents sont remplacés
+            _supprimer_fichiers(dossier_table, conserver=fichiers)
+
+        etat[nom_table] = {
+            'format': format_sortie,
+            'jusqua': jusqua.astimezone(dt_timezone.utc).isoformat(),
+        }
+        resultats[nom_table] = {
+            'lignes': nb_lignes,
+            'fichiers': fichiers,
+            'depuis': depuis.isoformat() if depuis else None,
+        }
+
+    _ecrire_etat(dossier, etat)
+    return resultats
+
+
+def charger_npz(dossier_table):
+    """
+    Recharge les fichiers .npz d'une table : {colonne: tableau}, catégories décodées
+    en chaînes et nulls remplacés par None (dtype object) là où il y en a.
+    Pratique pour les tests et les petits volumes ; pour l'analyse, préférer Arrow.
+    """
+    morceaux = {}
+    for nom in sorted(os.listdir(dossier_table)):
+        if not nom.endswith('.npz'):
+            continue
+        with np.load(os.path.join(dossier_table, nom)) as donnees:
+            for colonne in donnees.files:
+                if colonne.endswith(('__masque', '__dictionnaire')):
+                    continue
+                valeurs = donnees[colonne]
+                masque = donnees[f'{colonne}__masque'] if f'{colonne}__masque' in donnees.files else None
+                if f'{colonne}__dictionnaire' in donnees.files:
+                    dictionnaire = donnees[f'{colonne}__dictionnaire']
+                    valeurs = dictionnaire[np.clip(valeurs, 0, None)] if len(dictionnaire) else valeurs.astype(str)
+                if masque is not None:
+                    valeurs = valeurs.astype(object)
+                    valeurs[masque] = None
+                morceaux.setdefault(colonne, []).append(valeurs)
+    return {colonne: np.concatenate(tableaux) for colonne, tableaux in morceaux.items()}
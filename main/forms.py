@@ -1,10 +1,14 @@
+import logging
 
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from .models import CustomUser, RendezVous, Patient, Medecin, Infirmier, Secretaire
+from .models import CustomUser, RendezVous, Patient, Medecin, Infirmier, Secretaire, SerieRendezVous
+from . import series
 # Dans forms.py - CORRECT ✅
 from .models import Consultation
 
+logger = logging.getLogger(__name__)
+
 
 # class CustomUserCreationForm(UserCreationForm):
 #     email = forms.EmailField(required=True, label="Email")
@@ -103,8 +107,8 @@ class CustomUserCreationForm(UserCreationForm):
                     user=user,
                     service=self.cleaned_data.get('service', '')
                 )
-        except Exception as e:
-            print(f"Erreur lors de la création du profil spécialisé: {e}")
+        except Exception:
+            logger.exception("Erreur lors de la création du profil spécialisé", extra={'utilisateur': user.pk})
 
 
 # Dans main/forms.py - REMPLACEZ complètement la classe RendezVousForm
@@ -248,3 +252,115 @@ class ProfilMedicalForm(forms.ModelForm):
             raise forms.ValidationError("La tension diastolique doit être entre 1 et 200.")
         return tension     
      
+
+class CohorteForm(forms.Form):
+    """Critères du constructeur de cohortes (tous facultatifs)"""
+
+    STATUT_RDV_CHOICES = [
+        ('', 'Indifférent'),
+        ('tous', 'Au moins un RDV avec moi'),
+        ('aucun', 'Aucun RDV avec moi'),
+    ] + [(code, f"RDV {libelle.lower()}") for code, libelle in RendezVous.STATUS_CHOICES]
+
+    groupe_sanguin = forms.ChoiceField(
+        required=False, label="Groupe sanguin",
+        choices=[('', 'Tous')] + CustomUser._meta.get_field('groupe_sanguin').choices,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    allergies = forms.CharField(
+        required=False, label="Allergies (mots-clés)",
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ex: pénicilline'}),
+    )
+    antecedents = forms.CharField(
+        required=False, label="Antécédents / traitements (mots-clés)",
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ex: diabète'}),
+    )
+    age_min = forms.IntegerField(
+        required=False, min_value=0, max_value=130, label="Âge minimum",
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+    age_max = forms.IntegerField(
+        required=False, min_value=0, max_value=130, label="Âge maximum",
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+    consulte_depuis = forms.DateField(
+        required=False, label="Consulté depuis le",
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+    )
+    non_consulte_depuis = forms.DateField(
+        required=False, label="Non consulté depuis le",
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+    )
+    statut_rdv = forms.ChoiceField(
+        required=False, label="Rendez-vous avec moi", choices=STATUT_RDV_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        age_min = cleaned_data.get('age_min')
+        age_max = cleaned_data.get('age_max')
+        if age_min is not None and age_max is not None and age_min > age_max:
+            self.add_error('age_max', "L'âge maximum doit être supérieur à l'âge minimum.")
+        return cleaned_data
+
+
+class ReplanificationForm(forms.Form):
+    """Déplacement en masse de RDV (action d'admin) : décalage de dates et/ou autre médecin"""
+
+    decalage_jours = forms.IntegerField(
+        initial=0, label="Décalage (jours)",
+        help_text="Positif pour reporter, négatif pour avancer.",
+    )
+    medecin = forms.ModelChoiceField(
+        queryset=CustomUser.objects.none(), required=False, label="Confier au médecin",
+        empty_label="-- Même médecin --",
+    )
+
+    def __init__(self, *args, **kwargs):
+        specialites = kwargs.pop('specialites', None)
+        super().__init__(*args, **kwargs)
+        medecins = CustomUser.objects.filter(role='docteur', is_active=True).order_by('last_name', 'username')
+        if specialites is not None:
+            # Seuls les médecins de la spécialité des RDV sélectionnés peuvent les reprendre
+            if len(specialites) == 1:
+                medecins = medecins.filter(specialite=next(iter(specialites)))
+            else:
+                medecins = medecins.none()
+        self.fields['medecin'].queryset = medecins
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('decalage_jours') and not cleaned_data.get('medecin'):
+            raise forms.ValidationError("Indiquez un décalage ou un autre médecin.")
+        return cleaned_data
+
+
+class SerieRendezVousForm(forms.ModelForm):
+    """Série de RDV récurrents (admin) : les conflits de toutes les occurrences sont signalés avant l'enregistrement"""
+
+    class Meta:
+        model = SerieRendezVous
+        fields = ['patient', 'medecin', 'heure_rdv', 'motif', 'frequence', 'date_debut', 'date_fin', 'nombre']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if 'date_debut' in self.fields:
+            date_debut, date_fin = cleaned_data.get('date_debut'), cleaned_data.get('date_fin')
+            if not date_fin and not cleaned_data.get('nombre'):
+                raise forms.ValidationError("Indiquez une date de fin ou un nombre d'occurrences.")
+            if date_debut and date_fin and date_fin < date_debut:
+                self.add_error('date_fin', "La date de fin doit suivre la date de début.")
+        return cleaned_data
+
+    def _post_clean(self):
+        super()._post_clean()
+        if self.errors:
+            return
+        # L'instance porte maintenant les valeurs saisies
+        if self.instance.pk is None:
+            conflits = series.conflits_serie(self.instance)
+        else:
+            conflits = series.conflits_modification(self.instance)
+        for conflit in conflits:
+            self.add_error(None, conflit)
@@ -0,0 +1,136 @@
+# main/journalisation.py
+"""
+Journalisation structurée sans écriture disque dans les requêtes.
+
+Le handler `JournalEnFile` (configuré dans settings.LOGGING) ne fait que
+déposer l'enregistrement dans une file en mémoire ; un thread d'écoute
+(logging.handlers.QueueListener) le formate en JSON, une ligne par
+enregistrement, et l'écrit dans logs/esco.log.
+
+Tous les workers écrivent dans ce même fichier, ouvert en ajout : chaque
+ligne va à la fin du fichier, quel que soit le processus. Aucun worker ne
+le fait tourner (des rotations indépendantes perdraient des lignes) : la
+rotation est externe (logrotate par renommage, voir deploy/logrotate.esco),
+et chaque worker rouvre le fichier quand il a été déplacé (WatchedFileHandler).
+
+Le message et la trace d'une exception sont calculés dans le thread
+appelant (les arguments peuvent changer ensuite) ; le reste du formatage et
+l'écriture se font dans le thread d'écoute. La file est bornée : si le
+disque ne suit plus, les enregistrements en trop sont abandonnés plutôt
+que de bloquer une requête, et comptés dans la métrique
+esco_journal_perdus_total.
+
+`chronometre` produit les enregistrements de durée des chemins lents
+(génération PDF, actions de masse de l'administration), également comptés
+dans la métrique esco_operation_duree_secondes.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from . import metriques
+
+TAILLE_FILE = 10000
+
+# Attributs présents sur tout LogRecord : le reste vient de `extra=`
+_ATTRIBUTS_STANDARD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class FormatJSON(logging.Formatter):
+    """Une ligne JSON par enregistrement : horodatage, niveau, logger, message, champs `extra`, exception"""
+
+    def format(self, record):
+        donnees = {
+            'date': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'niveau': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'processus': record.process,
+            'thread': record.threadName,
+        }
+        donnees.update((cle, valeur) for cle, valeur in vars(record).items() if cle not in _ATTRIBUTS_STANDARD)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            donnees['exception'] = record.exc_text
+        return json.dumps(donnees, ensure_ascii=False, default=str)
+
+
+class JournalEnFile(logging.handlers.QueueHandler):
+    """
+    Handler des requêtes : met l'enregistrement en file. Le fichier et son
+    formateur (celui donné à ce handler par LOGGING) sont tenus par le
+    thread d'écoute, démarré à la création et recréé après un fork.
+    """
+
+    def __init__(self, filename, taille_file=TAILLE_FILE):
+        super().__init__(queue.Queue(taille_file))
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        self.fichier = logging.handlers.WatchedFileHandler(filename, encoding='utf-8', delay=True)
+        self.perdus = 0
+        self._demarrer()
+        atexit.register(self.arreter)
+
+    def _demarrer(self):
+        self.pid = os.getpid()
+        self.ecoute = logging.handlers.QueueListener(self.queue, self.fichier, respect_handler_level=True)
+        self.ecoute.start()
+
+    def setFormatter(self, fmt):
+        # Le formatage final a lieu dans le thread d'écoute
+        self.fichier.setFormatter(fmt)
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.pid != os.getpid():
+            # Processus fils (worker) : le thread d'écoute du parent n'existe pas ici
+            self.queue = queue.Queue(self.queue.maxsize)
+            self._demarrer()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.perdus += 1
+            metriques.incrementer('esco_journal_perdus_total')
+
+    def arreter(self):
+        """Écrit ce qui reste dans la file puis arrête le thread d'écoute"""
+        if self.pid == os.getpid() and self.ecoute._thread is not None:
+            self.ecoute.stop()
+        self.fichier.close()
+
+    def close(self):
+        self.arreter()
+        super().close()
+
+
+@contextmanager
+def chronometre(logger, evenement, **champs):
+    """
+    Enregistre la durée du bloc (INFO, champs `evenement`, `duree_ms` et
+    `champs`). Le bloc peut compléter `champs` (ex. nombre de pages) via le
+    dict renvoyé.
+    """
+    debut = time.perf_counter()
+    try:
+        yield champs
+    finally:
+        duree = time.perf_counter() - debut
+        metriques.observer('esco_operation_duree_secondes', duree, evenement=evenement)
+        duree_ms = round(duree * 1000, 1)
+        logger.info("%s en %.1f ms", evenement, duree_ms,
+                    extra={'evenement': evenement, 'duree_ms': duree_ms, **champs})
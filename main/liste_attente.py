@@ -0,0 +1,126 @@
+# main/liste_attente.py
+"""
+Liste d'attente : les créneaux libérés par une annulation sont attribués
+aux patients en attente.
+
+Pour chaque créneau libéré, dans l'ordre chronologique, la demande retenue
+est la plus ancienne (created_at) qui vise ce médecin, ou sa spécialité
+sans médecin précis, et dont les plages de dates et d'heures contiennent
+le créneau. Le patient reçoit directement un RDV programmé.
+
+Les déplacements (replanification, modification d'une série) libèrent de
+même les créneaux quittés et non repris.
+
+Une annulation en masse (action d'admin sur des dizaines de RDV) est
+traitée d'un bloc : une seule lecture des demandes candidates pour tous les
+créneaux libérés, servie par les index partiels attente_medecin et
+attente_specialite, puis un bulk_create des RDV et un bulk_update des
+demandes — le nombre de requêtes ne dépend pas du nombre d'annulations.
+"""
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CustomUser, DemandeAttente, RendezVous
+from .reservations import STATUTS_A_VENIR, transaction_ecriture
+
+
+def demandes_candidates(creneaux, specialites):
+    """
+    Demandes en attente pouvant convenir à au moins un des `creneaux`
+    (medecin_id, date, heure), triées de la plus ancienne à la plus récente.
+    """
+    medecins = {medecin for medecin, _, _ in creneaux}
+    dates = [jour for _, jour, _ in creneaux]
+    cible = Q(medecin__in=medecins)
+    specialites_visees = {specialites[medecin] for medecin in medecins} - {None, ''}
+    if specialites_visees:
+        cible |= Q(medecin__isnull=True, specialite__in=specialites_visees)
+    return (DemandeAttente.objects
+            .filter(cible, statut='en_attente', date_min__lte=max(dates), date_max__gte=min(dates))
+            .order_by('created_at', 'pk'))
+
+
+def _convient(demande, medecin, specialite, jour, heure):
+    if demande.medecin_id is not None:
+        if demande.medecin_id != medecin:
+            return False
+    elif not specialite or demande.specialite != specialite:
+        return False
+    return demande.date_min <= jour <= demande.date_max and demande.heure_min <= heure <= demande.heure_max
+
+
+def combler_creneaux(rdvs_annules):
+    """
+    Attribue les créneaux des RDV `rdvs_annules` (déjà annulés) aux demandes
+    en attente. À appeler dans la transaction de l'annulation, pour que le
+    créneau ne puisse pas être réservé entre-temps. Retourne les RDV créés.
+    """
+    aujourd_hui = timezone.localdate()
+    creneaux = sorted(
+        {(rdv.medecin_id, rdv.date_rdv, rdv.heure_rdv): rdv.patient_id
+         for rdv in rdvs_annules if rdv.date_rdv >= aujourd_hui}.items(),
+        key=lambda creneau: (creneau[0][1], creneau[0][2]),
+    )
+    if not creneaux:
+        return []
+    medecins = {medecin for (medecin, _, _), _ in creneaux}
+    specialites = dict(CustomUser.objects.filter(pk__in=medecins).values_list('pk', 'specialite'))
+    demandes = list(demandes_candidates([creneau for creneau, _ in creneaux], specialites))
+    if not demandes:
+        return []
+
+    # Un patient déjà pris à cette heure-là (chez un autre médecin) n'est pas retenu
+    occupes = set(
+        RendezVous.objects.exclude(status='annule')
+        .filter(patient__in={demande.patient_id for demande in demandes},
+                date_rdv__in={jour for (_, jour, _), _ in creneaux})
+        .values_list('patient', 'date_rdv', 'heure_rdv')
+    )
+
+    attribues = []
+    for (medecin, jour, heure), ancien_patient in creneaux:
+        for demande in demandes:
+            if (demande.statut == 'en_attente' and demande.patient_id != ancien_patient
+                    and (demande.patient_id, jour, heure) not in occupes
+                    and _convient(demande, medecin, specialites.get(medecin), jour, heure)):
+                demande.statut = 'attribuee'
+                demande.rdv = RendezVous(patient_id=demande.patient_id, medecin_id=medecin, date_rdv=jour,
+                                         heure_rdv=heure, motif=demande.motif,
+                                         notes="Créneau libéré, attribué depuis la liste d'attente")
+                occupes.add((demande.patient_id, jour, heure))
+                attribues.append(demande)
+                break
+    if not attribues:
+        return []
+
+    rdvs = RendezVous.objects.bulk_create([demande.rdv for demande in attribues])
+    maintenant = timezone.now()
+    for demande, rdv in zip(attribues, rdvs):
+        demande.rdv = rdv
+        demande.updated_at = maintenant
+    DemandeAttente.objects.bulk_update(attribues, ['statut', 'rdv', 'updated_at'])
+    return rdvs
+
+
+def annuler_rdvs(queryset):
+    """
+    Annule les RDV de `queryset` et attribue aux patients en attente les
+    créneaux à venir ainsi libérés. Retourne (nombre annulés, RDV attribués).
+    """
+    with transaction_ecriture():
+        liberes = list(queryset.filter(status__in=STATUTS_A_VENIR, date_rdv__gte=timezone.localdate())
+                       .only('patient', 'medecin', 'date_rdv', 'heure_rdv'))
+        annules = queryset.update(status='annule', updated_at=timezone.now())
+        return annules, combler_creneaux(liberes)
+
+
+def combler_deplacements(anciens, rdvs):
+    """
+    Attribue aux demandes en attente les créneaux quittés par des RDV
+    déplacés (replanification, modification d'une série). `anciens` sont
+    des copies des RDV avant le déplacement, `rdvs` les RDV enregistrés à
+    leur nouvelle place : un créneau repris par l'un d'eux n'est pas libéré.
+    À appeler dans la transaction du déplacement. Retourne les RDV créés.
+    """
+    repris = {(rdv.medecin_id, rdv.date_rdv, rdv.heure_rdv) for rdv in rdvs}
+    return combler_creneaux([rdv for rdv in anciens if (rdv.medecin_id, rdv.date_rdv, rdv.heure_rdv) not in repris])
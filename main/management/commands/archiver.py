@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main import archivage
+
+
+class Command(BaseCommand):
+    help = ("Archive les RDV (avec leurs consultations) et les soins plus anciens que l'horizon, "
+            "par lots en transactions courtes")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon', type=int, default=settings.ESCO_ARCHIVAGE_HORIZON_JOURS,
+                            help=f"Ancienneté en jours au-delà de laquelle archiver "
+                                 f"(défaut: ESCO_ARCHIVAGE_HORIZON_JOURS = {settings.ESCO_ARCHIVAGE_HORIZON_JOURS})")
+        parser.add_argument('--lot', type=int, default=archivage.TAILLE_LOT,
+                            help=f"RDV ou soins déplacés par transaction (défaut: {archivage.TAILLE_LOT})")
+        parser.add_argument('--pause', type=float, default=0,
+                            help="Pause entre deux lots, en secondes, pour laisser passer les écritures courantes")
+        parser.add_argument('--simulation', action='store_true',
+                            help="Compter ce qui serait archivé, sans rien déplacer")
+
+    def handle(self, *args, **options):
+        limite = archivage.date_limite(options['horizon'])
+        if options['simulation']:
+            comptes = archivage.a_archiver(options['horizon'])
+            self.stdout.write(f"Avant le {limite:%d/%m/%Y} : " + ', '.join(f"{n} {nom}" for nom, n in comptes.items()))
+            return
+
+        def apres_lot(bilan):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  lot {bilan['lots']} : {bilan['rendez_vous']} RDV, "
+                                  f"{bilan['consultations']} consultations, {bilan['soins']} soins")
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        debut = time.perf_counter()
+        bilan = archivage.archiver(options['horizon'], options['lot'], apres_lot)
+        duree = time.perf_counter() - debut
+        total = bilan['rendez_vous'] + bilan['consultations'] + bilan['soins']
+        self.stdout.write(self.style.SUCCESS(
+            f"Archivé avant le {limite:%d/%m/%Y} : {bilan['rendez_vous']} RDV, {bilan['consultations']} consultations, "
+            f"{bilan['soins']} soins en {bilan['lots']} lot(s), {duree:.2f} s ({total / duree if duree else 0:.0f} lignes/s)"
+        ))
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import statistics
+import time
+from datetime import date, time as heure, timedelta
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main import pdf
+from main.models import Consultation, CustomUser, Prescription, RendezVous
+
+CONTENU_ORDONNANCE = ("Paracétamol 1g : 1 comprimé matin, midi et soir pendant 5 jours\n"
+                      "Ibuprofène 400mg : 1 comprimé si douleur, 3 par jour au maximum\n"
+                      "Renouvellement : non")
+
+
+def _donnees():
+    """Dossier fictif en mémoire : le banc mesure le rendu seul, sans requête"""
+    medecin = CustomUser(pk=1, username='bench_medecin', first_name='Jean', last_name='Martin',
+                         role='docteur', specialite='Cardiologie')
+    patient = CustomUser(pk=2, username='bench_patient', first_name='Awa', last_name='Diallo', role='patient',
+                         email='awa@esco.test', telephone='06 00 00 00 00', adresse='Brazzaville',
+                         date_naissance=date(1985, 4, 12), poids=68, taille=165, groupe_sanguin='O+',
+                         tension_systolique=128, tension_diastolique=82, allergies='Pénicilline',
+                         antecedents_medicaux='Asthme léger', medicaments_actuels='Ventoline',
+                         personne_urgence_nom='Paul Diallo', personne_urgence_tel='06 11 11 11 11')
+    aujourd_hui = timezone.localdate()
+    rdvs = [RendezVous(patient=patient, medecin=medecin, date_rdv=aujourd_hui - timedelta(days=30 * i),
+                       heure_rdv=heure(9), motif='Contrôle tensionnel et renouvellement', status='termine')
+            for i in range(10)]
+    consultations = [Consultation(rdv=rdv, diagnostic='Hypertension contrôlée',
+                                  traitement='Poursuite du traitement, contrôle dans 3 mois') for rdv in rdvs]
+    prescriptions = [Prescription(pk=i, medecin=medecin, patient=patient, contenu=CONTENU_ORDONNANCE,
+                                  date_prescription=timezone.now() - timedelta(days=30 * i)) for i in range(10)]
+    constantes = {'poids': 68, 'taille': 165, 'imc': 25.0, 'tension': '128/82', 'tension_systolique': 128}
+    return patient, constantes, rdvs, consultations, prescriptions
+
+
+def _rendre(document, donnees):
+    patient, constantes, rdvs, consultations, prescriptions = donnees
+    sortie = BytesIO()
+    if document == 'dossier':
+        pdf.ecrire_dossier_medical(patient, sortie, constantes=constantes, rdvs=rdvs,
+                                   consultations=consultations, prescriptions=prescriptions)
+    else:
+        pdf.ecrire_ordonnances(prescriptions[:1], sortie)
+    return sortie.tell()
+
+
+def _travailleur(argument):
+    """Processus de rendu : `nombre` documents à la suite ; retourne les durées (s) et la taille"""
+    document, nombre = argument
+    donnees = _donnees()
+    durees = []
+    for _ in range(nombre):
+        debut = time.perf_counter()
+        taille = _rendre(document, donnees)
+        durees.append(time.perf_counter() - debut)
+    return durees, taille
+
+
+class Command(BaseCommand):
+    help = ("Banc d'essai du rendu PDF (main/pdf.py) : PDF par seconde, au total et par cœur, "
+            "pour le dossier médical et l'ordonnance")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--document', choices=['dossier', 'ordonnance'], action='append',
+                            help="Document(s) à mesurer (tous par défaut)")
+        parser.add_argument('--nombre', type=int, default=100, help="PDF rendus par processus (défaut: 100)")
+        parser.add_argument('--processus', type=int, default=1,
+                            help=f"Processus de rendu en parallèle (défaut: 1, cœurs disponibles: {os.cpu_count()})")
+
+    def handle(self, *args, **options):
+        nb_processus = options['processus']
+        self.stdout.write(f"Processus: {nb_processus}  PDF par processus: {options['nombre']}")
+        self.stdout.write(f"{'document':<12}{'PDF':>6}{'durée (s)':>11}{'PDF/s':>9}{'PDF/s/cœur':>12}"
+                          f"{'1er (ms)':>10}{'médiane (ms)':>14}{'p95 (ms)':>10}{'taille (ko)':>13}")
+        for document in options['document'] or ['dossier', 'ordonnance']:
+            argument = (document, options['nombre'])
+            debut = time.perf_counter()
+            if nb_processus > 1:
+                # fork : chaque processus part d'un cache de styles vide, comme un worker neuf
+                with multiprocessing.get_context('fork').Pool(nb_processus) as pool:
+                    bilans = pool.map(_travailleur, [argument] * nb_processus)
+            else:
+                bilans = [_travailleur(argument)]
+            duree = time.perf_counter() - debut
+
+            # Le premier rendu de chaque processus crée les styles (lru_cache) : compté à part
+            premiers = [durees[0] * 1000 for durees, _ in bilans]
+            suivants = sorted(d * 1000 for durees, _ in bilans for d in durees[1:]) or premiers
+            total = sum(len(durees) for durees, _ in bilans)
+            self.stdout.write(
+                f"{document:<12}{total:>6}{duree:>11.2f}{total / duree:>9.1f}{total / duree / nb_processus:>12.1f}"
+                f"{max(premiers):>10.1f}{statistics.median(suivants):>14.1f}"
+                f"{suivants[int(len(suivants) * 0.95)]:>10.1f}{bilans[0][1] / 1024:>13.1f}"
+            )
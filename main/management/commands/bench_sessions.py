@@ -0,0 +1,89 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+MOTEURS = ['signed_cookies', 'cache', 'cached_db', 'db']
+
+
+class Command(BaseCommand):
+    help = ("Compare les moteurs de session : temps par opération et requêtes SQL "
+            "générées sur la base clinique pour une navigation authentifiée")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=200, help="Nombre de sessions simulées")
+        parser.add_argument('--pages', type=int, default=20, help="Pages consultées par session")
+        parser.add_argument('--moteur', action='append', choices=MOTEURS,
+                            help="Moteur(s) à mesurer (tous par défaut)")
+
+    def handle(self, *args, **options):
+        moteurs = options['moteur'] or MOTEURS
+        self.stdout.write(f"Moteur configuré: {settings.SESSION_ENGINE}")
+        self.stdout.write(
+            f"{'moteur':<16}{'connexion (ms)':>16}{'page (ms)':>12}{'modif (ms)':>12}"
+            f"{'SQL clinique':>14}{'écritures':>11}"
+        )
+        for moteur in moteurs:
+            try:
+                resultat = self._mesurer(moteur, options['sessions'], options['pages'])
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"{moteur:<16}indisponible: {e}"))
+                continue
+            self.stdout.write(
+                f"{moteur:<16}{resultat['connexion']:>16.3f}{resultat['page']:>12.3f}"
+                f"{resultat['modification']:>12.3f}{resultat['requetes']:>14}{resultat['ecritures']:>11}"
+            )
+
+    def _mesurer(self, moteur, nb_sessions, nb_pages):
+        SessionStore = import_module(f'django.contrib.sessions.backends.{moteur}').SessionStore
+        connexion_clinique = connections['default']
+        durees = {'connexion': 0.0, 'page': 0.0, 'modification': 0.0}
+        cles = []
+
+        requetes = []
+
+        def compter(execute, sql, params, many, context):
+            requetes.append(sql)
+            return execute(sql, params, many, context)
+
+        with connexion_clinique.execute_wrapper(compter):
+            for i in range(nb_sessions):
+                # Connexion : création de la session authentifiée
+                debut = time.perf_counter()
+                session = SessionStore()
+                session['_auth_user_id'] = str(i)
+                session['_auth_user_backend'] = 'django.contrib.auth.backends.ModelBackend'
+                session['_auth_user_hash'] = 'x' * 64
+                session.save()
+                durees['connexion'] += time.perf_counter() - debut
+                cles.append(session.session_key)
+
+                # Navigation : lecture seule de la session à chaque page
+                debut = time.perf_counter()
+                for _ in range(nb_pages):
+                    page = SessionStore(session_key=session.session_key)
+                    page.get('_auth_user_id')
+                durees['page'] += time.perf_counter() - debut
+
+                # Modification occasionnelle (message flash, filtre mémorisé...)
+                debut = time.perf_counter()
+                session['dernier_filtre'] = 'today'
+                session.save()
+                durees['modification'] += time.perf_counter() - debut
+
+        for cle in cles:
+            SessionStore(session_key=cle).delete()
+
+        ecritures = [
+            sql for sql in requetes
+            if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        return {
+            'connexion': durees['connexion'] * 1000 / nb_sessions,
+            'page': durees['page'] * 1000 / (nb_sessions * nb_pages),
+            'modification': durees['modification'] * 1000 / nb_sessions,
+            'requetes': len(requetes),
+            'ecritures': len(ecritures),
+        }
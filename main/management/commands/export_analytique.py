@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+TABLES = ['rendezvous', 'consultation', 'prescription', 'soins', 'patients']
+
+
+class Command(BaseCommand):
+    help = ("Export colonnaire (Arrow IPC / Parquet, ou .npz sans pyarrow) des RDV, consultations, "
+            "prescriptions, soins et données démographiques des patients, en incrémental")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sortie', default=str(settings.BASE_DIR / 'exports'),
+                            help="Dossier de sortie (défaut: exports/)")
+        parser.add_argument('--format', choices=['arrow', 'parquet', 'npz'],
+                            help="Format de sortie (défaut: arrow si pyarrow est installé, npz sinon)")
+        parser.add_argument('--table', action='append', choices=TABLES,
+                            help="Table(s) à exporter (toutes par défaut)")
+        parser.add_argument('--complet', action='store_true',
+                            help="Ignorer l'export précédent et tout réexporter")
+        parser.add_argument('--lot', type=int, help="Nombre de lignes par lot")
+
+    def handle(self, *args, **options):
+        try:
+            from main import export_colonnes
+        except ImportError:
+            raise CommandError("NumPy est requis pour l'export analytique (pip install numpy).")
+
+        debut = time.perf_counter()
+        try:
+            resultats = export_colonnes.exporter(
+                options['sortie'],
+                tables=options['table'],
+                format_sortie=options['format'],
+                complet=options['complet'],
+                taille_lot=options['lot'] or export_colonnes.TAILLE_LOT,
+            )
+        except ImportError as e:
+            raise CommandError(f"{e} (pip install pyarrow) ou utilisez --format npz.")
+
+        for table, resultat in resultats.items():
+            mode = f"depuis {resultat['depuis']}" if resultat['depuis'] else "complet"
+            self.stdout.write(
+                f"{table:<14}{resultat['lignes']:>10} lignes  {len(resultat['fichiers'])} fichier(s)  ({mode})"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Export terminé dans {options['sortie']} en {time.perf_counter() - debut:.1f} s"
+        ))
@@ -0,0 +1,110 @@
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Code exécuté dans un interpréteur neuf pour chaque scénario de démarrage
+SCENARIOS = {
+    # Commande manage.py courte : configuration de Django seule
+    'commande': "import django; django.setup()",
+    # Worker WSGI prêt à servir : application + URLconf (vues, admin) chargées
+    'worker': (
+        "from django.core.wsgi import get_wsgi_application; get_wsgi_application(); "
+        "from django.urls import get_resolver; get_resolver().url_patterns"
+    ),
+}
+
+# Modules lourds qui ne doivent pas être chargés au démarrage
+MODULES_DIFFERES = ['reportlab', 'numpy', 'pyarrow', 'main.views_pdf', 'main.pdf']
+
+
+
+def code_scenario(nom):
+    """Code Python du scénario `nom`, qui affiche ensuite les modules lourds chargés"""
+    return (
+        "import os, sys; "
+        f"os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings.SETTINGS_MODULE!r}); "
+        f"{SCENARIOS[nom]}; "
+        f"print(','.join(m for m in {MODULES_DIFFERES!r} if m in sys.modules))"
+    )
+
+
+LIGNE_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| *(\S+)$')
+
+
+class Command(BaseCommand):
+    help = ("Profil du démarrage : temps d'import par module (façon python -X importtime) "
+            "et banc d'essai du démarrage à froid d'un worker et d'une commande courte")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=list(SCENARIOS), action='append',
+                            help="Scénario(s) à mesurer (tous par défaut)")
+        parser.add_argument('--repetitions', type=int, default=5,
+                            help="Démarrages à froid par scénario (défaut: 5)")
+        parser.add_argument('--top', type=int, default=20,
+                            help="Nombre de modules affichés dans le profil d'import (défaut: 20)")
+        parser.add_argument('--sans-profil', action='store_true',
+                            help="Ne mesurer que les temps de démarrage")
+
+    def _executer(self, nom, *options_python):
+        """Lance le scénario dans un interpréteur neuf ; retourne (durée en s, modules lourds chargés, stderr)"""
+        debut = time.perf_counter()
+        resultat = subprocess.run(
+            [sys.executable, *options_python, '-c', code_scenario(nom)],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        duree = time.perf_counter() - debut
+        if resultat.returncode != 0:
+            raise CommandError(resultat.stderr.strip().splitlines()[-1])
+        return duree, resultat.stdout.strip(), resultat.stderr
+
+    def handle(self, *args, **options):
+        scenarios = options['scenario'] or list(SCENARIOS)
+        repetitions = max(1, options['repetitions'])
+
+        self.stdout.write(f"{'scénario':<12}{'min (ms)':>10}{'médiane (ms)':>14}  modules lourds chargés")
+        for nom in scenarios:
+            durees = []
+            for _ in range(repetitions):
+                duree, charges, _ = self._executer(nom)
+                durees.append(duree * 1000)
+            self.stdout.write(
+                f"{nom:<12}{min(durees):>10.0f}{statistics.median(durees):>14.0f}  {charges or 'aucun'}"
+            )
+
+        if options['sans_profil']:
+            return
+
+        for nom in scenarios:
+            _, _, stderr = self._executer(nom, '-X', 'importtime')
+            self._afficher_profil(nom, stderr, options['top'])
+
+    def _afficher_profil(self, nom, stderr, top):
+        modules = []
+        for ligne in stderr.splitlines():
+            correspondance = LIGNE_IMPORTTIME.match(ligne)
+            if correspondance:
+                propre, cumule, module = correspondance.groups()
+                modules.append((module, int(propre), int(cumule)))
+
+        # Temps propre par paquet racine : où part le temps, toutes profondeurs confondues
+        paquets = {}
+        for module, propre, _ in modules:
+            racine = module.split('.')[0]
+            paquets[racine] = paquets.get(racine, 0) + propre
+        total = sum(paquets.values())
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\nProfil d'import — {nom} ({len(modules)} modules, {total / 1000:.0f} ms)"
+        ))
+        self.stdout.write(f"{'paquet':<30}{'propre (ms)':>12}{'part':>8}")
+        for racine, propre in sorted(paquets.items(), key=lambda p: -p[1])[:top]:
+            self.stdout.write(f"{racine:<30}{propre / 1000:>12.1f}{propre / total:>8.0%}")
+
+        self.stdout.write(f"\n{'module':<50}{'propre (ms)':>12}{'cumulé (ms)':>12}")
+        for module, propre, cumule in sorted(modules, key=lambda m: -m[2])[:top]:
+            self.stdout.write(f"{module:<50}{propre / 1000:>12.1f}{cumule / 1000:>12.1f}")
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ("Supprime les sessions expirées du cache fichier 'sessions' (équivalent de clearsessions, "
+            "sans effet sur ce moteur) ; à lancer chaque nuit par cron")
+
+    def handle(self, *args, **options):
+        if 'sessions' not in settings.CACHES:
+            raise CommandError("Pas de cache 'sessions' dans settings.CACHES")
+        cache = caches['sessions']
+        if not hasattr(cache, 'purger'):
+            raise CommandError("Le cache 'sessions' n'est pas un main.caches.FileBasedCache")
+        self.stdout.write(self.style.SUCCESS(f"{cache.purger()} session(s) expirée(s) supprimée(s)"))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import replica
+
+
+class Command(BaseCommand):
+    help = ("Rafraîchit en continu la réplique en lecture (ESCO_REPLICA_CHEMIN) avec l'API de "
+            "sauvegarde en ligne de SQLite, et affiche le retard")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalle', type=float, default=5,
+                            help="Secondes entre la fin d'une copie et le début de la suivante (défaut: 5)")
+        parser.add_argument('--une-fois', action='store_true', help="Une seule copie puis arrêt")
+        parser.add_argument('--pages', type=int, default=replica.PAGES_PAR_ETAPE,
+                            help=f"Pages copiées par étape, -1 pour tout copier d'un coup "
+                                 f"(défaut: {replica.PAGES_PAR_ETAPE})")
+        parser.add_argument('--pause', type=float, default=replica.PAUSE_ETAPE,
+                            help=f"Pause entre deux étapes, en secondes (défaut: {replica.PAUSE_ETAPE})")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Réplique : {replica.chemin()}")
+        while True:
+            precedent = replica.lire_etat()
+            etat = replica.rafraichir(pages=options['pages'], pause=options['pause'])
+            # Retard maximal atteint juste avant la publication de cette copie
+            retard = f"{etat['instantane'] + etat['duree'] - precedent['instantane']:.1f} s" if precedent else "-"
+            self.stdout.write(
+                f"{time.strftime('%H:%M:%S', time.localtime(etat['instantane']))}  copie {etat['duree'] * 1000:.0f} ms  "
+                f"{etat['taille'] / 1024 / 1024:.1f} Mo  retard max avant copie {retard}"
+            )
+            if options['une_fois']:
+                break
+            time.sleep(options['intervalle'])
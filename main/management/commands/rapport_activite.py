@@ -0,0 +1,69 @@
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _date(valeur):
+    try:
+        return date.fromisoformat(valeur)
+    except ValueError:
+        raise CommandError(f"Date invalide: {valeur} (format attendu AAAA-MM-JJ)")
+
+
+def _pourcentage(valeur):
+    return '-' if valeur is None else f"{valeur * 100:.1f}%"
+
+
+class Command(BaseCommand):
+    help = "Statistiques d'activité : délai de prise de RDV, annulations, RDV non honorés et taux d'occupation"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', type=_date, help="Date de début (AAAA-MM-JJ)")
+        parser.add_argument('--fin', type=_date, help="Date de fin (AAAA-MM-JJ)")
+        parser.add_argument('--medecin', type=int, help="Limiter à un médecin (id)")
+        parser.add_argument('--json', action='store_true', help="Sortie JSON")
+
+    def handle(self, *args, **options):
+        try:
+            from main.analytics import calculer_statistiques
+        except ImportError:
+            raise CommandError("NumPy est requis pour les statistiques d'activité (pip install numpy).")
+
+        stats = calculer_statistiques(options['debut'], options['fin'], options['medecin'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(stats, default=str, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Période: {stats['debut'] or '-'} -> {stats['fin'] or '-'} ({stats['total']} RDV)"
+        ))
+        delai = stats['delai']
+        self.stdout.write(
+            f"Délai de prise de RDV (jours): moyenne={delai['moyenne_jours']} "
+            f"médiane={delai['mediane_jours']} p90={delai['p90_jours']}"
+        )
+        self.stdout.write(
+            f"Annulations: {_pourcentage(stats['taux_annulation'])}  "
+            f"Non honorés: {_pourcentage(stats['taux_absence'])}  "
+            f"Occupation: {_pourcentage(stats['taux_occupation'])} "
+            f"(créneaux de {stats['duree_creneau_minutes']} min)"
+        )
+
+        sections = [
+            ('Par médecin', 'par_medecin', lambda ligne: f"{ligne['nom']} ({ligne['specialite']})"),
+            ('Par spécialité', 'par_specialite', lambda ligne: ligne['specialite']),
+            ('Par jour', 'par_jour', lambda ligne: ligne['jour']),
+        ]
+        for titre, cle, libelle in sections:
+            self.stdout.write('')
+            self.stdout.write(self.style.MIGRATE_HEADING(titre))
+            for ligne in stats[cle]:
+                self.stdout.write(
+                    f"  {libelle(ligne):<40} total={ligne['total']:<7} "
+                    f"annulation={_pourcentage(ligne['taux_annulation']):<7} "
+                    f"absence={_pourcentage(ligne['taux_absence']):<7} "
+                    f"délai médian={'-' if ligne['delai_median_jours'] is None else ligne['delai_median_jours']} j  "
+                    f"occupation={_pourcentage(ligne['taux_occupation'])}"
+                )
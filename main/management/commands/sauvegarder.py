@@ -0,0 +1,91 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main import sauvegardes
+
+
+def _mo(octets):
+    return octets / 1024 / 1024
+
+
+class Command(BaseCommand):
+    help = ("Sauvegarde en ligne de la base (API de sauvegarde SQLite par étapes, sans bloquer les écritures) : "
+            "instantané compressé et horodaté, empreinte SHA-256, rétention ; vérification et restauration")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dossier', default=None,
+                            help="Dossier des instantanés (défaut: ESCO_SAUVEGARDES_DOSSIER)")
+        parser.add_argument('--garder', type=int, default=settings.ESCO_SAUVEGARDES_GARDER,
+                            help=f"Instantanés conservés, 0 pour tout garder "
+                                 f"(défaut: ESCO_SAUVEGARDES_GARDER = {settings.ESCO_SAUVEGARDES_GARDER})")
+        parser.add_argument('--pages', type=int, default=sauvegardes.PAGES_PAR_ETAPE,
+                            help=f"Pages copiées par étape, -1 pour tout copier d'un coup "
+                                 f"(défaut: {sauvegardes.PAGES_PAR_ETAPE})")
+        parser.add_argument('--pause', type=float, default=sauvegardes.PAUSE_ETAPE,
+                            help=f"Pause entre deux étapes, en secondes (défaut: {sauvegardes.PAUSE_ETAPE})")
+        parser.add_argument('--lister', action='store_true', help="Lister les instantanés du dossier")
+        parser.add_argument('--verifier', metavar='FICHIER',
+                            help="Vérifier un instantané (empreinte, décompression, intégrité SQLite)")
+        parser.add_argument('--restaurer', metavar='FICHIER',
+                            help="Restaurer un instantané vérifié dans le fichier --vers")
+        parser.add_argument('--vers', metavar='CHEMIN', help="Fichier de destination de --restaurer")
+
+    def handle(self, *args, **options):
+        try:
+            if options['lister']:
+                self._lister(options['dossier'])
+            elif options['verifier']:
+                self._verifier(options['verifier'])
+            elif options['restaurer']:
+                if not options['vers']:
+                    raise CommandError("--restaurer demande --vers CHEMIN (jamais la base en service).")
+                self._restaurer(options['restaurer'], options['vers'])
+            else:
+                self._sauvegarder(options)
+        except (sauvegardes.SauvegardeInvalide, FileExistsError, ValueError) as e:
+            raise CommandError(str(e)) from e
+
+    def _sauvegarder(self, options):
+        mesures = sauvegardes.sauvegarder(options['dossier'], pages=options['pages'], pause=options['pause'],
+                                          garder=options['garder'])
+        duree = mesures['duree']
+        self.stdout.write(
+            f"Copie en ligne : {_mo(mesures['taille']):.1f} Mo en {duree:.2f} s "
+            f"({_mo(mesures['taille']) / duree if duree else 0:.1f} Mo/s), {mesures['etapes']} étape(s), "
+            f"{mesures['redemarrages']} redémarrage(s)"
+            + (" - copie finale en une étape" if mesures['une_etape'] else "")
+        )
+        self.stdout.write(
+            f"Blocage des écritures : {mesures['verrou'] * 1000:.1f} ms au total, "
+            f"{mesures['etape_max'] * 1000:.1f} ms au plus d'affilée"
+        )
+        self.stdout.write(
+            f"Compression : {_mo(mesures['taille_compressee']):.1f} Mo "
+            f"({mesures['taille_compressee'] / mesures['taille']:.0%}) en {mesures['compression']:.2f} s"
+        )
+        for chemin in mesures['supprimes']:
+            self.stdout.write(f"Rétention : {chemin.name} supprimé")
+        self.stdout.write(self.style.SUCCESS(f"{mesures['chemin']}\nsha256 {mesures['sha256']}"))
+
+    def _lister(self, dossier):
+        chemins = sauvegardes.instantanes(dossier)
+        if not chemins:
+            self.stdout.write("Aucun instantané.")
+        for chemin in chemins:
+            self.stdout.write(f"{chemin.name}  {_mo(chemin.stat().st_size):.1f} Mo")
+
+    def _verifier(self, chemin):
+        mesures = sauvegardes.verifier(Path(chemin))
+        self.stdout.write(self.style.SUCCESS(
+            f"{Path(chemin).name} intègre : {mesures['tables']} tables, {_mo(mesures['taille']):.1f} Mo, "
+            f"vérifié en {mesures['duree']:.2f} s"
+        ))
+
+    def _restaurer(self, chemin, vers):
+        mesures = sauvegardes.restaurer(Path(chemin), vers)
+        self.stdout.write(self.style.SUCCESS(
+            f"{Path(chemin).name} restauré dans {vers} : {mesures['tables']} tables, "
+            f"{_mo(mesures['taille']):.1f} Mo en {mesures['duree']:.2f} s"
+        ))
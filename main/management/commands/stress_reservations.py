@@ -0,0 +1,124 @@
+import multiprocessing
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import Count
+from django.utils import timezone
+
+from main.models import CustomUser, RendezVous
+from main.reservations import CreneauIndisponible, reserver_creneau
+
+HEURES_PAR_JOUR = 16  # créneaux de 30 min de 8h à 16h
+
+
+def _travailleur(numero, nb_reservations, medecins, patients, creneaux, depart, resultats):
+    """Processus client : réserve des créneaux tirés au hasard, tous en concurrence"""
+    random.seed(numero)
+    compteurs = {'reussies': 0, 'conflits': 0, 'reessais': 0, 'echecs': 0, 'durees': []}
+    depart.wait()
+    for _ in range(nb_reservations):
+        jour, heure = random.choice(creneaux)
+        rdv = RendezVous(patient_id=random.choice(patients), medecin_id=random.choice(medecins),
+                         date_rdv=jour, heure_rdv=heure, motif='Test de charge')
+        debut = time.perf_counter()
+        try:
+            compteurs['reessais'] += reserver_creneau(rdv) - 1
+            compteurs['reussies'] += 1
+        except CreneauIndisponible:
+            compteurs['conflits'] += 1
+        except OperationalError:
+            compteurs['echecs'] += 1
+        compteurs['durees'].append(time.perf_counter() - debut)
+    connection.close()
+    resultats.put(compteurs)
+
+
+class Command(BaseCommand):
+    help = ("Test de charge multi-processus de la réservation de créneaux sur une base "
+            "SQLite temporaire : réservations réussies par seconde et absence de doublons")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processus', type=int, default=8, help="Processus clients concurrents (défaut: 8)")
+        parser.add_argument('--reservations', type=int, default=200,
+                            help="Tentatives de réservation par processus (défaut: 200)")
+        parser.add_argument('--medecins', type=int, default=10, help="Médecins réservables (défaut: 10)")
+        parser.add_argument('--jours', type=int, default=5,
+                            help=f"Jours réservables, {HEURES_PAR_JOUR} créneaux par jour et par médecin (défaut: 5)")
+
+    def handle(self, *args, **options):
+        nom_origine = connection.settings_dict['NAME']
+        with tempfile.TemporaryDirectory() as dossier:
+            # Jamais sur la base clinique : base neuve, migrée, dans un dossier temporaire
+            connections.close_all()
+            connection.settings_dict['NAME'] = str(Path(dossier) / 'stress.sqlite3')
+            try:
+                self._executer(options)
+            finally:
+                connection.close()
+                connection.settings_dict['NAME'] = nom_origine
+
+    def _executer(self, options):
+        call_command('migrate', verbosity=0)
+        medecins = [u.pk for u in CustomUser.objects.bulk_create([
+            CustomUser(username=f'stress_medecin{i}', role='docteur', password='!') for i in range(options['medecins'])
+        ])]
+        patients = [u.pk for u in CustomUser.objects.bulk_create([
+            CustomUser(username=f'stress_patient{i}', role='patient', password='!') for i in range(50)
+        ])]
+        demain = timezone.localdate() + timedelta(days=1)
+        debut_journee = datetime(2000, 1, 1, 8, 0)
+        creneaux = [
+            (demain + timedelta(days=j), (debut_journee + timedelta(minutes=30 * h)).time())
+            for j in range(options['jours']) for h in range(HEURES_PAR_JOUR)
+        ]
+
+        # Les processus héritent de Django configuré mais pas de la connexion (fermée avant fork)
+        connections.close_all()
+        contexte = multiprocessing.get_context('fork')
+        depart, resultats = contexte.Event(), contexte.Queue()
+        processus = [
+            contexte.Process(target=_travailleur,
+                             args=(n, options['reservations'], medecins, patients, creneaux, depart, resultats))
+            for n in range(options['processus'])
+        ]
+        for p in processus:
+            p.start()
+        debut = time.perf_counter()
+        depart.set()
+        bilans = [resultats.get() for _ in processus]
+        duree = time.perf_counter() - debut
+        for p in processus:
+            p.join()
+
+        total = {cle: sum(b[cle] for b in bilans) for cle in ('reussies', 'conflits', 'reessais', 'echecs')}
+        durees = sorted(d * 1000 for b in bilans for d in b['durees'])
+        tentatives = len(durees)
+
+        self.stdout.write(f"Processus: {options['processus']}  tentatives: {tentatives}  "
+                          f"créneaux: {len(medecins) * len(creneaux)}  durée: {duree:.2f} s")
+        self.stdout.write(f"{'réussies':>10}{'conflits':>10}{'réessais':>10}{'échecs':>8}"
+                          f"{'réservations/s':>16}{'tentatives/s':>14}{'médiane (ms)':>14}{'p95 (ms)':>10}")
+        self.stdout.write(
+            f"{total['reussies']:>10}{total['conflits']:>10}{total['reessais']:>10}{total['echecs']:>8}"
+            f"{total['reussies'] / duree:>16.0f}{tentatives / duree:>14.0f}"
+            f"{statistics.median(durees):>14.1f}{durees[int(len(durees) * 0.95)]:>10.1f}"
+        )
+
+        # Vérification en base : aucun créneau réservé deux fois, aucune réservation perdue
+        doublons = (RendezVous.objects.exclude(status='annule')
+                    .values('medecin', 'date_rdv', 'heure_rdv')
+                    .annotate(nb=Count('pk')).filter(nb__gt=1).count())
+        enregistres = RendezVous.objects.count()
+        if doublons or enregistres != total['reussies']:
+            raise CommandError(f"{doublons} créneau(x) en double, {enregistres} RDV enregistrés "
+                               f"pour {total['reussies']} réservations réussies")
+        self.stdout.write(self.style.SUCCESS(
+            f"Aucun doublon : {enregistres} RDV enregistrés pour {total['reussies']} réservations réussies"
+        ))
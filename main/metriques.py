@@ -0,0 +1,333 @@
+# main/metriques.py
+"""
+Métriques Prometheus (vue `metriques`, URL /metrics).
+
+Mise à jour sans verrou : chaque thread a sa propre table de valeurs
+(`_tables`, indexée par identifiant de thread) qu'il est seul à modifier ;
+une mise à jour est une lecture et une écriture de dict. Un instantané du
+processus additionne les tables de ses threads. Les histogrammes gardent le
+nombre d'observations par intervalle (non cumulé) et leur somme.
+
+Agrégation entre workers : chaque processus publie son instantané dans
+settings.ESCO_METRIQUES_DOSSIER (`<pid>.json`, remplacé atomiquement)
+toutes les INTERVALLE secondes, par un thread démarré à la première mesure,
+et à l'arrêt. La vue additionne les fichiers du dossier. Pour que les
+compteurs ne baissent pas quand un worker est remplacé, le fichier d'un
+processus mort est repris par le processus qui sert la page : il le
+renomme (un seul processus y parvient), l'ajoute à son cumul
+(`cumul-<pid>.json`) puis le supprime. Le dossier est propre à une machine
+(les pid n'ont pas de sens ailleurs).
+
+Les indicateurs métier (rendez-vous du jour, liste d'attente) sont lus en
+base au moment de la collecte.
+"""
+import atexit
+import json
+import os
+import threading
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+INTERVALLE = 5.0
+
+SEUILS_DUREE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SEUILS_NOMBRE = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# nom -> (type, aide, seuils des histogrammes)
+METRIQUES = {
+    'esco_http_requetes_total': ('counter', "Requêtes HTTP par vue, méthode et statut", None),
+    'esco_http_duree_secondes': ('histogram', "Durée des requêtes HTTP par vue", SEUILS_DUREE),
+    'esco_sql_requetes': ('histogram', "Requêtes SQL par requête HTTP", SEUILS_NOMBRE),
+    'esco_sql_duree_secondes': ('histogram', "Temps SQL cumulé par requête HTTP", SEUILS_DUREE),
+    'esco_operation_duree_secondes': (
+        'histogram', "Durée des opérations chronométrées (génération PDF, actions de masse)", SEUILS_DUREE),
+    'esco_cache_lectures_total': (
+        'counter', "Lectures de cache par résultat (taux de succès : succes / total)", None),
+    'esco_journal_perdus_total': ('counter', "Enregistrements de journal abandonnés (file pleine)", None),
+    'esco_audit_perdus_total': ('counter', "Accès aux dossiers non journalisés (file pleine)", None),
+}
+
+# identifiant de thread -> {(nom, étiquettes): valeur}
+_tables = {}
+_verrou = threading.Lock()
+_etat = {'ecrivain': None, 'arret': None, 'cumul': None}
+
+
+def _table():
+    ident = threading.get_ident()
+    table = _tables.get(ident)
+    if table is None:
+        # Identifiant réutilisé par un nouveau thread : le précédent est terminé
+        table = _tables.setdefault(ident, {})
+    return table
+
+
+def incrementer(nom, valeur=1, **etiquettes):
+    """Ajoute `valeur` au compteur `nom`"""
+    if _etat['ecrivain'] is None:
+        _demarrer()
+    table = _table()
+    cle = (nom, tuple(sorted(etiquettes.items())))
+    table[cle] = table.get(cle, 0) + valeur
+
+
+def observer(nom, valeur, **etiquettes):
+    """Ajoute l'observation `valeur` à l'histogramme `nom`"""
+    if _etat['ecrivain'] is None:
+        _demarrer()
+    seuils = METRIQUES[nom][2]
+    table = _table()
+    cle = (nom, tuple(sorted(etiquettes.items())))
+    cases = table.get(cle)
+    if cases is None:
+        # Une case par seuil, une pour +Inf, puis la somme
+        cases = table[cle] = [0] * (len(seuils) + 2)
+    cases[bisect_left(seuils, valeur)] += 1
+    cases[-1] += valeur
+
+
+def _ajouter(total, cle, valeur):
+    if isinstance(valeur, list):
+        actuel = total.get(cle)
+        if actuel is None:
+            total[cle] = list(valeur)
+        elif len(actuel) == len(valeur):  # seuils inchangés
+            total[cle] = [a + b for a, b in zip(actuel, valeur)]
+    else:
+        total[cle] = total.get(cle, 0) + valeur
+
+
+def instantane():
+    """Valeurs du processus : somme des tables de ses threads"""
+    total = {}
+    for table in list(_tables.values()):
+        for cle, valeur in table.copy().items():
+            _ajouter(total, cle, list(valeur) if isinstance(valeur, list) else valeur)
+    return total
+
+
+# Fichiers du dossier partagé
+
+def dossier():
+    chemin = Path(settings.ESCO_METRIQUES_DOSSIER)
+    chemin.mkdir(parents=True, exist_ok=True)
+    return chemin
+
+
+def _lire(chemin):
+    try:
+        lignes = json.loads(chemin.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+    return {(nom, tuple(map(tuple, etiquettes))): valeur for nom, etiquettes, valeur in lignes}
+
+
+def _ecrire(chemin, valeurs):
+    temporaire = chemin.with_name(f'{chemin.name}.{os.getpid()}.tmp')
+    temporaire.write_text(json.dumps([[nom, etiquettes, valeur] for (nom, etiquettes), valeur in valeurs.items()]),
+                          encoding='utf-8')
+    os.replace(temporaire, chemin)
+
+
+def _pid(chemin):
+    try:
+        return int(chemin.stem.removeprefix('cumul-'))
+    except ValueError:
+        return None
+
+
+def _vivant(pid):
+    if os.name != 'posix':
+        return True  # pas de test d'existence fiable : rien n'est repris
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _cumul(racine):
+    """Cumul des processus morts repris par ce processus, chargé à la première publication"""
+    if _etat['cumul'] is None:
+        moi = os.getpid()
+        # Fichiers laissés par un processus mort qui avait le même pid
+        cumul = _lire(racine / f'cumul-{moi}.json')
+        for cle, valeur in _lire(racine / f'{moi}.json').items():
+            _ajouter(cumul, cle, valeur)
+        _etat['cumul'] = cumul
+    return _etat['cumul']
+
+
+def publier():
+    """Écrit l'instantané du processus dans le dossier partagé"""
+    racine = dossier()
+    with _verrou:
+        cumul = _cumul(racine)
+        _ecrire(racine / f'cumul-{os.getpid()}.json', cumul)
+        _ecrire(racine / f'{os.getpid()}.json', instantane())
+
+
+def _reprendre(racine):
+    """Ajoute au cumul de ce processus les fichiers des processus morts"""
+    moi = os.getpid()
+    for chemin in racine.glob('*.json'):
+        pid = _pid(chemin)
+        if pid is None or pid == moi or _vivant(pid):
+            continue
+        reprise = chemin.with_name(f'{chemin.name}.{moi}.reprise')
+        try:
+            os.rename(chemin, reprise)
+        except OSError:
+            continue  # déjà repris par un autre processus
+        with _verrou:
+            cumul = _cumul(racine)
+            for cle, valeur in _lire(reprise).items():
+                _ajouter(cumul, cle, valeur)
+            _ecrire(racine / f'cumul-{moi}.json', cumul)
+        reprise.unlink()
+
+
+def agreger():
+    """Valeurs de tous les processus de la machine"""
+    publier()
+    racine = dossier()
+    _reprendre(racine)
+    total = {}
+    for chemin in racine.glob('*.json'):
+        if _pid(chemin) is not None:
+            for cle, valeur in _lire(chemin).items():
+                _ajouter(total, cle, valeur)
+    return total
+
+
+# Thread de publication
+
+def _demarrer():
+    if not settings.ESCO_METRIQUES_ASYNCHRONE:
+        _etat['ecrivain'] = False  # pas de thread : publication à la collecte
+        return
+    with _verrou:
+        if _etat['ecrivain'] is not None:
+            return
+        arret = threading.Event()
+        ecrivain = threading.Thread(target=_boucle, args=(arret,), name='esco-metriques', daemon=True)
+        _etat.update(ecrivain=ecrivain, arret=arret)
+        ecrivain.start()
+
+
+def _boucle(arret):
+    while not arret.wait(INTERVALLE):
+        try:
+            publier()
+        except OSError:
+            pass  # dossier indisponible : nouvel essai au tour suivant
+
+
+def arreter():
+    """Arrête le thread de publication et publie les dernières valeurs"""
+    ecrivain, arret = _etat['ecrivain'], _etat['arret']
+    if ecrivain:
+        arret.set()
+        ecrivain.join(5)
+    _etat.update(ecrivain=None, arret=None)
+    if _tables:
+        try:
+            publier()
+        except OSError:
+            pass
+
+
+def reinitialiser():
+    """Oublie les valeurs du processus (tests, processus fils)"""
+    _tables.clear()
+    _etat.update(ecrivain=None, arret=None, cumul=None)
+
+
+def _apres_fork():
+    # Worker créé par fork : ni les valeurs, ni le thread, ni l'état du verrou du parent ne sont les siens
+    global _verrou
+    _verrou = threading.Lock()
+    reinitialiser()
+
+
+atexit.register(arreter)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_apres_fork)
+
+
+# Format texte Prometheus
+
+def _echapper(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquettes(etiquettes):
+    if not etiquettes:
+        return ''
+    return '{' + ','.join(f'{nom}="{_echapper(valeur)}"' for nom, valeur in etiquettes) + '}'
+
+
+def _nombre(valeur):
+    return str(int(valeur)) if float(valeur).is_integer() else repr(float(valeur))
+
+
+def _seuil(seuil):
+    return repr(float(seuil))
+
+
+def texte(valeurs, jauges=()):
+    """
+    Texte d'exposition Prometheus de `valeurs` ({(nom, étiquettes): valeur})
+    et des jauges `jauges` ((nom, aide, [(étiquettes, valeur)])).
+    """
+    par_nom = {}
+    for (nom, etiquettes), valeur in valeurs.items():
+        par_nom.setdefault(nom, []).append((etiquettes, valeur))
+    lignes = []
+    for nom, (genre, aide, seuils) in METRIQUES.items():
+        if nom not in par_nom:
+            continue
+        lignes += [f'# HELP {nom} {aide}', f'# TYPE {nom} {genre}']
+        for etiquettes, valeur in sorted(par_nom[nom]):
+            if genre != 'histogram':
+                lignes.append(f'{nom}{_etiquettes(etiquettes)} {_nombre(valeur)}')
+                continue
+            cumule = 0
+            for seuil, nombre in zip(seuils + ('+Inf',), valeur[:-1]):
+                cumule += nombre
+                le = seuil if seuil == '+Inf' else _seuil(seuil)
+                lignes.append(f'{nom}_bucket{_etiquettes(etiquettes + (("le", le),))} {_nombre(cumule)}')
+            lignes.append(f'{nom}_sum{_etiquettes(etiquettes)} {_nombre(valeur[-1])}')
+            lignes.append(f'{nom}_count{_etiquettes(etiquettes)} {_nombre(cumule)}')
+    for nom, aide, series in jauges:
+        lignes += [f'# HELP {nom} {aide}', f'# TYPE {nom} gauge']
+        lignes += [f'{nom}{_etiquettes(etiquettes)} {_nombre(valeur)}' for etiquettes, valeur in series]
+    return '\n'.join(lignes) + '\n'
+
+
+def jauges_metier():
+    """Indicateurs lus en base à la collecte"""
+    from datetime import datetime, time
+
+    from django.db.models import Count
+    from django.utils import timezone
+
+    from .models import DemandeAttente, RendezVous
+
+    aujourdhui = timezone.localdate()
+    debut_jour = timezone.make_aware(datetime.combine(aujourdhui, time.min))
+    du_jour = (RendezVous.objects.filter(date_rdv=aujourdhui).values('status').annotate(n=Count('pk'))
+               .order_by('status'))
+    # Un rendez-vous pris aujourd'hui a lieu aujourd'hui ou plus tard : l'index de date_rdv borne la recherche
+    pris = RendezVous.objects.filter(date_rdv__gte=aujourdhui, created_at__gte=debut_jour).count()
+    attente = DemandeAttente.objects.filter(statut='en_attente').count()
+    return [
+        ('esco_rdv_du_jour', "Rendez-vous prévus aujourd'hui par statut",
+         [((('statut', ligne['status']),), ligne['n']) for ligne in du_jour]),
+        ('esco_rdv_pris_aujourdhui', "Rendez-vous pris depuis minuit", [((), pris)]),
+        ('esco_liste_attente', "Demandes en liste d'attente", [((), attente)]),
+    ]
@@ -0,0 +1,114 @@
+# main/middleware.py
+"""Middlewares ESCO"""
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+
+from . import metriques, replica
+
+METHODES_LECTURE = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _MesureSQL:
+    """execute_wrapper : nombre et durée des requêtes SQL d'une requête HTTP"""
+
+    def __init__(self):
+        self.nombre = 0
+        self.duree = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.nombre += 1
+            self.duree += time.perf_counter() - debut
+
+
+class MetriquesMiddleware:
+    """
+    Métriques de chaque requête (voir main/metriques.py) : durée et statut
+    par vue (nom d'URL), nombre et durée des requêtes SQL, toutes bases
+    confondues. Placé en tête de MIDDLEWARE pour compter les autres.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sql = _MesureSQL()
+        debut = time.perf_counter()
+        with ExitStack() as pile:
+            for connexion in connections.all():
+                pile.enter_context(connexion.execute_wrapper(sql))
+            response = self.get_response(request)
+        duree = time.perf_counter() - debut
+
+        correspondance = request.resolver_match
+        vue = correspondance.view_name if correspondance else 'non_resolue'
+        metriques.incrementer('esco_http_requetes_total', vue=vue, methode=request.method,
+                              statut=response.status_code)
+        metriques.observer('esco_http_duree_secondes', duree, vue=vue)
+        metriques.observer('esco_sql_requetes', sql.nombre, vue=vue)
+        metriques.observer('esco_sql_duree_secondes', sql.duree, vue=vue)
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Lectures des requêtes GET sur la réplique (voir main/replica.py), sauf
+    si elle ne contient pas encore la dernière écriture de l'utilisateur.
+    Après toute autre requête, le cookie `esco_ecriture` retient l'instant
+    de l'écriture pour les lectures suivantes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in METHODES_LECTURE:
+            response = self.get_response(request)
+            # Instant pris après la vue : ses écritures sont validées
+            response.set_cookie(replica.COOKIE_ECRITURE, f'{time.time():.3f}', httponly=True, samesite='Lax',
+                                max_age=int(settings.ESCO_REPLICA_RETARD_MAX) + 1)
+            return response
+
+        try:
+            ecrit_le = float(request.COOKIES.get(replica.COOKIE_ECRITURE, ''))
+        except ValueError:
+            ecrit_le = None
+        with replica.lectures(ecrit_le):
+            return self.get_response(request)
+
+
+class ProfilMiddleware:
+    """
+    Profil d'une requête à la demande d'un superutilisateur (voir
+    main/profilage.py) : paramètre `?profil=` ou en-tête `X-Esco-Profil`,
+    valeur `echantillons` (par défaut) ou `cprofile`. Le profil est
+    enregistré (ProfilRequete) et la réponse indique sa page d'administration
+    (en-tête X-Esco-Profil) et ses durées (Server-Timing).
+
+    Sans demande, rien n'est fait : l'utilisateur n'est même pas chargé, et
+    le profileur n'est importé qu'à la première demande.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        demande = request.GET.get('profil') or request.headers.get('X-Esco-Profil')
+        if not demande or not request.user.is_superuser:
+            return self.get_response(request)
+
+        from . import profilage
+
+        mode = demande if demande in profilage.MODES else profilage.MODES[0]
+        response, mesures = profilage.profiler(lambda: self.get_response(request), mode)
+        profil = profilage.enregistrer(request, response, mode, mesures)
+        response['X-Esco-Profil'] = reverse('esco_admin:main_profilrequete_change', args=[profil.pk])
+        response['Server-Timing'] = f"total;dur={profil.duree_ms}, sql;dur={profil.duree_sql_ms:.1f}"
+        return response
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_remove_customuser_numero_licence_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MesureConstante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_mesure', models.CharField(choices=[('poids', 'Poids (kg)'), ('taille', 'Taille (cm)'), ('tension_systolique', 'Tension systolique'), ('tension_diastolique', 'Tension diastolique'), ('frequence_cardiaque', 'Fréquence cardiaque'), ('temperature', 'Température (°C)'), ('saturation', 'Saturation O2 (%)'), ('glycemie', 'Glycémie (g/L)')], max_length=20)),
+                ('valeur', models.FloatField()),
+                ('date_mesure', models.DateTimeField(default=django.utils.timezone.now)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='constantes', to=settings.AUTH_USER_MODEL)),
+                ('soin', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='constantes', to='main.soinsinfirmier')),
+            ],
+            options={
+                'verbose_name': 'Mesure de constante',
+                'verbose_name_plural': 'Mesures de constantes',
+                'indexes': [models.Index(fields=['patient', 'type_mesure', 'date_mesure'], name='constante_patient_type_date')],
+            },
+        ),
+    ]
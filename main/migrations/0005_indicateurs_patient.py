@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:05
+
+import django.db.models.expressions
+import django.db.models.functions.math
+import main.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0004_mesureconstante'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', main.models.CustomUserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='categorie_tension',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(models.Q(('tension_systolique__gte', 140), ('tension_diastolique__gte', 90), _connector='OR'), then=models.Value('hypertension')), models.When(tension_systolique__gte=120, then=models.Value('elevee')), models.When(tension_systolique__gt=0, then=models.Value('normale')), default=None), output_field=models.CharField(blank=True, choices=[('normale', 'Normale'), ('elevee', 'Élevée'), ('hypertension', 'Hypertension')], max_length=15, null=True), verbose_name='Catégorie de tension'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='imc',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(poids__gt=0, taille__gt=0, then=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('poids'), '*', models.Value(10000.0)), '/', django.db.models.expressions.CombinedExpression(models.F('taille'), '*', models.F('taille'))), 1)), default=None), output_field=models.FloatField(blank=True, null=True), verbose_name='IMC'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role', 'date_naissance'], name='user_role_naissance'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role', 'imc'], name='user_role_imc'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role', 'categorie_tension'], name='user_role_tension'),
+        ),
+    ]
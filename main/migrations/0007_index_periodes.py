@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_index_cohortes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['created_at'], name='consultation_created'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['medecin', 'date_prescription'], name='prescription_medecin_date'),
+        ),
+        migrations.AddIndex(
+            model_name='rendezvous',
+            index=models.Index(fields=['medecin', 'date_rdv', 'heure_rdv'], name='rdv_medecin_date'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:23
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0007_index_periodes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.comparison.Collate('username', 'NOCASE'), name='user_username_nocase'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.comparison.Collate('last_name', 'NOCASE'), name='user_nom_nocase'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.comparison.Collate('first_name', 'NOCASE'), name='user_prenom_nocase'),
+        ),
+        migrations.AddIndex(
+            model_name='mesureconstante',
+            index=models.Index(fields=['date_mesure'], name='constante_date'),
+        ),
+        migrations.AddIndex(
+            model_name='rendezvous',
+            index=models.Index(fields=['date_rdv'], name='rdv_date'),
+        ),
+        migrations.AddIndex(
+            model_name='soinsinfirmier',
+            index=models.Index(fields=['date_soin'], name='soin_date'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:37
+
+from django.db import migrations, models
+
+
+def verifier_doublons(apps, schema_editor):
+    """
+    Avant la contrainte : refuse de migrer tant que des créneaux ont plusieurs
+    RDV actifs. Le choix du RDV à garder revient au cabinet, pas à la migration.
+    """
+    RendezVous = apps.get_model('main', 'RendezVous')
+    actifs = RendezVous.objects.exclude(status='annule')
+    doublons = (actifs.values('medecin', 'date_rdv', 'heure_rdv')
+                .annotate(nb=models.Count('pk'))
+                .filter(nb__gt=1)
+                .order_by('date_rdv', 'heure_rdv', 'medecin'))
+    conflits = []
+    for creneau in doublons:
+        ids = sorted(actifs.filter(medecin=creneau['medecin'], date_rdv=creneau['date_rdv'],
+                                   heure_rdv=creneau['heure_rdv']).values_list('pk', flat=True))
+        conflits.append(f"  médecin {creneau['medecin']}, {creneau['date_rdv']:%d/%m/%Y} "
+                        f"{creneau['heure_rdv']:%H:%M} : RDV {', '.join(map(str, ids))}")
+    if conflits:
+        raise RuntimeError(
+            f"{len(conflits)} créneau(x) réservé(s) plusieurs fois. Annulez ou déplacez les RDV en trop "
+            "puis relancez la migration :\n" + '\n'.join(conflits)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_index_admin'),
+    ]
+
+    operations = [
+        migrations.RunPython(verifier_doublons, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='rendezvous',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'annule'), _negated=True), fields=('medecin', 'date_rdv', 'heure_rdv'), name='rdv_creneau_unique', violation_error_message='Ce créneau est déjà réservé pour ce médecin.'),
+        ),
+    ]
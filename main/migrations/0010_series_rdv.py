@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:45
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_creneau_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieRendezVous',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('heure_rdv', models.TimeField(default=datetime.time(9, 0))),
+                ('motif', models.TextField()),
+                ('frequence', models.CharField(choices=[('hebdomadaire', 'Toutes les semaines'), ('quinzaine', 'Toutes les deux semaines'), ('mensuelle', 'Tous les mois')], default='hebdomadaire', max_length=20)),
+                ('date_debut', models.DateField()),
+                ('date_fin', models.DateField(blank=True, help_text='Dernière date possible (incluse)', null=True)),
+                ('nombre', models.PositiveIntegerField(blank=True, help_text="Nombre d'occurrences", null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('medecin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_medecin', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_patient', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Série de rendez-vous',
+                'verbose_name_plural': 'Séries de rendez-vous',
+            },
+        ),
+        migrations.AddField(
+            model_name='rendezvous',
+            name='serie',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='main.serierendezvous'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:50
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_series_rdv'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandeAttente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('specialite', models.CharField(blank=True, max_length=100, null=True)),
+                ('motif', models.TextField()),
+                ('date_min', models.DateField(verbose_name='Au plus tôt le')),
+                ('date_max', models.DateField(verbose_name='Au plus tard le')),
+                ('heure_min', models.TimeField(default=datetime.time(8, 0), verbose_name='Pas avant')),
+                ('heure_max', models.TimeField(default=datetime.time(18, 0), verbose_name='Pas après')),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('attribuee', 'Créneau attribué'), ('retiree', 'Retirée')], default='en_attente', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('medecin', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='demandes_attente_medecin', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='demandes_attente', to=settings.AUTH_USER_MODEL)),
+                ('rdv', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='demande_attente', to='main.rendezvous')),
+            ],
+            options={
+                'verbose_name': "Demande de liste d'attente",
+                'verbose_name_plural': "Liste d'attente",
+                'indexes': [models.Index(condition=models.Q(('statut', 'en_attente')), fields=['medecin', 'date_min'], name='attente_medecin'), models.Index(condition=models.Q(('statut', 'en_attente')), fields=['specialite', 'date_min'], name='attente_specialite')],
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_liste_attente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RendezVousArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date_rdv', models.DateField()),
+                ('heure_rdv', models.TimeField()),
+                ('motif', models.TextField()),
+                ('status', models.CharField(choices=[('programme', 'Programmé'), ('confirme', 'Confirmé'), ('en_cours', 'En cours'), ('termine', 'Terminé'), ('annule', 'Annulé')], max_length=20)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archive_le', models.DateTimeField()),
+                ('medecin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('serie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.serierendezvous')),
+            ],
+            options={
+                'verbose_name': 'Rendez-vous archivé',
+                'verbose_name_plural': 'Rendez-vous archivés',
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsultationArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('symptomes', models.TextField(blank=True, null=True)),
+                ('diagnostic', models.TextField(blank=True, null=True)),
+                ('traitement', models.TextField(blank=True, null=True)),
+                ('observations', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archive_le', models.DateTimeField()),
+                ('rdv', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='main.rendezvousarchive')),
+            ],
+            options={
+                'verbose_name': 'Consultation archivée',
+                'verbose_name_plural': 'Consultations archivées',
+            },
+        ),
+        migrations.CreateModel(
+            name='SoinsInfirmierArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('type_soin', models.CharField(choices=[('pansement', 'Pansement'), ('injection', 'Injection'), ('perfusion', 'Perfusion'), ('prise_constantes', 'Prise de constantes'), ('medicament', 'Administration médicament'), ('autre', 'Autre')], max_length=30)),
+                ('description', models.TextField()),
+                ('date_soin', models.DateTimeField()),
+                ('observations', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archive_le', models.DateTimeField()),
+                ('infirmier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Soin archivé',
+                'verbose_name_plural': 'Soins archivés',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='rendezvousarchive',
+            index=models.Index(fields=['patient', 'medecin', 'date_rdv'], name='rdv_archive_patient'),
+        ),
+        migrations.AddIndex(
+            model_name='rendezvousarchive',
+            index=models.Index(fields=['medecin', 'date_rdv'], name='rdv_archive_medecin'),
+        ),
+        migrations.AddIndex(
+            model_name='soinsinfirmierarchive',
+            index=models.Index(fields=['patient', 'date_soin'], name='soin_archive_patient'),
+        ),
+    ]
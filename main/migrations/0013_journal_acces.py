@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_archives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccesDossier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('dossier', 'Consultation du dossier'), ('pdf', 'Téléchargement du dossier PDF'), ('ordonnance', "Impression d'ordonnance"), ('admin', "Fiche de l'administration")], max_length=20)),
+                ('objet', models.CharField(blank=True, help_text='Élément consulté, ex. « Prescription 12 »', max_length=100)),
+                ('adresse_ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('patient', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('utilisateur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Accès à un dossier',
+                'verbose_name_plural': 'Journal des accès aux dossiers',
+                'indexes': [models.Index(fields=['patient', 'date'], name='acces_patient_date'), models.Index(fields=['utilisateur', 'date'], name='acces_utilisateur_date'), models.Index(fields=['date'], name='acces_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_journal_acces'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilRequete',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('methode', models.CharField(max_length=10)),
+                ('chemin', models.CharField(max_length=500)),
+                ('statut', models.PositiveSmallIntegerField()),
+                ('mode', models.CharField(choices=[('echantillons', 'Échantillonnage'), ('cprofile', 'cProfile')], max_length=20)),
+                ('duree_ms', models.FloatField(verbose_name='Durée (ms)')),
+                ('nb_requetes', models.PositiveIntegerField(verbose_name='Requêtes SQL')),
+                ('duree_sql_ms', models.FloatField(verbose_name='Durée SQL (ms)')),
+                ('requetes', models.JSONField(default=list)),
+                ('statistiques', models.TextField(blank=True)),
+                ('piles', models.TextField(blank=True)),
+                ('utilisateur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Profil de requête',
+                'verbose_name_plural': 'Profils de requêtes',
+                'indexes': [models.Index(fields=['date'], name='profil_date')],
+            },
+        ),
+    ]
@@ -1,10 +1,119 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Collate, ExtractYear, Round
 from django.utils import timezone
+import calendar
 import uuid
-from datetime import time
+from datetime import date, time, timedelta
+
+# Tranches d'âge : (code, libellé, âge minimum, âge maximum inclus)
+TRANCHES_AGE = [
+    ('0-17', 'Moins de 18 ans', 0, 17),
+    ('18-39', '18 - 39 ans', 18, 39),
+    ('40-59', '40 - 59 ans', 40, 59),
+    ('60+', '60 ans et plus', 60, None),
+]
+
+# Catégories d'IMC : (code, libellé, borne basse incluse, borne haute exclue)
+CATEGORIES_IMC = [
+    ('insuffisance', 'Insuffisance pondérale', None, 18.5),
+    ('normal', 'Poids normal', 18.5, 25),
+    ('surpoids', 'Surpoids', 25, 30),
+    ('obesite', 'Obésité', 30, None),
+]
+
+CATEGORIES_TENSION = [
+    ('normale', 'Normale'),
+    ('elevee', 'Élevée'),
+    ('hypertension', 'Hypertension'),
+]
+
+
+def _date_il_y_a(annees, reference):
+    """Date d'il y a `annees` ans (le 29 février devient le 28)"""
+    try:
+        return reference.replace(year=reference.year - annees)
+    except ValueError:
+        return reference.replace(year=reference.year - annees, day=28)
+
+
+class CustomUserQuerySet(models.QuerySet):
+    """Filtres et annotations calculés par la base (âge, IMC, tension)"""
+
+    def avec_indicateurs(self):
+        """Annote l'âge, la tranche d'âge et la catégorie d'IMC de chaque utilisateur"""
+        today = timezone.localdate()
+        age = models.ExpressionWrapper(
+            models.Value(today.year) - ExtractYear('date_naissance') - models.Case(
+                models.When(
+                    models.Q(date_naissance__month__gt=today.month) |
+                    models.Q(date_naissance__month=today.month, date_naissance__day__gt=today.day),
+                    then=models.Value(1),
+                ),
+                default=models.Value(0),
+            ),
+            output_field=models.IntegerField(),
+        )
+        tranches = []
+        for code, _, age_min, age_max in TRANCHES_AGE:
+            conditions = {'date_naissance__lte': _date_il_y_a(age_min, today)}
+            if age_max is not None:
+                conditions['date_naissance__gt'] = _date_il_y_a(age_max + 1, today)
+            tranches.append(models.When(then=models.Value(code), **conditions))
+        categories_imc = [
+            models.When(self._q_intervalle('imc', bas, haut), then=models.Value(code))
+            for code, _, bas, haut in CATEGORIES_IMC
+        ]
+        return self.annotate(
+            age=age,
+            tranche_age=models.Case(*tranches, default=None, output_field=models.CharField()),
+            categorie_imc=models.Case(*categories_imc, default=None, output_field=models.CharField()),
+        )
+
+    @staticmethod
+    def _q_intervalle(champ, bas, haut):
+        conditions = {f'{champ}__isnull': False}
+        if bas is not None:
+            conditions[f'{champ}__gte'] = bas
+        if haut is not None:
+            conditions[f'{champ}__lt'] = haut
+        return models.Q(**conditions)
+
+    def age_entre(self, age_min=None, age_max=None):
+        """Filtre sur l'âge, traduit en intervalle de dates de naissance (utilise l'index)"""
+        today = timezone.localdate()
+        queryset = self.filter(date_naissance__isnull=False)
+        if age_min is not None:
+            queryset = queryset.filter(date_naissance__lte=_date_il_y_a(age_min, today))
+        if age_max is not None:
+            queryset = queryset.filter(date_naissance__gt=_date_il_y_a(age_max + 1, today))
+        return queryset
+
+    def tranche_age(self, code):
+        for code_tranche, _, age_min, age_max in TRANCHES_AGE:
+            if code_tranche == code:
+                return self.age_entre(age_min, age_max)
+        return self.none()
+
+    def categorie_imc(self, code):
+        for code_categorie, _, bas, haut in CATEGORIES_IMC:
+            if code_categorie == code:
+                return self.filter(self._q_intervalle('imc', bas, haut))
+        return self.none()
+
+    def recherche_prefixe(self, terme):
+        """Utilisateurs dont l'identifiant, le nom ou le prénom commence par `terme` (index NOCASE)"""
+        return self.filter(
+            models.Q(username__istartswith=terme) |
+            models.Q(last_name__istartswith=terme) |
+            models.Q(first_name__istartswith=terme)
+        )
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
 
-# Dans models.py, modifie le modèle CustomUser :
 
 class CustomUser(AbstractUser):
     ROLE_CHOICES = [
@@ -45,10 +154,62 @@ class CustomUser(AbstractUser):
     profil_complete = models.BooleanField(default=False, verbose_name="Profil médical complété")
     derniere_maj_profil = models.DateTimeField(blank=True, null=True, verbose_name="Dernière mise à jour du profil")
     
+    # Colonnes calculées par la base, indexées pour filtrer/trier les cohortes
+    imc = models.GeneratedField(
+        expression=models.Case(
+            models.When(
+                poids__gt=0, taille__gt=0,
+                then=Round(models.F('poids') * 10000.0 / (models.F('taille') * models.F('taille')), 1),
+            ),
+            default=None,
+        ),
+        output_field=models.FloatField(blank=True, null=True),
+        db_persist=True,
+        verbose_name="IMC",
+    )
+    categorie_tension = models.GeneratedField(
+        expression=models.Case(
+            models.When(
+                models.Q(tension_systolique__gte=140) | models.Q(tension_diastolique__gte=90),
+                then=models.Value('hypertension'),
+            ),
+            models.When(tension_systolique__gte=120, then=models.Value('elevee')),
+            models.When(tension_systolique__gt=0, then=models.Value('normale')),
+            default=None,
+        ),
+        output_field=models.CharField(max_length=15, blank=True, null=True, choices=CATEGORIES_TENSION),
+        db_persist=True,
+        verbose_name="Catégorie de tension",
+    )
+    
+    objects = CustomUserManager()
+    
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['role', 'date_naissance'], name='user_role_naissance'),
+            models.Index(fields=['role', 'imc'], name='user_role_imc'),
+            models.Index(fields=['role', 'categorie_tension'], name='user_role_tension'),
+            models.Index(fields=['role', 'groupe_sanguin'], name='user_role_groupe'),
+            models.Index(fields=['role', 'last_name', 'first_name'], name='user_role_nom'),
+            # Recherche par préfixe de l'admin : LIKE 'terme%' insensible à la casse
+            models.Index(Collate('username', 'NOCASE'), name='user_username_nocase'),
+            models.Index(Collate('last_name', 'NOCASE'), name='user_nom_nocase'),
+            models.Index(Collate('first_name', 'NOCASE'), name='user_prenom_nocase'),
+        ]
+    
+    # Champs texte volumineux, non chargés pour l'utilisateur de la requête (voir backends.py)
+    CHAMPS_MEDICAUX = ('adresse', 'allergies', 'antecedents_medicaux', 'medicaments_actuels')
+    def charger_profil_medical(self):
+        """Charge en une requête les champs médicaux différés"""
+        differes = self.get_deferred_fields() & set(self.CHAMPS_MEDICAUX)
+        if differes:
+            self.refresh_from_db(fields=sorted(differes))
+        return self
+    
     def get_age(self):
         """Calcule l'âge à partir de la date de naissance"""
         if self.date_naissance:
-            today = timezone.now().date()
+            today = timezone.localdate()
             return today.year - self.date_naissance.year - ((today.month, today.day) < (self.date_naissance.month, self.date_naissance.day))
         return None
     
@@ -65,6 +226,30 @@ class CustomUser(AbstractUser):
             return f"{self.tension_systolique}/{self.tension_diastolique}"
         return None
 
+    def get_constantes(self):
+        """
+        Dernières constantes connues : séries de mesures en priorité,
+        valeurs saisies dans le profil médical sinon.
+        """
+        constantes = {
+            'poids': self.poids,
+            'taille': self.taille,
+            'tension_systolique': self.tension_systolique,
+            'tension_diastolique': self.tension_diastolique,
+        }
+        for type_mesure, valeur in MesureConstante.dernieres_valeurs(self).items():
+            if valeur is not None:
+                constantes[type_mesure] = valeur
+
+        imc = None
+        if constantes['poids'] and constantes['taille']:
+            imc = round(constantes['poids'] / ((constantes['taille'] / 100) ** 2), 1)
+        constantes['imc'] = imc
+        constantes['tension'] = None
+        if constantes['tension_systolique'] and constantes['tension_diastolique']:
+            constantes['tension'] = f"{int(constantes['tension_systolique'])}/{int(constantes['tension_diastolique'])}"
+        return constantes
+
 class Patient(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
     numero_patient = models.CharField(max_length=20, unique=True, blank=True, null=True)
@@ -103,6 +288,56 @@ class Medecin(models.Model):
     def __str__(self):
         return f"Dr. {self.user.get_full_name() or self.user.username}"
 
+class SerieRendezVous(models.Model):
+    """
+    Rendez-vous récurrent (suivi de dialyse, pansement hebdomadaire...) :
+    même patient, médecin et heure à chaque occurrence. Les occurrences sont
+    des RendezVous ordinaires liés à la série (voir main/series.py).
+    """
+    FREQUENCE_CHOICES = [
+        ('hebdomadaire', 'Toutes les semaines'),
+        ('quinzaine', 'Toutes les deux semaines'),
+        ('mensuelle', 'Tous les mois'),
+    ]
+    # Garde-fou : trois ans d'occurrences hebdomadaires
+    MAX_OCCURRENCES = 156
+
+    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='series_patient')
+    medecin = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='series_medecin')
+    heure_rdv = models.TimeField(default=time(9, 0))
+    motif = models.TextField()
+    frequence = models.CharField(max_length=20, choices=FREQUENCE_CHOICES, default='hebdomadaire')
+    date_debut = models.DateField()
+    date_fin = models.DateField(blank=True, null=True, help_text="Dernière date possible (incluse)")
+    nombre = models.PositiveIntegerField(blank=True, null=True, help_text="Nombre d'occurrences")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Série de rendez-vous"
+        verbose_name_plural = "Séries de rendez-vous"
+
+    def __str__(self):
+        return f"Série {self.patient.username} - Dr. {self.medecin.username} - {self.get_frequence_display().lower()}"
+
+    def dates(self):
+        """Dates des occurrences, de date_debut jusqu'à date_fin et/ou `nombre` occurrences"""
+        dates = []
+        while len(dates) < min(self.nombre or self.MAX_OCCURRENCES, self.MAX_OCCURRENCES):
+            n = len(dates)
+            if self.frequence == 'mensuelle':
+                # Même jour du mois, ramené au dernier jour des mois plus courts
+                mois = self.date_debut.month - 1 + n
+                annee, mois = self.date_debut.year + mois // 12, mois % 12 + 1
+                jour = min(self.date_debut.day, calendar.monthrange(annee, mois)[1])
+                prochaine = date(annee, mois, jour)
+            else:
+                prochaine = self.date_debut + timedelta(weeks=n * (2 if self.frequence == 'quinzaine' else 1))
+            if self.date_fin and prochaine > self.date_fin:
+                break
+            dates.append(prochaine)
+        return dates
+
+
 class RendezVous(models.Model):
     STATUS_CHOICES = [
         ('programme', 'Programmé'),
@@ -119,12 +354,87 @@ class RendezVous(models.Model):
     motif = models.TextField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='programme')
     notes = models.TextField(blank=True, null=True)
+    serie = models.ForeignKey(SerieRendezVous, on_delete=models.SET_NULL, blank=True, null=True,
+                              related_name='occurrences')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Historique d'un patient avec un médecin (cohortes, dernière consultation)
+            models.Index(fields=['patient', 'medecin', 'date_rdv'], name='rdv_patient_medecin_date'),
+            # Agenda d'un médecin sur une période
+            models.Index(fields=['medecin', 'date_rdv', 'heure_rdv'], name='rdv_medecin_date'),
+            # Hiérarchie de dates de l'admin
+            models.Index(fields=['date_rdv'], name='rdv_date'),
+        ]
+        constraints = [
+            # Un seul RDV actif par créneau d'un médecin (voir main/reservations.py)
+            models.UniqueConstraint(
+                fields=['medecin', 'date_rdv', 'heure_rdv'],
+                condition=~models.Q(status='annule'),
+                name='rdv_creneau_unique',
+                violation_error_message="Ce créneau est déjà réservé pour ce médecin.",
+            ),
+        ]
     
     def __str__(self):
         return f"RDV {self.patient.username} - Dr. {self.medecin.username} - {self.date_rdv}"
 
+class DemandeAttente(models.Model):
+    """
+    Patient en liste d'attente chez un médecin précis, ou chez n'importe quel
+    médecin d'une spécialité (`medecin` vide). Un créneau libéré par une
+    annulation lui est attribué s'il tombe dans ses plages de dates et
+    d'heures acceptables (voir main/liste_attente.py) ; à égalité, la
+    demande la plus ancienne passe en premier.
+    """
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('attribuee', 'Créneau attribué'),
+        ('retiree', 'Retirée'),
+    ]
+
+    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='demandes_attente')
+    medecin = models.ForeignKey(CustomUser, on_delete=models.CASCADE, blank=True, null=True,
+                                related_name='demandes_attente_medecin')
+    specialite = models.CharField(max_length=100, blank=True, null=True)
+    motif = models.TextField()
+    date_min = models.DateField(verbose_name="Au plus tôt le")
+    date_max = models.DateField(verbose_name="Au plus tard le")
+    heure_min = models.TimeField(default=time(8, 0), verbose_name="Pas avant")
+    heure_max = models.TimeField(default=time(18, 0), verbose_name="Pas après")
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    rdv = models.OneToOneField(RendezVous, on_delete=models.SET_NULL, blank=True, null=True,
+                               related_name='demande_attente')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Demande de liste d'attente"
+        verbose_name_plural = "Liste d'attente"
+        indexes = [
+            # Index partiels : seules les demandes en attente y figurent, ils
+            # restent petits quand l'historique des demandes servies grossit
+            models.Index(fields=['medecin', 'date_min'], condition=models.Q(statut='en_attente'),
+                         name='attente_medecin'),
+            models.Index(fields=['specialite', 'date_min'], condition=models.Q(statut='en_attente'),
+                         name='attente_specialite'),
+        ]
+
+    def __str__(self):
+        cible = f"Dr. {self.medecin.username}" if self.medecin_id else self.specialite
+        return f"Attente {self.patient.username} - {cible} - {self.date_min} au {self.date_max}"
+
+    def clean(self):
+        if not self.medecin_id and not self.specialite:
+            raise ValidationError("Indiquez un médecin ou une spécialité.")
+        if self.date_min and self.date_max and self.date_max < self.date_min:
+            raise ValidationError({'date_max': "La date au plus tard doit suivre la date au plus tôt."})
+        if self.heure_min and self.heure_max and self.heure_max < self.heure_min:
+            raise ValidationError({'heure_max': "L'heure maximale doit suivre l'heure minimale."})
+
+
 class Consultation(models.Model):
     rdv = models.OneToOneField(RendezVous, on_delete=models.CASCADE)
     symptomes = models.TextField(blank=True, null=True)
@@ -133,6 +443,11 @@ class Consultation(models.Model):
     observations = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='consultation_created'),
+        ]
     
     def __str__(self):
         return f"Consultation {self.rdv.patient.username} - {self.rdv.date_rdv.strftime('%d/%m/%Y')}"
@@ -145,6 +460,11 @@ class Prescription(models.Model):
     date_prescription = models.DateTimeField(auto_now_add=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['medecin', 'date_prescription'], name='prescription_medecin_date'),
+        ]
     
     def __str__(self):
         return f"Prescription {self.patient.get_full_name()} - {self.date_prescription.strftime('%d/%m/%Y')}"
@@ -188,10 +508,253 @@ class SoinsInfirmier(models.Model):
     date_soin = models.DateTimeField()
     observations = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_soin'], name='soin_date'),
+        ]
     
     def __str__(self):
         return f"Soin {self.get_type_soin_display()} - {self.patient.username}"
 
+
+# ===== ARCHIVES (historique froid, voir main/archivage.py) =====
+# Mêmes colonnes que la table d'origine, même id, plus la date d'archivage.
+
+class RendezVousArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    medecin = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    date_rdv = models.DateField()
+    heure_rdv = models.TimeField()
+    motif = models.TextField()
+    status = models.CharField(max_length=20, choices=RendezVous.STATUS_CHOICES)
+    notes = models.TextField(blank=True, null=True)
+    serie = models.ForeignKey(SerieRendezVous, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archive_le = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Rendez-vous archivé"
+        verbose_name_plural = "Rendez-vous archivés"
+        indexes = [
+            models.Index(fields=['patient', 'medecin', 'date_rdv'], name='rdv_archive_patient'),
+            models.Index(fields=['medecin', 'date_rdv'], name='rdv_archive_medecin'),
+        ]
+
+    def __str__(self):
+        return f"RDV archivé {self.patient.username} - Dr. {self.medecin.username} - {self.date_rdv}"
+
+
+class ConsultationArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    rdv = models.OneToOneField(RendezVousArchive, on_delete=models.CASCADE)
+    symptomes = models.TextField(blank=True, null=True)
+    diagnostic = models.TextField(blank=True, null=True)
+    traitement = models.TextField(blank=True, null=True)
+    observations = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archive_le = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Consultation archivée"
+        verbose_name_plural = "Consultations archivées"
+
+    def __str__(self):
+        return f"Consultation archivée {self.rdv.patient.username} - {self.rdv.date_rdv.strftime('%d/%m/%Y')}"
+
+
+class SoinsInfirmierArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    infirmier = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    type_soin = models.CharField(max_length=30, choices=SoinsInfirmier.TYPE_SOIN_CHOICES)
+    description = models.TextField()
+    date_soin = models.DateTimeField()
+    observations = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    archive_le = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Soin archivé"
+        verbose_name_plural = "Soins archivés"
+        indexes = [
+            models.Index(fields=['patient', 'date_soin'], name='soin_archive_patient'),
+        ]
+
+    def __str__(self):
+        return f"Soin archivé {self.get_type_soin_display()} - {self.patient.username}"
+
+
+class AccesDossier(models.Model):
+    """
+    Journal des consultations de dossiers patients (qui a ouvert quoi, quand).
+    Écrit par lots en arrière-plan, jamais pendant la requête (voir main/audit.py).
+    """
+    ACTION_CHOICES = [
+        ('dossier', 'Consultation du dossier'),
+        ('pdf', 'Téléchargement du dossier PDF'),
+        ('ordonnance', "Impression d'ordonnance"),
+        ('admin', "Fiche de l'administration"),
+    ]
+
+    # SET_NULL : le journal survit à la suppression d'un compte
+    utilisateur = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    patient = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    objet = models.CharField(max_length=100, blank=True, help_text="Élément consulté, ex. « Prescription 12 »")
+    adresse_ip = models.GenericIPAddressField(blank=True, null=True)
+    # Instant de l'accès, pas de l'écriture du lot
+    date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Accès à un dossier"
+        verbose_name_plural = "Journal des accès aux dossiers"
+        indexes = [
+            # Qui a consulté le dossier de ce patient ? / Qu'a consulté cet utilisateur ?
+            models.Index(fields=['patient', 'date'], name='acces_patient_date'),
+            models.Index(fields=['utilisateur', 'date'], name='acces_utilisateur_date'),
+            models.Index(fields=['date'], name='acces_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} - {self.date:%d/%m/%Y %H:%M}"
+
+
+class ProfilRequete(models.Model):
+    """Profil d'une requête demandé par un superutilisateur (voir main/profilage.py)"""
+    MODE_CHOICES = [
+        ('echantillons', 'Échantillonnage'),
+        ('cprofile', 'cProfile'),
+    ]
+
+    date = models.DateTimeField(default=timezone.now)
+    utilisateur = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    methode = models.CharField(max_length=10)
+    chemin = models.CharField(max_length=500)
+    statut = models.PositiveSmallIntegerField()
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES)
+    duree_ms = models.FloatField(verbose_name="Durée (ms)")
+    nb_requetes = models.PositiveIntegerField(verbose_name="Requêtes SQL")
+    duree_sql_ms = models.FloatField(verbose_name="Durée SQL (ms)")
+    # [{'base', 'sql', 'params', 'duree_ms'}] dans l'ordre d'exécution
+    requetes = models.JSONField(default=list)
+    statistiques = models.TextField(blank=True)
+    # Format « collapsed » des outils de flamegraph : une ligne `a;b;c valeur`
+    piles = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = "Profil de requête"
+        verbose_name_plural = "Profils de requêtes"
+        indexes = [
+            models.Index(fields=['date'], name='profil_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.methode} {self.chemin} - {self.duree_ms:.0f} ms"
+
+
+class MesureConstanteQuerySet(models.QuerySet):
+    # Granularités possibles pour le sous-échantillonnage, de la plus fine à la plus large
+    GRANULARITES = [
+        ('minute', 60),
+        ('hour', 3600),
+        ('day', 86400),
+        ('week', 7 * 86400),
+        ('month', 31 * 86400),
+    ]
+
+    def serie(self, patient, type_mesure, debut, fin, nb_points=200):
+        """
+        Série d'une constante sur [debut, fin[, agrégée côté base (min/max/moyenne)
+        par intervalles pour ne pas dépasser environ `nb_points` points.
+        """
+        from django.db.models import Avg, Count, Max, Min
+        from django.db.models.functions import Trunc
+
+        duree = (fin - debut).total_seconds()
+        granularite = self.GRANULARITES[-1][0]
+        for nom, secondes in self.GRANULARITES:
+            if duree / secondes <= nb_points:
+                granularite = nom
+                break
+
+        return self.filter(
+            patient=patient,
+            type_mesure=type_mesure,
+            date_mesure__gte=debut,
+            date_mesure__lt=fin,
+        ).annotate(
+            periode=Trunc('date_mesure', granularite, tzinfo=timezone.get_current_timezone())
+        ).values('periode').annotate(
+            minimum=Min('valeur'),
+            maximum=Max('valeur'),
+            moyenne=Avg('valeur'),
+            nombre=Count('id'),
+        ).order_by('periode')
+
+    def derniere(self, patient, type_mesure):
+        """Dernière mesure d'une constante (lecture directe sur l'index)"""
+        return self.filter(patient=patient, type_mesure=type_mesure).order_by('-date_mesure').first()
+
+
+class MesureConstante(models.Model):
+    TYPE_CHOICES = [
+        ('poids', 'Poids (kg)'),
+        ('taille', 'Taille (cm)'),
+        ('tension_systolique', 'Tension systolique'),
+        ('tension_diastolique', 'Tension diastolique'),
+        ('frequence_cardiaque', 'Fréquence cardiaque'),
+        ('temperature', 'Température (°C)'),
+        ('saturation', 'Saturation O2 (%)'),
+        ('glycemie', 'Glycémie (g/L)'),
+    ]
+
+    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='constantes')
+    soin = models.ForeignKey(SoinsInfirmier, on_delete=models.SET_NULL, blank=True, null=True, related_name='constantes')
+    type_mesure = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    valeur = models.FloatField()
+    date_mesure = models.DateTimeField(default=timezone.now)
+
+    objects = MesureConstanteQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Mesure de constante"
+        verbose_name_plural = "Mesures de constantes"
+        indexes = [
+            models.Index(fields=['patient', 'type_mesure', 'date_mesure'], name='constante_patient_type_date'),
+            models.Index(fields=['date_mesure'], name='constante_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_type_mesure_display()} {self.valeur} - {self.patient.username}"
+
+    @classmethod
+    def annotations_dernieres_valeurs(cls, types=None, champ_patient='pk'):
+        """
+        Sous-requêtes donnant la dernière valeur de chaque constante, à utiliser
+        dans `.annotate()` / `.values()` sur un queryset de patients.
+        """
+        types = types or [code for code, _ in cls.TYPE_CHOICES]
+        return {
+            f"derniere_{type_mesure}": models.Subquery(
+                cls.objects.filter(
+                    patient=models.OuterRef(champ_patient),
+                    type_mesure=type_mesure,
+                ).order_by('-date_mesure').values('valeur')[:1]
+            )
+            for type_mesure in types
+        }
+
+    @classmethod
+    def dernieres_valeurs(cls, patient, types=None):
+        """Dernières valeurs de toutes les constantes d'un patient, en une seule requête"""
+        annotations = cls.annotations_dernieres_valeurs(types)
+        valeurs = CustomUser.objects.filter(pk=patient.pk).values(**annotations).first() or {}
+        return {cle.replace('derniere_', '', 1): valeur for cle, valeur in valeurs.items()}
+
 class Planning(models.Model):
     JOURS_SEMAINE = [
         ('lundi', 'Lundi'),
@@ -0,0 +1,505 @@
+# main/pdf.py
+"""
+Moteur de rendu PDF des documents de la clinique (dossier médical,
+ordonnances).
+
+reportlab est importé ici, au niveau du module : ce module n'est chargé que
+par les vues PDF (main/views_pdf.py, importé à la demande) et les commandes
+qui en ont besoin, jamais au démarrage d'un worker.
+
+Les styles de paragraphe et les modèles de tableau sont créés une seule
+fois par processus (lru_cache) puis partagés par tous les documents :
+getSampleStyleSheet() et les TableStyle ne sont plus reconstruits à chaque
+téléchargement. Les sections (identité, constantes, rendez-vous,
+consultations, prescriptions...) sont des fonctions qui retournent une
+liste de flowables à partir de données déjà chargées : elles ne font aucune
+requête, l'appelant charge les données (select_related) et compose le
+document.
+
+Les ordonnances sont dessinées page après page sur un FluxPdf : aucun
+flowable n'est construit à l'avance et chaque page est écrite dans la
+sortie dès showPage(), avant de lire la prescription suivante. Imprimer
+500 ordonnances coûte donc 500 fois une page, sans mise en page globale ni
+document gardé en mémoire : seuls la position de chaque objet et le numéro
+de chaque page (quelques octets) sont conservés jusqu'à la table des
+références écrite par save(). La vue d'impression en lot envoie ainsi le
+PDF par blocs pendant son rendu (voir main/views_pdf.py).
+"""
+import zlib
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, A5
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch, mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+CLINIQUE = "ESCO - Espace Santé Famille"
+CONTACT = "contact@esco-sante.fr | 01 23 45 67 89"
+
+POLICE = 'Helvetica'
+POLICE_GRAS = 'Helvetica-Bold'
+COULEUR_BANDEAU = colors.HexColor('#1e3a8a')
+
+# Mise en page compacte d'une ordonnance (A5 portrait)
+FORMAT_ORDONNANCE = A5
+MARGE = 12 * mm
+TAILLE_TEXTE = 10
+INTERLIGNE = 13
+
+# Largeurs de colonnes des tableaux du dossier (A4)
+COLONNES_FICHE = [2.5 * inch, 4 * inch]
+
+# Modèles de tableau : fiche libellé / valeur (couleur des libellés) ou liste
+# avec ligne d'en-tête (couleur de l'en-tête)
+MODELES_TABLEAU = {
+    'identite': ('fiche', colors.lightblue),
+    'constantes': ('fiche', colors.lightgreen),
+    'urgence': ('fiche', colors.orange),
+    'rendez_vous': ('liste', colors.purple),
+    'consultations': ('liste', colors.blue),
+    'prescriptions': ('liste', COULEUR_BANDEAU),
+}
+
+
+def _nom(utilisateur):
+    return utilisateur.get_full_name() or utilisateur.username
+
+
+def _tronquer(texte, longueur=40):
+    texte = texte or ''
+    return (texte[:longueur] + '...') if len(texte) > longueur else texte
+
+
+@lru_cache(maxsize=None)
+def styles():
+    """Styles de paragraphe partagés, créés au premier document du processus"""
+    base = getSampleStyleSheet()
+    return {
+        'titre': ParagraphStyle('EscoTitre', parent=base['Heading1'], fontSize=20, spaceAfter=30,
+                                alignment=1, textColor=colors.purple, fontName=POLICE_GRAS),
+        'section': ParagraphStyle('EscoSection', parent=base['Heading2'], fontSize=14, spaceAfter=15,
+                                  spaceBefore=20, textColor=colors.blue, fontName=POLICE_GRAS),
+        'normal': base['Normal'],
+        'cellule': ParagraphStyle('EscoCellule', parent=base['Normal'], fontSize=9, leading=11),
+        'pied': ParagraphStyle('EscoPied', parent=base['Normal'], fontSize=10, alignment=1,
+                               textColor=colors.grey),
+    }
+
+
+@lru_cache(maxsize=None)
+def style_tableau(modele):
+    """TableStyle du modèle `modele` (voir MODELES_TABLEAU), partagé entre documents"""
+    genre, couleur = MODELES_TABLEAU[modele]
+    if genre == 'fiche':
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), couleur),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), POLICE_GRAS),
+            ('FONTNAME', (1, 0), (-1, -1), POLICE),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), couleur),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), POLICE_GRAS),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ])
+
+
+def tableau(lignes, modele, largeurs=COLONNES_FICHE):
+    return Table(lignes, colWidths=largeurs, style=style_tableau(modele))
+
+
+def _cellule(texte):
+    return Paragraph(escape(texte or ''), styles()['cellule'])
+
+
+def _section(titre, *contenu):
+    return [Paragraph(titre, styles()['section']), *contenu, Spacer(1, 20)]
+
+
+# Sections réutilisables : chacune retourne une liste de flowables (vide
+# s'il n'y a rien à afficher) et ne fait aucune requête.
+
+def entete(*titres):
+    return [*(Paragraph(titre, styles()['titre']) for titre in titres), Spacer(1, 20)]
+
+
+def section_identite(patient):
+    lignes = [
+        ['Nom complet:', patient.get_full_name()],
+        ['Email:', patient.email],
+        ['Téléphone:', patient.telephone or 'Non renseigné'],
+        ['Adresse:', patient.adresse or 'Non renseignée'],
+    ]
+    if patient.date_naissance:
+        lignes.append(['Date de naissance:', patient.date_naissance.strftime('%d/%m/%Y')])
+        if patient.get_age():
+            lignes.append(['Âge:', f"{patient.get_age()} ans"])
+    return _section("👤 INFORMATIONS PERSONNELLES", tableau(lignes, 'identite'))
+
+
+def _statut_imc(imc):
+    if imc < 18.5:
+        return "Insuffisance pondérale"
+    if imc < 25:
+        return "Poids normal"
+    if imc < 30:
+        return "Surpoids"
+    return "Obésité"
+
+
+def _statut_tension(systolique):
+    if systolique < 120:
+        return "Normal"
+    if systolique < 140:
+        return "Élevé"
+    return "Hypertension"
+
+
+def section_constantes(constantes, groupe_sanguin=None):
+    """Constantes vitales : `constantes` est le dict de CustomUser.get_constantes()"""
+    lignes = []
+    if constantes.get('poids'):
+        lignes.append(['Poids:', f"{constantes['poids']} kg"])
+    if constantes.get('taille'):
+        lignes.append(['Taille:', f"{constantes['taille']} cm"])
+    if constantes.get('imc'):
+        lignes.append(['IMC:', f"{constantes['imc']} ({_statut_imc(constantes['imc'])})"])
+    if groupe_sanguin:
+        lignes.append(['Groupe sanguin:', groupe_sanguin])
+    if constantes.get('tension'):
+        lignes.append(['Tension artérielle:',
+                       f"{constantes['tension']} mmHg ({_statut_tension(constantes['tension_systolique'])})"])
+    if not lignes:
+        return []
+    return _section("⚕️ DONNÉES MÉDICALES", tableau(lignes, 'constantes'))
+
+
+def section_antecedents(patient):
+    contenu = []
+    for libelle, valeur in (("🚨 Allergies connues:", patient.allergies),
+                            ("📖 Antécédents médicaux:", patient.antecedents_medicaux),
+                            ("💊 Médicaments actuels:", patient.medicaments_actuels)):
+        if valeur:
+            contenu += [Paragraph(f"<b>{libelle}</b>", styles()['normal']),
+                        Paragraph(escape(valeur), styles()['normal']), Spacer(1, 10)]
+    if not contenu:
+        return []
+    return _section("📋 INFORMATIONS MÉDICALES DÉTAILLÉES", *contenu)
+
+
+def section_contact_urgence(patient):
+    lignes = []
+    if patient.personne_urgence_nom:
+        lignes.append(['Nom:', patient.personne_urgence_nom])
+    if patient.personne_urgence_tel:
+        lignes.append(['Téléphone:', patient.personne_urgence_tel])
+    if not lignes:
+        return []
+    return _section("🆘 CONTACT D'URGENCE", tableau(lignes, 'urgence'))
+
+
+def section_rendez_vous(rdvs, titre="📅 HISTORIQUE DES RENDEZ-VOUS"):
+    """`rdvs` : RendezVous avec select_related('medecin')"""
+    if not rdvs:
+        return []
+    lignes = [['Date', 'Médecin', 'Motif', 'Statut']] + [
+        [rdv.date_rdv.strftime('%d/%m/%Y'), rdv.medecin.get_full_name(), _tronquer(rdv.motif),
+         rdv.get_status_display()]
+        for rdv in rdvs
+    ]
+    return _section(titre, tableau(lignes, 'rendez_vous', [1.2 * inch, 1.8 * inch, 2.5 * inch, 1 * inch]))
+
+
+def section_consultations(consultations, titre="🩺 CONSULTATIONS"):
+    """`consultations` : Consultation avec select_related('rdv__medecin')"""
+    if not consultations:
+        return []
+    lignes = [['Date', 'Médecin', 'Diagnostic', 'Traitement']] + [
+        [consultation.rdv.date_rdv.strftime('%d/%m/%Y'), consultation.rdv.medecin.get_full_name(),
+         _cellule(consultation.diagnostic), _cellule(consultation.traitement)]
+        for consultation in consultations
+    ]
+    return _section(titre, tableau(lignes, 'consultations', [1 * inch, 1.5 * inch, 2 * inch, 2 * inch]))
+
+
+def section_prescriptions(prescriptions, titre="💊 PRESCRIPTIONS"):
+    """`prescriptions` : Prescription avec select_related('medecin')"""
+    if not prescriptions:
+        return []
+    lignes = [['Date', 'Médecin', 'Prescription']] + [
+        [timezone.localtime(prescription.date_prescription).strftime('%d/%m/%Y'),
+         prescription.medecin.get_full_name(), _cellule(prescription.contenu)]
+        for prescription in prescriptions
+    ]
+    return _section(titre, tableau(lignes, 'prescriptions', [1 * inch, 1.5 * inch, 4 * inch]))
+
+
+def pied_de_page():
+    style = styles()['pied']
+    return [
+        Spacer(1, 30),
+        Paragraph(f"📄 Document généré le {timezone.localtime().strftime('%d/%m/%Y à %H:%M')}", style),
+        Paragraph(f"🏥 {CLINIQUE} - Confidentiel", style),
+        Paragraph(f"📞 Contact: {CONTACT}", style),
+    ]
+
+
+def ecrire_document(flowables, sortie, pagesize=A4, **options):
+    """Met en page `flowables` et écrit le PDF dans `sortie` (fichier binaire)"""
+    SimpleDocTemplate(sortie, pagesize=pagesize, topMargin=1 * inch, **options).build(flowables)
+
+
+def ecrire_dossier_medical(patient, sortie, constantes=None, rdvs=(), consultations=(), prescriptions=()):
+    """
+    Dossier médical complet de `patient`, à partir de données déjà chargées
+    (voir les sections pour les select_related attendus).
+    """
+    ecrire_document([
+        *entete("🏥 ESCO - ESPACE SANTÉ FAMILLE", "DOSSIER MÉDICAL PERSONNEL"),
+        *section_identite(patient),
+        *section_constantes(constantes or {}, patient.groupe_sanguin),
+        *section_antecedents(patient),
+        *section_contact_urgence(patient),
+        *section_rendez_vous(rdvs, f"📅 HISTORIQUE DES RENDEZ-VOUS ({len(rdvs)} derniers)"),
+        *section_consultations(consultations),
+        *section_prescriptions(prescriptions),
+        *pied_de_page(),
+    ], sortie, title="Dossier médical", author=CLINIQUE)
+
+
+def _nombre(valeur):
+    return f'{valeur:.2f}'.rstrip('0').rstrip('.')
+
+
+def _chaine(texte, encodage='cp1252'):
+    """Chaîne littérale PDF ; cp1252 correspond au WinAnsiEncoding des polices standard"""
+    octets = texte.encode(encodage, 'replace')
+    return b'(' + octets.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+class FluxPdf:
+    """
+    Le sous-ensemble de reportlab.pdfgen.canvas.Canvas utilisé par les
+    ordonnances (texte en polices standard, traits, rectangles, couleurs),
+    mais chaque page est écrite dans `sortie` dès showPage() au lieu d'être
+    gardée jusqu'à save(). `sortie` n'a besoin que de write() : un tampon
+    peut être vidé entre deux pages.
+    """
+    CATALOGUE, PAGES, RESSOURCES, INFOS = 1, 2, 3, 4
+
+    def __init__(self, sortie, pagesize=A4):
+        self.sortie = sortie
+        self.largeur, self.hauteur = pagesize
+        self.octets = 0
+        self._positions = {}
+        self._prochain = self.INFOS + 1
+        self._pages = []
+        self._polices = {}
+        self._infos = {'Producer': CLINIQUE}
+        self._nouvelle_page()
+        self._ecrire(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._objet(self.CATALOGUE, b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGES)
+
+    def _ecrire(self, octets):
+        self.sortie.write(octets)
+        self.octets += len(octets)
+
+    def _numero(self):
+        numero, self._prochain = self._prochain, self._prochain + 1
+        return numero
+
+    def _objet(self, numero, contenu):
+        self._positions[numero] = self.octets
+        self._ecrire(b'%d 0 obj\n%s\nendobj\n' % (numero, contenu))
+
+    def _nouvelle_page(self):
+        self._code = []
+        self._police = (POLICE, 12)
+
+    def setTitle(self, titre):
+        self._infos['Title'] = titre
+
+    def setAuthor(self, auteur):
+        self._infos['Author'] = auteur
+
+    def setFont(self, nom, taille):
+        self._police = (nom, taille)
+
+    def setFillColor(self, couleur):
+        self._code.append(f'{_nombre(couleur.red)} {_nombre(couleur.green)} {_nombre(couleur.blue)} rg')
+
+    def setStrokeColor(self, couleur):
+        self._code.append(f'{_nombre(couleur.red)} {_nombre(couleur.green)} {_nombre(couleur.blue)} RG')
+
+    def rect(self, x, y, largeur, hauteur, stroke=1, fill=0):
+        operateur = {(1, 0): 'S', (0, 1): 'f', (1, 1): 'B'}.get((bool(stroke), bool(fill)), 'n')
+        self._code.append(f'{_nombre(x)} {_nombre(y)} {_nombre(largeur)} {_nombre(hauteur)} re {operateur}')
+
+    def line(self, x1, y1, x2, y2):
+        self._code.append(f'{_nombre(x1)} {_nombre(y1)} m {_nombre(x2)} {_nombre(y2)} l S')
+
+    def drawString(self, x, y, texte):
+        nom, taille = self._police
+        if nom not in self._polices:
+            self._polices[nom] = (f'F{len(self._polices) + 1}', self._numero())
+        ressource = self._polices[nom][0]
+        self._code.append(f'BT /{ressource} {_nombre(taille)} Tf {_nombre(x)} {_nombre(y)} Td '
+                          f'{_chaine(texte).decode("latin-1")} Tj ET')
+
+    def drawRightString(self, x, y, texte):
+        self.drawString(x - stringWidth(texte, *self._police), y, texte)
+
+    def drawCentredString(self, x, y, texte):
+        self.drawString(x - stringWidth(texte, *self._police) / 2, y, texte)
+
+    def showPage(self):
+        contenu = zlib.compress('\n'.join(self._code).encode('latin-1'))
+        flux = self._numero()
+        self._objet(flux, b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(contenu), contenu))
+        page = self._numero()
+        self._objet(page, b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] /Resources %d 0 R /Contents %d 0 R >>'
+                    % (self.PAGES, _nombre(self.largeur).encode(), _nombre(self.hauteur).encode(),
+                       self.RESSOURCES, flux))
+        self._pages.append(page)
+        self._nouvelle_page()
+
+    def save(self):
+        """Écrit l'arbre des pages, les polices, les métadonnées et la table des références"""
+        if self._code:
+            self.showPage()
+        for nom, (ressource, numero) in self._polices.items():
+            self._objet(numero, b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>'
+                        % nom.encode())
+        polices = b' '.join(b'/%s %d 0 R' % (ressource.encode(), numero)
+                            for ressource, numero in self._polices.values())
+        self._objet(self.RESSOURCES, b'<< /ProcSet [/PDF /Text] /Font << %s >> >>' % polices)
+        kids = b' '.join(b'%d 0 R' % page for page in self._pages)
+        self._objet(self.PAGES, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self._pages)))
+        self._objet(self.INFOS, b'<< %s >>' % b' '.join(
+            b'/%s %s' % (cle.encode(), _chaine(valeur, 'latin-1')) for cle, valeur in self._infos.items()))
+
+        references = self.octets
+        self._ecrire(b'xref\n0 %d\n0000000000 65535 f \n' % self._prochain)
+        self._ecrire(b''.join(b'%010d 00000 n \n' % self._positions[numero] for numero in range(1, self._prochain)))
+        self._ecrire(b'trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                     % (self._prochain, self.CATALOGUE, self.INFOS, references))
+
+
+class Ordonnances:
+    """
+    Dessine des ordonnances sur un FluxPdf, une (ou plusieurs, si le contenu
+    déborde) page par prescription, chacune écrite dans `sortie` dès qu'elle
+    est finie.
+    """
+
+    def __init__(self, sortie):
+        self.canvas = FluxPdf(sortie, pagesize=FORMAT_ORDONNANCE)
+        self.canvas.setTitle("Ordonnances")
+        self.canvas.setAuthor(CLINIQUE)
+        self.largeur, self.hauteur = FORMAT_ORDONNANCE
+        self.largeur_texte = self.largeur - 2 * MARGE
+        self.pages = 0
+        self._entetes = {}
+
+    def _entete(self, medecin):
+        """Lignes d'en-tête d'un médecin, calculées une fois par lot"""
+        if medecin.pk not in self._entetes:
+            self._entetes[medecin.pk] = (f"Dr. {_nom(medecin)}", medecin.specialite or 'Médecine générale')
+        return self._entetes[medecin.pk]
+
+    def _debut_page(self, prescription, suite=False):
+        c = self.canvas
+        nom_medecin, specialite = self._entete(prescription.medecin)
+        haut = self.hauteur - MARGE
+
+        c.setFillColor(COULEUR_BANDEAU)
+        c.rect(0, haut - 14 * mm, self.largeur, 14 * mm + MARGE, stroke=0, fill=1)
+        c.setFillColor(colors.white)
+        c.setFont(POLICE_GRAS, 12)
+        c.drawString(MARGE, haut - 6 * mm, nom_medecin)
+        c.setFont(POLICE, 9)
+        c.drawString(MARGE, haut - 11 * mm, specialite)
+        c.drawRightString(self.largeur - MARGE, haut - 6 * mm, CLINIQUE)
+
+        c.setFillColor(colors.black)
+        y = haut - 24 * mm
+        date = timezone.localtime(prescription.date_prescription).strftime('%d/%m/%Y')
+        c.setFont(POLICE_GRAS, TAILLE_TEXTE)
+        c.drawString(MARGE, y, f"Patient : {_nom(prescription.patient)}")
+        c.setFont(POLICE, TAILLE_TEXTE)
+        c.drawRightString(self.largeur - MARGE, y, f"Le {date}")
+        naissance = prescription.patient.date_naissance
+        if naissance:
+            y -= INTERLIGNE
+            c.drawString(MARGE, y, f"Né(e) le {naissance.strftime('%d/%m/%Y')}")
+        y -= 8 * mm
+        c.setFont(POLICE_GRAS, 11)
+        c.drawString(MARGE, y, "ORDONNANCE (suite)" if suite else "ORDONNANCE")
+        c.setStrokeColor(COULEUR_BANDEAU)
+        c.line(MARGE, y - 2 * mm, self.largeur - MARGE, y - 2 * mm)
+        return y - 8 * mm
+
+    def _fin_page(self, derniere):
+        c = self.canvas
+        if derniere:
+            c.setFont(POLICE, 9)
+            c.drawRightString(self.largeur - MARGE, MARGE + 14 * mm, "Signature et cachet")
+            c.setStrokeColor(colors.grey)
+            c.line(self.largeur - MARGE - 50 * mm, MARGE + 12 * mm, self.largeur - MARGE, MARGE + 12 * mm)
+        c.setFont(POLICE, 7)
+        c.setFillColor(colors.grey)
+        c.drawCentredString(self.largeur / 2, MARGE / 2, f"{CLINIQUE} - {CONTACT}")
+        c.setFillColor(colors.black)
+        c.showPage()
+        self.pages += 1
+
+    def ajouter(self, prescription):
+        """Dessine une prescription ; son contenu continue sur une nouvelle page s'il déborde"""
+        c = self.canvas
+        lignes = []
+        for paragraphe in prescription.contenu.splitlines() or ['']:
+            lignes.extend(simpleSplit(paragraphe, POLICE, TAILLE_TEXTE, self.largeur_texte) or [''])
+
+        bas = MARGE + 20 * mm
+        y = self._debut_page(prescription)
+        c.setFont(POLICE, TAILLE_TEXTE)
+        for ligne in lignes:
+            if y < bas:
+                self._fin_page(derniere=False)
+                y = self._debut_page(prescription, suite=True)
+                c.setFont(POLICE, TAILLE_TEXTE)
+            c.drawString(MARGE, y, ligne)
+            y -= INTERLIGNE
+        self._fin_page(derniere=True)
+
+    def terminer(self):
+        self.canvas.save()
+        return self.pages
+
+
+def ecrire_ordonnances(prescriptions, sortie):
+    """
+    Écrit dans `sortie` (fichier ouvert en binaire) un PDF des `prescriptions`,
+    un itérable parcouru une seule fois. Retourne le nombre de pages.
+    """
+    document = Ordonnances(sortie)
+    for prescription in prescriptions:
+        document.ajouter(prescription)
+    return document.terminer()
@@ -0,0 +1,106 @@
+# main/periodes.py
+"""
+Filtres de période (aujourd'hui, cette semaine, ce mois, personnalisée).
+
+Une période est un intervalle semi-ouvert [debut, fin[ de dates locales
+(fuseau TIME_ZONE de la clinique). Les filtres produits sont de simples
+comparaisons `champ >= debut AND champ < fin` : contrairement à
+`__date`, `__month` ou `__year`, qui appliquent une fonction SQL à la
+colonne, ils peuvent être servis par un index.
+
+Pour un DateTimeField, les bornes sont les minuits locaux convertis en
+datetimes aware ; pour un DateField, les dates elles-mêmes.
+"""
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from django.db import models
+from django.utils import timezone
+
+PERIODES = [
+    ('all', 'Toutes les dates'),
+    ('today', "Aujourd'hui"),
+    ('week', 'Cette semaine'),
+    ('month', 'Ce mois'),
+    ('custom', 'Période personnalisée'),
+]
+
+
+class Periode(namedtuple('Periode', ['debut', 'fin'])):
+    """Intervalle de dates locales [debut, fin[ (None : non borné de ce côté)"""
+
+    def bornes_horodatage(self):
+        """Minuits locaux (datetimes aware) de début et de fin"""
+        return tuple(
+            timezone.make_aware(datetime.combine(jour, time.min)) if jour else None
+            for jour in (self.debut, self.fin)
+        )
+
+    def q(self, champ, horodatage=True):
+        """Condition Q sur `champ` ; horodatage=False pour un DateField"""
+        debut, fin = self.bornes_horodatage() if horodatage else (self.debut, self.fin)
+        conditions = {}
+        if debut is not None:
+            conditions[f'{champ}__gte'] = debut
+        if fin is not None:
+            conditions[f'{champ}__lt'] = fin
+        return models.Q(**conditions)
+
+
+def periode(code, reference=None, debut=None, fin=None):
+    """
+    Période correspondant à `code` ('today', 'week', 'month' ou 'custom'),
+    None pour 'all' ou un code inconnu. `reference` vaut par défaut la date
+    locale du jour ; pour 'custom', `debut` et `fin` sont inclus (l'un des deux
+    peut manquer).
+    """
+    reference = reference or timezone.localdate()
+    if code == 'today':
+        return Periode(reference, reference + timedelta(days=1))
+    if code == 'week':
+        lundi = reference - timedelta(days=reference.weekday())
+        return Periode(lundi, lundi + timedelta(days=7))
+    if code == 'month':
+        premier = reference.replace(day=1)
+        suivant = (premier + timedelta(days=32)).replace(day=1)
+        return Periode(premier, suivant)
+    if code == 'custom' and (debut or fin):
+        return Periode(debut, fin + timedelta(days=1) if fin else None)
+    return None
+
+
+def _date_parametre(valeur):
+    try:
+        return date.fromisoformat(valeur) if valeur else None
+    except ValueError:
+        return None
+
+
+def periode_depuis_requete(request, parametre='date'):
+    """
+    Lit la période dans les paramètres GET : `<parametre>` (code) et, pour une
+    période personnalisée, `debut` / `fin` (AAAA-MM-JJ).
+    Retourne (code, Periode ou None).
+    """
+    code = request.GET.get(parametre, 'all')
+    return code, periode(
+        code,
+        debut=_date_parametre(request.GET.get('debut')),
+        fin=_date_parametre(request.GET.get('fin')),
+    )
+
+
+def _champ(modele, chemin):
+    """Champ désigné par un chemin de lookup ('rdv__date_rdv')"""
+    *relations, nom = chemin.split('__')
+    for relation in relations:
+        modele = modele._meta.get_field(relation).related_model
+    return modele._meta.get_field(nom)
+
+
+def filtrer(queryset, champ, periode):
+    """Restreint `queryset` à la période (aucun filtre si periode est None)"""
+    if periode is None:
+        return queryset
+    horodatage = isinstance(_champ(queryset.model, champ), models.DateTimeField)
+    return queryset.filter(periode.q(champ, horodatage=horodatage))
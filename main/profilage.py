@@ -0,0 +1,196 @@
+# main/profilage.py
+"""
+Profilage d'une requête à la demande (voir ProfilMiddleware).
+
+Deux modes :
+  - `echantillons` (par défaut) : un thread relève la pile du thread de la
+    requête toutes les INTERVALLE_ECHANTILLON secondes. Surcoût faible, la
+    page garde sa vitesse réelle ; les piles sont exactes, les durées
+    statistiques.
+  - `cprofile` : cProfile trace chaque appel. Durées exactes par fonction
+    (tableau pstats), mais la page est ralentie ; les piles sont
+    reconstruites depuis le graphe appelant/appelé de pstats, le temps
+    d'une fonction étant réparti entre ses appelants.
+
+Dans les deux cas, les requêtes SQL de toutes les bases sont relevées
+avec leur durée (connection.execute_wrapper). Les piles sont au format
+« collapsed » (une ligne `a;b;c valeur`) lu par flamegraph.pl, speedscope
+ou inferno.
+"""
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
+
+from .models import ProfilRequete
+
+MODES = ('echantillons', 'cprofile')
+INTERVALLE_ECHANTILLON = 0.001
+PROFONDEUR_MAX = 200
+# Mode cprofile : branches de moins de cette part du temps total fondues dans leur appelant
+SEUIL_BRANCHE = 0.001
+# Profils conservés : les plus anciens sont supprimés à l'enregistrement
+GARDER = 200
+
+
+def _nom(module, fonction, fichier=None, ligne=None):
+    nom = f"{module}:{fonction}" if module else f"{fichier}:{ligne}:{fonction}"
+    # « ; » et les espaces sont les séparateurs du format collapsed
+    return nom.replace(';', ',').replace(' ', '_')
+
+
+def _nom_cadre(cadre):
+    code = cadre.f_code
+    return _nom(cadre.f_globals.get('__name__'), code.co_qualname, code.co_filename, code.co_firstlineno)
+
+
+class Echantillonneur:
+    """Relève périodiquement la pile d'un thread ; `piles` compte les échantillons par pile"""
+
+    def __init__(self, thread_id, intervalle=INTERVALLE_ECHANTILLON):
+        self.thread_id = thread_id
+        self.intervalle = intervalle
+        self.piles = Counter()
+        self._arret = threading.Event()
+        self._thread = threading.Thread(target=self._boucle, name='esco-profil', daemon=True)
+
+    def _boucle(self):
+        while not self._arret.wait(self.intervalle):
+            cadre = sys._current_frames().get(self.thread_id)
+            pile = []
+            while cadre is not None and len(pile) < PROFONDEUR_MAX:
+                pile.append(_nom_cadre(cadre))
+                cadre = cadre.f_back
+            if pile:
+                self.piles[';'.join(reversed(pile))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._arret.set()
+        self._thread.join()
+
+
+def _piles_pstats(stats):
+    """
+    Piles reconstruites depuis pstats (microsecondes) : chaque fonction est
+    descendue depuis les racines (fonctions sans appelant profilé), son temps
+    cumulé venant de l'arête appelant -> appelé ; le reste est son temps propre.
+    Les branches sous SEUIL_BRANCHE du total sont comptées dans leur appelant,
+    ce qui borne le nombre de chemins parcourus.
+    """
+    seuil = stats.total_tt * SEUIL_BRANCHE
+    appeles = {}
+    for fonction, (_, _, _, _, appelants) in stats.stats.items():
+        for appelant, (_, _, _, cumule) in appelants.items():
+            appeles.setdefault(appelant, []).append((fonction, cumule))
+    piles = Counter()
+
+    def descendre(fonction, cumule, chemin, noms):
+        noms = noms + [_nom(None, fonction[2], fonction[0], fonction[1]) if fonction[0] != '~'
+                       else _nom('builtins', fonction[2])]
+        enfants = []
+        if len(noms) < PROFONDEUR_MAX:
+            enfants = [(f, min(c, cumule)) for f, c in appeles.get(fonction, []) if f not in chemin and c >= seuil]
+        for enfant, cumule_enfant in enfants:
+            descendre(enfant, cumule_enfant, chemin | {enfant}, noms)
+        propre = cumule - sum(c for _, c in enfants)
+        if propre > 0:
+            piles[';'.join(noms)] += max(1, round(propre * 1e6))
+
+    for fonction, (_, _, _, cumule, appelants) in stats.stats.items():
+        if not appelants:
+            descendre(fonction, cumule, {fonction}, [])
+    return piles
+
+
+def _tableau_pstats(stats, lignes=40):
+    sortie = io.StringIO()
+    stats.stream = sortie
+    stats.sort_stats('cumulative').print_stats(lignes)
+    return sortie.getvalue()
+
+
+def _tableau_echantillons(piles, intervalle, lignes=40):
+    """Fonctions les plus présentes en haut de pile (temps propre estimé)"""
+    propre = Counter()
+    for pile, nombre in piles.items():
+        propre[pile.rsplit(';', 1)[-1]] += nombre
+    total = sum(propre.values()) or 1
+    return '\n'.join(
+        [f"{total} échantillons toutes les {intervalle * 1000:g} ms", "  échant.      %  fonction"]
+        + [f"{nombre:9d} {nombre * 100 / total:6.1f}  {fonction}" for fonction, nombre in propre.most_common(lignes)]
+    )
+
+
+class _CaptureSQL:
+    def __init__(self, alias, requetes):
+        self.alias = alias
+        self.requetes = requetes
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.requetes.append({'base': self.alias, 'sql': sql, 'params': repr(params)[:500],
+                                  'duree_ms': round((time.perf_counter() - debut) * 1000, 3)})
+
+
+def profiler(appel, mode='echantillons'):
+    """
+    Exécute `appel()` sous le profileur `mode` ; retourne (résultat, mesures)
+    avec mesures = duree_ms, requetes (SQL et durées), statistiques (texte),
+    piles (collapsed).
+    """
+    requetes = []  # dans l'ordre d'exécution, toutes bases confondues
+    captures = [_CaptureSQL(connexion.alias, requetes) for connexion in connections.all()]
+    with ExitStack() as pile:
+        for capture in captures:
+            pile.enter_context(connections[capture.alias].execute_wrapper(capture))
+        debut = time.perf_counter()
+        if mode == 'cprofile':
+            profil = cProfile.Profile()
+            resultat = profil.runcall(appel)
+            duree = time.perf_counter() - debut
+            stats = pstats.Stats(profil)
+            statistiques, piles = _tableau_pstats(stats), _piles_pstats(stats)
+        else:
+            with Echantillonneur(threading.get_ident()) as echantillonneur:
+                resultat = appel()
+            duree = time.perf_counter() - debut
+            piles = echantillonneur.piles
+            statistiques = _tableau_echantillons(piles, echantillonneur.intervalle)
+
+    return resultat, {
+        'duree_ms': round(duree * 1000, 1),
+        'requetes': requetes,
+        'statistiques': statistiques,
+        'piles': '\n'.join(f"{pile} {valeur}" for pile, valeur in sorted(piles.items())),
+    }
+
+
+def enregistrer(request, response, mode, mesures):
+    """Enregistre le profil de `request` et ne garde que les GARDER plus récents"""
+    profil = ProfilRequete.objects.create(
+        utilisateur=request.user,
+        methode=request.method,
+        chemin=request.get_full_path()[:500],
+        statut=response.status_code,
+        mode=mode,
+        nb_requetes=len(mesures['requetes']),
+        duree_sql_ms=round(sum(r['duree_ms'] for r in mesures['requetes']), 1),
+        **mesures,
+    )
+    plus_ancien = next(iter(ProfilRequete.objects.order_by('-pk').values_list('pk', flat=True)[GARDER:GARDER + 1]), None)
+    if plus_ancien:
+        ProfilRequete.objects.filter(pk__lte=plus_ancien).delete()
+    return profil
@@ -0,0 +1,136 @@
+# main/replica.py
+"""
+Réplique en lecture seule de la base clinique.
+
+Activée par ESCO_REPLICA=1 (voir settings) : une copie de db.sqlite3 sert
+les lectures des requêtes GET (tableaux de bord, listes, exports, PDF) et
+laisse le verrou de la base principale aux écritures.
+
+La copie est rafraîchie en continu par la commande `rafraichir_replica`
+avec l'API de sauvegarde en ligne de SQLite (sauvegardes.copier_en_ligne) :
+copie par étapes dans un fichier temporaire puis remplacement atomique, si
+bien qu'un lecteur ne voit jamais une copie partielle. Un fichier <replica>.json
+mémorise l'instant de départ de la dernière copie : toute écriture validée
+avant cet instant est dans la réplique, ce qui donne son retard.
+
+Routage (main.routeurs.ReplicaRouter) : une lecture va sur la réplique
+seulement si
+  - elle a lieu pendant une requête GET/HEAD (ReplicaMiddleware) ;
+  - elle n'est pas dans une transaction de la base principale (les
+    vérifications de créneaux, par exemple, lisent sous verrou) ;
+  - la réplique a moins de ESCO_REPLICA_RETARD_MAX secondes de retard ;
+  - elle contient la dernière écriture de l'utilisateur : après un POST,
+    le cookie `esco_ecriture` retient l'instant de l'écriture et les
+    lectures restent sur la base principale jusqu'à ce qu'une copie plus
+    récente soit disponible (lecture de ses propres écritures).
+Dans tous les autres cas, et hors requête HTTP (commandes), tout va sur la
+base principale.
+"""
+import contextvars
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from . import sauvegardes
+
+ALIAS = 'replica'
+COOKIE_ECRITURE = 'esco_ecriture'
+
+# Pages copiées par étape de sauvegarde (-1 : tout en une étape) et pause entre
+# deux étapes, pendant laquelle la base principale est libre pour les écritures
+PAGES_PAR_ETAPE = 4096
+PAUSE_ETAPE = 0.005
+
+# Fréquence maximale de relecture du fichier d'état (secondes)
+RELECTURE_ETAT = 1.0
+
+_lectures_replica = contextvars.ContextVar('esco_lectures_replica', default=False)
+_etat = {'lu_le': 0.0, 'instantane': None}
+
+
+def active():
+    return ALIAS in settings.DATABASES
+
+
+def chemin():
+    return str(settings.ESCO_REPLICA_CHEMIN)
+
+
+def chemin_etat(destination=None):
+    return f"{destination or chemin()}.json"
+
+
+def lire_etat(destination=None):
+    """État de la dernière copie ({'instantane', 'duree', 'taille'}), None s'il n'y en a pas"""
+    try:
+        with open(chemin_etat(destination), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def instantane():
+    """Instant (timestamp) de départ de la dernière copie, relu au plus une fois par seconde"""
+    maintenant = time.monotonic()
+    if maintenant - _etat['lu_le'] >= RELECTURE_ETAT:
+        etat = lire_etat()
+        _etat['instantane'] = etat['instantane'] if etat else None
+        _etat['lu_le'] = maintenant
+    return _etat['instantane']
+
+
+def retard():
+    """Retard de la réplique en secondes, None si elle n'a jamais été copiée"""
+    debut = instantane()
+    return None if debut is None else max(0.0, time.time() - debut)
+
+
+def disponible(ecrit_le=None):
+    """La réplique est-elle assez fraîche, et contient-elle une écriture faite à `ecrit_le` ?"""
+    debut = instantane()
+    if debut is None or time.time() - debut > settings.ESCO_REPLICA_RETARD_MAX:
+        return False
+    return ecrit_le is None or debut >= ecrit_le
+
+
+@contextmanager
+def lectures(ecrit_le=None):
+    """Autorise les lectures sur la réplique dans ce bloc, si elle est disponible"""
+    jeton = _lectures_replica.set(active() and disponible(ecrit_le))
+    try:
+        yield
+    finally:
+        _lectures_replica.reset(jeton)
+
+
+def lecture_sur_replica():
+    return _lectures_replica.get() and not connections['default'].in_atomic_block
+
+
+def rafraichir(source=None, destination=None, pages=PAGES_PAR_ETAPE, pause=PAUSE_ETAPE):
+    """
+    Copie la base `source` (principale par défaut) vers `destination` (la
+    réplique) avec l'API de sauvegarde, puis publie l'état. Retourne l'état.
+    """
+    source = str(source or settings.DATABASES['default']['NAME'])
+    destination = str(destination or chemin())
+    temporaire = destination + '.partiel'
+    if os.path.exists(temporaire):
+        os.remove(temporaire)
+
+    # Les écritures validées avant `debut` sont dans la copie : si la source
+    # change pendant la sauvegarde, SQLite recommence la copie
+    debut = time.time()
+    mesures = sauvegardes.copier_en_ligne(source, temporaire, pages, pause)
+    os.replace(temporaire, destination)
+
+    etat = {'instantane': debut, 'duree': time.time() - debut, 'taille': mesures['taille'],
+            'etape_max': mesures['etape_max']}
+    with open(chemin_etat(destination) + '.partiel', 'w', encoding='utf-8') as f:
+        json.dump(etat, f)
+    os.replace(chemin_etat(destination) + '.partiel', chemin_etat(destination))
+    return etat
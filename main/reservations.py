@@ -0,0 +1,215 @@
+# main/reservations.py
+"""
+Réservation de créneaux de rendez-vous sans double réservation.
+
+La contrainte unique partielle `rdv_creneau_unique` (un seul RDV non annulé
+par médecin, date et heure) tranche entre deux réservations simultanées :
+la seconde reçoit une IntegrityError, transformée en CreneauIndisponible.
+
+Chaque réservation est une transaction courte (BEGIN IMMEDIATE, voir
+transaction_ecriture) limitée à l'INSERT. Si SQLite reste verrouillé au-delà
+du `timeout` de la connexion, la réservation est retentée après une attente
+exponentielle avec gigue.
+
+Les opérations sur plusieurs RDV (replanification en masse) vérifient tous
+les créneaux visés en une passe — quelques requêtes quel que soit le nombre
+de RDV — puis écrivent tout dans une seule transaction.
+"""
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from copy import copy
+from datetime import timedelta
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from .models import Planning, RendezVous
+
+TENTATIVES = 5
+ATTENTE_INITIALE = 0.05  # secondes, doublée à chaque nouvelle tentative
+
+
+# Statuts d'un RDV encore à venir, que l'on peut déplacer
+STATUTS_A_VENIR = ('programme', 'confirme')
+JOURS = [code for code, _ in Planning.JOURS_SEMAINE]
+
+
+class CreneauIndisponible(Exception):
+    """Le créneau (médecin, date, heure) est déjà pris par un RDV actif"""
+
+
+class ConflitsCreneaux(Exception):
+    """Un ou plusieurs créneaux visés sont indisponibles ; `conflits` liste les motifs"""
+
+    def __init__(self, conflits):
+        super().__init__(f"{len(conflits)} conflit(s) de créneau")
+        self.conflits = conflits
+
+
+@contextmanager
+def transaction_ecriture(using=None):
+    """
+    transaction.atomic() dont le BEGIN prend aussitôt le verrou d'écriture
+    SQLite (BEGIN IMMEDIATE) : une transaction qui lit puis écrit des RDV
+    attend le verrou (`timeout` de la connexion) au lieu d'échouer avec
+    « database is locked » au moment d'écrire. Limité aux écritures de
+    rendez-vous : les autres transactions gardent le BEGIN différé.
+    Dans un bloc atomique existant, simple point de sauvegarde.
+    """
+    connexion = transaction.get_connection(using)
+    if connexion.vendor != 'sqlite' or connexion.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+    connexion.ensure_connection()
+    mode = connexion.transaction_mode
+    connexion.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            connexion.transaction_mode = mode  # BEGIN IMMEDIATE déjà émis
+            yield
+    finally:
+        connexion.transaction_mode = mode
+
+
+def _creneau_pris(erreur):
+    message = str(erreur)
+    return 'rdv_creneau_unique' in message or 'main_rendezvous.heure_rdv' in message
+
+
+def _base_verrouillee(erreur):
+    message = str(erreur)
+    return 'locked' in message or 'busy' in message
+
+
+def reserver_creneau(rdv, tentatives=TENTATIVES, using=None):
+    """
+    Enregistre le nouveau rendez-vous `rdv` si son créneau est libre.
+    Lève CreneauIndisponible sinon. Retourne le nombre de tentatives
+    effectuées (1 sans attente sur le verrou).
+    """
+    for tentative in range(1, tentatives + 1):
+        try:
+            with transaction_ecriture(using=using):
+                rdv.save(force_insert=True, using=using)
+            return tentative
+        except IntegrityError as e:
+            if _creneau_pris(e):
+                raise CreneauIndisponible("Ce créneau vient d'être réservé, choisissez un autre horaire.") from e
+            raise
+        except OperationalError as e:
+            if not _base_verrouillee(e) or tentative == tentatives:
+                raise
+            rdv.pk = None
+            time.sleep(ATTENTE_INITIALE * 2 ** (tentative - 1) * random.uniform(0.5, 1.5))
+
+
+def _libelle(rdv, motif):
+    medecin = rdv.medecin.get_full_name() or rdv.medecin.username
+    return f"{rdv.date_rdv:%d/%m/%Y} {rdv.heure_rdv:%H:%M}, Dr. {medecin} : {motif}"
+
+
+def conflits_creneaux(rdvs, deplaces=()):
+    """
+    Motifs de conflit des RDV actifs `rdvs` (nouveaux ou modifiés en mémoire)
+    avec les agendas visés, en trois requêtes au plus :
+      - deux RDV de `rdvs` sur le même créneau ;
+      - créneau déjà pris par un RDV actif, hors `deplaces` (pk des RDV qui
+        quittent leur créneau actuel) ;
+      - créneau hors du planning du médecin, s'il en a un.
+    """
+    if not rdvs:
+        return []
+    conflits = []
+    creneaux = Counter((rdv.medecin_id, rdv.date_rdv, rdv.heure_rdv) for rdv in rdvs)
+    medecins = {medecin for medecin, _, _ in creneaux}
+
+    occupes = set(
+        RendezVous.objects.exclude(status='annule').exclude(pk__in=deplaces)
+        .filter(medecin__in=medecins,
+                date_rdv__gte=min(rdv.date_rdv for rdv in rdvs),
+                date_rdv__lte=max(rdv.date_rdv for rdv in rdvs),
+                heure_rdv__in={rdv.heure_rdv for rdv in rdvs})
+        .values_list('medecin', 'date_rdv', 'heure_rdv')
+    )
+
+    plages = defaultdict(list)
+    avec_planning = set()
+    for user_id, jour, debut, fin, disponible in (Planning.objects.filter(user__in=medecins)
+                                                  .values_list('user', 'jour', 'heure_debut', 'heure_fin', 'disponible')):
+        avec_planning.add(user_id)
+        if disponible:
+            plages[user_id, jour].append((debut, fin))
+
+    for rdv in rdvs:
+        creneau = (rdv.medecin_id, rdv.date_rdv, rdv.heure_rdv)
+        if creneaux[creneau] > 1:
+            conflits.append(_libelle(rdv, "plusieurs rendez-vous sur ce créneau"))
+        elif creneau in occupes:
+            conflits.append(_libelle(rdv, "créneau déjà réservé"))
+        elif rdv.medecin_id in avec_planning and not any(
+            debut <= rdv.heure_rdv < fin for debut, fin in plages[rdv.medecin_id, JOURS[rdv.date_rdv.weekday()]]
+        ):
+            conflits.append(_libelle(rdv, "hors du planning du médecin"))
+    return conflits
+
+
+def replanifier(queryset, decalage_jours=0, medecin=None):
+    """
+    Décale de `decalage_jours` et/ou confie à `medecin` les RDV à venir de
+    `queryset` (statut à venir et date à partir d'aujourd'hui). Tout ou
+    rien : lève ConflitsCreneaux si un seul créneau visé est indisponible ou
+    passé. Retourne le nombre de RDV déplacés.
+
+    La vérification et l'écriture se font dans la même transaction (verrou
+    d'écriture pris dès le BEGIN IMMEDIATE) : aucune réservation ne peut
+    s'intercaler entre les deux. Les créneaux quittés sont attribués à la
+    liste d'attente dans cette transaction.
+    """
+    with transaction_ecriture():
+        aujourd_hui = timezone.localdate()
+        rdvs = list(queryset.filter(status__in=STATUTS_A_VENIR, date_rdv__gte=aujourd_hui).select_related('medecin'))
+        conflits = []
+        if medecin is not None:
+            # Remplacement par un médecin de la même spécialité uniquement
+            conflits = [_libelle(rdv, f"spécialité différente de celle du Dr. {medecin.username}")
+                        for rdv in rdvs if rdv.medecin.specialite != medecin.specialite]
+        anciens = [copy(rdv) for rdv in rdvs]
+        for rdv in rdvs:
+            rdv.date_rdv += timedelta(days=decalage_jours)
+            if medecin is not None:
+                rdv.medecin = medecin
+            if rdv.date_rdv < aujourd_hui:
+                conflits.append(_libelle(rdv, "date passée"))
+
+        conflits += conflits_creneaux(rdvs, deplaces=[rdv.pk for rdv in rdvs])
+        if conflits:
+            raise ConflitsCreneaux(conflits)
+        enregistrer_deplacements(rdvs, ['date_rdv', 'medecin'])
+        # Import local : liste_attente importe ce module
+        from .liste_attente import combler_deplacements
+        combler_deplacements(anciens, rdvs)
+    return len(rdvs)
+
+
+def enregistrer_deplacements(rdvs, champs):
+    """
+    Enregistre en un seul bulk_update les `champs` modifiés des RDV actifs
+    `rdvs`, dont les nouveaux créneaux ont été vérifiés (conflits_creneaux).
+    À appeler dans une transaction.
+
+    La contrainte unique est vérifiée ligne par ligne pendant l'UPDATE : un
+    RDV qui prend le créneau qu'un autre RDV déplacé n'a pas encore quitté la
+    violerait. Les RDV sont donc d'abord sortis de la contrainte (statut
+    annulé), puis le bulk_update rétablit leur statut.
+    """
+    maintenant = timezone.now()
+    for rdv in rdvs:
+        rdv.updated_at = maintenant
+    RendezVous.objects.filter(pk__in=[rdv.pk for rdv in rdvs]).update(status='annule')
+    try:
+        RendezVous.objects.bulk_update(rdvs, [*champs, 'status', 'updated_at'])
+    except IntegrityError as e:
+        raise ConflitsCreneaux(["créneau réservé pendant l'enregistrement"]) from e
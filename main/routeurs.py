@@ -0,0 +1,59 @@
+# main/routeurs.py
+"""Routeurs de base de données ESCO"""
+from . import replica
+
+
+class SessionsRouter:
+    """
+    Envoie les sessions Django dans une base SQLite dédiée pour qu'elles
+    n'entrent pas en concurrence avec les écritures cliniques (verrou
+    d'écriture unique de SQLite).
+    """
+    app_label = 'sessions'
+    base = 'sessions'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return self.base
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return self.base
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == self.app_label:
+            return db == self.base
+        if db == self.base:
+            return False
+        return None
+
+
+class ReplicaRouter:
+    """
+    Lectures sur la réplique SQLite quand main.replica l'autorise (requête
+    GET, hors transaction, réplique assez fraîche), écritures toujours sur
+    la base principale. La réplique n'est jamais migrée : c'est une copie.
+    """
+
+    def db_for_read(self, model, **hints):
+        if replica.lecture_sur_replica():
+            return replica.ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {'default', replica.ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica.ALIAS:
+            return False
+        return None
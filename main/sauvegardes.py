@@ -0,0 +1,241 @@
+# main/sauvegardes.py
+"""
+Sauvegardes en ligne de la base clinique.
+
+La copie passe par l'API de sauvegarde en ligne de SQLite, par étapes de
+quelques pages : chaque étape ne tient le verrou partagé de la base que le
+temps de copier ses pages, puis une pause laisse passer les écritures. Le
+temps d'une étape est donc le blocage maximal subi par un écrivain ; il est
+mesuré et rapporté.
+
+Si la base est modifiée pendant la copie, SQLite recommence depuis le
+début. Sous une charge d'écriture soutenue, une copie par petites étapes
+pourrait ne jamais finir : après REDEMARRAGES_MAX reprises, la copie est
+refaite en une seule étape (blocage plus long, mais borné).
+
+Chaque instantané est compressé (gzip) en flux, horodaté et accompagné
+d'une empreinte SHA-256 au format de `sha256sum` ; les plus anciens sont
+supprimés au-delà de la rétention. Un instantané se vérifie (empreinte,
+décompression dans un fichier de travail, PRAGMA integrity_check) et se
+restaure dans un fichier distinct, jamais par-dessus la base en service.
+"""
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+
+PAGES_PAR_ETAPE = 256
+PAUSE_ETAPE = 0.002
+REDEMARRAGES_MAX = 3
+TAILLE_BLOC = 1024 * 1024
+
+PREFIXE = 'esco-'
+EXTENSION = '.sqlite3.gz'
+# Horodatage à la microseconde (les instantanés plus anciens l'ont à la seconde) :
+# l'ordre des noms est l'ordre chronologique
+NOM_INSTANTANE = re.compile(rf'^{PREFIXE}\d{{8}}T\d{{6}}(\d{{6}})?{re.escape(EXTENSION)}$')
+
+
+class SauvegardeInvalide(Exception):
+    """Instantané corrompu : empreinte différente ou base SQLite invalide"""
+
+
+class _TropDeRedemarrages(Exception):
+    pass
+
+
+def copier_en_ligne(source, destination, pages=PAGES_PAR_ETAPE, pause=PAUSE_ETAPE):
+    """
+    Copie la base SQLite `source` dans `destination` avec l'API de sauvegarde,
+    par étapes de `pages` pages séparées de `pause` secondes. Retourne les
+    mesures : durée, étapes, temps de verrou cumulé et plus longue étape
+    (blocage maximal d'un écrivain), redémarrages.
+    """
+    mesures = {'etapes': 0, 'verrou': 0.0, 'etape_max': 0.0, 'redemarrages': 0, 'une_etape': False}
+    suivi = {'restant': None, 'fin_etape': None}
+
+    def progression(statut, restant, total):
+        duree_etape = time.perf_counter() - suivi['fin_etape']
+        mesures['etapes'] += 1
+        mesures['verrou'] += duree_etape
+        mesures['etape_max'] = max(mesures['etape_max'], duree_etape)
+        if suivi['restant'] is not None and restant > suivi['restant']:
+            # La source a changé : SQLite reprend la copie au début
+            mesures['redemarrages'] += 1
+            if mesures['redemarrages'] > REDEMARRAGES_MAX:
+                raise _TropDeRedemarrages
+        suivi['restant'] = restant
+        if restant and pause:
+            time.sleep(pause)
+        suivi['fin_etape'] = time.perf_counter()
+
+    debut = time.perf_counter()
+    with closing(sqlite3.connect(str(source), timeout=30)) as src:
+        try:
+            with closing(sqlite3.connect(str(destination))) as dst:
+                suivi['fin_etape'] = time.perf_counter()
+                src.backup(dst, pages=pages, progress=progression)
+        except _TropDeRedemarrages:
+            mesures['une_etape'] = True
+            with closing(sqlite3.connect(str(destination))) as dst:
+                suivi['fin_etape'] = time.perf_counter()
+                src.backup(dst, pages=-1, progress=progression)
+    mesures['duree'] = time.perf_counter() - debut
+    mesures['taille'] = os.path.getsize(destination)
+    return mesures
+
+
+class _Empreinte:
+    """Fichier en écriture qui calcule le SHA-256 de ce qui le traverse"""
+
+    def __init__(self, fichier):
+        self.fichier = fichier
+        self.sha256 = hashlib.sha256()
+
+    def write(self, donnees):
+        self.sha256.update(donnees)
+        return self.fichier.write(donnees)
+
+    def flush(self):
+        self.fichier.flush()
+
+
+def empreinte(chemin):
+    sha256 = hashlib.sha256()
+    with open(chemin, 'rb') as f:
+        for bloc in iter(lambda: f.read(TAILLE_BLOC), b''):
+            sha256.update(bloc)
+    return sha256.hexdigest()
+
+
+def dossier_par_defaut():
+    return Path(settings.ESCO_SAUVEGARDES_DOSSIER)
+
+
+def instantanes(dossier=None):
+    """Instantanés du dossier, du plus ancien au plus récent"""
+    dossier = Path(dossier or dossier_par_defaut())
+    if not dossier.is_dir():
+        return []
+    return sorted(chemin for chemin in dossier.iterdir() if NOM_INSTANTANE.match(chemin.name))
+
+
+def sauvegarder(dossier=None, source=None, pages=PAGES_PAR_ETAPE, pause=PAUSE_ETAPE, garder=None):
+    """
+    Crée un instantané compressé et son empreinte dans `dossier`, puis
+    applique la rétention (`garder` instantanés). Lève FileExistsError si
+    un instantané du même nom existe déjà. Retourne les mesures.
+    """
+    dossier = Path(dossier or dossier_par_defaut())
+    dossier.mkdir(parents=True, exist_ok=True)
+    source = source or settings.DATABASES['default']['NAME']
+    garder = settings.ESCO_SAUVEGARDES_GARDER if garder is None else garder
+    chemin = dossier / f"{PREFIXE}{datetime.now():%Y%m%dT%H%M%S%f}{EXTENSION}"
+
+    with tempfile.TemporaryDirectory(dir=dossier) as travail:
+        copie = Path(travail) / 'copie.sqlite3'
+        mesures = copier_en_ligne(source, copie, pages, pause)
+
+        debut = time.perf_counter()
+        partiel = Path(travail) / chemin.name
+        with open(copie, 'rb') as entree, open(partiel, 'wb') as sortie:
+            compteur = _Empreinte(sortie)
+            with gzip.GzipFile(filename=chemin.name[:-len('.gz')], mode='wb', fileobj=compteur, mtime=0) as gz:
+                shutil.copyfileobj(entree, gz, TAILLE_BLOC)
+        try:
+            # Lien sans écrasement : un instantané existant et son empreinte ne sont jamais remplacés
+            os.link(partiel, chemin)
+        except FileExistsError as e:
+            raise FileExistsError(f"Instantané déjà présent, non remplacé : {chemin.name}") from e
+        mesures['compression'] = time.perf_counter() - debut
+
+    mesures['sha256'] = compteur.sha256.hexdigest()
+    Path(f'{chemin}.sha256').write_text(f"{mesures['sha256']}  {chemin.name}\n", encoding='utf-8')
+    mesures['chemin'] = chemin
+    mesures['taille_compressee'] = chemin.stat().st_size
+    mesures['supprimes'] = appliquer_retention(dossier, garder)
+    return mesures
+
+
+def appliquer_retention(dossier, garder):
+    """Supprime les instantanés (et empreintes) au-delà des `garder` plus récents"""
+    anciens = instantanes(dossier)[:-garder] if garder > 0 else []
+    for chemin in anciens:
+        chemin.unlink()
+        Path(f'{chemin}.sha256').unlink(missing_ok=True)
+    return anciens
+
+
+def _decompresser(chemin, destination):
+    with gzip.open(chemin, 'rb') as entree, open(destination, 'wb') as sortie:
+        shutil.copyfileobj(entree, sortie, TAILLE_BLOC)
+
+
+def _controler(chemin):
+    """Vérifie l'empreinte de l'instantané `chemin` ; lève SauvegardeInvalide"""
+    fichier_empreinte = Path(f'{chemin}.sha256')
+    if not fichier_empreinte.exists():
+        raise SauvegardeInvalide(f"Empreinte absente : {fichier_empreinte.name}")
+    attendue = fichier_empreinte.read_text(encoding='utf-8').split()[0]
+    if empreinte(chemin) != attendue:
+        raise SauvegardeInvalide(f"Empreinte SHA-256 différente pour {Path(chemin).name}")
+
+
+def _integrite(base):
+    try:
+        with closing(sqlite3.connect(f'file:{base}?mode=ro', uri=True)) as connexion:
+            resultat = connexion.execute('PRAGMA integrity_check').fetchone()[0]
+            tables = connexion.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        raise SauvegardeInvalide(f"Base invalide : {e}") from e
+    if resultat != 'ok':
+        raise SauvegardeInvalide(f"Base invalide : {resultat}")
+    return tables
+
+
+def verifier(chemin):
+    """
+    Vérifie l'instantané `chemin` : empreinte, décompression dans un fichier
+    de travail, intégrité SQLite. Lève SauvegardeInvalide ; retourne les mesures.
+    """
+    debut = time.perf_counter()
+    _controler(chemin)
+    with tempfile.TemporaryDirectory() as travail:
+        base = Path(travail) / 'verification.sqlite3'
+        try:
+            _decompresser(chemin, base)
+        except (OSError, EOFError) as e:
+            raise SauvegardeInvalide(f"Décompression impossible : {e}") from e
+        tables = _integrite(base)
+        taille = base.stat().st_size
+    return {'tables': tables, 'taille': taille, 'duree': time.perf_counter() - debut}
+
+
+def restaurer(chemin, destination):
+    """
+    Restaure l'instantané `chemin`, vérifié, dans le fichier `destination`,
+    qui ne doit pas être la base en service. Retourne les mesures.
+    """
+    destination = Path(destination)
+    if destination.resolve() == Path(settings.DATABASES['default']['NAME']).resolve():
+        raise ValueError("Restauration refusée par-dessus la base en service : choisir un autre fichier.")
+    debut = time.perf_counter()
+    _controler(chemin)
+    partiel = destination.with_name(destination.name + '.partiel')
+    _decompresser(chemin, partiel)
+    try:
+        tables = _integrite(partiel)
+    except SauvegardeInvalide:
+        partiel.unlink()
+        raise
+    os.replace(partiel, destination)
+    return {'tables': tables, 'taille': destination.stat().st_size, 'duree': time.perf_counter() - debut}
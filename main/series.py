@@ -0,0 +1,114 @@
+# main/series.py
+"""
+Séries de rendez-vous récurrents.
+
+Une série est développée en RendezVous concrets, liés par `serie` : les
+agendas, listes et exports les traitent comme n'importe quel RDV. Les
+créneaux de toutes les occurrences sont vérifiés en une passe
+(reservations.conflits_creneaux) avant un unique bulk_create ; une seule
+occurrence en conflit et rien n'est créé.
+
+Une fois créée, la série reste modifiable en bloc : heure, médecin ou motif
+des occurrences à venir (un bulk_update), ou annulation de la suite (un UPDATE).
+Dans les deux cas, les créneaux libérés vont à la liste d'attente.
+"""
+from copy import copy
+
+from django.db import IntegrityError
+from django.utils import timezone
+
+from . import liste_attente
+from .models import RendezVous
+from .reservations import (
+    STATUTS_A_VENIR, ConflitsCreneaux, conflits_creneaux, enregistrer_deplacements, transaction_ecriture,
+)
+
+# Champs de la série reportés sur ses occurrences à venir quand ils changent
+CHAMPS_OCCURRENCE = ['medecin', 'heure_rdv', 'motif']
+
+
+def occurrences(serie):
+    """RendezVous (non enregistrés) correspondant aux dates de la série"""
+    return [
+        RendezVous(serie=serie, patient=serie.patient, medecin=serie.medecin,
+                   date_rdv=jour, heure_rdv=serie.heure_rdv, motif=serie.motif)
+        for jour in serie.dates()
+    ]
+
+
+def conflits_serie(serie):
+    """Motifs de conflit des occurrences d'une série pas encore créée"""
+    return conflits_creneaux(occurrences(serie))
+
+
+def creer_serie(serie):
+    """
+    Enregistre `serie` et toutes ses occurrences, ou rien : lève
+    ConflitsCreneaux si un créneau est indisponible. Retourne les occurrences.
+    """
+    with transaction_ecriture():
+        rdvs = occurrences(serie)
+        if not rdvs:
+            raise ConflitsCreneaux(["aucune occurrence entre la date de début et la date de fin"])
+        conflits = conflits_creneaux(rdvs)
+        if conflits:
+            raise ConflitsCreneaux(conflits)
+        serie.save()
+        for rdv in rdvs:
+            rdv.serie = serie
+        try:
+            return RendezVous.objects.bulk_create(rdvs)
+        except IntegrityError as e:
+            raise ConflitsCreneaux(["créneau réservé pendant la création de la série"]) from e
+
+
+def suite(serie, a_partir_de=None):
+    """Occurrences à venir de la série, à partir de `a_partir_de` (aujourd'hui par défaut)"""
+    return serie.occurrences.filter(date_rdv__gte=a_partir_de or timezone.localdate(),
+                                    status__in=STATUTS_A_VENIR)
+
+
+def _suite_modifiee(serie, a_partir_de):
+    """Occurrences à venir portant les valeurs de `serie`, et leurs copies d'avant la modification"""
+    rdvs = list(suite(serie, a_partir_de).select_related('medecin'))
+    anciens = [copy(rdv) for rdv in rdvs]
+    for rdv in rdvs:
+        for champ in CHAMPS_OCCURRENCE:
+            setattr(rdv, champ, getattr(serie, champ))
+    return anciens, rdvs
+
+
+def conflits_modification(serie, a_partir_de=None):
+    """Motifs de conflit si les valeurs de `serie` (modifiées en mémoire) étaient reportées sur la suite"""
+    _, rdvs = _suite_modifiee(serie, a_partir_de)
+    return conflits_creneaux(rdvs, deplaces=[rdv.pk for rdv in rdvs])
+
+
+def modifier_suite(serie, a_partir_de=None):
+    """
+    Enregistre `serie`, dont l'heure, le médecin ou le motif ont été modifiés
+    en mémoire, et reporte ces valeurs sur les occurrences à venir. Tout ou
+    rien : lève ConflitsCreneaux. Retourne le nombre d'occurrences modifiées.
+    """
+    with transaction_ecriture():
+        anciens, rdvs = _suite_modifiee(serie, a_partir_de)
+        conflits = conflits_creneaux(rdvs, deplaces=[rdv.pk for rdv in rdvs])
+        if conflits:
+            raise ConflitsCreneaux(conflits)
+        serie.save()
+        if rdvs:
+            enregistrer_deplacements(rdvs, CHAMPS_OCCURRENCE)
+            liste_attente.combler_deplacements(anciens, rdvs)
+    return len(rdvs)
+
+
+def annuler_suite(series, a_partir_de=None):
+    """
+    Annule, en un UPDATE, les occurrences à venir des séries du queryset
+    `series` et attribue les créneaux libérés à la liste d'attente.
+    Retourne (nombre annulés, RDV attribués).
+    """
+    return liste_attente.annuler_rdvs(
+        RendezVous.objects.filter(serie__in=series, date_rdv__gte=a_partir_de or timezone.localdate(),
+                                  status__in=STATUTS_A_VENIR)
+    )
@@ -0,0 +1,13 @@
+from django import template
+
+from main.admin_echelle import hierarchie_dates
+
+register = template.Library()
+
+@register.inclusion_tag('admin/date_hierarchy.html')
+def date_hierarchy_indexee(cl):
+    """
+    Remplace le tag `date_hierarchy` de l'admin : mêmes liens, choix obtenus
+    par sondages indexés (voir main.admin_echelle.hierarchie_dates).
+    """
+    return hierarchie_dates(cl)
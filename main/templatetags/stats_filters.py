@@ -0,0 +1,12 @@
+from django import template
+
+register = template.Library()
+
+@register.filter(name='pourcentage')
+def pourcentage(valeur, decimales=1):
+    """
+    Affiche un ratio (0..1) en pourcentage, ou un tiret si la valeur est absente.
+    """
+    if valeur is None:
+        return '-'
+    return f"{valeur * 100:.{int(decimales)}f} %"
@@ -0,0 +1,129 @@
+"""
+Jeux de données de test à plusieurs échelles.
+
+`creer_donnees(echelle)` crée un cabinet complet (médecins, patients,
+infirmiers, secrétaires, RDV, séries de RDV, liste d'attente, consultations,
+prescriptions, soins, planning, constantes, journal des accès, profils) dont le volume est proportionnel à `echelle` :
+les tests de nombre de requêtes comparent deux échelles.
+"""
+from datetime import time, timedelta
+
+from django.utils import timezone
+
+from main.models import (
+    AccesDossier, Consultation, CustomUser, Infirmier, Medecin, MesureConstante, Patient,
+    DemandeAttente, Planning, Prescription, ProfilRequete, RendezVous, Secretaire, SerieRendezVous, SoinsInfirmier,
+)
+from main.series import occurrences
+
+MOT_DE_PASSE = 'motdepasse'
+
+
+def _utilisateur(username, role, **champs):
+    utilisateur = CustomUser(username=username, role=role, first_name=username.title(),
+                             last_name='Test', email=f'{username}@esco.test', **champs)
+    utilisateur.set_password(MOT_DE_PASSE)
+    return utilisateur
+
+
+def creer_donnees(echelle=1):
+    """
+    Crée les données et retourne un dict avec les utilisateurs de référence
+    ('medecin', 'patient', 'infirmier', 'secretaire', 'admin') utilisés par les tests.
+    """
+    aujourd_hui = timezone.localdate()
+    nb_patients = 4 * echelle
+    nb_medecins = 1 + echelle
+
+    medecins = CustomUser.objects.bulk_create([
+        _utilisateur(f'medecin{i}', 'docteur', specialite='Cardiologie' if i % 2 else 'Généraliste')
+        for i in range(nb_medecins)
+    ])
+    patients = CustomUser.objects.bulk_create([
+        _utilisateur(f'patient{i}', 'patient', poids=60 + i, taille=170, groupe_sanguin='O+',
+                     tension_systolique=120 + i, tension_diastolique=80,
+                     date_naissance=aujourd_hui.replace(year=aujourd_hui.year - 20 - i),
+                     allergies='Aucune', antecedents_medicaux='RAS', profil_complete=True)
+        for i in range(nb_patients)
+    ])
+    infirmiers = CustomUser.objects.bulk_create([_utilisateur(f'infirmier{i}', 'infirmier') for i in range(echelle)])
+    secretaires = CustomUser.objects.bulk_create([_utilisateur(f'secretaire{i}', 'secretaire') for i in range(echelle)])
+    infirmier, secretaire = infirmiers[0], secretaires[0]
+    admin = _utilisateur('admin', 'admin', is_staff=True, is_superuser=True)
+    admin.save()
+
+    Medecin.objects.bulk_create([Medecin(user=medecin, specialite=medecin.specialite) for medecin in medecins])
+    Patient.objects.bulk_create([Patient(user=patient, groupe_sanguin='O+') for patient in patients])
+    Infirmier.objects.bulk_create([Infirmier(user=utilisateur, service='Urgences') for utilisateur in infirmiers])
+    Secretaire.objects.bulk_create([Secretaire(user=utilisateur, service='Accueil') for utilisateur in secretaires])
+    Planning.objects.bulk_create([
+        Planning(user=medecin, jour=jour, heure_debut=time(8), heure_fin=time(12))
+        for medecin in medecins
+        for jour, _ in Planning.JOURS_SEMAINE[:5]
+    ])
+
+    # Chaque patient voit chaque médecin : RDV passés (consultés), du jour et à venir
+    rendez_vous = []
+    for i, patient in enumerate(patients):
+        for medecin in medecins:
+            for decalage, status in ((-30, 'termine'), (-7, 'termine'), (0, 'confirme'), (3, 'programme'), (10, 'annule')):
+                rendez_vous.append(RendezVous(
+                    patient=patient, medecin=medecin,
+                    date_rdv=aujourd_hui + timedelta(days=decalage),
+                    # Un créneau distinct par patient (contrainte rdv_creneau_unique)
+                    heure_rdv=time(8 + i // 2, 30 * (i % 2)),
+                    motif='Contrôle', status=status,
+                ))
+    rendez_vous = RendezVous.objects.bulk_create(rendez_vous)
+    # Une série hebdomadaire par patient avec le premier médecin, l'après-midi
+    series = SerieRendezVous.objects.bulk_create([
+        SerieRendezVous(patient=patient, medecin=medecins[0], heure_rdv=time(12 + i // 2, 30 * (i % 2)),
+                        motif='Pansement', date_debut=aujourd_hui + timedelta(days=2), nombre=3)
+        for i, patient in enumerate(patients)
+    ])
+    RendezVous.objects.bulk_create([rdv for serie in series for rdv in occurrences(serie)])
+    DemandeAttente.objects.bulk_create([
+        DemandeAttente(patient=patient, medecin=medecins[-1], specialite=medecins[-1].specialite, motif='Contrôle',
+                       date_min=aujourd_hui, date_max=aujourd_hui + timedelta(days=30))
+        for patient in patients
+    ])
+    Consultation.objects.bulk_create([
+        Consultation(rdv=rdv, symptomes='Fatigue', diagnostic='RAS', traitement='Repos')
+        for rdv in rendez_vous if rdv.status == 'termine'
+    ])
+    Prescription.objects.bulk_create([
+        Prescription(medecin=medecin, patient=patient, contenu='Paracétamol 1g')
+        for patient in patients
+        for medecin in medecins
+    ])
+    SoinsInfirmier.objects.bulk_create([
+        SoinsInfirmier(patient=patient, infirmier=infirmier, type_soin='injection',
+                       description='Injection', date_soin=timezone.now())
+        for patient in patients
+    ])
+    MesureConstante.objects.bulk_create([
+        MesureConstante(patient=patient, type_mesure=type_mesure, valeur=valeur,
+                        date_mesure=timezone.now() - timedelta(days=jours))
+        for patient in patients
+        for jours in range(3)
+        for type_mesure, valeur in (('poids', 70), ('tension_systolique', 125))
+    ])
+    AccesDossier.objects.bulk_create([
+        AccesDossier(utilisateur=medecin, patient=patient, action='dossier')
+        for patient in patients
+        for medecin in medecins
+    ])
+    ProfilRequete.objects.bulk_create([
+        ProfilRequete(utilisateur=admin, methode='GET', chemin=f'/medecin/dossier/{patient.pk}/', statut=200,
+                      mode='echantillons', duree_ms=12.5, nb_requetes=1, duree_sql_ms=0.4,
+                      requetes=[{'base': 'default', 'sql': 'SELECT 1', 'params': '()', 'duree_ms': 0.4}])
+        for patient in patients
+    ])
+
+    return {
+        'medecin': medecins[0],
+        'patient': patients[0],
+        'infirmier': infirmier,
+        'secretaire': secretaire,
+        'admin': admin,
+    }
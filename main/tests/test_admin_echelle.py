@@ -0,0 +1,99 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from main.admin_echelle import PaginateurPlafonne, _sondages, choix_medecins
+from main.models import CustomUser, Patient, RendezVous
+
+from .donnees import creer_donnees
+from .test_periodes import plan_requete
+
+
+def url_liste(model):
+    return reverse(f'esco_admin:main_{model._meta.model_name}_changelist')
+
+
+class AdminEchelleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees(2)
+        # Patient sans aucun rendez-vous
+        cls.sans_rdv = CustomUser.objects.create_user('isole', password='x', role='patient')
+        Patient.objects.create(user=cls.sans_rdv)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.utilisateurs['admin'])
+
+    def _liste(self, model, **parametres):
+        response = self.client.get(url_liste(model), parametres)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_filtre_patients_par_medecin(self):
+        cl = self._liste(Patient, medecin=self.utilisateurs['medecin'].pk)
+        attendus = set(RendezVous.objects.filter(medecin=self.utilisateurs['medecin']).values_list('patient', flat=True))
+        self.assertEqual({patient.user_id for patient in cl.result_list}, attendus)
+
+    def test_filtre_patients_avec_ou_sans_rdv(self):
+        avec = self._liste(Patient, avec_rdv='oui')
+        sans = self._liste(Patient, avec_rdv='non')
+        self.assertNotIn(self.sans_rdv.pk, {patient.user_id for patient in avec.result_list})
+        self.assertEqual([patient.user_id for patient in sans.result_list], [self.sans_rdv.pk])
+
+    def test_choix_medecins_en_cache(self):
+        self._liste(RendezVous)
+        with self.assertNumQueries(0):
+            choix = choix_medecins()
+        self.assertEqual(len(choix), CustomUser.objects.filter(role='docteur').count())
+
+    def test_hierarchie_dates_jours_non_vides(self):
+        aujourd_hui = timezone.localdate()
+        response = self.client.get(url_liste(RendezVous),
+                                   {'date_rdv__year': aujourd_hui.year, 'date_rdv__month': aujourd_hui.month})
+        du_mois = RendezVous.objects.filter(date_rdv__year=aujourd_hui.year, date_rdv__month=aujourd_hui.month)
+        jours = set(du_mois.values_list('date_rdv__day', flat=True))
+        # Un lien par jour ayant des RDV, aucun pour les autres
+        self.assertEqual(response.content.decode().count('date_rdv__day='), len(jours))
+        for jour in jours:
+            self.assertContains(response, f'date_rdv__day={jour}&amp;')
+        self.assertEqual(response.context['cl'].result_count, du_mois.count())
+
+    def test_sondages_par_intervalle(self):
+        aujourd_hui = timezone.localdate()
+        intervalles = [(aujourd_hui, aujourd_hui + timedelta(days=1)),
+                       (aujourd_hui + timedelta(days=1), aujourd_hui + timedelta(days=2))]
+        self.assertEqual(list(_sondages(RendezVous.objects.all(), 'date_rdv', False, intervalles)), [True, False])
+
+
+@override_settings(ESCO_ADMIN_GRANDE_ECHELLE=True)
+class AdminGrandeEchelleTests(AdminEchelleTests):
+
+    def test_recherche_par_prefixe(self):
+        cl = self._liste(RendezVous, q='PATIENT1')
+        self.assertTrue(cl.result_count)
+        self.assertTrue(all(rdv.patient.username.startswith('patient1') for rdv in cl.result_list))
+
+    def test_recherche_par_prefixe_indexee(self):
+        plan = ' '.join(plan_requete(CustomUser.objects.recherche_prefixe('dup')))
+        self.assertIn('user_username_nocase', plan)
+        self.assertIn('user_nom_nocase', plan)
+        self.assertIn('user_prenom_nocase', plan)
+
+    def test_comptage_plafonne(self):
+        with mock.patch.object(PaginateurPlafonne, 'plafond', 10):
+            response = self.client.get(url_liste(RendezVous))
+        self.assertEqual(response.context['cl'].result_count, 10)
+        self.assertIsNone(response.context['cl'].full_result_count)
+        self.assertContains(response, 'Plus de 10')
+
+    def test_autocompletion_limitee_au_role(self):
+        response = self.client.get(reverse('esco_admin:autocomplete'), {
+            'app_label': 'main', 'model_name': 'rendezvous', 'field_name': 'medecin', 'term': '',
+        })
+        ids = {int(resultat['id']) for resultat in response.json()['results']}
+        self.assertEqual(ids, set(CustomUser.objects.filter(role='docteur').values_list('pk', flat=True)))
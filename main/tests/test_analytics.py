@@ -0,0 +1,57 @@
+from datetime import date, datetime, time, timezone as dt_timezone
+
+import numpy as np
+
+from django.test import TestCase, override_settings
+
+from main import analytics
+from main.models import CustomUser, Planning, RendezVous
+
+
+@override_settings(TIME_ZONE='Europe/Paris')
+class StatistiquesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medecin = CustomUser.objects.create(username='medecin', role='docteur', specialite='Cardiologie')
+        cls.patient = CustomUser.objects.create(username='patient', role='patient')
+
+    def _rdv(self, jour, heure, cree_le_utc, status='programme'):
+        rdv = RendezVous.objects.create(patient=self.patient, medecin=self.medecin, date_rdv=jour,
+                                        heure_rdv=heure, motif='Contrôle', status=status)
+        RendezVous.objects.filter(pk=rdv.pk).update(created_at=cree_le_utc)
+        return rdv
+
+    def test_delai_avec_changement_d_heure(self):
+        # Pris la veille à 10 h heure de Paris : en hiver (UTC+1) puis en été (UTC+2)
+        self._rdv(date(2030, 1, 16), time(10), datetime(2030, 1, 15, 9, tzinfo=dt_timezone.utc))
+        self._rdv(date(2030, 7, 16), time(10), datetime(2030, 7, 15, 8, tzinfo=dt_timezone.utc))
+        # Pris le samedi 10 h (UTC+1) pour le lundi 10 h, après le passage à l'heure d'été
+        self._rdv(date(2030, 4, 1), time(10), datetime(2030, 3, 30, 9, tzinfo=dt_timezone.utc))
+
+        stats = analytics.calculer_statistiques(date(2030, 1, 1), date(2030, 12, 31))
+        self.assertEqual(stats['delai']['moyenne_jours'], round(4 / 3, 3))
+        self.assertEqual(stats['delai']['mediane_jours'], 1.0)
+
+    def test_taux_et_occupation(self):
+        lundi = date(2024, 1, 8)
+        Planning.objects.create(user=self.medecin, jour='lundi', heure_debut=time(8), heure_fin=time(10))
+        cree = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        self._rdv(lundi, time(8), cree, 'termine')
+        self._rdv(lundi, time(8, 30), cree, 'programme')  # passé, non honoré
+        self._rdv(lundi, time(9), cree, 'annule')
+
+        stats = analytics.calculer_statistiques(lundi, lundi)
+        self.assertEqual((stats['total'], stats['annules'], stats['non_honores']), (3, 1, 1))
+        self.assertEqual(stats['taux_annulation'], round(1 / 3, 3))
+        self.assertEqual(stats['taux_absence'], 0.5)
+        # 4 créneaux de 30 minutes le lundi, 2 RDV non annulés
+        self.assertEqual(stats['taux_occupation'], 0.5)
+        medecin, = stats['par_medecin']
+        self.assertEqual((medecin['specialite'], medecin['creneaux']), ('Cardiologie', 4))
+        self.assertEqual(stats['par_jour'][0]['total'], 3)
+
+    def test_decalages_locaux(self):
+        # Passage à l'heure d'été à Paris le 31 mars 2030 à 1 h UTC
+        instants = [datetime(2030, 3, 31, 0, 59, tzinfo=dt_timezone.utc), datetime(2030, 3, 31, 1, tzinfo=dt_timezone.utc)]
+        decalages = analytics._decalages_locaux(np.asarray([int(instant.timestamp()) for instant in instants]))
+        self.assertEqual(decalages.tolist(), [3600, 7200])
@@ -0,0 +1,107 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from main import archivage, export_colonnes
+from main.models import (
+    Consultation, ConsultationArchive, DemandeAttente, MesureConstante, RendezVous, RendezVousArchive,
+    SoinsInfirmier, SoinsInfirmierArchive,
+)
+
+from .donnees import creer_donnees
+
+# Les RDV de test sont à J-30, J-7, J0, J+3 et J+10 : un horizon de 10 jours archive ceux de J-30
+HORIZON = 10
+
+
+class ArchivageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+        cls.anciens = set(RendezVous.objects.filter(date_rdv__lt=archivage.date_limite(HORIZON))
+                          .values_list('pk', flat=True))
+        cls.soin = SoinsInfirmier.objects.create(
+            patient=cls.utilisateurs['patient'], infirmier=cls.utilisateurs['infirmier'], type_soin='pansement',
+            description='Pansement', date_soin=timezone.now() - timedelta(days=400),
+        )
+
+    def test_archivage_par_lots(self):
+        nb_consultations = Consultation.objects.filter(rdv__in=self.anciens).count()
+        ancien = RendezVous.objects.filter(pk__in=self.anciens).first()
+        demande = DemandeAttente.objects.first()
+        DemandeAttente.objects.filter(pk=demande.pk).update(statut='attribuee', rdv=ancien)
+
+        lots = []
+        bilan = archivage.archiver(HORIZON, taille_lot=3, apres_lot=lambda bilan: lots.append(bilan['lots']))
+        self.assertEqual(bilan['rendez_vous'], len(self.anciens))
+        self.assertEqual(bilan['consultations'], nb_consultations)
+        self.assertEqual(bilan['soins'], 1)
+        self.assertGreater(len(lots), 2)
+
+        # Mêmes id, rien ne reste dans les tables chaudes
+        self.assertEqual(set(RendezVousArchive.objects.values_list('pk', flat=True)), self.anciens)
+        self.assertFalse(RendezVous.objects.filter(pk__in=self.anciens).exists())
+        self.assertEqual(ConsultationArchive.objects.count(), nb_consultations)
+        self.assertEqual(SoinsInfirmierArchive.objects.count(), 1)
+        self.assertEqual(RendezVousArchive.objects.get(pk=ancien.pk).motif, ancien.motif)
+        self.assertIsNone(DemandeAttente.objects.get(pk=demande.pk).rdv)
+
+        # Rien de plus à archiver
+        self.assertEqual(archivage.archiver(HORIZON)['lots'], 0)
+
+    def test_soin_avec_mesures(self):
+        mesure = MesureConstante.objects.create(patient=self.utilisateurs['patient'], soin=self.soin,
+                                                type_mesure='temperature', valeur=37.2,
+                                                date_mesure=self.soin.date_soin)
+        self.assertEqual(archivage.archiver(HORIZON)['soins'], 1)
+        connection.check_constraints()
+        mesure.refresh_from_db()
+        self.assertIsNone(mesure.soin_id)
+        self.assertEqual(mesure.valeur, 37.2)
+        self.assertTrue(SoinsInfirmierArchive.objects.filter(pk=self.soin.pk).exists())
+
+    def test_dossiers_lisent_l_historique_complet(self):
+        patient, medecin = self.utilisateurs['patient'], self.utilisateurs['medecin']
+        self.client.force_login(patient)
+        avant = self.client.get(reverse('mon_dossier_medical')).context['stats']
+        self.client.force_login(medecin)
+        dossier_avant = self.client.get(reverse('dossier_patient', args=[patient.pk])).context['stats']
+
+        archivage.archiver(HORIZON)
+
+        self.client.force_login(patient)
+        apres = self.client.get(reverse('mon_dossier_medical')).context['stats']
+        self.assertEqual(apres['total_rdv'], avant['total_rdv'])
+        self.assertEqual(apres['total_consultations'], avant['total_consultations'])
+        self.client.force_login(medecin)
+        response = self.client.get(reverse('dossier_patient', args=[patient.pk]))
+        self.assertEqual(response.context['stats']['total_rdv'], dossier_avant['total_rdv'])
+        self.assertIsInstance(response.context['stats']['premier_rdv'], RendezVousArchive)
+        self.assertEqual(response.context['stats']['premier_rdv'].pk, dossier_avant['premier_rdv'].pk)
+        self.assertEqual(len(response.context['rdv_list']), min(10, dossier_avant['total_rdv']))
+
+    def test_export_inchange(self):
+        def ids(table):
+            lots = export_colonnes.lire_lots(table)
+            dictionnaires = next(lots)
+            return dictionnaires, sorted(int(i) for lot in lots for i in lot['id'][0])
+
+        avant = {table: ids(table) for table in ('rendezvous', 'consultation', 'soins')}
+        archivage.archiver(HORIZON)
+        for table, resultat in avant.items():
+            self.assertEqual(ids(table), resultat, table)
+
+    def test_commande(self):
+        sortie = StringIO()
+        call_command('archiver', horizon=HORIZON, simulation=True, stdout=sortie)
+        self.assertIn(f"{len(self.anciens)} rendez_vous", sortie.getvalue())
+        self.assertEqual(RendezVousArchive.objects.count(), 0)
+
+        call_command('archiver', horizon=HORIZON, stdout=sortie)
+        self.assertIn(f"{len(self.anciens)} RDV", sortie.getvalue())
+        self.assertEqual(RendezVousArchive.objects.count(), len(self.anciens))
@@ -0,0 +1,131 @@
+import time
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from main import audit, metriques
+from main.admin import admin_site
+from main.models import AccesDossier, Prescription, RendezVous
+
+from .donnees import creer_donnees
+
+
+class JournalAccesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+
+    def setUp(self):
+        # Les autres tests laissent des événements en file (pas de thread pendant les tests)
+        audit.reinitialiser()
+        AccesDossier.objects.all().delete()
+
+    def _acces(self):
+        return list(AccesDossier.objects.order_by('pk').values_list('utilisateur', 'patient', 'action', 'objet'))
+
+    def test_vues_mettent_en_file_sans_ecrire(self):
+        medecin, patient = self.utilisateurs['medecin'], self.utilisateurs['patient']
+        prescription = Prescription.objects.filter(patient=patient).first()
+        self.client.force_login(medecin)
+        self.client.get(reverse('dossier_patient', args=[patient.pk]))
+        # L'accès à une ordonnance est journalisé quand sa page est envoyée
+        b''.join(self.client.get(reverse('imprimer_prescription', args=[prescription.pk])).streaming_content)
+        self.client.force_login(patient)
+        self.client.get(reverse('mon_dossier_medical'))
+        self.client.get(reverse('download_my_dossier_pdf'))
+        self.assertEqual(AccesDossier.objects.count(), 0)
+
+        self.assertEqual(audit.vider(), 4)
+        self.assertEqual(self._acces(), [
+            (medecin.pk, patient.pk, 'dossier', ''),
+            (medecin.pk, patient.pk, 'ordonnance', f'Prescription {prescription.pk}'),
+            (patient.pk, patient.pk, 'dossier', ''),
+            (patient.pk, patient.pk, 'pdf', ''),
+        ])
+        self.assertEqual(AccesDossier.objects.first().adresse_ip, '127.0.0.1')
+
+    def test_fiches_de_l_administration(self):
+        rdv = RendezVous.objects.filter(patient=self.utilisateurs['patient']).first()
+        self.client.force_login(self.utilisateurs['admin'])
+        self.client.get(reverse('esco_admin:main_rendezvous_change', args=[rdv.pk]))
+        self.client.get(reverse('esco_admin:main_customuser_change', args=[self.utilisateurs['patient'].pk]))
+        self.client.get(reverse('esco_admin:main_customuser_change', args=[self.utilisateurs['medecin'].pk]))
+        audit.vider()
+        self.assertEqual([ligne[1:3] for ligne in self._acces()],
+                         [(self.utilisateurs['patient'].pk, 'admin')] * 2)
+
+    @override_settings(ESCO_AUDIT_FILE_MAX=3)
+    def test_file_pleine_sans_ecriture_par_la_requete(self):
+        audit.reinitialiser()
+        metriques.reinitialiser()
+        self.addCleanup(metriques.reinitialiser)
+        requete = RequestFactory().get('/')
+        requete.user = self.utilisateurs['medecin']
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                audit.enregistrer(requete, self.utilisateurs['patient'].pk, 'dossier')
+        # Les événements en trop sont abandonnés et comptés
+        self.assertEqual(metriques.instantane()[('esco_audit_perdus_total', ())], 2)
+        self.assertEqual(audit.vider(), 3)
+
+    def test_lot_en_echec_garde(self):
+        requete = RequestFactory().get('/')
+        requete.user = self.utilisateurs['medecin']
+        for _ in range(2):
+            audit.enregistrer(requete, self.utilisateurs['patient'].pk, 'dossier')
+        with mock.patch.object(audit, '_ecrire', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('main.audit', 'ERROR'):
+            self.assertEqual(audit.vider(), 0)
+        self.assertEqual(len(audit._etat['en_echec']), 2)
+        audit.enregistrer(requete, self.utilisateurs['patient'].pk, 'pdf')
+        self.assertEqual(audit.vider(), 3)
+        self.assertEqual(AccesDossier.objects.count(), 3)
+
+    def test_liste_par_patient_et_par_utilisateur(self):
+        audit.reinitialiser()
+        medecin, patient = self.utilisateurs['medecin'], self.utilisateurs['patient']
+        creer = [AccesDossier(utilisateur=medecin, patient=patient, action='dossier'),
+                 AccesDossier(utilisateur=patient, patient=patient, action='pdf'),
+                 AccesDossier(utilisateur=medecin, patient=self.utilisateurs['admin'], action='admin')]
+        AccesDossier.objects.bulk_create(creer)
+        url = reverse(f'{admin_site.name}:main_accesdossier_changelist')
+        self.client.force_login(self.utilisateurs['admin'])
+        self.assertEqual(self.client.get(url, {'patient': patient.pk}).context['cl'].result_count, 2)
+        self.assertEqual(self.client.get(url, {'utilisateur': medecin.pk}).context['cl'].result_count, 2)
+        # Journal en lecture seule
+        acces = AccesDossier.objects.first()
+        response = self.client.post(reverse(f'{admin_site.name}:main_accesdossier_delete', args=[acces.pk]))
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(ESCO_AUDIT_ASYNCHRONE=True)
+@mock.patch.object(audit, 'INTERVALLE', 0.05)
+class EcrivainTests(TransactionTestCase):
+    def setUp(self):
+        audit.reinitialiser()
+        self.addCleanup(audit.reinitialiser)
+        self.utilisateurs = creer_donnees()
+        self.requete = RequestFactory().get('/')
+        self.requete.user = self.utilisateurs['medecin']
+
+    def test_ecriture_en_arriere_plan_et_a_l_arret(self):
+        patient = self.utilisateurs['patient']
+        initial = AccesDossier.objects.count()
+        for _ in range(3):
+            audit.enregistrer(self.requete, patient.pk, 'dossier')
+        ecrivain = audit._etat['ecrivain']
+        self.assertTrue(ecrivain.is_alive())
+        limite = time.monotonic() + 5
+        while AccesDossier.objects.count() < initial + 3 and time.monotonic() < limite:
+            time.sleep(0.02)
+        self.assertEqual(AccesDossier.objects.count(), initial + 3)
+
+        # À l'arrêt, le thread s'arrête et ce qui reste en file est écrit
+        with mock.patch.object(audit, 'INTERVALLE', 60):
+            audit.arreter()
+            audit.enregistrer(self.requete, patient.pk, 'pdf')
+            audit.arreter()
+        self.assertFalse(ecrivain.is_alive())
+        self.assertEqual(AccesDossier.objects.filter(action='pdf').count(), 1)
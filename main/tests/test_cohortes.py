@@ -0,0 +1,49 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from main.models import CustomUser
+
+
+class CohorteApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medecin = CustomUser.objects.create(username='medecin', role='docteur')
+        cls.patient = CustomUser.objects.create(username='patient0', role='patient', last_name='P00',
+                                                groupe_sanguin='A+')
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'patient{i}', role='patient', last_name=f'P{i:02d}',
+                       groupe_sanguin='O+' if i % 2 else 'A+')
+            for i in range(1, 12)
+        ])
+        CustomUser.objects.create(username='inactif', role='patient', groupe_sanguin='O+', is_active=False)
+
+    def setUp(self):
+        self.client.force_login(self.medecin)
+
+    def _api(self, **parametres):
+        return self.client.get(reverse('cohorte_patients_api'), parametres)
+
+    def test_reserve_aux_medecins(self):
+        self.client.force_login(self.patient)
+        self.assertEqual(self._api().status_code, 403)
+
+    def test_criteres_invalides(self):
+        reponse = self._api(age_min='-3')
+        self.assertEqual(reponse.status_code, 400)
+        self.assertIn('age_min', reponse.json()['details'])
+
+    def test_filtre_et_pagination(self):
+        donnees = self._api(groupe_sanguin='O+', taille='2', page='2').json()
+        self.assertEqual((donnees['total'], donnees['page'], donnees['pages']), (6, 2, 3))
+        self.assertEqual([ligne['last_name'] for ligne in donnees['resultats']], ['P05', 'P07'])
+
+    def test_taille_bornee(self):
+        for taille, attendue in [('0', 1), ('-5', 1), ('1000', 500), ('abc', 50), ('', 50), ('3', 3)]:
+            with self.subTest(taille=taille):
+                reponse = self._api(taille=taille)
+                self.assertEqual(reponse.status_code, 200)
+                self.assertEqual(len(reponse.json()['resultats']), min(attendue, 12))
+
+    def test_taille_par_defaut(self):
+        donnees = self._api().json()
+        self.assertEqual((donnees['total'], donnees['pages'], len(donnees['resultats'])), (12, 1, 12))
@@ -0,0 +1,125 @@
+import json
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from main import constantes
+from main.models import CustomUser, MesureConstante, SoinsInfirmier
+
+from .donnees import creer_donnees
+
+
+class TourneeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+        cls.patients = list(CustomUser.objects.filter(role='patient').order_by('pk')[:2])
+
+    def test_enregistrement_en_bloc(self):
+        infirmier = self.utilisateurs['infirmier']
+        avant = SoinsInfirmier.objects.count()
+        soins = constantes.enregistrer_tournee(infirmier, [
+            {'patient': self.patients[0], 'mesures': {'poids': '72.5', 'temperature': 37.2}},
+            {'patient': self.patients[1].pk, 'mesures': {'saturation': 98, 'glycemie': ''}, 'observations': 'RAS'},
+            {'patient': self.patients[1].pk, 'mesures': {'poids': None}},  # rien de mesuré : ignoré
+        ])
+        self.assertEqual(len(soins), 2)
+        self.assertEqual(SoinsInfirmier.objects.count(), avant + 2)
+        soin = SoinsInfirmier.objects.get(pk=soins[0].pk)
+        self.assertEqual((soin.type_soin, soin.description), ('prise_constantes', 'Poids (kg): 72.5, Température (°C): 37.2'))
+        self.assertEqual(sorted(soin.constantes.values_list('type_mesure', 'valeur')),
+                         [('poids', 72.5), ('temperature', 37.2)])
+        self.assertEqual(list(SoinsInfirmier.objects.get(pk=soins[1].pk).constantes.values_list('patient', 'type_mesure')),
+                         [(self.patients[1].pk, 'saturation')])
+
+    def test_type_inconnu_refuse_sans_ecriture(self):
+        avant = (SoinsInfirmier.objects.count(), MesureConstante.objects.count())
+        with self.assertRaisesMessage(ValueError, 'pouls'):
+            constantes.enregistrer_tournee(self.utilisateurs['infirmier'], [
+                {'patient': self.patients[0], 'mesures': {'poids': 70}},
+                {'patient': self.patients[1], 'mesures': {'pouls': 80}},
+            ])
+        self.assertEqual((SoinsInfirmier.objects.count(), MesureConstante.objects.count()), avant)
+
+    def test_vue_tournee(self):
+        url = reverse('tournee_constantes')
+        corps = {'releves': [{'patient': self.patients[0].pk, 'mesures': {'poids': 71},
+                              'date': '2025-03-12T08:30:00'}]}
+        self.client.force_login(self.utilisateurs['medecin'])
+        self.assertEqual(self.client.post(url, corps, content_type='application/json').status_code, 403)
+
+        self.client.force_login(self.utilisateurs['infirmier'])
+        response = self.client.post(url, corps, content_type='application/json')
+        self.assertEqual((response.status_code, response.json()), (201, {'soins_crees': 1}))
+        mesure = MesureConstante.objects.latest('pk')
+        self.assertEqual(timezone.localtime(mesure.date_mesure).replace(tzinfo=None), datetime(2025, 3, 12, 8, 30))
+
+        for releves in ([{'patient': self.patients[0].pk, 'mesures': {'pouls': 80}}],
+                        [{'patient': self.utilisateurs['medecin'].pk, 'mesures': {'poids': 80}}],
+                        [{'mesures': {'poids': 80}}]):
+            with self.subTest(releves=releves):
+                response = self.client.post(url, json.dumps({'releves': releves}), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(url, 'pas du json', content_type='application/json').status_code, 400)
+
+    def test_vue_tournee_corps_mal_forme(self):
+        url = reverse('tournee_constantes')
+        self.client.force_login(self.utilisateurs['infirmier'])
+        avant = SoinsInfirmier.objects.count()
+        for corps in ('[1, 2]', '{"releves": 3}', '{"releves": ["releve"]}',
+                      json.dumps({'releves': [{'patient': self.patients[0].pk, 'mesures': [71]}]}),
+                      # json.loads accepte NaN et Infinity
+                      '{"releves": [{"patient": %d, "mesures": {"poids": NaN}}]}' % self.patients[0].pk,
+                      '{"releves": [{"patient": %d, "mesures": {"poids": Infinity}}]}' % self.patients[0].pk):
+            with self.subTest(corps=corps):
+                response = self.client.post(url, corps, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(SoinsInfirmier.objects.count(), avant)
+
+    def test_valeur_non_finie_refusee(self):
+        for valeur in ('nan', float('inf'), '-inf'):
+            with self.subTest(valeur=valeur), self.assertRaisesMessage(ValueError, 'non finie'):
+                constantes.enregistrer_tournee(self.utilisateurs['infirmier'], [
+                    {'patient': self.patients[0], 'mesures': {'temperature': valeur}},
+                ])
+        with self.assertRaisesMessage(ValueError, 'mal formé'):
+            constantes.enregistrer_tournee(self.utilisateurs['infirmier'], [
+                {'patient': self.patients[0], 'mesures': ['poids', 70]},
+            ])
+
+
+class SerieTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+        cls.patient = CustomUser.objects.create(username='suivi', role='patient')
+        debut = timezone.now() - timedelta(days=2)
+        MesureConstante.objects.bulk_create([
+            MesureConstante(patient=cls.patient, type_mesure='temperature', valeur=36 + i / 10,
+                            date_mesure=debut + timedelta(hours=i))
+            for i in range(10)
+        ])
+
+    def test_serie_json(self):
+        url = reverse('constantes_patient', args=[self.patient.pk])
+        self.client.force_login(self.utilisateurs['medecin'])
+        response = self.client.get(url, {'type': 'temperature'})
+        self.assertEqual(response.status_code, 200)
+        donnees = response.json()
+        self.assertEqual(sum(point['nombre'] for point in donnees['points']), 10)
+        self.assertEqual(min(point['min'] for point in donnees['points']), 36)
+        self.assertEqual(donnees['derniere']['valeur'], 36.9)
+        # Regroupées en au plus 2 points : par jour
+        response = self.client.get(url, {'type': 'temperature', 'points': 2})
+        self.assertLessEqual(len(response.json()['points']), 3)
+
+    def test_serie_refusee(self):
+        url = reverse('constantes_patient', args=[self.patient.pk])
+        self.client.force_login(self.utilisateurs['patient'])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.utilisateurs['infirmier'])
+        self.assertEqual(self.client.get(url, {'type': 'pouls'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'debut': 'hier'}).status_code, 400)
+        self.assertIsNone(self.client.get(url, {'type': 'poids'}).json()['derniere'])
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import TestCase
+from django.urls import reverse
+
+from main.management.commands.profil_demarrage import code_scenario
+
+from .donnees import creer_donnees
+
+
+class DemarrageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+
+    def test_worker_ne_charge_pas_les_modules_lourds(self):
+        # Interpréteur neuf : le processus de test a pu importer reportlab
+        resultat = subprocess.run([sys.executable, '-c', code_scenario('worker')], cwd=settings.BASE_DIR,
+                                  capture_output=True, text=True, check=True)
+        self.assertEqual(resultat.stdout.strip(), '')
+
+    def test_telechargement_pdf_differe(self):
+        self.client.force_login(self.utilisateurs['patient'])
+        response = self.client.get(reverse('download_my_dossier_pdf'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
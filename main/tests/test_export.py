@@ -0,0 +1,75 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.admin import helpers
+from django.core.management import call_command
+from django.test import TestCase
+
+from main import export_colonnes
+from main.models import Consultation, CustomUser, Prescription, RendezVous, SoinsInfirmier
+
+from .donnees import creer_donnees
+from .test_admin_echelle import url_liste
+
+
+class ExportAnalytiqueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+
+    def setUp(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        self.sortie = dossier.name
+
+    def _exporter(self, *options):
+        sortie = StringIO()
+        call_command('export_analytique', '--sortie', self.sortie, '--format', 'npz', *options, stdout=sortie)
+        return sortie.getvalue()
+
+    def _ids(self, table):
+        return sorted(export_colonnes.charger_npz(os.path.join(self.sortie, table)).get('id', []))
+
+    def test_export_complet(self):
+        sortie = self._exporter()
+        self.assertIn('Export terminé', sortie)
+        attendus = {
+            'rendezvous': RendezVous.objects.all(),
+            'consultation': Consultation.objects.all(),
+            'prescription': Prescription.objects.all(),
+            'soins': SoinsInfirmier.objects.all(),
+            'patients': CustomUser.objects.filter(role='patient'),
+        }
+        for table, queryset in attendus.items():
+            with self.subTest(table=table):
+                self.assertEqual(self._ids(table), sorted(queryset.values_list('pk', flat=True)))
+
+    def test_incremental_apres_action_admin(self):
+        self._exporter()
+        rdv = RendezVous.objects.exclude(status='confirme').exclude(status='annule').first()
+        self.client.force_login(self.utilisateurs['admin'])
+        self.client.post(url_liste(RendezVous), {'action': 'marquer_confirme',
+                                                 helpers.ACTION_CHECKBOX_NAME: [rdv.pk]})
+        self.assertEqual(RendezVous.objects.get(pk=rdv.pk).status, 'confirme')
+
+        sortie = self._exporter('--table', 'rendezvous', '--table', 'consultation')
+        self.assertIn('depuis', sortie)
+        rdvs = export_colonnes.charger_npz(os.path.join(self.sortie, 'rendezvous'))
+        # Fichier complet puis fichier incrémental : la dernière version du RDV est confirmée
+        self.assertEqual(list(rdvs['id']).count(rdv.pk), 2)
+        self.assertEqual(rdvs['status'][-1], 'confirme')
+        self.assertEqual(self._ids('consultation'), sorted(Consultation.objects.values_list('pk', flat=True)))
+
+    def test_complet_remplace_les_fichiers(self):
+        self._exporter('--table', 'rendezvous')
+        self._exporter('--table', 'rendezvous', '--complet')
+        self.assertEqual(len(os.listdir(os.path.join(self.sortie, 'rendezvous'))), 1)
+        self.assertEqual(self._ids('rendezvous'), sorted(RendezVous.objects.values_list('pk', flat=True)))
+
+    def test_lots(self):
+        self._exporter('--table', 'rendezvous', '--table', 'patients', '--lot', '3')
+        self.assertEqual(self._ids('rendezvous'), sorted(RendezVous.objects.values_list('pk', flat=True)))
+        self.assertEqual(self._ids('patients'),
+                         sorted(CustomUser.objects.filter(role='patient').values_list('pk', flat=True)))
+        self.assertGreater(len(os.listdir(os.path.join(self.sortie, 'rendezvous'))), 1)
@@ -0,0 +1,100 @@
+from datetime import date
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from main.models import CustomUser, _date_il_y_a
+
+AUJOURDHUI = date(2025, 3, 12)
+
+TENSIONS = {
+    'tension_normale': (119, 89), 'tension_elevee': (120, 70), 'presque_hypertendu': (139, 89),
+    'systolique_haute': (140, 60), 'diastolique_haute': (110, 90), 'tension_inconnue': (None, None),
+}
+
+
+class DateIlYATests(SimpleTestCase):
+    def test_29_fevrier(self):
+        self.assertEqual(_date_il_y_a(18, date(2025, 3, 12)), date(2007, 3, 12))
+        self.assertEqual(_date_il_y_a(1, date(2024, 2, 29)), date(2023, 2, 28))
+
+
+@mock.patch('django.utils.timezone.localdate', return_value=AUJOURDHUI)
+class AgeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        naissances = {
+            'dix_huit': date(2007, 3, 12),  # 18 ans aujourd'hui
+            'dix_sept': date(2007, 3, 13),  # 18 ans demain
+            'soixante': date(1965, 3, 12),
+            'cinquante_neuf': date(1965, 3, 13),
+            'nouveau_ne': AUJOURDHUI,
+            'inconnu': None,
+        }
+        for nom, naissance in naissances.items():
+            CustomUser.objects.create(username=nom, role='patient', date_naissance=naissance)
+
+    def _par_nom(self, queryset):
+        return set(queryset.values_list('username', flat=True))
+
+    def test_age_et_tranche_annotes(self, _):
+        indicateurs = {u.username: (u.age, u.tranche_age) for u in CustomUser.objects.avec_indicateurs()}
+        self.assertEqual(indicateurs, {
+            'dix_huit': (18, '18-39'),
+            'dix_sept': (17, '0-17'),
+            'soixante': (60, '60+'),
+            'cinquante_neuf': (59, '40-59'),
+            'nouveau_ne': (0, '0-17'),
+            'inconnu': (None, None),
+        })
+
+    def test_filtres_sur_les_bornes(self, _):
+        utilisateurs = CustomUser.objects.all()
+        self.assertEqual(self._par_nom(utilisateurs.age_entre(18, 59)), {'dix_huit', 'cinquante_neuf'})
+        self.assertEqual(self._par_nom(utilisateurs.age_entre(age_min=60)), {'soixante'})
+        self.assertEqual(self._par_nom(utilisateurs.age_entre(age_max=17)), {'dix_sept', 'nouveau_ne'})
+        self.assertEqual(self._par_nom(utilisateurs.tranche_age('40-59')), {'cinquante_neuf'})
+        self.assertFalse(utilisateurs.tranche_age('inconnue').exists())
+
+
+class ColonnesCalculeesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Taille de 100 cm : l'IMC vaut le poids
+        mesures = {
+            'maigre': (18.4, 100), 'normal_bas': (18.5, 100), 'surpoids_bas': (25, 100), 'obese_bas': (30, 100),
+            'reel': (70, 175), 'sans_taille': (70, None), 'sans_poids': (None, 175), 'taille_nulle': (70, 0),
+        }
+        for nom, (poids, taille) in mesures.items():
+            CustomUser.objects.create(username=nom, role='patient', poids=poids, taille=taille)
+        for nom, (systolique, diastolique) in TENSIONS.items():
+            CustomUser.objects.create(username=nom, role='patient', tension_systolique=systolique,
+                                      tension_diastolique=diastolique)
+
+    def test_imc_et_categorie(self):
+        valeurs = {u.username: (u.imc, u.categorie_imc)
+                   for u in CustomUser.objects.avec_indicateurs().filter(tension_systolique__isnull=True)}
+        self.assertEqual(valeurs, {
+            'maigre': (18.4, 'insuffisance'),
+            'normal_bas': (18.5, 'normal'),
+            'surpoids_bas': (25.0, 'surpoids'),
+            'obese_bas': (30.0, 'obesite'),
+            'reel': (22.9, 'normal'),
+            'sans_taille': (None, None),
+            'sans_poids': (None, None),
+            'taille_nulle': (None, None),
+            'tension_inconnue': (None, None),
+        })
+        self.assertEqual(set(CustomUser.objects.categorie_imc('normal').values_list('username', flat=True)),
+                         {'normal_bas', 'reel'})
+
+    def test_categorie_tension(self):
+        categories = dict(CustomUser.objects.filter(username__in=TENSIONS).values_list('username', 'categorie_tension'))
+        self.assertEqual(categories, {
+            'tension_normale': 'normale',
+            'tension_elevee': 'elevee',
+            'presque_hypertendu': 'elevee',
+            'systolique_haute': 'hypertension',
+            'diastolique_haute': 'hypertension',
+            'tension_inconnue': None,
+        })
@@ -0,0 +1,110 @@
+import json
+import logging
+import tempfile
+import threading
+from pathlib import Path
+
+from django.contrib.admin import helpers
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from main import metriques
+from main.journalisation import FormatJSON, JournalEnFile
+from main.models import DemandeAttente
+
+from .donnees import creer_donnees
+
+
+class JournalEnFileTests(SimpleTestCase):
+    def setUp(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        self.chemin = Path(dossier.name) / 'logs' / 'esco.log'
+        self.logger = logging.getLogger('esco.test_journalisation')
+        self.logger.propagate = False
+        self.addCleanup(setattr, self.logger, 'propagate', True)
+
+    def _handler(self, **options):
+        handler = JournalEnFile(self.chemin, **options)
+        handler.setFormatter(FormatJSON())
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+        return handler
+
+    def test_json_ecrit_par_le_thread_d_ecoute(self):
+        handler = self._handler()
+        threads = []
+        emit = handler.fichier.emit
+        handler.fichier.emit = lambda record: (threads.append(threading.current_thread()), emit(record))
+
+        valeurs = {'n': 1}
+        self.logger.warning("Valeur %(n)s", valeurs, extra={'utilisateur': 7})
+        valeurs['n'] = 2  # le message est figé au moment de l'appel
+        try:
+            raise ValueError("boum")
+        except ValueError:
+            self.logger.exception("Échec")
+        handler.arreter()
+
+        lignes = [json.loads(ligne) for ligne in self.chemin.read_text(encoding='utf-8').splitlines()]
+        self.assertEqual([ligne['message'] for ligne in lignes], ["Valeur 1", "Échec"])
+        self.assertEqual(lignes[0]['utilisateur'], 7)
+        self.assertEqual(lignes[0]['niveau'], 'WARNING')
+        self.assertIn('ValueError: boum', lignes[1]['exception'])
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_file_pleine_sans_blocage(self):
+        metriques.reinitialiser()
+        self.addCleanup(metriques.reinitialiser)
+        handler = self._handler(taille_file=1)
+        handler.ecoute.stop()
+        for _ in range(3):
+            self.logger.warning("message")
+        self.assertEqual(handler.perdus, 2)
+        self.assertEqual(metriques.instantane()[('esco_journal_perdus_total', ())], 2)
+
+    def test_fichier_commun_et_rotation_externe(self):
+        # Deux workers sur le même fichier, renommé entre-temps par logrotate
+        workers = [self._handler(), self._handler()]
+
+        def ecrire(message):
+            for numero, handler in enumerate(workers):
+                handler.handle(self.logger.makeRecord(self.logger.name, logging.WARNING, __file__, 0,
+                                                      f'{message} {numero}', None, None))
+                handler.queue.join()
+
+        ecrire('avant')
+        self.chemin.rename(self.chemin.with_name('esco.log.1'))
+        ecrire('apres')
+        for handler in workers:
+            handler.arreter()
+
+        def messages(chemin):
+            return [json.loads(ligne)['message'] for ligne in chemin.read_text(encoding='utf-8').splitlines()]
+        self.assertEqual(messages(self.chemin.with_name('esco.log.1')), ['avant 0', 'avant 1'])
+        self.assertEqual(messages(self.chemin), ['apres 0', 'apres 1'])
+
+
+class ChronometreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+
+    def test_duree_du_dossier_pdf(self):
+        self.client.force_login(self.utilisateurs['patient'])
+        with self.assertLogs('main.views_pdf', 'INFO') as journal:
+            self.client.get(reverse('download_my_dossier_pdf'))
+        record, = journal.records
+        self.assertEqual(record.evenement, 'pdf_dossier')
+        self.assertGreater(record.duree_ms, 0)
+        self.assertGreater(record.octets, 0)
+
+    def test_duree_des_actions_de_masse(self):
+        demandes = list(DemandeAttente.objects.values_list('pk', flat=True))
+        self.client.force_login(self.utilisateurs['admin'])
+        with self.assertLogs('main.admin', 'INFO') as journal:
+            self.client.post(reverse('esco_admin:main_demandeattente_changelist'),
+                             {'action': 'retirer', helpers.ACTION_CHECKBOX_NAME: demandes})
+        record, = journal.records
+        self.assertEqual((record.evenement, record.action, record.lignes), ('action_admin', 'retirer', len(demandes)))
@@ -0,0 +1,137 @@
+from datetime import time, timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from main.liste_attente import annuler_rdvs, combler_deplacements, demandes_candidates
+from main.models import CustomUser, DemandeAttente, RendezVous, SerieRendezVous
+from main.reservations import replanifier
+from main.series import annuler_suite, creer_serie, modifier_suite
+
+from .donnees import creer_donnees
+from .test_admin_echelle import url_liste
+from .test_periodes import plan_requete
+
+
+class ListeAttenteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+        cls.medecin = CustomUser.objects.create_user('dr_attente', password='x', role='docteur', specialite='Dermatologie')
+        cls.confrere = CustomUser.objects.create_user('dr_confrere', password='x', role='docteur',
+                                                      specialite='Dermatologie')
+        cls.patients = [CustomUser.objects.create_user(f'attente{i}', password='x', role='patient') for i in range(6)]
+        cls.jour = timezone.localdate() + timedelta(days=5)
+        # Agenda du médecin : six créneaux pris le même jour
+        cls.rdvs = RendezVous.objects.bulk_create([
+            RendezVous(patient=cls.utilisateurs['patient'], medecin=cls.medecin, date_rdv=cls.jour,
+                       heure_rdv=time(9 + i, 0), motif='Consultation')
+            for i in range(6)
+        ])
+
+    def _demande(self, patient, **champs):
+        return DemandeAttente.objects.create(**{
+            'patient': patient, 'medecin': self.medecin, 'motif': 'Contrôle',
+            'date_min': self.jour, 'date_max': self.jour + timedelta(days=7), **champs,
+        })
+
+    def _annuler(self, *rdvs):
+        return annuler_rdvs(RendezVous.objects.filter(pk__in=[rdv.pk for rdv in rdvs]))
+
+    def test_demande_la_plus_ancienne_servie(self):
+        premiere = self._demande(self.patients[0])
+        seconde = self._demande(self.patients[1])
+        annules, attribues = self._annuler(self.rdvs[0])
+        self.assertEqual((annules, len(attribues)), (1, 1))
+        premiere.refresh_from_db()
+        self.assertEqual(premiere.statut, 'attribuee')
+        self.assertEqual((premiere.rdv.patient, premiere.rdv.date_rdv, premiere.rdv.heure_rdv),
+                         (self.patients[0], self.jour, time(9, 0)))
+        self.assertEqual(DemandeAttente.objects.get(pk=seconde.pk).statut, 'en_attente')
+
+    def test_plages_et_specialite(self):
+        # Hors plage horaire, puis demande de spécialité sans médecin précis
+        trop_tard = self._demande(self.patients[0], heure_min=time(16, 0))
+        specialite = self._demande(self.patients[1], medecin=None, specialite='Dermatologie')
+        autre_specialite = self._demande(self.patients[2], medecin=None, specialite='Cardiologie')
+        _, attribues = self._annuler(self.rdvs[0])
+        self.assertEqual([rdv.patient for rdv in attribues], [self.patients[1]])
+        self.assertEqual(DemandeAttente.objects.get(pk=specialite.pk).statut, 'attribuee')
+        self.assertEqual(set(DemandeAttente.objects.filter(pk__in=[trop_tard.pk, autre_specialite.pk])
+                             .values_list('statut', flat=True)), {'en_attente'})
+
+    def test_annulations_en_masse_nombre_de_requetes_constant(self):
+        for patient in self.patients:
+            self._demande(patient)
+        # Savepoint, lecture, UPDATE, spécialités, demandes, RDV des patients, INSERT, UPDATE, release
+        with self.assertNumQueries(9):
+            self._annuler(*self.rdvs[:2])
+        with self.assertNumQueries(9):
+            _, attribues = self._annuler(*self.rdvs[2:])
+        self.assertEqual([rdv.patient for rdv in attribues], self.patients[2:])
+        self.assertFalse(DemandeAttente.objects.filter(statut='en_attente', medecin=self.medecin).exists())
+
+    def test_demandes_candidates_indexees(self):
+        plan = ' '.join(plan_requete(demandes_candidates(
+            [(self.medecin.pk, self.jour, time(9, 0))], {self.medecin.pk: 'Dermatologie'}
+        )))
+        self.assertIn('attente_medecin', plan)
+        self.assertIn('attente_specialite', plan)
+
+    def test_annulation_par_le_patient(self):
+        attente = self._demande(self.patients[0])
+        self.client.force_login(self.utilisateurs['patient'])
+        response = self.client.post(reverse('annuler_rdv', args=[self.rdvs[3].pk]))
+        self.assertRedirects(response, reverse('mes_rdv'), fetch_redirect_response=False)
+        self.assertEqual(RendezVous.objects.get(pk=self.rdvs[3].pk).status, 'annule')
+        attente.refresh_from_db()
+        self.assertEqual(attente.rdv.heure_rdv, time(12, 0))
+
+        # RDV d'un autre patient
+        self.client.force_login(self.patients[1])
+        response = self.client.post(reverse('annuler_rdv', args=[self.rdvs[4].pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_action_admin(self):
+        self._demande(self.patients[0])
+        self.client.force_login(self.utilisateurs['admin'])
+        response = self.client.post(url_liste(RendezVous), {
+            'action': 'marquer_annule', '_selected_action': [self.rdvs[0].pk, self.rdvs[1].pk],
+        }, follow=True)
+        self.assertContains(response, "1 créneau(x) libéré(s)")
+
+    def test_replanification(self):
+        demande = self._demande(self.patients[0])
+        self.assertEqual(replanifier(RendezVous.objects.filter(pk=self.rdvs[0].pk), medecin=self.confrere), 1)
+        demande.refresh_from_db()
+        self.assertEqual((demande.statut, demande.rdv.medecin, demande.rdv.heure_rdv),
+                         ('attribuee', self.medecin, time(9, 0)))
+
+    def test_creneau_repris_par_un_rdv_deplace(self):
+        # Les deux RDV échangent leur médecin : aucun créneau n'est libéré
+        autre = RendezVous.objects.create(patient=self.patients[5], medecin=self.confrere, date_rdv=self.jour,
+                                          heure_rdv=time(9, 0), motif='Consultation')
+        demande = self._demande(self.patients[0])
+        rdvs = list(RendezVous.objects.filter(pk__in=[self.rdvs[0].pk, autre.pk]))
+        anciens = [RendezVous(patient_id=rdv.patient_id, medecin_id=rdv.medecin_id, date_rdv=rdv.date_rdv,
+                              heure_rdv=rdv.heure_rdv) for rdv in rdvs]
+        for rdv in rdvs:
+            rdv.medecin = self.confrere if rdv.medecin_id == self.medecin.pk else self.medecin
+        self.assertEqual(combler_deplacements(anciens, rdvs), [])
+        self.assertEqual(DemandeAttente.objects.get(pk=demande.pk).statut, 'en_attente')
+
+    def test_series(self):
+        serie = SerieRendezVous(patient=self.patients[5], medecin=self.medecin, heure_rdv=time(15, 0),
+                                motif='Suivi', date_debut=self.jour, nombre=1)
+        creer_serie(serie)
+        demandes = [self._demande(self.patients[0]), self._demande(self.patients[1])]
+
+        serie.heure_rdv = time(16, 0)
+        self.assertEqual(modifier_suite(serie), 1)
+        demandes[0].refresh_from_db()
+        self.assertEqual((demandes[0].statut, demandes[0].rdv.heure_rdv), ('attribuee', time(15, 0)))
+
+        annules, attribues = annuler_suite(SerieRendezVous.objects.filter(pk=serie.pk))
+        self.assertEqual((annules, [(rdv.patient, rdv.heure_rdv) for rdv in attribues]),
+                         (1, [(self.patients[1], time(16, 0))]))
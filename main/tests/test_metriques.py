@@ -0,0 +1,135 @@
+import os
+import subprocess
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from main import metriques
+from main.admin_echelle import choix_medecins
+from main.models import DemandeAttente
+
+from .donnees import creer_donnees
+
+
+def _dossier_temporaire(test):
+    dossier = tempfile.TemporaryDirectory()
+    test.addCleanup(dossier.cleanup)
+    reglage = override_settings(ESCO_METRIQUES_DOSSIER=Path(dossier.name))
+    reglage.enable()
+    test.addCleanup(reglage.disable)
+    metriques.reinitialiser()
+    test.addCleanup(metriques.reinitialiser)
+    return Path(dossier.name)
+
+
+def _pid_termine():
+    processus = subprocess.Popen(['true'])
+    processus.wait()
+    return processus.pid
+
+
+class MetriquesTests(SimpleTestCase):
+    def setUp(self):
+        self.dossier = _dossier_temporaire(self)
+
+    def test_tables_par_thread_additionnees(self):
+        def requetes():
+            for _ in range(1000):
+                metriques.incrementer('esco_http_requetes_total', vue='home', methode='GET', statut=200)
+        threads = [threading.Thread(target=requetes) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cle = ('esco_http_requetes_total', (('methode', 'GET'), ('statut', 200), ('vue', 'home')))
+        self.assertEqual(metriques.instantane()[cle], 4000)
+
+    def test_texte_histogramme_cumule(self):
+        for duree in (0.003, 0.2, 0.2, 30):
+            metriques.observer('esco_http_duree_secondes', duree, vue='home')
+        texte = metriques.texte(metriques.instantane(), [('esco_liste_attente', "Attente", [((), 3)])])
+        self.assertIn('# TYPE esco_http_duree_secondes histogram', texte)
+        self.assertIn('esco_http_duree_secondes_bucket{vue="home",le="0.005"} 1', texte)
+        self.assertIn('esco_http_duree_secondes_bucket{vue="home",le="0.25"} 3', texte)
+        self.assertIn('esco_http_duree_secondes_bucket{vue="home",le="10.0"} 3', texte)
+        self.assertIn('esco_http_duree_secondes_bucket{vue="home",le="+Inf"} 4', texte)
+        self.assertIn('esco_http_duree_secondes_count{vue="home"} 4', texte)
+        self.assertIn('esco_http_duree_secondes_sum{vue="home"} 30.403', texte)
+        self.assertIn('# TYPE esco_liste_attente gauge\nesco_liste_attente 3\n', texte)
+
+    @unittest.skipUnless(os.name == 'posix', "reprise des processus morts sous POSIX uniquement")
+    def test_workers_additionnes_et_morts_repris(self):
+        nom = 'esco_http_requetes_total'
+        metriques.incrementer(nom, 2, vue='home')
+        # Worker vivant (le processus parent) et worker mort
+        vivant, mort = os.getppid(), _pid_termine()
+        metriques._ecrire(self.dossier / f'{vivant}.json', {(nom, (('vue', 'home'),)): 3})
+        metriques._ecrire(self.dossier / f'{mort}.json', {(nom, (('vue', 'home'),)): 5})
+
+        cle = (nom, (('vue', 'home'),))
+        self.assertEqual(metriques.agreger()[cle], 10)
+        self.assertFalse((self.dossier / f'{mort}.json').exists())
+        self.assertEqual(metriques._lire(self.dossier / f'cumul-{os.getpid()}.json')[cle], 5)
+        # Le total ne baisse pas après la reprise
+        self.assertEqual(metriques.agreger()[cle], 10)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "fork indisponible")
+    def test_worker_forke_part_de_zero(self):
+        nom = 'esco_http_requetes_total'
+        metriques.incrementer(nom, vue='home')
+        pid = os.fork()
+        if pid == 0:
+            try:
+                metriques.incrementer(nom, 10, vue='home')
+                metriques.publier()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(metriques._lire(self.dossier / f'{pid}.json')[(nom, (('vue', 'home'),))], 10)
+        self.assertEqual(metriques.agreger()[(nom, (('vue', 'home'),))], 11)
+
+
+class ExpositionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+
+    def setUp(self):
+        _dossier_temporaire(self)
+
+    def test_requetes_et_indicateurs(self):
+        self.client.force_login(self.utilisateurs['medecin'])
+        self.client.get(reverse('dossier_patient', args=[self.utilisateurs['patient'].pk]))
+        self.assertEqual(self.client.get(reverse('metriques')).status_code, 403)
+
+        self.client.force_login(self.utilisateurs['admin'])
+        response = self.client.get(reverse('metriques'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        texte = response.content.decode()
+        self.assertIn('esco_http_requetes_total{methode="GET",statut="200",vue="dossier_patient"} 1', texte)
+        self.assertIn('esco_sql_requetes_count{vue="dossier_patient"} 1', texte)
+        self.assertIn('esco_sql_duree_secondes_count{vue="dossier_patient"} 1', texte)
+        attente = DemandeAttente.objects.filter(statut='en_attente').count()
+        self.assertIn(f'esco_liste_attente {attente}\n', texte)
+        self.assertIn('esco_rdv_pris_aujourdhui ', texte)
+
+    @override_settings(ESCO_METRIQUES_JETON='secret')
+    def test_collecteur_par_jeton(self):
+        self.assertEqual(self.client.get(reverse('metriques'), HTTP_AUTHORIZATION='Bearer autre').status_code, 403)
+        self.assertEqual(self.client.get(reverse('metriques'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_succes_du_cache_et_duree_des_pdf(self):
+        cache.clear()
+        choix_medecins()
+        choix_medecins()
+        self.client.force_login(self.utilisateurs['patient'])
+        self.client.get(reverse('download_my_dossier_pdf'))
+        texte = metriques.texte(metriques.instantane())
+        self.assertIn('esco_cache_lectures_total{cache="default",resultat="echec"} 1', texte)
+        self.assertIn('esco_cache_lectures_total{cache="default",resultat="succes"} 1', texte)
+        self.assertIn('esco_operation_duree_secondes_count{evenement="pdf_dossier"} 1', texte)
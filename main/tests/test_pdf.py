@@ -0,0 +1,111 @@
+import re
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from main.models import Prescription
+
+from .donnees import creer_donnees
+
+PAGE = re.compile(rb'/Type /Page\b(?!s)')
+
+
+def nb_pages(response):
+    contenu = b''.join(response.streaming_content)
+    assert contenu.startswith(b'%PDF')
+    return len(PAGE.findall(contenu))
+
+
+class OrdonnancesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+        cls.prescription = Prescription.objects.filter(medecin=cls.utilisateurs['medecin']).first()
+
+    def test_ordonnance_medecin_et_patient(self):
+        url = reverse('imprimer_prescription', args=[self.prescription.pk])
+        for role in ('medecin', 'patient'):
+            self.client.force_login(self.utilisateurs[role])
+            response = self.client.get(url)
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+            self.assertEqual(nb_pages(response), 1)
+
+        self.client.force_login(self.utilisateurs['infirmier'])
+        self.assertRedirects(self.client.get(url), reverse('dashboard'), fetch_redirect_response=False)
+
+    def test_contenu_long_sur_plusieurs_pages(self):
+        Prescription.objects.filter(pk=self.prescription.pk).update(contenu='Paracétamol 1g matin et soir\n' * 80)
+        self.client.force_login(self.utilisateurs['medecin'])
+        response = self.client.get(reverse('imprimer_prescription', args=[self.prescription.pk]))
+        self.assertGreater(nb_pages(response), 1)
+
+    def test_lot_du_jour_une_page_par_ordonnance(self):
+        medecin = self.utilisateurs['medecin']
+        self.client.force_login(medecin)
+        with self.assertNumQueries(3):
+            # Utilisateur, exists(), puis une lecture unique des prescriptions avec médecin et patient
+            response = self.client.get(reverse('imprimer_prescriptions'))
+            pages = nb_pages(response)
+        self.assertEqual(pages, Prescription.objects.filter(medecin=medecin).count())
+
+        # Filtre patient repris de mes_prescriptions
+        response = self.client.get(reverse('imprimer_prescriptions'),
+                                   {'date': 'all', 'patient': self.utilisateurs['patient'].pk})
+        self.assertEqual(nb_pages(response), 1)
+
+    def test_lot_par_medecin_pour_l_administration(self):
+        self.client.force_login(self.utilisateurs['admin'])
+        response = self.client.get(reverse('imprimer_prescriptions'))
+        self.assertEqual(nb_pages(response), Prescription.objects.count())
+        response = self.client.get(reverse('imprimer_prescriptions'), {'medecin': self.utilisateurs['medecin'].pk})
+        self.assertEqual(nb_pages(response),
+                         Prescription.objects.filter(medecin=self.utilisateurs['medecin']).count())
+
+        self.client.force_login(self.utilisateurs['patient'])
+        self.assertRedirects(self.client.get(reverse('imprimer_prescriptions')), reverse('dashboard'),
+                             fetch_redirect_response=False)
+
+    def test_filtres_invalides(self):
+        self.client.force_login(self.utilisateurs['admin'])
+        for filtres in ({'medecin': 'abc'}, {'patient': '1 OR 1=1'}):
+            response = self.client.get(reverse('imprimer_prescriptions'), filtres)
+            self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+    def test_lot_envoye_par_blocs(self):
+        self.client.force_login(self.utilisateurs['admin'])
+        with mock.patch('main.views_pdf.TAILLE_BLOC', 1024):
+            response = self.client.get(reverse('imprimer_prescriptions'), {'date': 'all'})
+            blocs = list(response.streaming_content)
+        self.assertGreater(len(blocs), 1)
+        contenu = b''.join(blocs)
+        self.assertTrue(contenu.startswith(b'%PDF') and contenu.endswith(b'%%EOF\n'))
+        self.assertEqual(len(PAGE.findall(contenu)), Prescription.objects.count())
+
+
+class MoteurPdfTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+
+    def test_dossier_sans_requete_par_ligne(self):
+        self.client.force_login(self.utilisateurs['patient'])
+        # Utilisateur, profil médical différé, constantes, puis une requête par section
+        # (deux pour les RDV et les consultations : table chaude et archive)
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('download_my_dossier_pdf'))
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_styles_partages_entre_documents(self):
+        from main import pdf
+
+        self.assertIs(pdf.styles(), pdf.styles())
+        self.assertIs(pdf.style_tableau('identite'), pdf.style_tableau('identite'))
+
+    def test_banc_d_essai(self):
+        sortie = StringIO()
+        call_command('bench_pdf', nombre=2, stdout=sortie)
+        self.assertIn('dossier', sortie.getvalue())
+        self.assertIn('ordonnance', sortie.getvalue())
@@ -0,0 +1,134 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from main import periodes
+from main.models import Consultation, CustomUser, Prescription, RendezVous
+
+
+def plan_requete(queryset):
+    """Lignes de EXPLAIN QUERY PLAN (SQLite) pour un queryset"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [ligne[-1] for ligne in cursor.fetchall()]
+
+
+class PeriodeTests(SimpleTestCase):
+    """Bornes des périodes : intervalles semi-ouverts en dates locales"""
+
+    def test_aujourdhui(self):
+        periode = periodes.periode('today', reference=date(2025, 3, 12))
+        self.assertEqual(periode, (date(2025, 3, 12), date(2025, 3, 13)))
+
+    def test_semaine_du_lundi_au_lundi_suivant(self):
+        periode = periodes.periode('week', reference=date(2025, 3, 16))  # dimanche
+        self.assertEqual(periode, (date(2025, 3, 10), date(2025, 3, 17)))
+
+    def test_mois_de_decembre(self):
+        periode = periodes.periode('month', reference=date(2024, 12, 31))
+        self.assertEqual(periode, (date(2024, 12, 1), date(2025, 1, 1)))
+
+    def test_personnalisee_fin_incluse(self):
+        periode = periodes.periode('custom', debut=date(2025, 1, 1), fin=date(2025, 1, 31))
+        self.assertEqual(periode, (date(2025, 1, 1), date(2025, 2, 1)))
+        self.assertEqual(periodes.periode('custom', fin=date(2025, 1, 31)), (None, date(2025, 2, 1)))
+        self.assertIsNone(periodes.periode('custom'))
+        self.assertIsNone(periodes.periode('all'))
+
+    def test_bornes_dans_le_fuseau_de_la_clinique(self):
+        debut, fin = periodes.periode('today', reference=date(2025, 3, 12)).bornes_horodatage()
+        # Africa/Brazzaville = UTC+1 : minuit local = 23h UTC la veille
+        self.assertEqual(debut.astimezone(dt_timezone.utc), datetime(2025, 3, 11, 23, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(fin - debut, timedelta(days=1))
+
+
+class FiltresPeriodeVuesTests(TestCase):
+    """Les vues filtrent sur la journée / le mois locaux"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.medecin = CustomUser.objects.create_user('medecin', password='x', role='docteur')
+        cls.patient = CustomUser.objects.create_user('patient', password='x', role='patient')
+        aujourd_hui = timezone.localdate()
+        minuit = timezone.make_aware(datetime.combine(aujourd_hui, datetime.min.time()))
+        # 00h30 locale aujourd'hui (la veille en UTC) et 23h30 locale hier
+        cls.dans_la_journee = cls._prescription(minuit + timedelta(minutes=30))
+        cls.hier_soir = cls._prescription(minuit - timedelta(minutes=30))
+
+    @classmethod
+    def _prescription(cls, moment):
+        prescription = Prescription.objects.create(medecin=cls.medecin, patient=cls.patient, contenu='x')
+        Prescription.objects.filter(pk=prescription.pk).update(date_prescription=moment)
+        return prescription
+
+    def setUp(self):
+        self.client.login(username='medecin', password='x')
+
+    def _ids(self, **parametres):
+        response = self.client.get(reverse('mes_prescriptions'), parametres)
+        self.assertEqual(response.status_code, 200)
+        return {prescription.pk for prescription in response.context['prescriptions_list']}
+
+    def test_aujourdhui(self):
+        self.assertEqual(self._ids(date='today'), {self.dans_la_journee.pk})
+
+    def test_personnalisee(self):
+        hier = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(self._ids(date='custom', debut=hier, fin=hier), {self.hier_soir.pk})
+        self.assertEqual(self._ids(date='custom', debut=hier), {self.dans_la_journee.pk, self.hier_soir.pk})
+
+    def test_toutes_les_dates(self):
+        self.assertEqual(self._ids(), {self.dans_la_journee.pk, self.hier_soir.pk})
+
+    def test_rdv_du_jour(self):
+        aujourd_hui = timezone.localdate()
+        RendezVous.objects.create(patient=self.patient, medecin=self.medecin, date_rdv=aujourd_hui, motif='x')
+        RendezVous.objects.create(patient=self.patient, medecin=self.medecin,
+                                  date_rdv=aujourd_hui + timedelta(days=40), motif='x')
+        response = self.client.get(reverse('rdv_medecin'), {'date': 'today'})
+        self.assertEqual(response.context['stats']['total'], 1)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Plans de requête propres à SQLite')
+class PlansRequetePeriodeTests(TestCase):
+    """Les filtres de période sont servis par un index (pas de fonction sur la colonne)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.medecin = CustomUser.objects.create_user('medecin', role='docteur')
+
+    def assertRecherchePlage(self, plan, index, colonne):
+        self.assertTrue(
+            any(f'INDEX {index} ' in ligne and f'{colonne}>? AND {colonne}<?' in ligne for ligne in plan),
+            plan,
+        )
+
+    def test_prescriptions_du_medecin(self):
+        for code in ('today', 'week', 'month'):
+            queryset = periodes.filtrer(
+                Prescription.objects.filter(medecin=self.medecin), 'date_prescription', periodes.periode(code)
+            )
+            self.assertRecherchePlage(plan_requete(queryset), 'prescription_medecin_date', 'date_prescription')
+
+    def test_rdv_du_medecin(self):
+        for code in ('today', 'week', 'month'):
+            queryset = periodes.filtrer(
+                RendezVous.objects.filter(medecin=self.medecin), 'date_rdv', periodes.periode(code)
+            )
+            self.assertRecherchePlage(plan_requete(queryset), 'rdv_medecin_date', 'date_rdv')
+
+    def test_consultations_globales_du_mois(self):
+        queryset = periodes.filtrer(Consultation.objects.all(), 'created_at', periodes.periode('month'))
+        self.assertRecherchePlage(plan_requete(queryset), 'consultation_created', 'created_at')
+
+    def test_consultations_du_mois_sans_parcours_complet(self):
+        queryset = Consultation.objects.filter(
+            periodes.periode('month').q('created_at'), rdv__medecin=self.medecin
+        )
+        plan = plan_requete(queryset)
+        self.assertFalse([ligne for ligne in plan if ligne.startswith('SCAN')], plan)
@@ -0,0 +1,69 @@
+import time
+
+from django.test import TestCase
+from django.urls import reverse
+
+from main import profilage
+from main.models import CustomUser, ProfilRequete
+
+from .donnees import creer_donnees
+
+
+def _attente_profilee():
+    time.sleep(0.05)
+    return CustomUser.objects.count()
+
+
+class ProfilageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+
+    def test_echantillons_et_sql(self):
+        resultat, mesures = profilage.profiler(_attente_profilee)
+        self.assertEqual(resultat, CustomUser.objects.count())
+        self.assertGreaterEqual(mesures['duree_ms'], 50)
+        self.assertEqual(len(mesures['requetes']), 1)
+        self.assertIn('COUNT(*)', mesures['requetes'][0]['sql'])
+        # Format collapsed : « a;b;c nombre », la fonction en attente en haut de pile
+        pile, nombre = max((ligne.rsplit(' ', 1) for ligne in mesures['piles'].splitlines()), key=lambda p: int(p[1]))
+        self.assertTrue(pile.endswith('main.tests.test_profilage:_attente_profilee'))
+        self.assertIn('_attente_profilee', mesures['statistiques'])
+
+    def test_cprofile(self):
+        _, mesures = profilage.profiler(_attente_profilee, 'cprofile')
+        self.assertIn('cumulative', mesures['statistiques'])
+        lignes = [ligne.rsplit(' ', 1) for ligne in mesures['piles'].splitlines()]
+        self.assertTrue(any('_attente_profilee;builtins:<built-in_method_time.sleep>' in pile for pile, _ in lignes))
+        total_us = sum(int(valeur) for _, valeur in lignes)
+        self.assertAlmostEqual(total_us / 1000, mesures['duree_ms'], delta=mesures['duree_ms'] * 0.2)
+
+    def test_middleware_reserve_aux_superutilisateurs(self):
+        url = reverse('dossier_patient', args=[self.utilisateurs['patient'].pk])
+        self.client.force_login(self.utilisateurs['medecin'])
+        response = self.client.get(url, {'profil': 'cprofile'})
+        self.assertNotIn('X-Esco-Profil', response)
+
+        self.client.force_login(self.utilisateurs['admin'])
+        avant = ProfilRequete.objects.count()
+        response = self.client.get(reverse('dashboard_admin'), HTTP_X_ESCO_PROFIL='cprofile')
+        self.assertEqual(ProfilRequete.objects.count(), avant + 1)
+        profil = ProfilRequete.objects.latest('pk')
+        self.assertEqual(response['X-Esco-Profil'], reverse('esco_admin:main_profilrequete_change', args=[profil.pk]))
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertEqual((profil.chemin, profil.statut, profil.mode), (reverse('dashboard_admin'), 200, 'cprofile'))
+        self.assertEqual(profil.nb_requetes, len(profil.requetes))
+
+        # Page d'administration et téléchargement des piles
+        page = self.client.get(response['X-Esco-Profil'])
+        self.assertContains(page, 'Télécharger les piles')
+        piles = self.client.get(reverse('esco_admin:main_profilrequete_piles', args=[profil.pk]))
+        self.assertEqual(piles.content.decode().strip(), profil.piles)
+
+    def test_retention(self):
+        profilage.GARDER, garder = 2, profilage.GARDER
+        self.addCleanup(setattr, profilage, 'GARDER', garder)
+        self.client.force_login(self.utilisateurs['admin'])
+        for _ in range(3):
+            self.client.get(reverse('dashboard_admin'), {'profil': '1'})
+        self.assertEqual(ProfilRequete.objects.count(), 2)
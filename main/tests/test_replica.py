@@ -0,0 +1,93 @@
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+from unittest import mock
+
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from main import replica
+from main.middleware import ReplicaMiddleware
+from main.models import RendezVous
+from main.routeurs import ReplicaRouter
+
+
+class RafraichissementTests(SimpleTestCase):
+    def setUp(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        self.source, self.destination = Path(dossier.name) / 'source.sqlite3', Path(dossier.name) / 'replique.sqlite3'
+        with closing(sqlite3.connect(self.source)) as base:
+            base.execute('CREATE TABLE t (x INTEGER)')
+            base.executemany('INSERT INTO t VALUES (?)', [(i,) for i in range(1000)])
+            base.commit()
+
+    def test_copie_et_etat(self):
+        avant = time.time()
+        etat = replica.rafraichir(self.source, self.destination, pages=1, pause=0)
+        self.assertGreaterEqual(etat['instantane'], avant)
+        self.assertEqual(replica.lire_etat(self.destination), etat)
+        with closing(sqlite3.connect(self.destination)) as copie:
+            self.assertEqual(copie.execute('SELECT COUNT(*) FROM t').fetchone()[0], 1000)
+        self.assertFalse(Path(f'{self.destination}.partiel').exists())
+
+    def test_pause_entre_les_etapes(self):
+        with mock.patch('time.sleep') as pause:
+            replica.rafraichir(self.source, self.destination, pages=1, pause=0.01)
+        # Une pause après chaque étape sauf la dernière, source libre ou non
+        self.assertGreater(pause.call_count, 1)
+        self.assertEqual({appel.args for appel in pause.call_args_list}, {(0.01,)})
+
+
+@mock.patch.object(replica, 'active', return_value=True)
+class RoutageTests(SimpleTestCase):
+    # Pas de TestCase : sa transaction englobante enverrait toutes les lectures sur la base principale
+    databases = {'default'}
+
+    def setUp(self):
+        self.routeur = ReplicaRouter()
+
+    def _lecture(self, instantane, ecrit_le=None):
+        with mock.patch.object(replica, 'instantane', return_value=instantane), replica.lectures(ecrit_le):
+            return self.routeur.db_for_read(RendezVous)
+
+    def test_lecture_sur_replique_fraiche(self, _):
+        self.assertEqual(self._lecture(time.time() - 1), replica.ALIAS)
+        self.assertIsNone(self.routeur.db_for_read(RendezVous))  # hors requête
+
+    def test_repli_sur_la_base_principale(self, _):
+        self.assertIsNone(self._lecture(None))  # jamais copiée
+        self.assertIsNone(self._lecture(time.time() - 3600))  # trop en retard
+        # Lecture de ses propres écritures : copie antérieure à l'écriture
+        self.assertIsNone(self._lecture(time.time() - 1, ecrit_le=time.time()))
+        self.assertEqual(self._lecture(time.time(), ecrit_le=time.time() - 1), replica.ALIAS)
+
+    def test_transaction_sur_la_base_principale(self, _):
+        with mock.patch.object(replica, 'instantane', return_value=time.time()), replica.lectures():
+            with transaction.atomic():
+                self.assertIsNone(self.routeur.db_for_read(RendezVous))
+            self.assertEqual(self.routeur.db_for_read(RendezVous), replica.ALIAS)
+
+    def test_ecritures_et_migrations(self, _):
+        self.assertEqual(self.routeur.db_for_write(RendezVous), 'default')
+        self.assertFalse(self.routeur.allow_migrate(replica.ALIAS, 'main'))
+        self.assertIsNone(self.routeur.allow_migrate('default', 'main'))
+
+    def test_middleware_collant_apres_ecriture(self, _):
+        lectures = []
+
+        def vue(request):
+            lectures.append(replica.lecture_sur_replica())
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(vue)
+        requetes = RequestFactory()
+        with mock.patch.object(replica, 'instantane', return_value=time.time() - 1):
+            response = middleware(requetes.post('/'))
+            cookie = response.cookies[replica.COOKIE_ECRITURE].value
+            middleware(requetes.get('/', HTTP_COOKIE=f'{replica.COOKIE_ECRITURE}={cookie}'))
+            middleware(requetes.get('/'))
+        self.assertEqual(lectures, [False, False, True])
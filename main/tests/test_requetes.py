@@ -0,0 +1,129 @@
+"""
+Nombre de requêtes SQL par page.
+
+Chaque vue et chaque liste de l'admin est chargée sur deux jeux de données
+d'échelles différentes : le nombre de requêtes attendu est le même, il ne
+doit pas dépendre du volume (pas de N+1). Si une modification change un
+de ces nombres, vérifier qu'il reste constant puis mettre à jour le budget.
+"""
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.admin import admin_site
+from main.backends import ESCOModelBackend
+from main.models import CustomUser
+
+from .donnees import creer_donnees
+
+# (rôle de l'utilisateur connecté, nom d'URL, utilisateur passé en argument, paramètres GET) -> requêtes
+NB_REQUETES_VUES = {
+    ('patient', 'dashboard_patient', None, None): 6,
+    ('medecin', 'dashboard_medecin', None, None): 6,
+    ('admin', 'dashboard_admin', None, None): 1,
+    ('infirmier', 'dashboard_infirmier', None, None): 1,
+    ('secretaire', 'dashboard_secretaire', None, None): 1,
+    ('medecin', 'dossier_patient', 'patient', None): 17,
+    ('medecin', 'mes_prescriptions', None, None): 5,
+    ('medecin', 'mes_prescriptions', None, (('date', 'month'),)): 5,
+    ('medecin', 'rdv_medecin', None, None): 5,
+    ('medecin', 'rdv_medecin', None, (('date', 'week'),)): 5,
+    ('medecin', 'planning_medecin', None, None): 2,
+    ('medecin', 'liste_patients', None, None): 3,
+    ('medecin', 'liste_patients', None, (('filter', 'avec_historique'), ('tri', 'age'))): 3,
+    ('medecin', 'consultations_medecin', None, None): 4,
+    ('medecin', 'cohorte_patients', None, (('groupe_sanguin', 'O+'),)): 3,
+    ('medecin', 'mes_rdv', None, None): 2,
+    ('patient', 'mes_rdv', None, None): 2,
+    ('patient', 'consultations', None, None): 4,
+    ('patient', 'mon_dossier_medical', None, None): 12,
+}
+
+# Modèle enregistré sur admin_site -> requêtes de la liste (changelist)
+NB_REQUETES_ADMIN = {
+    'CustomUser': 5,
+    'Patient': 5,
+    'Medecin': 5,
+    'Infirmier': 5,
+    'Secretaire': 5,
+    'RendezVous': 7,
+    'Consultation': 7,
+    'SoinsInfirmier': 7,
+    'Planning': 4,
+    'MesureConstante': 7,
+    'SerieRendezVous': 4,
+    'DemandeAttente': 5,
+    'AccesDossier': 7,
+    'ProfilRequete': 5,
+}
+
+
+class NombreRequetesMixin:
+    echelle = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees(cls.echelle)
+
+    def setUp(self):
+        # Choix des filtres de l'admin mis en cache : mesurer à froid
+        cache.clear()
+
+    def _verifier(self, utilisateur, url, nb_requetes, parametres=None):
+        self.client.force_login(utilisateur)
+        with self.assertNumQueries(nb_requetes):
+            response = self.client.get(url, parametres)
+        self.assertEqual(response.status_code, 200)
+
+    def test_vues(self):
+        for (role, nom, argument, parametres), nb_requetes in NB_REQUETES_VUES.items():
+            with self.subTest(vue=nom, role=role, parametres=parametres):
+                arguments = [self.utilisateurs[argument].pk] if argument else []
+                self._verifier(self.utilisateurs[role], reverse(nom, args=arguments),
+                               nb_requetes, dict(parametres or ()))
+
+    def test_listes_admin(self):
+        for model in admin_site._registry:
+            with self.subTest(model=model.__name__):
+                self.assertIn(model.__name__, NB_REQUETES_ADMIN, "Budget de requêtes manquant pour ce modèle")
+                url = reverse(f'{admin_site.name}:{model._meta.app_label}_{model._meta.model_name}_changelist')
+                self._verifier(self.utilisateurs['admin'], url, NB_REQUETES_ADMIN[model.__name__])
+
+
+# Sessions signées : aucune requête de session, seul le chargement de l'utilisateur est compté
+SESSIONS_SIGNEES = override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+
+
+@SESSIONS_SIGNEES
+class NombreRequetesPetiteEchelleTests(NombreRequetesMixin, TestCase):
+    echelle = 1
+
+
+@SESSIONS_SIGNEES
+class NombreRequetesGrandeEchelleTests(NombreRequetesMixin, TestCase):
+    echelle = 6
+
+
+class UtilisateurDeLaRequeteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+
+    def test_chargement_sans_champs_medicaux(self):
+        patient = self.utilisateurs['patient']
+        with CaptureQueriesContext(connection) as requetes:
+            utilisateur = ESCOModelBackend().get_user(patient.pk)
+            # Contrôles de rôle et affichage : aucune requête de plus
+            self.assertEqual((utilisateur.role, utilisateur.get_full_name()), ('patient', patient.get_full_name()))
+        self.assertEqual(len(requetes), 1)
+        self.assertNotIn('"allergies"', requetes[0]['sql'])
+        self.assertEqual(utilisateur.get_deferred_fields(), set(CustomUser.CHAMPS_MEDICAUX))
+
+        # Champs médicaux rechargés ensemble, une seule fois
+        with self.assertNumQueries(1):
+            utilisateur.charger_profil_medical()
+            utilisateur.charger_profil_medical()
+            self.assertEqual((utilisateur.allergies, utilisateur.antecedents_medicaux), ('Aucune', 'RAS'))
+        self.assertEqual(utilisateur.get_deferred_fields(), set())
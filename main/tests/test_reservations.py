@@ -0,0 +1,216 @@
+import subprocess
+import sys
+from datetime import time, timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from main import export_colonnes
+from main.models import CustomUser, RendezVous
+from main.reservations import (
+    ConflitsCreneaux, CreneauIndisponible, replanifier, reserver_creneau, transaction_ecriture,
+)
+
+from .donnees import creer_donnees
+from .test_admin_echelle import url_liste
+
+
+class ReservationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+        cls.jour = timezone.localdate() + timedelta(days=30)
+        cls.pris = RendezVous.objects.create(patient=cls.utilisateurs['patient'], medecin=cls.utilisateurs['medecin'],
+                                             date_rdv=cls.jour, heure_rdv=time(10, 0), motif='Contrôle')
+
+    def _rdv(self, heure=time(10, 0)):
+        return RendezVous(patient=self.utilisateurs['patient'], medecin=self.utilisateurs['medecin'],
+                          date_rdv=self.jour, heure_rdv=heure, motif='Suivi')
+
+    def test_creneau_pris(self):
+        with self.assertRaises(CreneauIndisponible):
+            reserver_creneau(self._rdv())
+        self.assertEqual(RendezVous.objects.filter(date_rdv=self.jour).count(), 1)
+
+    def test_creneau_libere_par_annulation(self):
+        RendezVous.objects.filter(pk=self.pris.pk).update(status='annule')
+        self.assertEqual(reserver_creneau(self._rdv()), 1)
+
+    def test_reessai_si_base_verrouillee(self):
+        save = RendezVous.save
+        erreurs = [OperationalError('database is locked')]
+
+        def save_verrouille(rdv, *args, **kwargs):
+            if erreurs:
+                raise erreurs.pop()
+            return save(rdv, *args, **kwargs)
+
+        with mock.patch.object(RendezVous, 'save', save_verrouille), mock.patch('main.reservations.time.sleep') as attente:
+            self.assertEqual(reserver_creneau(self._rdv(time(11, 0))), 2)
+        attente.assert_called_once()
+        self.assertTrue(RendezVous.objects.filter(date_rdv=self.jour, heure_rdv=time(11, 0)).exists())
+
+    def test_conflit_affiche_dans_le_formulaire(self):
+        self.client.force_login(self.utilisateurs['patient'])
+        donnees = {'patient': self.utilisateurs['patient'].pk, 'medecin': self.utilisateurs['medecin'].pk,
+                   'date_rdv': self.jour.isoformat(), 'heure_rdv': '10:00', 'motif': 'Suivi'}
+        response = self.client.post(reverse('nouveau_rdv'), donnees)
+        self.assertContains(response, 'Ce créneau')
+        self.assertEqual(RendezVous.objects.filter(date_rdv=self.jour).count(), 1)
+
+        # Créneau pris entre la validation du formulaire et l'INSERT
+        with mock.patch('main.views.reserver_creneau', side_effect=CreneauIndisponible("Ce créneau vient d'être réservé")):
+            response = self.client.post(reverse('nouveau_rdv'), {**donnees, 'heure_rdv': '15:00'})
+        self.assertContains(response, 'vient d&#x27;être réservé')
+
+    def test_charge_multi_processus_sans_doublon(self):
+        # Processus séparé : la commande travaille sur sa propre base temporaire
+        resultat = subprocess.run(
+            [sys.executable, 'manage.py', 'stress_reservations', '--processus', '4', '--reservations', '30',
+             '--medecins', '1', '--jours', '1'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        self.assertEqual(resultat.returncode, 0, resultat.stderr)
+        self.assertIn('Aucun doublon', resultat.stdout)
+
+
+class ReplanificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+        cls.medecin = cls.utilisateurs['medecin']
+        # Même spécialité que `medecin`, sans planning
+        cls.remplacant = CustomUser.objects.create_user('remplacant', password='x', role='docteur',
+                                                        specialite=cls.medecin.specialite)
+        lundi = timezone.localdate() + timedelta(days=14 - timezone.localdate().weekday())
+        cls.lundi = lundi
+        cls.rdvs = RendezVous.objects.bulk_create([
+            RendezVous(patient=cls.utilisateurs['patient'], medecin=cls.medecin, date_rdv=lundi + timedelta(days=jours),
+                       heure_rdv=time(9, 0), motif='Suivi')
+            for jours in (0, 7)
+        ])
+
+    def _selection(self):
+        return RendezVous.objects.filter(pk__in=[rdv.pk for rdv in self.rdvs])
+
+    def test_decalage_en_chaine(self):
+        # Le premier RDV prend le créneau que le second quitte, dans le même UPDATE ;
+        # le premier créneau libéré est proposé à la liste d'attente (vide) en deux requêtes
+        with self.assertNumQueries(9):
+            self.assertEqual(replanifier(self._selection(), decalage_jours=7), 2)
+        self.assertEqual(sorted(self._selection().values_list('date_rdv', flat=True)),
+                         [self.lundi + timedelta(days=7), self.lundi + timedelta(days=14)])
+        self.assertEqual(set(self._selection().values_list('status', flat=True)), {'programme'})
+
+    def test_conflits_tout_ou_rien(self):
+        RendezVous.objects.create(patient=self.utilisateurs['patient'], medecin=self.medecin,
+                                  date_rdv=self.lundi + timedelta(days=15), heure_rdv=time(9, 0), motif='Autre')
+        with self.assertRaises(ConflitsCreneaux) as contexte:
+            # Le second RDV arriverait sur le mardi déjà pris
+            replanifier(self._selection(), decalage_jours=8)
+        self.assertEqual(len(contexte.exception.conflits), 1)
+        with self.assertRaises(ConflitsCreneaux) as contexte:
+            # Samedis : hors du planning du médecin
+            replanifier(self._selection(), decalage_jours=5)
+        self.assertIn('hors du planning', contexte.exception.conflits[0])
+        self.assertEqual(sorted(self._selection().values_list('date_rdv', flat=True)),
+                         [self.lundi, self.lundi + timedelta(days=7)])
+
+    def test_ni_rdv_passe_ni_date_passee(self):
+        passe = RendezVous.objects.create(patient=self.utilisateurs['patient'], medecin=self.medecin,
+                                          date_rdv=timezone.localdate() - timedelta(days=7),
+                                          heure_rdv=time(7, 10), motif='Oublié')
+        # Un RDV passé resté « programmé » n'est pas déplacé avec les autres
+        self.assertEqual(replanifier(RendezVous.objects.filter(pk__in=[passe.pk, self.rdvs[0].pk]),
+                                     decalage_jours=1), 1)
+        passe.refresh_from_db()
+        self.assertEqual(passe.date_rdv, timezone.localdate() - timedelta(days=7))
+
+        recul = (self.lundi - timezone.localdate()).days + 2
+        with self.assertRaises(ConflitsCreneaux) as contexte:
+            replanifier(self._selection(), decalage_jours=-recul)
+        self.assertIn('date passée', contexte.exception.conflits[0])
+        self.assertEqual(sorted(self._selection().values_list('date_rdv', flat=True)),
+                         [self.lundi + timedelta(days=1), self.lundi + timedelta(days=7)])
+
+    def test_medecin_de_meme_specialite(self):
+        autre = CustomUser.objects.exclude(specialite=self.medecin.specialite).filter(role='docteur').first()
+        with self.assertRaises(ConflitsCreneaux):
+            replanifier(self._selection(), medecin=autre)
+        self.assertEqual(replanifier(self._selection(), medecin=self.remplacant), 2)
+        self.assertFalse(self._selection().exclude(medecin=self.remplacant).exists())
+
+    def test_action_admin(self):
+        self.client.force_login(self.utilisateurs['admin'])
+        donnees = {'action': 'replanifier', '_selected_action': [rdv.pk for rdv in self.rdvs]}
+        response = self.client.post(url_liste(RendezVous), donnees)
+        self.assertContains(response, 'Replanifier')
+        self.assertEqual(set(response.context['form'].fields['medecin'].queryset), {self.medecin, self.remplacant})
+
+        response = self.client.post(url_liste(RendezVous),
+                                    {**donnees, 'appliquer': '1', 'decalage_jours': 0, 'medecin': self.remplacant.pk})
+        self.assertRedirects(response, url_liste(RendezVous))
+        self.assertEqual(self._selection().filter(medecin=self.remplacant).count(), 2)
+
+
+class TransactionEcritureTests(TransactionTestCase):
+    def _debuts(self, bloc):
+        with CaptureQueriesContext(connection) as requetes:
+            bloc()
+        return [requete['sql'] for requete in requetes if requete['sql'].startswith('BEGIN')]
+
+    def _dans(self, gestionnaire):
+        def bloc():
+            with gestionnaire():
+                RendezVous.objects.count()
+        return bloc
+
+    def test_verrou_d_ecriture_pour_les_reservations_seulement(self):
+        self.assertEqual(self._debuts(self._dans(transaction_ecriture)), ['BEGIN IMMEDIATE'])
+        self.assertEqual(self._debuts(self._dans(transaction.atomic)), ['BEGIN'])
+        self.assertIsNone(connection.transaction_mode)
+
+    def test_imbrique(self):
+        def bloc():
+            with transaction.atomic(), transaction_ecriture():
+                RendezVous.objects.count()
+        self.assertEqual(self._debuts(bloc), ['BEGIN'])
+
+    def test_export_sans_transaction(self):
+        creer_donnees()
+        self.assertEqual(self._debuts(lambda: list(export_colonnes.lire_lots('rendezvous', taille_lot=3))), [])
+
+
+class MigrationCreneauUniqueTests(TransactionTestCase):
+    avant = [('main', '0008_index_admin')]
+    apres = [('main', '0009_creneau_unique')]
+
+    def tearDown(self):
+        executeur = MigrationExecutor(connection)
+        executeur.migrate(executeur.loader.graph.leaf_nodes())
+
+    def test_doublons_refuses(self):
+        executeur = MigrationExecutor(connection)
+        executeur.migrate(self.avant)
+        apps = executeur.loader.project_state(self.avant).apps
+        Utilisateur, RendezVousAvant = apps.get_model('main', 'CustomUser'), apps.get_model('main', 'RendezVous')
+        medecin = Utilisateur.objects.create(username='medecin', role='docteur')
+        patient = Utilisateur.objects.create(username='patient', role='patient')
+        creneau = {'medecin': medecin, 'date_rdv': timezone.localdate(), 'heure_rdv': time(9, 0)}
+        rdvs = [RendezVousAvant.objects.create(patient=patient, motif='Suivi', **creneau) for _ in range(2)]
+        RendezVousAvant.objects.create(patient=patient, motif='Suivi', status='annule', **creneau)
+
+        executeur = MigrationExecutor(connection)
+        with self.assertRaisesMessage(RuntimeError, f"09:00 : RDV {rdvs[0].pk}, {rdvs[1].pk}"):
+            executeur.migrate(self.apres)
+        self.assertEqual(RendezVousAvant.objects.exclude(status='annule').count(), 2)
+
+        RendezVousAvant.objects.filter(pk=rdvs[1].pk).update(status='annule')
+        executeur = MigrationExecutor(connection)
+        executeur.migrate(self.apres)
@@ -0,0 +1,76 @@
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from main import views_supervision
+from main.caches import FileBasedCache
+
+
+class SanteTests(SimpleTestCase):
+    def test_vivant_sans_base(self):
+        # SimpleTestCase : toute requête SQL ferait échouer le test
+        response = self.client.get(reverse('sante'))
+        self.assertEqual(response.json()['statut'], 'ok')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+
+class CacheFichierTests(SimpleTestCase):
+    def test_prolonger_une_entree_expiree(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        cache = FileBasedCache(dossier.name, {'NOM': 'test'})
+        cache.set(views_supervision.CLE_CACHE, 1, 60)
+        with mock.patch('django.core.cache.backends.filebased.time.time', return_value=time.time() + 120):
+            self.assertFalse(cache.touch(views_supervision.CLE_CACHE, 60))
+        self.assertIsNone(cache.get(views_supervision.CLE_CACHE))
+        self.assertFalse(cache.touch(views_supervision.CLE_CACHE, 60))
+
+
+class PretTests(TransactionTestCase):
+    def test_pret(self):
+        response = self.client.get(reverse('pret'))
+        self.assertEqual(response.status_code, 200)
+        donnees = response.json()
+        self.assertEqual(donnees['statut'], 'pret')
+        self.assertEqual(set(donnees['verifications']),
+                         {'base_lecture', 'base_verrou_ecriture', 'caches', 'migrations', 'disque'})
+        for resultat in donnees['verifications'].values():
+            self.assertTrue(resultat['ok'])
+            self.assertGreaterEqual(resultat['duree_ms'], 0)
+        self.assertGreater(donnees['verifications']['disque']['libre_octets'], 0)
+
+    def test_cache_sans_nouvelle_entree(self):
+        self.client.get(reverse('pret'))
+        # Sondes suivantes : la clé est prolongée, jamais recréée
+        with mock.patch.object(type(caches['sessions']), 'set') as ecriture:
+            for _ in range(3):
+                self.assertEqual(self.client.get(reverse('pret')).status_code, 200)
+        ecriture.assert_not_called()
+
+    @override_settings(ESCO_SANTE_DELAI=0.2)
+    def test_base_verrouillee_retiree_vite(self):
+        # Une autre connexion garde le verrou d'écriture
+        autre = views_supervision._sqlite(5)
+        self.addCleanup(autre.close)
+        autre.execute('BEGIN IMMEDIATE')
+        self.addCleanup(autre.execute, 'ROLLBACK')
+
+        with self.assertLogs('main.views_supervision', 'WARNING'):
+            response = self.client.get(reverse('pret'))
+        self.assertEqual(response.status_code, 503)
+        donnees = response.json()
+        self.assertEqual(donnees['statut'], 'indisponible')
+        self.assertFalse(donnees['verifications']['base_verrou_ecriture']['ok'])
+        self.assertTrue(donnees['verifications']['base_lecture']['ok'])
+        self.assertLess(donnees['duree_ms'], 2000)
+
+    @override_settings(ESCO_SANTE_DISQUE_MIN=2 ** 62)
+    def test_disque_plein(self):
+        with self.assertLogs('main.views_supervision', 'WARNING'):
+            response = self.client.get(reverse('pret'))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['verifications']['disque']['ok'])
@@ -0,0 +1,109 @@
+import gzip
+import sqlite3
+import tempfile
+from contextlib import closing
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from main import sauvegardes
+
+
+class SauvegardesTests(SimpleTestCase):
+    def setUp(self):
+        travail = tempfile.TemporaryDirectory()
+        self.addCleanup(travail.cleanup)
+        self.travail = Path(travail.name)
+        self.dossier = self.travail / 'sauvegardes'
+        self.source = self.travail / 'source.sqlite3'
+        with closing(sqlite3.connect(self.source)) as base:
+            base.execute('CREATE TABLE t (x TEXT)')
+            base.executemany('INSERT INTO t VALUES (?)', [(f'ligne {i}',) for i in range(5000)])
+            base.commit()
+        # La base « en service » des tests est la source temporaire
+        patch = mock.patch.dict(settings.DATABASES['default'], NAME=str(self.source))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _compter(self, base):
+        with closing(sqlite3.connect(base)) as connexion:
+            return connexion.execute('SELECT COUNT(*) FROM t').fetchone()[0]
+
+    def test_instantane_par_etapes(self):
+        mesures = sauvegardes.sauvegarder(self.dossier, pages=4, pause=0, garder=7)
+        chemin = mesures['chemin']
+        self.assertRegex(chemin.name, sauvegardes.NOM_INSTANTANE)
+        self.assertGreater(mesures['etapes'], 1)
+        self.assertGreaterEqual(mesures['verrou'], mesures['etape_max'])
+        self.assertLess(mesures['taille_compressee'], mesures['taille'])
+        # Empreinte au format sha256sum, calculée sur le fichier écrit
+        self.assertEqual(Path(f'{chemin}.sha256').read_text(), f"{mesures['sha256']}  {chemin.name}\n")
+        self.assertEqual(sauvegardes.empreinte(chemin), mesures['sha256'])
+        self.assertEqual(sauvegardes.verifier(chemin)['tables'], 1)
+
+    def test_retention(self):
+        self.dossier.mkdir()
+        anciens = [self.dossier / f'esco-2024010{i}T000000.sqlite3.gz' for i in range(1, 4)]
+        for chemin in anciens:
+            chemin.write_bytes(b'')
+            Path(f'{chemin}.sha256').write_text('')
+        mesures = sauvegardes.sauvegarder(self.dossier, pause=0, garder=2)
+        self.assertEqual(mesures['supprimes'], anciens[:2])
+        self.assertEqual(sauvegardes.instantanes(self.dossier), [anciens[2], mesures['chemin']])
+        self.assertFalse(Path(f'{anciens[0]}.sha256').exists())
+
+    def test_instantanes_de_la_meme_seconde(self):
+        premier = sauvegardes.sauvegarder(self.dossier, pause=0)
+        second = sauvegardes.sauvegarder(self.dossier, pause=0)
+        self.assertEqual(sauvegardes.instantanes(self.dossier), [premier['chemin'], second['chemin']])
+        self.assertEqual(sauvegardes.empreinte(premier['chemin']), premier['sha256'])
+
+        # Même horodatage : l'instantané existant et son empreinte sont conservés
+        horloge = mock.patch('main.sauvegardes.datetime')
+        maintenant = horloge.start()
+        self.addCleanup(horloge.stop)
+        maintenant.now.return_value = datetime.strptime(second['chemin'].name[5:26], '%Y%m%dT%H%M%S%f')
+        with self.assertRaises(FileExistsError):
+            sauvegardes.sauvegarder(self.dossier, pause=0)
+        sauvegardes.verifier(second['chemin'])
+        self.assertEqual(len(list(self.dossier.iterdir())), 4)
+
+    def test_instantane_corrompu(self):
+        chemin = sauvegardes.sauvegarder(self.dossier, pause=0)['chemin']
+        donnees = bytearray(chemin.read_bytes())
+        donnees[len(donnees) // 2] ^= 0xFF
+        chemin.write_bytes(donnees)
+        with self.assertRaisesMessage(sauvegardes.SauvegardeInvalide, 'Empreinte'):
+            sauvegardes.verifier(chemin)
+
+        # Empreinte cohérente mais contenu qui n'est pas une base SQLite
+        chemin.write_bytes(gzip.compress(b'pas une base' * 1000))
+        Path(f'{chemin}.sha256').write_text(f'{sauvegardes.empreinte(chemin)}  {chemin.name}\n')
+        with self.assertRaisesMessage(sauvegardes.SauvegardeInvalide, 'Base invalide'):
+            sauvegardes.verifier(chemin)
+
+    def test_restauration(self):
+        chemin = sauvegardes.sauvegarder(self.dossier, pause=0)['chemin']
+        restauree = self.travail / 'restauree.sqlite3'
+        self.assertEqual(sauvegardes.restaurer(chemin, restauree)['tables'], 1)
+        self.assertEqual(self._compter(restauree), 5000)
+        with self.assertRaisesMessage(ValueError, 'base en service'):
+            sauvegardes.restaurer(chemin, self.source)
+
+    def test_commande(self):
+        sortie = StringIO()
+        call_command('sauvegarder', dossier=str(self.dossier), pause=0, stdout=sortie)
+        self.assertIn('Blocage des écritures', sortie.getvalue())
+        chemin = sauvegardes.instantanes(self.dossier)[-1]
+
+        call_command('sauvegarder', verifier=str(chemin), stdout=sortie)
+        self.assertIn('intègre', sortie.getvalue())
+        call_command('sauvegarder', restaurer=str(chemin), vers=str(self.travail / 'r.sqlite3'), stdout=sortie)
+        self.assertEqual(self._compter(self.travail / 'r.sqlite3'), 5000)
+        with self.assertRaises(CommandError):
+            call_command('sauvegarder', restaurer=str(chemin), vers=str(self.source), stdout=sortie)
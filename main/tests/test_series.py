@@ -0,0 +1,109 @@
+from datetime import date, time, timedelta
+from unittest import mock
+
+from django.contrib.admin.models import LogEntry
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from main.models import CustomUser, RendezVous, SerieRendezVous
+from main.reservations import ConflitsCreneaux
+from main.series import annuler_suite, creer_serie, modifier_suite
+
+from .donnees import creer_donnees
+
+
+class SerieRendezVousTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+        # Médecin sans planning : seuls les RDV existants peuvent créer des conflits
+        cls.medecin = CustomUser.objects.create_user('dr_suivi', password='x', role='docteur')
+        cls.lundi = timezone.localdate() + timedelta(days=7 - timezone.localdate().weekday())
+
+    def _serie(self, **champs):
+        return SerieRendezVous(**{
+            'patient': self.utilisateurs['patient'], 'medecin': self.medecin, 'heure_rdv': time(10, 0),
+            'motif': 'Dialyse', 'date_debut': self.lundi, 'nombre': 4, **champs,
+        })
+
+    def test_dates(self):
+        self.assertEqual(self._serie(frequence='quinzaine').dates()[-1], self.lundi + timedelta(weeks=6))
+        self.assertEqual(self._serie(frequence='hebdomadaire', nombre=None, date_fin=self.lundi + timedelta(days=20)).dates(),
+                         [self.lundi + timedelta(weeks=n) for n in range(3)])
+        # Fin de mois ramenée au dernier jour des mois plus courts
+        self.assertEqual(self._serie(frequence='mensuelle', date_debut=date(2027, 1, 31)).dates(),
+                         [date(2027, 1, 31), date(2027, 2, 28), date(2027, 3, 31), date(2027, 4, 30)])
+
+    def test_creation_en_un_insert(self):
+        serie = self._serie()
+        # Savepoint, RDV existants, planning, série, bulk_create, release
+        with self.assertNumQueries(6):
+            self.assertEqual(len(creer_serie(serie)), 4)
+        self.assertEqual(serie.occurrences.count(), 4)
+
+    def test_conflit_tout_ou_rien(self):
+        RendezVous.objects.create(patient=self.utilisateurs['patient'], medecin=self.medecin,
+                                  date_rdv=self.lundi + timedelta(weeks=2), heure_rdv=time(10, 0), motif='Autre')
+        with self.assertRaises(ConflitsCreneaux) as contexte:
+            creer_serie(self._serie())
+        self.assertEqual(len(contexte.exception.conflits), 1)
+        self.assertFalse(SerieRendezVous.objects.filter(medecin=self.medecin).exists())
+
+    def test_modifier_et_annuler_la_suite(self):
+        serie = self._serie()
+        premiere, *suite = creer_serie(serie)
+        RendezVous.objects.filter(pk=premiere.pk).update(status='termine')
+
+        serie.heure_rdv = time(11, 0)
+        self.assertEqual(modifier_suite(serie), 3)
+        self.assertEqual(set(serie.occurrences.exclude(pk=premiere.pk).values_list('heure_rdv', flat=True)),
+                         {time(11, 0)})
+        self.assertEqual(serie.occurrences.get(pk=premiere.pk).heure_rdv, time(10, 0))
+
+        with self.assertNumQueries(6):
+            self.assertEqual(annuler_suite(SerieRendezVous.objects.filter(pk=serie.pk)), (3, []))
+        self.assertEqual(serie.occurrences.filter(status='annule').count(), 3)
+
+    def test_admin_signale_les_conflits(self):
+        creer_serie(self._serie())
+        self.client.force_login(self.utilisateurs['admin'])
+        url = reverse('esco_admin:main_serierendezvous_add')
+        donnees = {'patient': self.utilisateurs['patient'].pk, 'medecin': self.medecin.pk, 'heure_rdv': '10:00',
+                   'motif': 'Pansement', 'frequence': 'hebdomadaire', 'date_debut': self.lundi.isoformat(), 'nombre': 2}
+        response = self.client.post(url, donnees)
+        self.assertContains(response, 'créneau déjà réservé', count=2)
+
+        response = self.client.post(url, {**donnees, 'heure_rdv': '14:00'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(RendezVous.objects.filter(medecin=self.medecin, heure_rdv=time(14, 0)).count(), 2)
+
+        serie = SerieRendezVous.objects.get(medecin=self.medecin, heure_rdv=time(14, 0))
+        response = self.client.post(reverse('esco_admin:main_serierendezvous_change', args=[serie.pk]),
+                                    {'medecin': self.medecin.pk, 'heure_rdv': '15:00', 'motif': 'Pansement'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(set(serie.occurrences.values_list('heure_rdv', flat=True)), {time(15, 0)})
+
+    def test_admin_conflit_a_l_enregistrement(self):
+        # Créneau pris entre la validation du formulaire et l'enregistrement
+        self.client.force_login(self.utilisateurs['admin'])
+        url = reverse('esco_admin:main_serierendezvous_add')
+        donnees = {'patient': self.utilisateurs['patient'].pk, 'medecin': self.medecin.pk, 'heure_rdv': '10:00',
+                   'motif': 'Pansement', 'frequence': 'hebdomadaire', 'date_debut': self.lundi.isoformat(), 'nombre': 2}
+        conflit = ConflitsCreneaux(["créneau réservé pendant la création de la série"])
+        with mock.patch('main.series.creer_serie', side_effect=conflit):
+            response = self.client.post(url, donnees, follow=True)
+        self.assertEqual(response.redirect_chain, [(url, 302)])
+        self.assertContains(response, 'réservé pendant la création de la série')
+        self.assertFalse(SerieRendezVous.objects.filter(medecin=self.medecin).exists())
+        self.assertFalse(LogEntry.objects.exists())
+
+        serie = self._serie()
+        creer_serie(serie)
+        url = reverse('esco_admin:main_serierendezvous_change', args=[serie.pk])
+        with mock.patch('main.series.modifier_suite', side_effect=conflit):
+            response = self.client.post(url, {'medecin': self.medecin.pk, 'heure_rdv': '15:00', 'motif': 'Pansement'},
+                                        follow=True)
+        self.assertEqual(response.redirect_chain, [(url, 302)])
+        self.assertContains(response, 'réservé pendant la création de la série')
+        self.assertEqual(set(serie.occurrences.values_list('heure_rdv', flat=True)), {time(10, 0)})
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from main.models import RendezVous
+from main.routeurs import SessionsRouter
+
+from .donnees import creer_donnees
+
+# Réglages vus par un processus lancé avec ESCO_SESSION_BACKEND=<moteur>
+CODE_REGLAGES = """
+import json
+from esco_clean import settings
+print(json.dumps([settings.SESSION_ENGINE, sorted(settings.DATABASES), settings.DATABASE_ROUTERS]))
+"""
+
+
+class MoteurTests(SimpleTestCase):
+    def _reglages(self, moteur):
+        resultat = subprocess.run([sys.executable, '-c', CODE_REGLAGES], cwd=settings.BASE_DIR, check=True,
+                                  capture_output=True, text=True, env=dict(os.environ, ESCO_SESSION_BACKEND=moteur, ESCO_REPLICA=''))
+        return resultat.stdout.strip()
+
+    def test_choix_du_moteur(self):
+        self.assertEqual(self._reglages('signed_cookies'),
+                         '["django.contrib.sessions.backends.signed_cookies", ["default"], []]')
+        self.assertEqual(self._reglages('cache'), '["django.contrib.sessions.backends.cache", ["default"], []]')
+        # Sessions en base : base dédiée et routeur
+        self.assertEqual(self._reglages('cached_db'),
+                         '["django.contrib.sessions.backends.cached_db", ["default", "sessions"], '
+                         '["main.routeurs.SessionsRouter"]]')
+
+    def test_routeur(self):
+        routeur = SessionsRouter()
+        self.assertEqual((routeur.db_for_read(Session), routeur.db_for_write(Session)), ('sessions', 'sessions'))
+        self.assertIsNone(routeur.db_for_read(RendezVous))
+        self.assertIsNone(routeur.db_for_write(RendezVous))
+        self.assertTrue(routeur.allow_migrate('sessions', 'sessions'))
+        self.assertFalse(routeur.allow_migrate('default', 'sessions'))
+        self.assertFalse(routeur.allow_migrate('sessions', 'main'))
+        self.assertIsNone(routeur.allow_migrate('default', 'main'))
+
+
+class SessionsEnCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = creer_donnees()
+
+    def test_pas_d_eviction_des_sessions(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        reglages = {alias: dict(options) for alias, options in settings.CACHES.items()}
+        reglages['sessions']['LOCATION'] = dossier.name
+        with override_settings(CACHES=reglages, SESSION_ENGINE='django.contrib.sessions.backends.cache'):
+            # Au-delà des 300 entrées par défaut, Django supprimerait un tiers du cache
+            cache = caches['sessions']
+            cache.set_many({f'session{i}': i for i in range(350)})
+            self.assertEqual(len(cache._list_cache_files()), 350)
+
+            self.client.force_login(self.utilisateurs['medecin'])
+            self.assertEqual(self.client.get(reverse('dashboard_medecin')).status_code, 200)
+            self.assertEqual(len(cache._list_cache_files()), 351)
+
+    def test_purge_des_sessions_expirees(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        reglages = {alias: dict(options) for alias, options in settings.CACHES.items()}
+        reglages['sessions']['LOCATION'] = dossier.name
+        with override_settings(CACHES=reglages):
+            cache = caches['sessions']
+            # Sans éviction, une écriture ne parcourt pas le dossier
+            with mock.patch.object(cache, '_list_cache_files') as parcours:
+                cache.set_many({f'expiree{i}': i for i in range(5)}, timeout=0)
+                cache.set('active', 1, timeout=3600)
+            parcours.assert_not_called()
+            self.assertEqual(len(cache._list_cache_files()), 6)
+
+            sortie = StringIO()
+            call_command('purger_sessions', stdout=sortie)
+            self.assertIn('5 session(s)', sortie.getvalue())
+            self.assertEqual(len(cache._list_cache_files()), 1)
+            self.assertEqual(cache.get('active'), 1)
@@ -1,5 +1,18 @@
 from django.urls import path
-from . import views
+from django.utils.module_loading import import_string
+from . import views, views_supervision
+
+
+def vue_differee(chemin):
+    """
+    Vue importée au premier appel : le module qui la définit (et ses
+    dépendances lourdes, comme reportlab) n'est pas chargé au démarrage.
+    """
+    def vue(request, *args, **kwargs):
+        return import_string(chemin)(request, *args, **kwargs)
+    vue.__name__ = chemin.rsplit('.', 1)[-1]
+    return vue
+
 
 urlpatterns = [
     # Page d'accueil
@@ -21,16 +34,19 @@ urlpatterns = [
     # Rendez-vous
     path('nouveau-rdv/', views.nouveau_rdv, name='nouveau_rdv'),
     path('mes-rdv/', views.mes_rdv, name='mes_rdv'),
+    path('mes-rdv/<int:rdv_id>/annuler/', views.annuler_rdv, name='annuler_rdv'),
     
     # URLs Patients
     path('consultations/', views.consultations, name='consultations'),
     path('mon-dossier-medical/', views.mon_dossier_medical, name='mon_dossier_medical'),
-    path('download-dossier-pdf/', views.download_my_dossier_pdf, name='download_my_dossier_pdf'),
+    path('download-dossier-pdf/', vue_differee('main.views_pdf.download_my_dossier_pdf'), name='download_my_dossier_pdf'),
     
     # URLs Médecin
     path('nouvelle-consultation/', views.nouvelle_consultation, name='nouvelle_consultation'),
     path('consultations-medecin/', views.consultations_medecin, name='consultations_medecin'),
     path('liste-patients/', views.liste_patients, name='liste_patients'),
+    path('cohortes/', views.cohorte_patients, name='cohorte_patients'),
+    path('api/cohortes/', views.cohorte_patients_api, name='cohorte_patients_api'),
     # Vérifie que cette ligne existe dans urls.py
     path('rdv-medecin/', views.rdv_medecin, name='rdv_medecin'),
     path('planning-medecin/', views.planning_medecin, name='planning_medecin'),
@@ -40,9 +56,19 @@ urlpatterns = [
     path('profile/', views.profile, name='profile'),
     # Dans urls.py, ajoute ces lignes :
     path('mes-prescriptions/', views.mes_prescriptions, name='mes_prescriptions'),
+    path('mes-prescriptions/imprimer/', vue_differee('main.views_pdf.imprimer_prescriptions'), name='imprimer_prescriptions'),
+    path('medecin/prescription/imprimer/<int:prescription_id>/', vue_differee('main.views_pdf.imprimer_prescription'), name='imprimer_prescription'),
     path('dossier-patient/<int:patient_id>/', views.dossier_patient, name='dossier_patient'),
     # Dans urls.py, ajoute :
     path('profil-medical/', views.profil_medical, name='profil_medical'),
+    # Constantes vitales
+    path('constantes/<int:patient_id>/', views.constantes_patient, name='constantes_patient'),
+    path('constantes/tournee/', views.tournee_constantes, name='tournee_constantes'),
+
+    # Supervision
+    path('metrics', views_supervision.exposition_metriques, name='metriques'),
+    path('healthz', views_supervision.sante, name='sante'),
+    path('readyz', views_supervision.pret, name='pret'),
 ]
 
 
@@ -111,7 +137,6 @@ urlpatterns = [
 #     path('download-dossier-pdf/', views.download_my_dossier_pdf, name='download_my_dossier_pdf'),
 #     path('dashboard/', views.dashboard, name='dashboard'),
 #     path('mon-dossier-medical/', views.mon_dossier_medical, name='mon_dossier_medical'),
-#     path('medecin/prescription/imprimer/<int:prescription_id>/', views.imprimer_prescription, name='imprimer_prescription'),
 #     path('medecin/nouvelle-consultation/', views.nouvelle_consultation, name='nouvelle_consultation'),
 #     path('dashboard/patient/', views.dashboard_patient, name='dashboard_patient'),
 #     path('dashboard/medecin/', views.dashboard_medecin, name='dashboard_medecin'),
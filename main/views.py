@@ -6,33 +6,33 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.utils import timezone
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 from django.core.exceptions import PermissionDenied
 from datetime import datetime, timedelta
 from django.db.models.functions import TruncDate
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.core.paginator import Paginator
 import io
 from datetime import datetime
 # Imports des modèles et formulaires
 from .models import CustomUser, Patient, Prescription, RendezVous, SoinsInfirmier, Consultation, Medecin, Infirmier, Secretaire
-from .forms import CustomUserCreationForm, ProfilMedicalForm, RendezVousForm, ProfileUpdateForm
+from .forms import CustomUserCreationForm, ProfilMedicalForm, RendezVousForm, ProfileUpdateForm, CohorteForm
+from .models import MesureConstante, TRANCHES_AGE, CATEGORIES_IMC, CATEGORIES_TENSION
+from . import archivage, audit, constantes, cohortes, liste_attente, periodes
+from .reservations import STATUTS_A_VENIR, CreneauIndisponible, reserver_creneau
+import csv
+import json
+import logging
 
-# Imports pour PDF
-from django.http import HttpResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.units import inch
-from reportlab.lib.colors import HexColor
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from io import BytesIO
-import datetime
 from datetime import datetime, time
 from django.utils.timezone import make_aware, is_naive
 # Dans views.py - CORRECT ✅
 from .models import Consultation, RendezVous, CustomUser
 
+logger = logging.getLogger(__name__)
+
 # ==================== DÉCORATEURS ====================
 
 def patient_required(view_func):
@@ -57,6 +57,7 @@ def profil_medical(request):
         messages.error(request, 'Accès réservé aux patients.')
         return redirect('dashboard')
     
+    request.user.charger_profil_medical()
     if request.method == 'POST':
         form = ProfilMedicalForm(request.POST, instance=request.user)
         if form.is_valid():
@@ -64,6 +65,7 @@ def profil_medical(request):
             user.profil_complete = True
             user.derniere_maj_profil = timezone.now()
             user.save()
+            constantes.enregistrer_profil(user, form.changed_data, user.derniere_maj_profil)
             
             messages.success(request, 'Votre profil médical a été mis à jour avec succès!')
             return redirect('dashboard_patient')
@@ -183,15 +185,15 @@ def dashboard_patient(request):
     # Récupérer les données du patient
     prochains_rdv = RendezVous.objects.filter(
         patient=request.user,
-        date_rdv__gte=timezone.now().date()
-    ).order_by('date_rdv')
+        date_rdv__gte=timezone.localdate()
+    ).select_related('medecin').order_by('date_rdv')
     
     rdv_total = RendezVous.objects.filter(patient=request.user).count()
     consultations_total = Consultation.objects.filter(rdv__patient=request.user).count()
     
     dernieres_consultations = Consultation.objects.filter(
         rdv__patient=request.user
-    ).order_by('-created_at')[:3]
+    ).select_related('rdv__medecin').order_by('-created_at')[:3]
     
     context = {
         'prochains_rdv': prochains_rdv[:5],
@@ -211,7 +213,7 @@ def dashboard_medecin(request):
         return redirect('dashboard')
     
     # Données aujourd'hui
-    today = timezone.now().date()
+    today = timezone.localdate()
     rdv_aujourd_hui = RendezVous.objects.filter(
         medecin=request.user,
         date_rdv=today
@@ -228,9 +230,8 @@ def dashboard_medecin(request):
             rdv__medecin=request.user
         ).count(),
         'consultations_mois': Consultation.objects.filter(
+            periodes.periode('month', today).q('created_at'),
             rdv__medecin=request.user,
-            created_at__month=today.month,
-            created_at__year=today.year
         ).count(),
     }
     
@@ -317,7 +318,7 @@ def nouveau_rdv(request):
                     rdv.medecin = request.user
                     # Le patient est choisi dans le formulaire
                 
-                rdv.save()
+                reserver_creneau(rdv)
                 messages.success(request, 'Rendez-vous créé avec succès!')
                 
                 # Redirection selon le rôle
@@ -326,7 +327,11 @@ def nouveau_rdv(request):
                 else:
                     return redirect('dashboard_medecin')
                     
+            except CreneauIndisponible as e:
+                # Créneau pris entre la validation du formulaire et l'enregistrement
+                form.add_error('heure_rdv', str(e))
             except Exception as e:
+                logger.exception("Échec de la prise de rendez-vous", extra={'utilisateur': request.user.pk})
                 messages.error(request, f'Erreur: {str(e)}')
         else:
             messages.error(request, 'Erreurs dans le formulaire.')
@@ -354,14 +359,38 @@ def nouveau_rdv(request):
 def mes_rdv(request):
     """Vue pour voir mes rendez-vous"""
     if hasattr(request.user, 'role') and request.user.role == 'patient':
-        rdv_list = RendezVous.objects.filter(patient=request.user).order_by('-date_rdv')
+        rdv_list = RendezVous.objects.filter(patient=request.user).select_related('medecin').order_by('-date_rdv')
     elif hasattr(request.user, 'role') and request.user.role == 'docteur':
-        rdv_list = RendezVous.objects.filter(medecin=request.user).order_by('-date_rdv')
+        rdv_list = RendezVous.objects.filter(medecin=request.user).select_related('patient', 'medecin').order_by('-date_rdv')
     else:
         messages.error(request, 'Accès non autorisé.')
         return redirect('dashboard')
     
-    return render(request, 'mes_rdv.html', {'rdv_list': rdv_list})
+    return render(request, 'mes_rdv.html', {
+        'rdv_list': rdv_list,
+        'aujourd_hui': timezone.localdate(),
+        'statuts_annulables': STATUTS_A_VENIR,
+    })
+
+@login_required
+@require_POST
+def annuler_rdv(request, rdv_id):
+    """Annulation d'un RDV à venir par son patient ; le créneau libéré profite à la liste d'attente"""
+    if not (hasattr(request.user, 'role') and request.user.role == 'patient'):
+        messages.error(request, 'Accès non autorisé.')
+        return redirect('dashboard')
+
+    rdv = RendezVous.objects.filter(pk=rdv_id, patient=request.user)
+    annules, _ = liste_attente.annuler_rdvs(
+        rdv.filter(status__in=STATUTS_A_VENIR, date_rdv__gte=timezone.localdate())
+    )
+    if annules:
+        messages.success(request, 'Rendez-vous annulé.')
+    elif rdv.exists():
+        messages.error(request, "Ce rendez-vous ne peut plus être annulé.")
+    else:
+        raise Http404("Rendez-vous introuvable")
+    return redirect('mes_rdv')
 
 # ==================== VUES PATIENTS ====================
 
@@ -390,13 +419,16 @@ def mon_dossier_medical(request):
     if not (hasattr(request.user, 'role') and request.user.role == 'patient'):
         messages.error(request, 'Accès réservé aux patients.')
         return redirect('dashboard')
+
+    # Journal des accès : mis en file, écrit plus tard par lots (main/audit.py)
+    audit.enregistrer(request, request.user.pk, 'dossier')
     
-    # Récupérer toutes les données du patient
-    rdv_list = RendezVous.objects.filter(patient=request.user).order_by('-date_rdv')[:10]
+    # Récupérer toutes les données du patient (historique archivé compris)
+    rdvs = archivage.Historique(RendezVous, patient=request.user)
+    consultations = archivage.Historique(Consultation, rdv__patient=request.user)
+    rdv_list = rdvs.select_related('medecin').order_by('-date_rdv')[:10]
     
-    consultations_list = Consultation.objects.filter(
-        rdv__patient=request.user
-    ).order_by('-created_at')[:5]
+    consultations_list = consultations.select_related('rdv__medecin').order_by('-created_at')[:5]
     
     prescriptions_list = Prescription.objects.filter(
         patient=request.user
@@ -404,16 +436,17 @@ def mon_dossier_medical(request):
     
     # Statistiques
     stats = {
-        'total_rdv': RendezVous.objects.filter(patient=request.user).count(),
-        'total_consultations': Consultation.objects.filter(rdv__patient=request.user).count(),
+        'total_rdv': rdvs.count(),
+        'total_consultations': consultations.count(),
         'total_prescriptions': Prescription.objects.filter(patient=request.user).count(),
         'prochains_rdv': RendezVous.objects.filter(
             patient=request.user,
-            date_rdv__gte=timezone.now().date()
+            date_rdv__gte=timezone.localdate()
         ).count(),
     }
     
     # Profil médical (s'il existe)
+    request.user.charger_profil_medical()
     patient_profile = request.user if hasattr(request.user, 'profil_complete') else None
     
     context = {
@@ -439,15 +472,19 @@ def dossier_patient(request, patient_id):
     except CustomUser.DoesNotExist:
         messages.error(request, 'Patient non trouvé.')
         return redirect('liste_patients')
+
+    audit.enregistrer(request, patient.pk, 'dossier')
     
-    # Historique des RDV avec ce médecin
-    rdv_list = RendezVous.objects.filter(
+    # Historique des RDV avec ce médecin (archives comprises)
+    rdv_list = archivage.Historique(
+        RendezVous,
         patient=patient,
         medecin=request.user
     ).order_by('-date_rdv', '-heure_rdv')
     
     # Consultations
-    consultations_list = Consultation.objects.filter(
+    consultations_list = archivage.Historique(
+        Consultation,
         rdv__patient=patient,
         rdv__medecin=request.user
     ).order_by('-created_at')
@@ -467,11 +504,13 @@ def dossier_patient(request, patient_id):
         'dernier_rdv': rdv_list.first(),
     }
     
-    # 🆕 Données médicales du patient
+    # 🆕 Données médicales du patient (dernières mesures, profil sinon)
+    constantes_patient = patient.get_constantes()
     donnees_medicales = {
         'age': patient.get_age(),
-        'imc': patient.get_imc(),
-        'tension': patient.get_tension(),
+        'imc': constantes_patient['imc'],
+        'tension': constantes_patient['tension'],
+        'constantes': constantes_patient,
         'profil_complete': patient.profil_complete,
     }
     
@@ -487,9 +526,91 @@ def dossier_patient(request, patient_id):
     return render(request, 'dossier_patient.html', context)
 
 
+def _datetime_locale(valeur):
+    """Convertit une date ISO en datetime aware (fuseau de la clinique si aucun fuseau n'est indiqué)"""
+    moment = datetime.fromisoformat(valeur)
+    return make_aware(moment) if is_naive(moment) else moment
+
+@login_required
+def constantes_patient(request, patient_id):
+    """Série d'une constante d'un patient, sous-échantillonnée pour les graphiques (JSON)"""
+    if not (hasattr(request.user, 'role') and request.user.role in ['docteur', 'infirmier']):
+        return JsonResponse({'erreur': 'Accès réservé au personnel soignant.'}, status=403)
+
+    patient = get_object_or_404(CustomUser, id=patient_id, role='patient')
+    type_mesure = request.GET.get('type', 'tension_systolique')
+    if type_mesure not in constantes.TYPES_VALIDES:
+        return JsonResponse({'erreur': f'Type de mesure inconnu: {type_mesure}'}, status=400)
+
+    fin = timezone.now()
+    debut = fin - timedelta(days=30)
+    try:
+        if request.GET.get('debut'):
+            debut = _datetime_locale(request.GET['debut'])
+        if request.GET.get('fin'):
+            fin = _datetime_locale(request.GET['fin'])
+        nb_points = min(int(request.GET.get('points', 200)), 2000)
+    except ValueError:
+        return JsonResponse({'erreur': 'Paramètres invalides.'}, status=400)
+
+    serie = MesureConstante.objects.serie(patient, type_mesure, debut, fin, nb_points)
+    derniere = MesureConstante.objects.derniere(patient, type_mesure)
+
+    return JsonResponse({
+        'patient': patient.id,
+        'type': type_mesure,
+        'debut': debut.isoformat(),
+        'fin': fin.isoformat(),
+        'points': [
+            {
+                'periode': point['periode'].isoformat(),
+                'min': point['minimum'],
+                'max': point['maximum'],
+                'moyenne': point['moyenne'],
+                'nombre': point['nombre'],
+            }
+            for point in serie
+        ],
+        'derniere': {
+            'valeur': derniere.valeur,
+            'date': derniere.date_mesure.isoformat(),
+        } if derniere else None,
+    })
+
+@login_required
+@require_POST
+def tournee_constantes(request):
+    """Enregistrement en bloc des constantes relevées pendant une tournée infirmière (JSON)"""
+    if not (hasattr(request.user, 'role') and request.user.role == 'infirmier'):
+        return JsonResponse({'erreur': 'Accès réservé aux infirmiers.'}, status=403)
+
+    try:
+        donnees = json.loads(request.body)
+        if not isinstance(donnees.get('releves'), list) or not all(
+                isinstance(releve, dict) and isinstance(releve.get('mesures'), dict) for releve in donnees['releves']):
+            return JsonResponse({'erreur': 'Relevés mal formés.'}, status=400)
+        releves = [
+            {
+                'patient': int(releve['patient']),
+                'mesures': releve['mesures'],
+                'date_mesure': _datetime_locale(releve['date']) if releve.get('date') else None,
+                'observations': releve.get('observations'),
+            }
+            for releve in donnees['releves']
+        ]
+        ids_patients = {releve['patient'] for releve in releves}
+        if CustomUser.objects.filter(id__in=ids_patients, role='patient').count() != len(ids_patients):
+            return JsonResponse({'erreur': 'Patient inconnu dans les relevés.'}, status=400)
+        soins = constantes.enregistrer_tournee(request.user, releves)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return JsonResponse({'erreur': str(e)}, status=400)
+
+    return JsonResponse({'soins_crees': len(soins)}, status=201)
+
 @login_required
 def profile(request):
     """Vue pour modifier le profil"""
+    request.user.charger_profil_medical()
     if request.method == 'POST':
         form = ProfileUpdateForm(request.POST, instance=request.user)
         if form.is_valid():
@@ -547,6 +668,7 @@ def nouvelle_consultation(request):
         except RendezVous.DoesNotExist:
             messages.error(request, 'Rendez-vous non trouvé')
         except Exception as e:
+            logger.exception("Échec de l'enregistrement de la consultation", extra={'utilisateur': request.user.pk})
             messages.error(request, f'Erreur: {str(e)}')
     
     context = {
@@ -566,57 +688,166 @@ def liste_patients(request):
     tous_patients = CustomUser.objects.filter(
         role='patient',
         is_active=True
-    ).order_by('last_name', 'first_name')
-    
-    # Créer les statistiques pour chaque patient
-    patients_with_stats = []
-    for patient in tous_patients:
-        # RDV avec ce médecin
-        rdv_count = RendezVous.objects.filter(
-            patient=patient,
-            medecin=request.user
-        ).count()
-        
-        # Dernière consultation
-        derniere_consultation = Consultation.objects.filter(
-            rdv__patient=patient,
-            rdv__medecin=request.user
-        ).order_by('-created_at').first()
-        
-        # Dernière prescription
-        derniere_prescription = Prescription.objects.filter(
-            patient=patient,
-            medecin=request.user
-        ).order_by('-date_prescription').first()
-        
-        # Prochain RDV
-        prochain_rdv = RendezVous.objects.filter(
-            patient=patient,
-            medecin=request.user,
-            date_rdv__gte=timezone.now().date()
-        ).order_by('date_rdv', 'heure_rdv').first()
-        
-        patients_with_stats.append({
-            'patient': patient,
-            'rdv_count': rdv_count,
-            'derniere_consultation': derniere_consultation,
-            'derniere_prescription': derniere_prescription,
-            'prochain_rdv': prochain_rdv,
-            'has_history': rdv_count > 0,  # Si le patient a un historique avec ce médecin
-        })
+    ).avec_indicateurs()
+
+    # Filtres démographiques calculés par la base (âge, IMC, tension)
+    filtre_age = request.GET.get('age', '')
+    filtre_imc = request.GET.get('imc', '')
+    filtre_tension = request.GET.get('tension', '')
+    if filtre_age:
+        tous_patients = tous_patients.tranche_age(filtre_age)
+    if filtre_imc:
+        tous_patients = tous_patients.categorie_imc(filtre_imc)
+    if filtre_tension:
+        tous_patients = tous_patients.filter(categorie_tension=filtre_tension)
+
+    tri = request.GET.get('tri', 'nom')
+    ordres = {
+        'nom': ('last_name', 'first_name'),
+        'age': (F('age').asc(nulls_last=True), 'last_name'),
+        'imc': (F('imc').desc(nulls_last=True), 'last_name'),
+    }
+    tous_patients = tous_patients.order_by(*ordres.get(tri, ordres['nom']))
+    
+    # Statistiques de chaque patient avec ce médecin, calculées par des sous-requêtes
+    # (une seule requête pour toute la page, quel que soit le nombre de patients)
+    rdv_avec_moi = RendezVous.objects.filter(patient=OuterRef('pk'), medecin=request.user)
+    prochain_rdv = rdv_avec_moi.filter(date_rdv__gte=timezone.localdate()).order_by('date_rdv', 'heure_rdv')
+    tous_patients = tous_patients.annotate(
+        rdv_count=Coalesce(Subquery(
+            rdv_avec_moi.order_by().values('patient').annotate(total=Count('pk')).values('total')
+        ), 0),
+        derniere_consultation=Subquery(
+            Consultation.objects.filter(rdv__patient=OuterRef('pk'), rdv__medecin=request.user)
+            .order_by('-created_at').values('created_at')[:1]
+        ),
+        derniere_prescription=Subquery(
+            Prescription.objects.filter(patient=OuterRef('pk'), medecin=request.user)
+            .order_by('-date_prescription').values('date_prescription')[:1]
+        ),
+        prochain_rdv_date=Subquery(prochain_rdv.values('date_rdv')[:1]),
+        prochain_rdv_heure=Subquery(prochain_rdv.values('heure_rdv')[:1]),
+    )
     
     # Filtrer si demandé (seulement patients avec historique)
     filter_type = request.GET.get('filter', 'all')
     if filter_type == 'avec_historique':
-        patients_with_stats = [p for p in patients_with_stats if p['has_history']]
+        tous_patients = tous_patients.filter(Exists(rdv_avec_moi))
+    
+    paginator = Paginator(tous_patients, 20)
+    patients_page = paginator.get_page(request.GET.get('page'))
+    patients_with_stats = [
+        {
+            'patient': patient,
+            'rdv_count': patient.rdv_count,
+            'derniere_consultation': patient.derniere_consultation,
+            'derniere_prescription': patient.derniere_prescription,
+            'prochain_rdv': {
+                'date_rdv': patient.prochain_rdv_date,
+                'heure_rdv': patient.prochain_rdv_heure,
+            } if patient.prochain_rdv_date else None,
+            'has_history': patient.rdv_count > 0,  # Si le patient a un historique avec ce médecin
+        }
+        for patient in patients_page
+    ]
+    
+    # Paramètres de filtre conservés dans les liens de pagination
+    parametres = request.GET.copy()
+    parametres.pop('page', None)
     
     context = {
         'patients_with_stats': patients_with_stats,
-        'total_patients': len(patients_with_stats),
+        'page_obj': patients_page,
+        'parametres': parametres.urlencode(),
+        'total_patients': paginator.count,
         'filter_type': filter_type,
+        'filtre_age': filtre_age,
+        'filtre_imc': filtre_imc,
+        'filtre_tension': filtre_tension,
+        'tri': tri,
+        'tranches_age': TRANCHES_AGE,
+        'categories_imc': CATEGORIES_IMC,
+        'categories_tension': CATEGORIES_TENSION,
     }
     
     return render(request, 'liste_patients.html', context)
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de l'écrire"""
+    def write(self, valeur):
+        return valeur
+
+def _export_cohorte_csv(cohorte):
+    """Export CSV de la cohorte, généré par lots sans charger toute la liste"""
+    writer = csv.writer(_Echo(), delimiter=';')
+
+    def generer():
+        yield '\ufeff'  # BOM pour Excel
+        yield writer.writerow([libelle for _, libelle in cohortes.COLONNES])
+        for ligne in cohortes.lignes(cohorte).iterator(chunk_size=2000):
+            yield writer.writerow([
+                '' if ligne[cle] is None else ligne[cle] for cle, _ in cohortes.COLONNES
+            ])
+
+    response = StreamingHttpResponse(generer(), content_type='text/csv; charset=utf-8')
+    nom_fichier = f"cohorte_{timezone.localdate().strftime('%Y%m%d')}.csv"
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    return response
+
+@login_required
+def cohorte_patients(request):
+    """Constructeur de cohortes : recherche multicritère des patients (HTML et export CSV)"""
+    if not (hasattr(request.user, 'role') and request.user.role == 'docteur'):
+        messages.error(request, 'Accès réservé aux médecins.')
+        return redirect('dashboard')
+
+    form = CohorteForm(request.GET or None)
+    page_obj = None
+    if form.is_valid():
+        cohorte = cohortes.construire_cohorte(request.user, form.cleaned_data)
+        if request.GET.get('format') == 'csv':
+            return _export_cohorte_csv(cohorte)
+        paginator = Paginator(cohortes.lignes(cohorte), 25)
+        page_obj = paginator.get_page(request.GET.get('page'))
+
+    # Paramètres de recherche conservés dans les liens de pagination / d'export
+    parametres = request.GET.copy()
+    parametres.pop('page', None)
+    parametres.pop('format', None)
+
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'parametres': parametres.urlencode(),
+    }
+    return render(request, 'cohorte_patients.html', context)
+
+@login_required
+def cohorte_patients_api(request):
+    """Constructeur de cohortes : mêmes critères que la vue HTML, résultats paginés en JSON"""
+    if not (hasattr(request.user, 'role') and request.user.role == 'docteur'):
+        return JsonResponse({'erreur': 'Accès réservé aux médecins.'}, status=403)
+
+    form = CohorteForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'erreur': 'Critères invalides.', 'details': form.errors}, status=400)
+
+    # Taille de page bornée à [1, 500] ; valeur non numérique : taille par défaut
+    try:
+        taille_page = max(1, min(int(request.GET.get('taille', 50)), 500))
+    except (TypeError, ValueError):
+        taille_page = 50
+
+    cohorte = cohortes.construire_cohorte(request.user, form.cleaned_data)
+    paginator = Paginator(cohortes.lignes(cohorte), taille_page)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    return JsonResponse({
+        'total': paginator.count,
+        'page': page_obj.number,
+        'pages': paginator.num_pages,
+        'resultats': list(page_obj.object_list),
+    })
 @login_required
 def rdv_medecin(request):
     """Vue pour afficher les rendez-vous du médecin"""
@@ -626,7 +857,6 @@ def rdv_medecin(request):
     
     # Filtres
     filter_status = request.GET.get('status', 'all')
-    filter_date = request.GET.get('date', 'all')
     
     # Base queryset
     rdv_queryset = RendezVous.objects.filter(medecin=request.user)
@@ -635,12 +865,8 @@ def rdv_medecin(request):
     if filter_status != 'all':
         rdv_queryset = rdv_queryset.filter(status=filter_status)
     
-    if filter_date == 'today':
-        rdv_queryset = rdv_queryset.filter(date_rdv=timezone.now().date())
-    elif filter_date == 'week':
-        start_week = timezone.now().date()
-        end_week = start_week + timedelta(days=7)
-        rdv_queryset = rdv_queryset.filter(date_rdv__range=[start_week, end_week])
+    filter_date, periode = periodes.periode_depuis_requete(request)
+    rdv_queryset = periodes.filtrer(rdv_queryset, 'date_rdv', periode)
     
     rdv_list = rdv_queryset.order_by('-date_rdv', '-heure_rdv')
     
@@ -649,7 +875,7 @@ def rdv_medecin(request):
         'total': rdv_queryset.count(),
         'today': RendezVous.objects.filter(
             medecin=request.user, 
-            date_rdv=timezone.now().date()
+            date_rdv=timezone.localdate()
         ).count(),
         'programme': rdv_queryset.filter(status='programme').count(),
         'termine': rdv_queryset.filter(status='termine').count(),
@@ -672,19 +898,19 @@ def planning_medecin(request):
         return redirect('dashboard')
     
     # Récupérer les RDV pour les 7 prochains jours
-    today = timezone.now().date()
+    today = timezone.localdate()
     end_date = today + timedelta(days=7)
     
     rdv_semaine = RendezVous.objects.filter(
         medecin=request.user,
-        date_rdv__range=[today, end_date]
+        date_rdv__gte=today,
+        date_rdv__lt=end_date,
     ).select_related('patient').order_by('date_rdv', 'heure_rdv')
     
-    # Organiser par jour
-    planning_par_jour = {}
-    for i in range(7):
-        date = today + timedelta(days=i)
-        planning_par_jour[date] = rdv_semaine.filter(date_rdv=date)
+    # Organiser par jour (une seule requête, regroupée en Python)
+    planning_par_jour = {today + timedelta(days=i): [] for i in range(7)}
+    for rdv in rdv_semaine:
+        planning_par_jour[rdv.date_rdv].append(rdv)
     
     context = {
         'planning_par_jour': planning_par_jour,
@@ -726,7 +952,7 @@ def mes_prescriptions(request):
     
     # Filtres
     patient_filter = request.GET.get('patient', '')
-    date_filter = request.GET.get('date', 'all')
+    date_filter, periode = periodes.periode_depuis_requete(request)
     
     # Base queryset
     prescriptions_queryset = Prescription.objects.filter(medecin=request.user)
@@ -737,23 +963,9 @@ def mes_prescriptions(request):
             patient__id=patient_filter
         )
     
-    if date_filter == 'today':
-        prescriptions_queryset = prescriptions_queryset.filter(
-            date_prescription__date=timezone.now().date()
-        )
-    elif date_filter == 'week':
-        start_week = timezone.now().date()
-        end_week = start_week + timedelta(days=7)
-        prescriptions_queryset = prescriptions_queryset.filter(
-            date_prescription__date__range=[start_week, end_week]
-        )
-    elif date_filter == 'month':
-        prescriptions_queryset = prescriptions_queryset.filter(
-            date_prescription__month=timezone.now().month,
-            date_prescription__year=timezone.now().year
-        )
+    prescriptions_queryset = periodes.filtrer(prescriptions_queryset, 'date_prescription', periode)
     
-    prescriptions_list = prescriptions_queryset.order_by('-date_prescription')
+    prescriptions_list = prescriptions_queryset.select_related('patient').order_by('-date_prescription')
     
     # Pagination
     paginator = Paginator(prescriptions_list, 10)
@@ -771,6 +983,9 @@ def mes_prescriptions(request):
         'patients_list': patients_list,
         'patient_filter': patient_filter,
         'date_filter': date_filter,
+        'date_debut': request.GET.get('debut', ''),
+        'date_fin': request.GET.get('fin', ''),
+        'periodes': periodes.PERIODES,
         'total_prescriptions': prescriptions_queryset.count(),
     }
     
@@ -844,6 +1059,7 @@ def nouvelle_prescription(request):
         except CustomUser.DoesNotExist:
             messages.error(request, 'Patient non trouvé')
         except Exception as e:
+            logger.exception("Échec de la création de la prescription", extra={'utilisateur': request.user.pk})
             messages.error(request, f'Erreur: {str(e)}')
     
     # 🔧 MODIFICATION ICI : Afficher TOUS les patients actifs
@@ -855,250 +1071,3 @@ def nouvelle_prescription(request):
     return render(request, 'nouvelle_prescription.html', {
         'patients': patients
     })
-    
- # Ajoute cette vue complète à la fin de views.py :
-
-@login_required
-def download_my_dossier_pdf(request):
-    """Télécharger le dossier médical complet du patient en PDF"""
-    if not (hasattr(request.user, 'role') and request.user.role == 'patient'):
-        messages.error(request, 'Accès réservé aux patients.')
-        return redirect('dashboard')
-    
-    try:
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.lib import colors
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
-        from io import BytesIO
-        
-        # Créer le PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch)
-        
-        # Styles personnalisés
-        styles = getSampleStyleSheet()
-        
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            spaceAfter=30,
-            alignment=1,  # Center
-            textColor=colors.purple,
-            fontName='Helvetica-Bold'
-        )
-        
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=15,
-            spaceBefore=20,
-            textColor=colors.blue,
-            fontName='Helvetica-Bold'
-        )
-        
-        # Contenu du PDF
-        story = []
-        
-        # En-tête avec logo virtuel
-        story.append(Paragraph("🏥 ESCO - ESPACE SANTÉ FAMILLE", title_style))
-        story.append(Paragraph("DOSSIER MÉDICAL PERSONNEL", title_style))
-        story.append(Spacer(1, 20))
-        
-        # Informations personnelles
-        story.append(Paragraph("👤 INFORMATIONS PERSONNELLES", heading_style))
-        
-        # Table des informations personnelles
-        personal_data = [
-            ['Nom complet:', request.user.get_full_name()],
-            ['Email:', request.user.email],
-            ['Téléphone:', request.user.telephone or 'Non renseigné'],
-            ['Adresse:', request.user.adresse or 'Non renseignée'],
-        ]
-        
-        if hasattr(request.user, 'date_naissance') and request.user.date_naissance:
-            personal_data.append(['Date de naissance:', request.user.date_naissance.strftime('%d/%m/%Y')])
-            if request.user.get_age():
-                personal_data.append(['Âge:', f"{request.user.get_age()} ans"])
-        
-        personal_table = Table(personal_data, colWidths=[2.5*inch, 4*inch])
-        personal_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
-        story.append(personal_table)
-        story.append(Spacer(1, 20))
-        
-        # Données médicales
-        if hasattr(request.user, 'poids') and (request.user.poids or request.user.taille or 
-                                              getattr(request.user, 'groupe_sanguin', None) or 
-                                              request.user.get_tension()):
-            story.append(Paragraph("⚕️ DONNÉES MÉDICALES", heading_style))
-            
-            medical_data = []
-            if request.user.poids:
-                medical_data.append(['Poids:', f"{request.user.poids} kg"])
-            if request.user.taille:
-                medical_data.append(['Taille:', f"{request.user.taille} cm"])
-            if request.user.get_imc():
-                imc = request.user.get_imc()
-                status_imc = ""
-                if imc < 18.5:
-                    status_imc = " (Insuffisance pondérale)"
-                elif 18.5 <= imc < 25:
-                    status_imc = " (Poids normal)"
-                elif 25 <= imc < 30:
-                    status_imc = " (Surpoids)"
-                else:
-                    status_imc = " (Obésité)"
-                medical_data.append(['IMC:', f"{imc}{status_imc}"])
-            
-            if hasattr(request.user, 'groupe_sanguin') and request.user.groupe_sanguin:
-                medical_data.append(['Groupe sanguin:', request.user.groupe_sanguin])
-            if request.user.get_tension():
-                tension = request.user.get_tension()
-                systolique = request.user.tension_systolique
-                status_tension = ""
-                if systolique:
-                    if systolique < 120:
-                        status_tension = " (Normal)"
-                    elif 120 <= systolique < 140:
-                        status_tension = " (Élevé)"
-                    else:
-                        status_tension = " (Hypertension)"
-                medical_data.append(['Tension artérielle:', f"{tension} mmHg{status_tension}"])
-                
-            if medical_data:
-                medical_table = Table(medical_data, colWidths=[2.5*inch, 4*inch])
-                medical_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (0, -1), colors.lightgreen),
-                    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                    ('FONTNAME', (1, 0), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ]))
-                story.append(medical_table)
-                story.append(Spacer(1, 20))
-        
-        # Informations médicales détaillées
-        if hasattr(request.user, 'allergies') and (request.user.allergies or 
-                                                  getattr(request.user, 'antecedents_medicaux', None) or 
-                                                  getattr(request.user, 'medicaments_actuels', None)):
-            story.append(Paragraph("📋 INFORMATIONS MÉDICALES DÉTAILLÉES", heading_style))
-            
-            if request.user.allergies:
-                story.append(Paragraph("<b>🚨 Allergies connues:</b>", styles['Normal']))
-                story.append(Paragraph(request.user.allergies, styles['Normal']))
-                story.append(Spacer(1, 10))
-                
-            if getattr(request.user, 'antecedents_medicaux', None):
-                story.append(Paragraph("<b>📖 Antécédents médicaux:</b>", styles['Normal']))
-                story.append(Paragraph(request.user.antecedents_medicaux, styles['Normal']))
-                story.append(Spacer(1, 10))
-                
-            if getattr(request.user, 'medicaments_actuels', None):
-                story.append(Paragraph("<b>💊 Médicaments actuels:</b>", styles['Normal']))
-                story.append(Paragraph(request.user.medicaments_actuels, styles['Normal']))
-                story.append(Spacer(1, 20))
-        
-        # Contact d'urgence
-        if hasattr(request.user, 'personne_urgence_nom') and (request.user.personne_urgence_nom or 
-                                                              getattr(request.user, 'personne_urgence_tel', None)):
-            story.append(Paragraph("🆘 CONTACT D'URGENCE", heading_style))
-            
-            urgence_data = []
-            if request.user.personne_urgence_nom:
-                urgence_data.append(['Nom:', request.user.personne_urgence_nom])
-            if getattr(request.user, 'personne_urgence_tel', None):
-                urgence_data.append(['Téléphone:', request.user.personne_urgence_tel])
-                
-            if urgence_data:
-                urgence_table = Table(urgence_data, colWidths=[2.5*inch, 4*inch])
-                urgence_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (0, -1), colors.orange),
-                    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                    ('FONTNAME', (1, 0), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ]))
-                story.append(urgence_table)
-                story.append(Spacer(1, 20))
-        
-        # Historique des rendez-vous
-        rdv_list = RendezVous.objects.filter(patient=request.user).order_by('-date_rdv')[:10]
-        if rdv_list:
-            story.append(Paragraph("📅 HISTORIQUE DES RENDEZ-VOUS (10 derniers)", heading_style))
-            
-            rdv_data = [['Date', 'Médecin', 'Motif', 'Statut']]
-            for rdv in rdv_list:
-                rdv_data.append([
-                    rdv.date_rdv.strftime('%d/%m/%Y'),
-                    rdv.medecin.get_full_name(),
-                    (rdv.motif[:40] + '...') if len(rdv.motif) > 40 else rdv.motif,
-                    rdv.get_status_display()
-                ])
-            
-            rdv_table = Table(rdv_data, colWidths=[1.2*inch, 1.8*inch, 2.5*inch, 1*inch])
-            rdv_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.purple),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 11),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            story.append(rdv_table)
-            story.append(Spacer(1, 20))
-        
-        # Pied de page
-        story.append(Spacer(1, 30))
-        
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=10,
-            alignment=1,  # Center
-            textColor=colors.grey
-        )
-        
-        story.append(Paragraph(f"📄 Document généré le {timezone.now().strftime('%d/%m/%Y à %H:%M')}", footer_style))
-        story.append(Paragraph("🏥 ESCO - Espace Santé Famille - Confidentiel", footer_style))
-        story.append(Paragraph("📞 Contact: contact@esco-sante.fr | ☎️ 01 23 45 67 89", footer_style))
-        
-        # Construire le PDF
-        doc.build(story)
-        
-        # Préparer la réponse
-        buffer.seek(0)
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="dossier_medical_{request.user.username}_{timezone.now().strftime("%Y%m%d")}.pdf"'
-        
-        return response
-        
-    except ImportError:
-        messages.error(request, 'Erreur: ReportLab non installé. Contactez l\'administrateur.')
-        return redirect('dashboard_patient')
-    except Exception as e:
-        messages.error(request, f'Erreur lors de la génération du PDF: {str(e)}')
-        return redirect('dashboard_patient')
\ No newline at end of file
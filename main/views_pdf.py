@@ -0,0 +1,146 @@
+# main/views_pdf.py
+"""
+Vues de génération PDF.
+
+Ce module n'est importé qu'au premier téléchargement (voir `vue_differee`
+dans urls.py) : ni reportlab ni ce code ne sont chargés au démarrage
+d'un worker ou d'une commande manage.py.
+"""
+import logging
+from io import BytesIO
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.utils import timezone
+
+from . import archivage, audit, pdf, periodes
+from .journalisation import chronometre
+from .models import Consultation, Prescription, RendezVous
+
+logger = logging.getLogger(__name__)
+
+TAILLE_BLOC = 64 * 1024  # octets de PDF envoyés à la fois par l'impression des ordonnances
+
+
+def _journaliser(request, prescriptions):
+    """Met en file l'accès à chaque ordonnance au fil de l'impression"""
+    for prescription in prescriptions:
+        audit.enregistrer(request, prescription.patient_id, 'ordonnance', f'Prescription {prescription.pk}')
+        yield prescription
+
+
+def _blocs_ordonnances(request, prescriptions):
+    """
+    PDF des `prescriptions` par blocs d'environ TAILLE_BLOC octets, envoyés
+    au fil du rendu : le document n'est jamais entier en mémoire.
+    """
+    tampon = BytesIO()
+    with chronometre(logger, 'pdf_ordonnances', utilisateur=request.user.pk) as champs:
+        document = pdf.Ordonnances(tampon)
+        for prescription in _journaliser(request, prescriptions):
+            document.ajouter(prescription)
+            if tampon.tell() >= TAILLE_BLOC:
+                yield tampon.getvalue()
+                tampon.seek(0)
+                tampon.truncate()
+        champs['pages'] = document.terminer()
+        champs['octets'] = document.canvas.octets
+        yield tampon.getvalue()
+
+
+def _reponse_ordonnances(request, prescriptions, nom_fichier):
+    response = StreamingHttpResponse(_blocs_ordonnances(request, prescriptions), content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{nom_fichier}"'
+    return response
+
+
+@login_required
+def imprimer_prescription(request, prescription_id):
+    """Ordonnance imprimable d'une prescription, pour son médecin ou son patient"""
+    prescription = get_object_or_404(Prescription.objects.select_related('medecin', 'patient'), pk=prescription_id)
+    if request.user.pk not in (prescription.medecin_id, prescription.patient_id) and not request.user.is_staff:
+        messages.error(request, 'Accès non autorisé à cette prescription.')
+        return redirect('dashboard')
+    return _reponse_ordonnances(request, [prescription], f'ordonnance_{prescription.pk}.pdf')
+
+
+@login_required
+def imprimer_prescriptions(request):
+    """
+    Impression en lot : toutes les prescriptions d'une journée (par défaut
+    aujourd'hui, ou la période des filtres de mes_prescriptions) dans un seul
+    PDF, une ordonnance par page. Un médecin imprime les siennes ; le
+    personnel administratif peut choisir le médecin (`medecin`) ou tout imprimer.
+    """
+    if getattr(request.user, 'role', None) == 'docteur':
+        prescriptions = Prescription.objects.filter(medecin=request.user)
+    elif request.user.is_staff or getattr(request.user, 'role', None) in ('admin', 'secretaire'):
+        prescriptions = Prescription.objects.all()
+    else:
+        messages.error(request, 'Accès réservé aux médecins.')
+        return redirect('dashboard')
+    retour = 'mes_prescriptions' if request.user.role == 'docteur' else 'dashboard'
+
+    try:
+        # Le filtre médecin n'est proposé qu'à l'administration
+        if request.GET.get('medecin') and request.user.role != 'docteur':
+            prescriptions = prescriptions.filter(medecin__id=int(request.GET['medecin']))
+        if request.GET.get('patient'):
+            prescriptions = prescriptions.filter(patient__id=int(request.GET['patient']))
+    except ValueError:
+        messages.error(request, "Filtres d'impression invalides.")
+        return redirect(retour)
+    if 'date' in request.GET:
+        code, periode = periodes.periode_depuis_requete(request)
+    else:
+        code, periode = 'today', periodes.periode('today')
+    prescriptions = periodes.filtrer(prescriptions, 'date_prescription', periode)
+
+    if not prescriptions.exists():
+        messages.info(request, 'Aucune prescription à imprimer pour ces critères.')
+        return redirect(retour)
+
+    # Lecture par paquets : chaque prescription est dessinée puis oubliée
+    prescriptions = (prescriptions.select_related('medecin', 'patient')
+                     .order_by('medecin', 'date_prescription', 'pk')
+                     .iterator(chunk_size=200))
+    return _reponse_ordonnances(request, prescriptions, f'ordonnances_{code}_{timezone.localdate():%Y%m%d}.pdf')
+
+
+@login_required
+def download_my_dossier_pdf(request):
+    """Télécharger le dossier médical complet du patient en PDF"""
+    if not (hasattr(request.user, 'role') and request.user.role == 'patient'):
+        messages.error(request, 'Accès réservé aux patients.')
+        return redirect('dashboard')
+
+    try:
+        patient = request.user.charger_profil_medical()
+        audit.enregistrer(request, patient.pk, 'pdf')
+        buffer = BytesIO()
+        with chronometre(logger, 'pdf_dossier', utilisateur=request.user.pk) as champs:
+            pdf.ecrire_dossier_medical(
+                patient, buffer,
+                constantes=patient.get_constantes(),
+                rdvs=archivage.Historique(RendezVous, patient=patient).select_related('medecin')
+                     .order_by('-date_rdv')[:10],
+                consultations=archivage.Historique(Consultation, rdv__patient=patient).select_related('rdv__medecin')
+                              .order_by('-rdv__date_rdv')[:10],
+                prescriptions=list(Prescription.objects.filter(patient=patient).select_related('medecin')
+                                   .order_by('-date_prescription')[:10]),
+            )
+            champs['octets'] = buffer.tell()
+
+        # Préparer la réponse
+        buffer.seek(0)
+        response = HttpResponse(buffer, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="dossier_medical_{request.user.username}_{timezone.now().strftime("%Y%m%d")}.pdf"'
+
+        return response
+
+    except Exception as e:
+        logger.exception("Échec de la génération du dossier PDF", extra={'utilisateur': request.user.pk})
+        messages.error(request, f'Erreur lors de la génération du PDF: {str(e)}')
+        return redirect('dashboard_patient')
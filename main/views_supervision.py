@@ -0,0 +1,172 @@
+# main/views_supervision.py
+"""
+Vues de supervision, lues par des outils et non par des utilisateurs :
+  - /metrics (format texte Prometheus). Accès : adresse de
+    settings.ESCO_METRIQUES_ADRESSES, jeton settings.ESCO_METRIQUES_JETON
+    (en-tête `Authorization: Bearer <jeton>`) ou superutilisateur connecté ;
+  - /healthz : le processus répond (aucune vérification) ;
+  - /readyz : le worker peut servir des pages. Chaque vérification est
+    chronométrée ; réponse 503 si l'une échoue, pour que le répartiteur de
+    charge retire le worker. Sans authentification (répartiteur de charge),
+    aucune donnée patient n'y figure.
+"""
+import hmac
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.views.decorators.cache import never_cache
+
+from . import metriques, replica
+
+logger = logging.getLogger(__name__)
+
+
+def _collecteur_autorise(request):
+    jeton = settings.ESCO_METRIQUES_JETON
+    if jeton and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {jeton}'):
+        return True
+    if request.META.get('REMOTE_ADDR') in settings.ESCO_METRIQUES_ADRESSES:
+        return True
+    return request.user.is_superuser
+
+
+def exposition_metriques(request):
+    """Métriques de tous les workers de la machine et indicateurs métier"""
+    if not _collecteur_autorise(request):
+        return HttpResponseForbidden()
+    try:
+        jauges = metriques.jauges_metier()
+    except DatabaseError:
+        # Base indisponible : les métriques des requêtes restent utiles
+        logger.exception("Indicateurs métier indisponibles")
+        jauges = []
+    return HttpResponse(metriques.texte(metriques.agreger(), jauges),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@never_cache
+def sante(request):
+    """Le processus est vivant"""
+    return JsonResponse({'statut': 'ok', 'processus': os.getpid()})
+
+
+def _sqlite(delai):
+    """
+    Connexion séparée à la base principale, qui attend au plus `delai`
+    secondes un verrou : la connexion des requêtes attend jusqu'à 5 s, et
+    celle du thread courant peut être dans une transaction.
+    """
+    parametres = connections[DEFAULT_DB_ALIAS].get_connection_params()
+    return sqlite3.connect(parametres['database'], timeout=delai, uri=parametres.get('uri', False),
+                           isolation_level=None)
+
+
+def _base_lecture():
+    connexion = _sqlite(settings.ESCO_SANTE_DELAI)
+    try:
+        connexion.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+    finally:
+        connexion.close()
+    return {}
+
+
+def _base_verrou_ecriture():
+    """Prend puis relâche le verrou d'écriture (BEGIN IMMEDIATE), sans rien écrire"""
+    connexion = _sqlite(settings.ESCO_SANTE_DELAI)
+    try:
+        connexion.execute('BEGIN IMMEDIATE')
+        connexion.execute('ROLLBACK')
+    finally:
+        connexion.close()
+    return {}
+
+
+CLE_CACHE = 'esco_readyz'
+DUREE_CLE_CACHE = 60
+
+
+def _caches():
+    """
+    Écriture et relecture d'une même clé dans chaque cache. La clé est
+    prolongée (touch) plutôt que recréée : un cache fichier compte ses
+    fichiers, et peut en supprimer, à chaque nouvelle entrée.
+    """
+    for alias in settings.CACHES:
+        cache = caches[alias]
+        if not cache.touch(CLE_CACHE, DUREE_CLE_CACHE):
+            cache.set(CLE_CACHE, 1, DUREE_CLE_CACHE)
+        if cache.get(CLE_CACHE) != 1:
+            raise RuntimeError(f"Cache {alias} : valeur écrite non relue")
+    return {}
+
+
+# Une fois les migrations appliquées, elles le restent : plus vérifié ensuite
+_migrations = {'a_jour': False}
+
+
+def _migrations_appliquees():
+    if not _migrations['a_jour']:
+        from django.db.migrations.executor import MigrationExecutor
+
+        executeur = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+        en_attente = executeur.migration_plan(executeur.loader.graph.leaf_nodes())
+        if en_attente:
+            raise RuntimeError(f"{len(en_attente)} migration(s) non appliquée(s)")
+        _migrations['a_jour'] = True
+    return {}
+
+
+def _disque():
+    dossier = Path(settings.MEDIA_ROOT)
+    while not dossier.exists() and dossier != dossier.parent:
+        dossier = dossier.parent
+    libre = shutil.disk_usage(dossier).free
+    if libre < settings.ESCO_SANTE_DISQUE_MIN:
+        raise RuntimeError(f"{libre} octets libres pour MEDIA_ROOT")
+    return {'libre_octets': libre}
+
+
+def _replique():
+    # Information seulement : une réplique en retard n'est plus lue (ReplicaMiddleware)
+    retard = replica.retard()
+    return {'retard_s': None if retard is None else round(retard, 1)}
+
+
+VERIFICATIONS = {
+    'base_lecture': _base_lecture,
+    'base_verrou_ecriture': _base_verrou_ecriture,
+    'caches': _caches,
+    'migrations': _migrations_appliquees,
+    'disque': _disque,
+}
+
+
+@never_cache
+def pret(request):
+    """Vérifications de disponibilité du worker, chronométrées"""
+    verifications = dict(VERIFICATIONS, **({'replique': _replique} if replica.active() else {}))
+    resultats = {}
+    debut = time.perf_counter()
+    for nom, verification in verifications.items():
+        debut_verification = time.perf_counter()
+        try:
+            resultat = {'ok': True, **verification()}
+        except (DatabaseError, sqlite3.Error, OSError, RuntimeError) as exc:
+            logger.warning("Vérification %s en échec : %s", nom, exc)
+            resultat = {'ok': False, 'erreur': str(exc)}
+        resultat['duree_ms'] = round((time.perf_counter() - debut_verification) * 1000, 1)
+        resultats[nom] = resultat
+    disponible = all(resultat['ok'] for resultat in resultats.values())
+    return JsonResponse({
+        'statut': 'pret' if disponible else 'indisponible',
+        'duree_ms': round((time.perf_counter() - debut) * 1000, 1),
+        'verifications': resultats,
+    }, status=200 if disponible else 503)